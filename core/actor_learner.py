@@ -0,0 +1,351 @@
+"""
+Actor-Learner
+Takes training off the decision loop: the in-loop actor only runs
+inference and ships transitions to a learner process, which owns the
+replay (or rollout) storage, trains continuously and publishes its policy
+weights back at a fixed interval, so frame-loop latency does not depend
+on the cost of an update
+"""
+
+import time
+import queue
+import logging
+import multiprocessing
+from typing import Optional, Dict, Any, List, Tuple, Union
+
+import numpy as np
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+from .advanced_reinforcement_learning import AdvancedRLAgent
+
+# (observation, action, reward, next_observation, done, policy_info)
+Transition = Tuple[np.ndarray, Union[int, np.ndarray], float, np.ndarray, bool, Optional[Dict[str, float]]]
+
+
+def _publish(weights, message: Dict[str, Any]) -> bool:
+    """Replace the unread weights message (if any) with a newer one; False if the slot stayed busy"""
+    try:
+        weights.put_nowait(message)
+        return True
+    except queue.Full:
+        pass
+
+    try:
+        weights.get_nowait()
+    except queue.Empty:
+        pass
+
+    try:
+        weights.put_nowait(message)
+        return True
+    except queue.Full:
+        return False
+
+
+def _learner(agent_kwargs: Dict[str, Any], transitions, weights, stop_event, publish_interval: float,
+             updates_per_transition: Optional[float], max_batches_per_drain: int, num_threads: Optional[int],
+             save_path: Optional[str]):
+    """Learner process body: store incoming transitions, train, publish weights"""
+    logger = logging.getLogger(__name__)
+
+    if TORCH_AVAILABLE and num_threads:
+        torch.set_num_threads(num_threads)
+
+    agent = AdvancedRLAgent(**agent_kwargs)
+
+    stats = {
+        'transitions': 0,
+        'batches': 0,
+        'updates': 0,
+        'update_ms': 0.0,
+        'publishes': 0,
+        'gaps': 0,
+        'started': time.time()
+    }
+    last_train_info = {}
+    last_publish = None
+    version = 0
+    expected_sequence = None
+
+    def drain(timeout: float) -> int:
+        """Store queued transition batches, waiting up to timeout for the first"""
+        nonlocal expected_sequence
+        received = 0
+
+        for index in range(max_batches_per_drain):
+            try:
+                sequence, batch = transitions.get(timeout=timeout) if index == 0 and timeout > 0 \
+                    else transitions.get_nowait()
+            except queue.Empty:
+                break
+
+            # The actor dropped the batches in between: the steps before and
+            # after the gap are not consecutive
+            if expected_sequence is not None and sequence != expected_sequence:
+                agent.mark_episode_boundary()
+                stats['gaps'] += 1
+            expected_sequence = sequence + 1
+
+            for transition in batch:
+                agent.store_transition(*transition)
+
+            received += len(batch)
+            stats['batches'] += 1
+
+        stats['transitions'] += received
+        return received
+
+    def message() -> Dict[str, Any]:
+        return {
+            'version': version,
+            'policy': agent.get_policy_state(),
+            'stats': dict(stats, agent=agent.get_training_stats(), train=last_train_info)
+        }
+
+    try:
+        while not stop_event.is_set():
+            trained = False
+
+            if updates_per_transition is None or stats['updates'] < updates_per_transition * stats['transitions']:
+                started = time.perf_counter()
+                train_info = agent.learn()
+
+                if train_info:
+                    trained = True
+                    last_train_info = train_info
+                    stats['updates'] += 1
+                    stats['update_ms'] = (time.perf_counter() - started) * 1000
+
+            # Block on the queue only while there is nothing to train on
+            drain(0.0 if trained else 0.05)
+
+            now = time.perf_counter()
+            if last_publish is None or now - last_publish >= publish_interval:
+                if _publish(weights, message()):
+                    version += 1
+                    last_publish = now
+                    stats['publishes'] += 1
+
+        # Keep what the actor flushed on stop and hand back the final weights
+        while drain(0.0):
+            pass
+
+        _publish(weights, message())
+
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"Learner failed: {e}")
+        raise
+    finally:
+        if save_path:
+            agent.save_model(save_path)
+
+
+class ActorLearner:
+    """
+    In-loop actor with a learner process
+
+    The actor agent is built in this process from agent_kwargs and never
+    trains: select_action() runs inference and picks up weights the
+    learner published since the last call, add_transition() batches
+    transitions into a bounded queue without blocking (a full queue drops
+    the batch and counts it). Batches are numbered, and the learner ends
+    the episode of the last step before a missing batch, so PPO's rollout
+    does not bootstrap across the gap. The learner builds its own agent from the
+    same arguments, trains as fast as it can or at most
+    updates_per_transition updates per received transition (DQN decays
+    epsilon per update, so a cap ties exploration to collected
+    experience) and publishes every publish_interval seconds.
+
+    Transitions are pickled by the queue's feeder thread after
+    add_transition() returns, so observations must not be views of
+    buffers that change (use ObservationStack.snapshot()). PPO steps
+    carry the value and log probability of the actor's last
+    select_action() call. The learner is started with spawn by default,
+    which works with CUDA already initialized in this process; the
+    calling script needs the usual `if __name__ == "__main__":` guard.
+    """
+
+    def __init__(self, agent_kwargs: Dict[str, Any], publish_interval: float = 1.0, send_batch: int = 8,
+                 queue_size: int = 64, updates_per_transition: Optional[float] = None,
+                 max_batches_per_drain: int = 16, learner_threads: Optional[int] = None,
+                 save_path: Optional[str] = None, start_method: Optional[str] = "spawn"):
+        self.logger = logging.getLogger(__name__)
+
+        self.agent_kwargs = dict(agent_kwargs)
+        self.agent = AdvancedRLAgent(**self.agent_kwargs)
+
+        self.publish_interval = publish_interval
+        self.send_batch = send_batch
+        self.queue_size = queue_size
+        self.updates_per_transition = updates_per_transition
+        self.max_batches_per_drain = max_batches_per_drain
+        self.learner_threads = learner_threads
+        self.save_path = save_path
+
+        self.context = multiprocessing.get_context(start_method)
+        self.process = None
+        self.transitions = None
+        self.weights = None
+        self.stop_event = None
+
+        self._pending = []
+        self._sequence = 0
+        self._policy_info = None
+        self.learner_stats = {}
+
+        self.stats = {
+            'transitions': 0,
+            'sent_batches': 0,
+            'dropped_transitions': 0,
+            'weights_version': -1,
+            'weight_loads': 0,
+            'load_ms': 0.0,
+            'select_ms': 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Start the learner process"""
+        if self.running:
+            return
+
+        self.transitions = self.context.Queue(maxsize=self.queue_size)
+        self.weights = self.context.Queue(maxsize=1)
+        self.stop_event = self.context.Event()
+
+        self.process = self.context.Process(
+            target=_learner,
+            args=(self.agent_kwargs, self.transitions, self.weights, self.stop_event, self.publish_interval,
+                  self.updates_per_transition, self.max_batches_per_drain, self.learner_threads, self.save_path),
+            daemon=True
+        )
+        self.process.start()
+
+        self.logger.info(f"Learner process started (pid {self.process.pid})")
+
+    def stop(self, timeout: float = 10.0):
+        """Flush pending transitions, stop the learner and load its last published weights"""
+        if self.process is None:
+            return
+
+        self.flush()
+        self.stop_event.set()
+
+        # The learner cannot exit while its last weights message is still
+        # in its feeder thread, so keep reading while waiting for it
+        deadline = time.perf_counter() + timeout
+        while self.process.is_alive() and time.perf_counter() < deadline:
+            self.poll_weights()
+            self.process.join(timeout=0.05)
+
+        if self.process.is_alive():
+            self.logger.warning("Learner did not stop in time; terminating it")
+            self.process.terminate()
+            self.process.join(timeout=1.0)
+
+        self.poll_weights()
+
+        # Unsent batches must not keep this process from exiting
+        self.transitions.cancel_join_thread()
+        self.transitions.close()
+        self.weights.close()
+
+        self.process = None
+        self.logger.info("Learner process stopped")
+
+    def poll_weights(self) -> bool:
+        """Load weights the learner published since the last poll (non-blocking)"""
+        if self.weights is None:
+            return False
+
+        try:
+            message = self.weights.get_nowait()
+        except (queue.Empty, OSError, EOFError):
+            return False
+
+        started = time.perf_counter()
+        self.agent.load_policy_state(message['policy'])
+
+        self.learner_stats = message['stats']
+        self.stats['weights_version'] = message['version']
+        self.stats['weight_loads'] += 1
+        self.stats['load_ms'] = (time.perf_counter() - started) * 1000
+
+        return True
+
+    def select_action(self, observation: np.ndarray, training: bool = True) -> Union[int, np.ndarray]:
+        """Select an action with the latest published weights (inference only)"""
+        started = time.perf_counter()
+        self.poll_weights()
+
+        actions, info = self.agent.select_actions(np.asarray(observation)[np.newaxis], training=training,
+                                                  return_info=True)
+
+        # Kept for the transition this action leads to (PPO's rollout needs them)
+        self._policy_info = {'value': float(info['values'][0]), 'log_prob': float(info['log_probs'][0])} \
+            if info else None
+
+        self.stats['select_ms'] = (time.perf_counter() - started) * 1000
+
+        action = actions[0]
+        return action.item() if np.ndim(action) == 0 else action
+
+    def add_transition(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float,
+                       next_observation: np.ndarray, done: bool):
+        """Queue a transition for the learner; sent in batches of send_batch and at episode ends"""
+        self._pending.append((observation, action, reward, next_observation, done, self._policy_info))
+        self.stats['transitions'] += 1
+
+        if len(self._pending) >= self.send_batch or done:
+            self.flush()
+
+    def flush(self):
+        """Send pending transitions now; drops them if the queue is full or the learner is not running"""
+        if not self._pending:
+            return
+
+        batch: List[Transition] = self._pending
+        self._pending = []
+
+        # Numbered whether or not it is sent, so the learner sees the gap
+        sequence = self._sequence
+        self._sequence += 1
+
+        if not self.running:
+            self.stats['dropped_transitions'] += len(batch)
+            return
+
+        try:
+            self.transitions.put_nowait((sequence, batch))
+            self.stats['sent_batches'] += 1
+        except queue.Full:
+            self.stats['dropped_transitions'] += len(batch)
+
+    def get_training_stats(self) -> Dict[str, Any]:
+        """The learner agent's training statistics (as of its last publish) plus actor and learner counters"""
+        stats = dict(self.learner_stats.get('agent') or self.agent.get_training_stats())
+
+        learner = {key: value for key, value in self.learner_stats.items() if key != 'agent'}
+        learner['alive'] = self.running
+
+        stats['actor'] = dict(self.stats, pending=len(self._pending))
+        stats['learner'] = learner
+
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -22,82 +22,18 @@ try:
 except ImportError:
     TORCH_AVAILABLE = False
 
-class ExperienceBuffer:
+from .replay_buffer import ReplayBuffer, FrameStackReplayBuffer
+from .rollout_buffer import RolloutBuffer
+
+class ExperienceBuffer(ReplayBuffer):
     """
     Experience replay buffer for reinforcement learning
-    Based on implementations from multiple RL algorithms
+    Preallocated arrays with sum-tree prioritized sampling (see ReplayBuffer)
     """
     
-    def __init__(self, buffer_size: int = 100000, prioritized: bool = False):
+    def __init__(self, buffer_size: int = 100000, prioritized: bool = False, **kwargs):
+        super().__init__(capacity=buffer_size, prioritized=prioritized, **kwargs)
         self.buffer_size = buffer_size
-        self.prioritized = prioritized
-        
-        # Standard buffers
-        self.observations = deque(maxlen=buffer_size)
-        self.actions = deque(maxlen=buffer_size)
-        self.rewards = deque(maxlen=buffer_size)
-        self.next_observations = deque(maxlen=buffer_size)
-        self.dones = deque(maxlen=buffer_size)
-        
-        # For prioritized replay
-        if prioritized:
-            self.priorities = deque(maxlen=buffer_size)
-            self.max_priority = 1.0
-        
-        self.logger = logging.getLogger(__name__)
-        
-    def add(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float, 
-            next_observation: np.ndarray, done: bool, priority: float = None):
-        """Add experience to buffer"""
-        self.observations.append(observation)
-        self.actions.append(action)
-        self.rewards.append(reward)
-        self.next_observations.append(next_observation)
-        self.dones.append(done)
-        
-        if self.prioritized:
-            if priority is None:
-                priority = self.max_priority
-            self.priorities.append(priority)
-            self.max_priority = max(self.max_priority, priority)
-    
-    def sample(self, batch_size: int) -> Dict[str, np.ndarray]:
-        """Sample batch from experience buffer"""
-        if len(self.observations) < batch_size:
-            return None
-        
-        if self.prioritized:
-            # Prioritized sampling
-            priorities = np.array(self.priorities, dtype=np.float32)
-            probabilities = priorities / np.sum(priorities)
-            indices = np.random.choice(len(self.observations), batch_size, p=probabilities)
-        else:
-            # Uniform sampling
-            indices = np.random.choice(len(self.observations), batch_size, replace=False)
-        
-        batch = {
-            'observations': np.array([self.observations[i] for i in indices]),
-            'actions': np.array([self.actions[i] for i in indices]),
-            'rewards': np.array([self.rewards[i] for i in indices]),
-            'next_observations': np.array([self.next_observations[i] for i in indices]),
-            'dones': np.array([self.dones[i] for i in indices]),
-            'indices': indices
-        }
-        
-        return batch
-    
-    def update_priorities(self, indices: np.ndarray, priorities: np.ndarray):
-        """Update priorities for prioritized replay"""
-        if not self.prioritized:
-            return
-        
-        for idx, priority in zip(indices, priorities):
-            if 0 <= idx < len(self.priorities):
-                self.priorities[idx] = priority
-                self.max_priority = max(self.max_priority, priority)
-    
-    def __len__(self):
-        return len(self.observations)
 
 class DQNNetwork(nn.Module):
     """
@@ -250,7 +186,8 @@ class AdvancedRLAgent:
     """
     
     def __init__(self, algorithm: str = "DQN", input_shape: Tuple[int, ...] = (84, 84, 4), 
-                 num_actions: int = 4, continuous: bool = False, device: str = "auto"):
+                 num_actions: int = 4, continuous: bool = False, device: str = "auto",
+                 replay_capacity: int = 100000):
         self.logger = logging.getLogger(__name__)
         
         if not TORCH_AVAILABLE:
@@ -260,6 +197,7 @@ class AdvancedRLAgent:
         self.input_shape = input_shape
         self.num_actions = num_actions
         self.continuous = continuous
+        self.replay_capacity = replay_capacity
         
         # Device setup
         if device == "auto":
@@ -303,7 +241,7 @@ class AdvancedRLAgent:
         self.target_q_network.load_state_dict(self.q_network.state_dict())
         
         self.optimizer = optim.Adam(self.q_network.parameters(), lr=0.0001)
-        self.experience_buffer = ExperienceBuffer(buffer_size=100000, prioritized=True)
+        self.experience_buffer = self._create_experience_buffer(prioritized=True)
         
         # DQN hyperparameters
         self.epsilon = 1.0
@@ -313,6 +251,19 @@ class AdvancedRLAgent:
         self.batch_size = 32
         self.target_update_freq = 1000
     
+    def _create_experience_buffer(self, prioritized: bool = False) -> ReplayBuffer:
+        """
+        Replay for this agent's observations
+        
+        Frame stacks (C, H, W) are stored one frame per step instead of
+        two full stacks per transition, about 8x less memory.
+        """
+        if len(self.input_shape) == 3:
+            return FrameStackReplayBuffer(capacity=self.replay_capacity, stack_size=self.input_shape[0],
+                                          prioritized=prioritized)
+        
+        return ExperienceBuffer(buffer_size=self.replay_capacity, prioritized=prioritized)
+    
     def _initialize_ppo(self):
         """Initialize PPO components"""
         self.actor_critic = ActorCriticNetwork(
@@ -327,18 +278,15 @@ class AdvancedRLAgent:
         self.clip_epsilon = 0.2
         self.value_coeff = 0.5
         self.entropy_coeff = 0.01
-        self.batch_size = 64
+        self.batch_size = 64  # minibatch size
+        self.rollout_length = 512
         self.ppo_epochs = 4
+        self.target_kl = 0.015  # stop the update's epochs early past 1.5x this
         
         # PPO rollout storage
-        self.rollout_buffer = {
-            'observations': [],
-            'actions': [],
-            'rewards': [],
-            'values': [],
-            'log_probs': [],
-            'dones': []
-        }
+        self.rollout_buffer = RolloutBuffer(self.rollout_length, self.gamma, self.gae_lambda)
+        self._rollout_tail = (None, True)  # next observation and done of the last stored step
+        self.ppo_stats = {}
     
     def _initialize_ddpg(self):
         """Initialize DDPG components"""
@@ -371,7 +319,7 @@ class AdvancedRLAgent:
         self.actor_optimizer = optim.Adam(self.actor.parameters(), lr=0.0001)
         self.critic_optimizer = optim.Adam(self.critic.parameters(), lr=0.001)
         
-        self.experience_buffer = ExperienceBuffer(buffer_size=100000)
+        self.experience_buffer = self._create_experience_buffer()
         
         # DDPG hyperparameters
         self.gamma = 0.99
@@ -405,8 +353,14 @@ class AdvancedRLAgent:
         self.noise_clip = 0.5
     
     def select_action(self, observation: np.ndarray, training: bool = True) -> Union[int, np.ndarray]:
-        """Select action based on current policy"""
-        observation = torch.FloatTensor(observation).unsqueeze(0).to(self.device)
+        """
+        Select action based on current policy
+        
+        Observations may be views (e.g. ObservationStack.observation());
+        float32 arrays are wrapped without a copy and uint8 planes are
+        scaled to [0, 1] on the device.
+        """
+        observation = self._observation_tensor(observation).unsqueeze(0)
         
         if self.algorithm == "DQN":
             return self._select_action_dqn(observation, training)
@@ -415,6 +369,62 @@ class AdvancedRLAgent:
         elif self.algorithm in ["DDPG", "TD3"]:
             return self._select_action_ddpg(observation, training)
     
+    def select_actions(self, observations: np.ndarray, training: bool = True,
+                       return_info: bool = False) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """
+        Select one action per observation of a batch in a single forward pass
+        
+        Used with several environments (see VecEnvCollector). With
+        return_info, PPO also returns the 'values' and 'log_probs' its
+        rollout needs, so collection does not run the network twice.
+        """
+        observations = self._observation_tensor(observations)
+        count = observations.shape[0]
+        info = {}
+        
+        with torch.no_grad():
+            if self.algorithm == "DQN":
+                actions = self.q_network(observations).argmax(dim=1).cpu().numpy()
+                
+                if training:
+                    explore = np.random.random(count) < self.epsilon
+                    actions[explore] = np.random.randint(self.num_actions, size=int(explore.sum()))
+            
+            elif self.algorithm == "PPO":
+                actor_output, values = self.actor_critic(observations)
+                
+                if self.continuous:
+                    mean, std = actor_output
+                    dist = torch.distributions.Normal(mean, std)
+                    sampled = dist.sample() if training else mean
+                    log_probs = dist.log_prob(sampled).sum(dim=-1)
+                else:
+                    dist = torch.distributions.Categorical(actor_output)
+                    sampled = dist.sample() if training else actor_output.argmax(dim=-1)
+                    log_probs = dist.log_prob(sampled)
+                
+                actions = sampled.cpu().numpy()
+                info = {'values': values.squeeze(-1).cpu().numpy(), 'log_probs': log_probs.cpu().numpy()}
+            
+            else:
+                actor_output, _ = self.actor(observations)
+                mean, _ = actor_output
+                actions = mean.cpu().numpy()
+                
+                if training:
+                    noise = np.random.normal(0, self.noise_std, size=actions.shape)
+                    actions = np.clip(actions + noise, -1, 1)
+        
+        return (actions, info) if return_info else actions
+    
+    def _observation_tensor(self, observation: np.ndarray) -> torch.Tensor:
+        tensor = torch.as_tensor(observation, device=self.device)
+        
+        if tensor.dtype == torch.uint8:
+            return tensor.float().div_(255.0)
+        
+        return tensor.float()
+    
     def _select_action_dqn(self, observation: torch.Tensor, training: bool) -> int:
         """DQN action selection with epsilon-greedy"""
         if training and np.random.random() < self.epsilon:
@@ -464,15 +474,82 @@ class AdvancedRLAgent:
     def train_step(self, observation: np.ndarray, action: Union[int, np.ndarray], 
                    reward: float, next_observation: np.ndarray, done: bool):
         """Perform one training step"""
-        # Add experience to buffer
-        if hasattr(self, 'experience_buffer'):
+        self.store_transition(observation, action, reward, next_observation, done)
+        return self.learn()
+    
+    def store_transition(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float,
+                         next_observation: np.ndarray, done: bool,
+                         policy_info: Optional[Dict[str, float]] = None):
+        """
+        Store one transition without training
+        
+        PPO takes the step's 'value' and 'log_prob' from policy_info when
+        the acting policy supplied them (e.g. an actor process, see
+        ActorLearner) and evaluates its own network otherwise.
+        """
+        if self.algorithm == "PPO":
+            self._store_ppo_step(observation, action, reward, next_observation, done, policy_info)
+        else:
             self.experience_buffer.add(observation, action, reward, next_observation, done)
-        
-        # Algorithm-specific training
+    
+    def mark_episode_boundary(self):
+        """
+        Treat the last stored transition as the end of an episode
+        
+        For when the transitions that followed it were lost: PPO's GAE must
+        not join the steps on either side of the gap. Replay transitions
+        are independent of each other, so DQN, DDPG and TD3 need nothing.
+        """
+        if self.algorithm == "PPO":
+            self.rollout_buffer.end_episode()
+            self._rollout_tail = (None, True)
+    
+    def learn(self) -> Dict[str, float]:
+        """One update from the stored experience; {} while there is not enough (PPO: until the rollout is full)"""
         if self.algorithm == "DQN":
             return self._train_dqn()
         elif self.algorithm == "PPO":
-            return self._train_ppo(observation, action, reward, next_observation, done)
+            if self.rollout_buffer.full:
+                return self._ppo_update(*self._rollout_tail)
+            return {}
+        elif self.algorithm == "DDPG":
+            return self._train_ddpg()
+        elif self.algorithm == "TD3":
+            return self._train_td3()
+    
+    def train_batch(self, observations: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                    next_observations: np.ndarray, dones: np.ndarray,
+                    policy_info: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, float]:
+        """
+        Perform one training step from one step of several environments
+        
+        Replay algorithms store the N transitions and run one update; PPO
+        stores the step in a rollout with one column per environment
+        (rollout_length is split across them) and needs the values and log
+        probabilities from select_actions(return_info=True).
+        """
+        if self.algorithm == "PPO":
+            num_envs = len(observations)
+            
+            if self.rollout_buffer.num_envs != num_envs:
+                if len(self.rollout_buffer):
+                    self._ppo_update()
+                self.rollout_buffer = RolloutBuffer(max(1, self.rollout_length // num_envs), self.gamma,
+                                                    self.gae_lambda, num_envs=num_envs)
+            
+            self.rollout_buffer.add(observations, actions, rewards, policy_info['values'],
+                                    policy_info['log_probs'], dones, batched=True)
+            
+            if self.rollout_buffer.full:
+                return self._ppo_update(next_observations, dones)
+            
+            return {}
+        
+        for env_id, transition in enumerate(zip(observations, actions, rewards, next_observations, dones)):
+            self.experience_buffer.add(*transition, env_id=env_id)
+        
+        if self.algorithm == "DQN":
+            return self._train_dqn()
         elif self.algorithm == "DDPG":
             return self._train_ddpg()
         elif self.algorithm == "TD3":
@@ -483,31 +560,35 @@ class AdvancedRLAgent:
         if len(self.experience_buffer) < self.batch_size:
             return {}
         
-        # Sample batch
+        # Sample batch (contiguous arrays, wrapped without a copy on CPU)
         batch = self.experience_buffer.sample(self.batch_size)
         
-        observations = torch.FloatTensor(batch['observations']).to(self.device)
-        actions = torch.LongTensor(batch['actions']).to(self.device)
-        rewards = torch.FloatTensor(batch['rewards']).to(self.device)
-        next_observations = torch.FloatTensor(batch['next_observations']).to(self.device)
-        dones = torch.BoolTensor(batch['dones']).to(self.device)
+        observations = self._observation_tensor(batch['observations'])
+        actions = torch.as_tensor(batch['actions'], device=self.device).long()
+        rewards = torch.as_tensor(batch['rewards'], device=self.device)
+        next_observations = self._observation_tensor(batch['next_observations'])
+        dones = torch.as_tensor(batch['dones'], device=self.device)
+        weights = torch.as_tensor(batch['weights'], device=self.device)
         
         # Current Q values
-        current_q_values = self.q_network(observations).gather(1, actions.unsqueeze(1))
+        current_q_values = self.q_network(observations).gather(1, actions.unsqueeze(1)).squeeze(1)
         
         # Target Q values
         with torch.no_grad():
             next_q_values = self.target_q_network(next_observations).max(1)[0]
             target_q_values = rewards + (self.gamma * next_q_values * ~dones)
         
-        # Compute loss
-        loss = F.mse_loss(current_q_values.squeeze(), target_q_values)
+        # Importance-weighted loss; TD errors become the new priorities
+        td_errors = target_q_values - current_q_values
+        loss = (weights * td_errors.pow(2)).mean()
         
         # Optimize
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
         
+        self.experience_buffer.update_priorities(batch['indices'], td_errors.detach().abs().cpu().numpy())
+        
         # Update target network
         if self.training_step % self.target_update_freq == 0:
             self.target_q_network.load_state_dict(self.q_network.state_dict())
@@ -519,114 +600,144 @@ class AdvancedRLAgent:
         
         return {'loss': loss.item(), 'epsilon': self.epsilon}
     
-    def _train_ppo(self, observation: np.ndarray, action: Union[int, np.ndarray], 
-                   reward: float, next_observation: np.ndarray, done: bool) -> Dict[str, float]:
-        """PPO training step (simplified rollout collection)"""
-        # Add to rollout buffer
-        obs_tensor = torch.FloatTensor(observation).unsqueeze(0).to(self.device)
-        
-        with torch.no_grad():
-            actor_output, value = self.actor_critic(obs_tensor)
+    def _store_ppo_step(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float,
+                        next_observation: np.ndarray, done: bool,
+                        policy_info: Optional[Dict[str, float]] = None):
+        """Add one step to the rollout, remembering its successor for the update's bootstrap value"""
+        if self.rollout_buffer.num_envs != 1:
+            self.rollout_buffer = RolloutBuffer(self.rollout_length, self.gamma, self.gae_lambda)
+        
+        if policy_info is not None:
+            value, log_prob = policy_info['value'], policy_info['log_prob']
+        else:
+            with torch.no_grad():
+                actor_output, value = self.actor_critic(self._observation_tensor(observation).unsqueeze(0))
+                
+                if self.continuous:
+                    mean, std = actor_output
+                    dist = torch.distributions.Normal(mean, std)
+                    log_prob = dist.log_prob(torch.as_tensor(action, dtype=torch.float32, device=self.device)).sum()
+                else:
+                    action_probs = actor_output
+                    dist = torch.distributions.Categorical(action_probs)
+                    log_prob = dist.log_prob(torch.as_tensor([action], device=self.device))
             
-            if self.continuous:
-                mean, std = actor_output
-                dist = torch.distributions.Normal(mean, std)
-                log_prob = dist.log_prob(torch.FloatTensor(action).to(self.device)).sum()
-            else:
-                action_probs = actor_output
-                dist = torch.distributions.Categorical(action_probs)
-                log_prob = dist.log_prob(torch.LongTensor([action]).to(self.device))
+            value, log_prob = value.item(), log_prob.item()
         
-        self.rollout_buffer['observations'].append(observation)
-        self.rollout_buffer['actions'].append(action)
-        self.rollout_buffer['rewards'].append(reward)
-        self.rollout_buffer['values'].append(value.item())
-        self.rollout_buffer['log_probs'].append(log_prob.item())
-        self.rollout_buffer['dones'].append(done)
-        
-        # Train when rollout is complete or buffer is full
-        if done or len(self.rollout_buffer['observations']) >= self.batch_size:
-            return self._ppo_update()
-        
-        return {}
+        self.rollout_buffer.add(observation, action, reward, value, log_prob, done)
+        self._rollout_tail = (next_observation, done)
     
-    def _ppo_update(self) -> Dict[str, float]:
-        """Perform PPO update"""
-        if len(self.rollout_buffer['observations']) == 0:
+    def _ppo_update(self, next_observation: Optional[np.ndarray] = None,
+                    done: Union[bool, np.ndarray] = True) -> Dict[str, float]:
+        """
+        Perform PPO update
+        
+        Advantages are bootstrapped from the value of next_observation
+        (one per environment for batched rollouts) unless the rollout's
+        last step ended the episode. The rollout is moved to the
+        device once and each epoch runs shuffled minibatches; epochs stop
+        early once the approximate KL divergence from the rollout policy
+        passes 1.5x target_kl.
+        """
+        if len(self.rollout_buffer) == 0:
             return {}
         
-        # Convert to tensors
-        observations = torch.FloatTensor(self.rollout_buffer['observations']).to(self.device)
-        actions = torch.LongTensor(self.rollout_buffer['actions']).to(self.device) if not self.continuous else torch.FloatTensor(self.rollout_buffer['actions']).to(self.device)
-        rewards = torch.FloatTensor(self.rollout_buffer['rewards']).to(self.device)
-        old_values = torch.FloatTensor(self.rollout_buffer['values']).to(self.device)
-        old_log_probs = torch.FloatTensor(self.rollout_buffer['log_probs']).to(self.device)
+        started = time.perf_counter()
+        
+        last_value = 0.0
+        if next_observation is not None and not np.all(done):
+            next_observation = self._observation_tensor(next_observation)
+            if next_observation.dim() == len(self.input_shape):
+                next_observation = next_observation.unsqueeze(0)
+            
+            with torch.no_grad():
+                _, value = self.actor_critic(next_observation)
+            
+            last_value = value.squeeze(-1).cpu().numpy() * (1.0 - np.asarray(done, dtype=np.float32))
+        
+        self.rollout_buffer.finish(last_value)
+        rollout = self.rollout_buffer.get()
         
-        # Compute advantages using GAE
-        advantages = self._compute_gae(rewards, old_values)
-        returns = advantages + old_values
+        # Convert to tensors once
+        observations = self._observation_tensor(rollout['observations'])
+        actions = torch.as_tensor(rollout['actions'], device=self.device)
+        actions = actions.float() if self.continuous else actions.long()
+        old_log_probs = torch.as_tensor(rollout['log_probs'], device=self.device)
+        returns = torch.as_tensor(rollout['returns'], device=self.device)
+        advantages = torch.as_tensor(rollout['advantages'], device=self.device)
         
         # Normalize advantages
         advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
         
         total_loss = 0.0
+        minibatches = 0
+        epochs = 0
+        approx_kl = 0.0
         
         # PPO update epochs
         for _ in range(self.ppo_epochs):
-            # Forward pass
-            actor_output, values = self.actor_critic(observations)
-            
-            if self.continuous:
-                mean, std = actor_output
-                dist = torch.distributions.Normal(mean, std)
-                log_probs = dist.log_prob(actions).sum(dim=-1)
-                entropy = dist.entropy().sum(dim=-1).mean()
-            else:
-                action_probs = actor_output
-                dist = torch.distributions.Categorical(action_probs)
-                log_probs = dist.log_prob(actions)
-                entropy = dist.entropy().mean()
-            
-            # PPO loss components
-            ratio = torch.exp(log_probs - old_log_probs)
-            clipped_ratio = torch.clamp(ratio, 1 - self.clip_epsilon, 1 + self.clip_epsilon)
+            epoch_kl = []
             
-            policy_loss = -torch.min(ratio * advantages, clipped_ratio * advantages).mean()
-            value_loss = F.mse_loss(values.squeeze(), returns)
-            entropy_loss = -self.entropy_coeff * entropy
+            for indices in self.rollout_buffer.minibatches(self.batch_size):
+                batch = torch.as_tensor(indices, device=self.device)
+                
+                # Forward pass
+                actor_output, values = self.actor_critic(observations[batch])
+                
+                if self.continuous:
+                    mean, std = actor_output
+                    dist = torch.distributions.Normal(mean, std)
+                    log_probs = dist.log_prob(actions[batch]).sum(dim=-1)
+                    entropy = dist.entropy().sum(dim=-1).mean()
+                else:
+                    action_probs = actor_output
+                    dist = torch.distributions.Categorical(action_probs)
+                    log_probs = dist.log_prob(actions[batch])
+                    entropy = dist.entropy().mean()
+                
+                # PPO loss components
+                log_ratio = log_probs - old_log_probs[batch]
+                ratio = torch.exp(log_ratio)
+                clipped_ratio = torch.clamp(ratio, 1 - self.clip_epsilon, 1 + self.clip_epsilon)
+                
+                batch_advantages = advantages[batch]
+                policy_loss = -torch.min(ratio * batch_advantages, clipped_ratio * batch_advantages).mean()
+                value_loss = F.mse_loss(values.squeeze(-1), returns[batch])
+                entropy_loss = -self.entropy_coeff * entropy
+                
+                loss = policy_loss + self.value_coeff * value_loss + entropy_loss
+                total_loss += loss.item()
+                minibatches += 1
+                
+                # Optimize
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.optimizer.step()
+                
+                with torch.no_grad():
+                    # Low-variance KL estimate (ratio - 1) - log ratio
+                    epoch_kl.append(((ratio - 1) - log_ratio).mean().item())
             
-            loss = policy_loss + self.value_coeff * value_loss + entropy_loss
-            total_loss += loss.item()
+            epochs += 1
+            approx_kl = float(np.mean(epoch_kl))
             
-            # Optimize
-            self.optimizer.zero_grad()
-            loss.backward()
-            self.optimizer.step()
+            if self.target_kl is not None and approx_kl > 1.5 * self.target_kl:
+                break
         
-        # Clear rollout buffer
-        for key in self.rollout_buffer:
-            self.rollout_buffer[key].clear()
+        steps = len(self.rollout_buffer) * self.rollout_buffer.num_envs
+        self.rollout_buffer.reset()
         
         self.training_step += 1
         
-        return {'loss': total_loss / self.ppo_epochs}
-    
-    def _compute_gae(self, rewards: torch.Tensor, values: torch.Tensor) -> torch.Tensor:
-        """Compute Generalized Advantage Estimation"""
-        advantages = torch.zeros_like(rewards)
-        advantage = 0
-        
-        for t in reversed(range(len(rewards))):
-            if t == len(rewards) - 1:
-                next_value = 0
-            else:
-                next_value = values[t + 1]
-            
-            delta = rewards[t] + self.gamma * next_value - values[t]
-            advantage = delta + self.gamma * self.gae_lambda * advantage
-            advantages[t] = advantage
+        self.ppo_stats = {
+            'loss': total_loss / max(minibatches, 1),
+            'approx_kl': approx_kl,
+            'epochs': epochs,
+            'rollout_steps': steps,
+            'update_ms': (time.perf_counter() - started) * 1000
+        }
         
-        return advantages
+        return dict(self.ppo_stats)
     
     def _train_ddpg(self) -> Dict[str, float]:
         """DDPG training step"""
@@ -635,11 +746,11 @@ class AdvancedRLAgent:
         
         batch = self.experience_buffer.sample(self.batch_size)
         
-        observations = torch.FloatTensor(batch['observations']).to(self.device)
-        actions = torch.FloatTensor(batch['actions']).to(self.device)
-        rewards = torch.FloatTensor(batch['rewards']).to(self.device)
-        next_observations = torch.FloatTensor(batch['next_observations']).to(self.device)
-        dones = torch.BoolTensor(batch['dones']).to(self.device)
+        observations = self._observation_tensor(batch['observations'])
+        actions = torch.as_tensor(batch['actions'], device=self.device)
+        rewards = torch.as_tensor(batch['rewards'], device=self.device)
+        next_observations = self._observation_tensor(batch['next_observations'])
+        dones = torch.as_tensor(batch['dones'], device=self.device)
         
         # Critic update
         with torch.no_grad():
@@ -682,6 +793,46 @@ class AdvancedRLAgent:
         for target_param, param in zip(target_network.parameters(), source_network.parameters()):
             target_param.data.copy_(self.tau * param.data + (1 - self.tau) * target_param.data)
     
+    def _policy_networks(self) -> Dict[str, nn.Module]:
+        """Networks action selection uses, by attribute name"""
+        if self.algorithm == "DQN":
+            return {'q_network': self.q_network}
+        elif self.algorithm == "PPO":
+            return {'actor_critic': self.actor_critic}
+        return {'actor': self.actor}
+    
+    def get_policy_state(self) -> Dict[str, Any]:
+        """
+        Weights and exploration state of the acting policy
+        
+        Tensors are returned as CPU numpy arrays, so the state pickles to
+        another process without torch's shared-memory tensor handling.
+        """
+        state = {
+            'training_step': self.training_step,
+            'networks': {
+                name: {key: value.detach().cpu().numpy() for key, value in network.state_dict().items()}
+                for name, network in self._policy_networks().items()
+            }
+        }
+        
+        if self.algorithm == "DQN":
+            state['epsilon'] = self.epsilon
+        
+        return state
+    
+    def load_policy_state(self, state: Dict[str, Any]):
+        """Load a get_policy_state() result (e.g. published by a learner) into the acting networks"""
+        networks = self._policy_networks()
+        
+        for name, weights in state['networks'].items():
+            networks[name].load_state_dict({key: torch.from_numpy(value) for key, value in weights.items()})
+        
+        self.training_step = state.get('training_step', self.training_step)
+        
+        if self.algorithm == "DQN":
+            self.epsilon = state.get('epsilon', self.epsilon)
+    
     def save_model(self, filepath: str):
         """Save model state"""
         try:
@@ -751,5 +902,7 @@ class AdvancedRLAgent:
         
         if self.algorithm == "DQN":
             stats['epsilon'] = self.epsilon
+        elif self.algorithm == "PPO":
+            stats['ppo'] = dict(self.ppo_stats)
         
         return stats
\ No newline at end of file
@@ -15,6 +15,9 @@ from dataclasses import dataclass
 from enum import Enum
 import numpy as np
 
+from .counter_ocr import counter_reward
+from .intelligent_learning_engine import GameState
+
 class PlayMode(Enum):
     IDLE = "idle"
     FARMING = "farming"
@@ -60,7 +63,7 @@ class AutonomousPlaySystem:
     """System for fully autonomous gameplay"""
     
     def __init__(self, enhanced_vision=None, automation_engine=None, 
-                 learning_system=None, gameplay_recorder=None):
+                 learning_system=None, gameplay_recorder=None, learning_engine=None):
         self.logger = logging.getLogger(__name__)
         
         # Core systems
@@ -68,6 +71,7 @@ class AutonomousPlaySystem:
         self.automation_engine = automation_engine
         self.learning_system = learning_system
         self.gameplay_recorder = gameplay_recorder
+        self.learning_engine = learning_engine
         
         # Autonomous state
         self.is_autonomous = False
@@ -100,6 +104,13 @@ class AutonomousPlaySystem:
             'risk_tolerance': 0.4  # Willingness to try risky strategies
         }
         
+        # Rewards come from on-screen counter changes when counters are readable;
+        # counters are read on the first analysed frame at least reward_settle_time
+        # after the action, once the game has had time to update them
+        self.resource_weights = {}
+        self.reward_settle_time = 0.5
+        self._pending_outcome = None
+        
         # Knowledge base
         self.known_strategies = {}
         self.environmental_memory = {}
@@ -158,6 +169,9 @@ class AutonomousPlaySystem:
             if self.autonomous_thread:
                 self.autonomous_thread.join(timeout=10.0)
             
+            # The last action's counters were never re-read by the loop
+            self._settle_pending_outcome()
+            
             # Stop recording
             if self.gameplay_recorder:
                 recording_result = self.gameplay_recorder.stop_recording()
@@ -216,6 +230,9 @@ class AutonomousPlaySystem:
             # 1. Assess current situation
             game_state = self._assess_game_state()
             
+            # Reward the previous action from this frame's counters
+            self._settle_pending_outcome(game_state)
+            
             # 2. Update goal progress
             self._update_goal_progress(game_state)
             
@@ -271,42 +288,44 @@ class AutonomousPlaySystem:
         
         return game_state
     
+    def _target_opportunity(self, opportunity_type: str, priority: Priority,
+                            targets: List[Any], value_per_target: int) -> Dict[str, Any]:
+        """Opportunity for a group of tracks (or raw elements) of one type"""
+        # Longest-tracked targets first: they are the most reliable to act on
+        targets = sorted(targets, key=lambda target: getattr(target, 'first_seen', 0.0))
+        
+        return {
+            'type': opportunity_type,
+            'priority': priority,
+            'count': len(targets),
+            'estimated_value': len(targets) * value_per_target,
+            'locations': [target.position for target in targets],
+            'track_ids': [getattr(target, 'track_id', None) for target in targets]
+        }
+    
     def _identify_opportunities(self, vision_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Identify opportunities in current game state"""
         opportunities = []
         
         try:
-            detected_elements = vision_analysis.get('detected_elements', {})
+            # Tracks keep stable IDs and predicted positions across frames;
+            # fall back to raw detections when no tracker is feeding the analysis
+            targets = vision_analysis.get('tracks') or vision_analysis.get('detected_elements', {})
             
             # Treasure opportunities
-            if 'chests' in detected_elements and detected_elements['chests']:
-                opportunities.append({
-                    'type': 'treasure_collection',
-                    'priority': Priority.HIGH,
-                    'count': len(detected_elements['chests']),
-                    'estimated_value': len(detected_elements['chests']) * 10,
-                    'locations': [elem.position for elem in detected_elements['chests']]
-                })
+            if targets.get('chests'):
+                opportunities.append(self._target_opportunity('treasure_collection', Priority.HIGH,
+                                                              targets['chests'], 10))
             
             # Egg hatching opportunities
-            if 'eggs' in detected_elements and detected_elements['eggs']:
-                opportunities.append({
-                    'type': 'egg_hatching',
-                    'priority': Priority.MEDIUM,
-                    'count': len(detected_elements['eggs']),
-                    'estimated_value': len(detected_elements['eggs']) * 5,
-                    'locations': [elem.position for elem in detected_elements['eggs']]
-                })
+            if targets.get('eggs'):
+                opportunities.append(self._target_opportunity('egg_hatching', Priority.MEDIUM,
+                                                              targets['eggs'], 5))
             
             # Resource gathering opportunities
-            if 'resources' in detected_elements and detected_elements['resources']:
-                opportunities.append({
-                    'type': 'resource_gathering',
-                    'priority': Priority.MEDIUM,
-                    'count': len(detected_elements['resources']),
-                    'estimated_value': len(detected_elements['resources']) * 3,
-                    'locations': [elem.position for elem in detected_elements['resources']]
-                })
+            if targets.get('resources'):
+                opportunities.append(self._target_opportunity('resource_gathering', Priority.MEDIUM,
+                                                              targets['resources'], 3))
             
             # Farming opportunities (breakables areas)
             active_zones = vision_analysis.get('active_zones', {})
@@ -530,14 +549,20 @@ class AutonomousPlaySystem:
             
             result['execution_time'] = time.time() - start_time
             
-            # Record action for learning
-            if self.gameplay_recorder:
-                self.gameplay_recorder.record_manual_action(
-                    action_type=action.action_type,
-                    position=action.parameters.get('position'),
-                    success=result['success'],
-                    reward=10.0 if result['success'] else -1.0
-                )
+            outcome = {
+                'action': action,
+                'result': result,
+                'game_state': game_state,
+                'timestamp': time.time()
+            }
+            
+            # Counter changes only show up a few frames after the click: defer
+            # the reward to the next analysed frame when counters are readable
+            if self.enhanced_vision and game_state.get('resources'):
+                result['reward'] = None
+                self._pending_outcome = outcome
+            else:
+                self._record_outcome(outcome, {})
             
             return result
             
@@ -550,6 +575,73 @@ class AutonomousPlaySystem:
                 'execution_time': time.time() - start_time
             }
     
+    def _settle_pending_outcome(self, game_state: Optional[Dict[str, Any]] = None):
+        """Reward the pending action from the counters of an analysed frame taken after it settled"""
+        outcome = self._pending_outcome
+        if outcome is None:
+            return
+        
+        self._pending_outcome = None
+        
+        try:
+            remaining = outcome['timestamp'] + self.reward_settle_time - time.time()
+            
+            if game_state is not None and remaining <= 0:
+                resources_after = game_state.get('resources') or {}
+            else:
+                # Too early (or no frame to read): wait out the settle time and capture
+                if remaining > 0:
+                    time.sleep(remaining)
+                resources_after = self.enhanced_vision.read_counters(fresh=True)
+            
+            self._record_outcome(outcome, resources_after)
+        
+        except Exception as e:
+            self.logger.error(f"Action reward failed: {e}")
+    
+    def _record_outcome(self, outcome: Dict[str, Any], resources_after: Dict[str, float]):
+        """Reward an executed action and hand it to the recorder and the learning engine"""
+        action = outcome['action']
+        result = outcome['result']
+        game_state = outcome['game_state']
+        resources_before = game_state.get('resources') or {}
+        
+        if resources_before and resources_after:
+            result['resources'] = resources_after
+            result['reward'] = counter_reward(resources_before, resources_after, self.resource_weights)
+        else:
+            result['reward'] = 10.0 if result['success'] else -1.0
+        
+        # Record action for learning
+        if self.gameplay_recorder:
+            self.gameplay_recorder.record_manual_action(
+                action_type=action.action_type,
+                position=action.parameters.get('position'),
+                success=result['success'],
+                reward=result['reward']
+            )
+        
+        if self.learning_engine:
+            state = self._learning_state(game_state.get('ui_state', {}), resources_before, game_state['timestamp'])
+            
+            if resources_before and resources_after:
+                next_state = self._learning_state(game_state.get('ui_state', {}), resources_after, time.time())
+                self.learning_engine.record_transition(state, action.action_type, next_state,
+                                                       result.get('outcome', ''))
+            else:
+                self.learning_engine.record_experience(state, action.action_type, result['reward'],
+                                                       result.get('outcome', ''))
+    
+    def _learning_state(self, ui_state: Dict[str, Any], resources: Dict[str, float],
+                        timestamp: float) -> GameState:
+        """Learning engine state: UI and counter values (no screen features are kept)"""
+        return GameState(
+            screen_features=np.zeros(0, dtype=np.float32),
+            ui_elements=dict(ui_state),
+            player_stats=dict(resources),
+            timestamp=timestamp
+        )
+    
     def _execute_chest_opening(self, parameters: Dict[str, Any]) -> str:
         """Execute chest opening action"""
         try:
@@ -599,14 +691,33 @@ class AutonomousPlaySystem:
         """Execute exploration action"""
         try:
             if self.automation_engine:
-                # Move to a random location for exploration
+                # Move to a random location for exploration, along a planned
+                # path around known obstacles when vision is available
                 target_pos = parameters.get('target_position', (400, 300))
-                return self.automation_engine.move_to_area(target_pos)
+                waypoints = self._plan_route(target_pos[:2])
+                
+                result = None
+                for waypoint in waypoints:
+                    result = self.automation_engine.move_to_area(waypoint)
+                return result
             else:
                 return "Exploring area"
         except Exception as e:
             return f"Exploration failed: {e}"
     
+    def _plan_route(self, target: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Waypoints from the character (screen centre) to a target, ending at the target"""
+        screenshot = self.enhanced_vision.last_screenshot if self.enhanced_vision else None
+        
+        if screenshot is None:
+            return [target]
+        
+        height, width = screenshot.shape[:2]
+        path = self.enhanced_vision.get_optimal_path((width // 2, height // 2), target)
+        
+        # The first waypoint is the character's own position
+        return path[1:] if path and len(path) > 1 else [target]
+    
     def get_autonomous_status(self) -> Dict[str, Any]:
         """Get current autonomous play status"""
         status = {
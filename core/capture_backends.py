@@ -0,0 +1,433 @@
+"""
+Capture Backends
+Pluggable screen capture sources (mss, PIL ImageGrab, PyAutoGUI and a
+synthetic/file replay source) that all write BGR frames directly into a
+caller-supplied buffer, plus benchmarking to pick the fastest one
+"""
+
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Tuple, Any, Dict, List, Sequence, Union
+
+import numpy as np
+import cv2
+
+try:
+    import mss
+    MSS_AVAILABLE = True
+except Exception:
+    MSS_AVAILABLE = False
+
+try:
+    from PIL import ImageGrab
+    IMAGEGRAB_AVAILABLE = True
+except Exception:
+    IMAGEGRAB_AVAILABLE = False
+
+try:
+    import pyautogui
+    PYAUTOGUI_AVAILABLE = True
+except Exception:
+    PYAUTOGUI_AVAILABLE = False
+
+# Regions are (left, top, width, height), as used by pyautogui.screenshot
+Region = Tuple[int, int, int, int]
+
+# Order used when no benchmark has been run
+BACKEND_PREFERENCE = ["mss", "pil", "pyautogui"]
+
+
+class CaptureBackend:
+    """
+    Base class for capture sources
+
+    grab() returns a BGR uint8 frame. When `out` is given the frame is
+    written into it (it must have the frame's shape) and `out` is returned,
+    so captures can land directly in a ring buffer slot.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def is_available(self) -> bool:
+        return False
+
+    def screen_size(self) -> Tuple[int, int]:
+        """(width, height) of the area captured when no region is given"""
+        raise NotImplementedError()
+
+    def frame_shape(self, region: Optional[Region] = None) -> Tuple[int, int, int]:
+        if region:
+            return (int(region[3]), int(region[2]), 3)
+
+        width, height = self.screen_size()
+        return (height, width, 3)
+
+    def grab(self, region: Optional[Region] = None, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        raise NotImplementedError()
+
+    def grab_into_buffer(self, frame_buffer: Any, region: Optional[Region] = None,
+                         timestamp: Optional[float] = None) -> Optional[np.ndarray]:
+        """Capture straight into the next slot of a ring buffer (acquire_slot/commit/abort)"""
+        capture_time = time.time() if timestamp is None else timestamp
+        slot = frame_buffer.acquire_slot(self.frame_shape(region))
+
+        try:
+            frame = self.grab(region, out=slot)
+        except Exception:
+            frame_buffer.abort()
+            raise
+
+        if frame is None:
+            frame_buffer.abort()
+            return None
+
+        frame_buffer.commit(capture_time)
+        return slot
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _write(frame: np.ndarray, conversion: Optional[int], out: Optional[np.ndarray]) -> np.ndarray:
+        """Convert a captured frame to BGR with a single pass, into out when given"""
+        if out is not None and out.shape[:2] != frame.shape[:2]:
+            raise ValueError(f"Capture of shape {frame.shape[:2]} does not fit buffer of shape {out.shape[:2]}")
+
+        if conversion is not None:
+            return cv2.cvtColor(frame, conversion, dst=out)
+
+        if out is None:
+            return frame
+
+        np.copyto(out, frame)
+        return out
+
+    @staticmethod
+    def _pil_conversion(image: Any) -> Optional[int]:
+        mode = getattr(image, "mode", "RGB")
+
+        if mode == "RGBA":
+            return cv2.COLOR_RGBA2BGR
+        if mode == "L":
+            return cv2.COLOR_GRAY2BGR
+
+        return cv2.COLOR_RGB2BGR
+
+
+class MSSBackend(CaptureBackend):
+    """mss capture; the raw BGRA buffer is converted to BGR in one pass"""
+
+    name = "mss"
+
+    def __init__(self, monitor: int = 1):
+        super().__init__()
+        self.monitor = monitor
+
+        # mss handles are not safe to share between threads
+        self._local = threading.local()
+
+    def is_available(self) -> bool:
+        if not MSS_AVAILABLE:
+            return False
+
+        try:
+            self._grabber()
+            return True
+        except Exception:
+            return False
+
+    def _grabber(self):
+        grabber = getattr(self._local, "grabber", None)
+
+        if grabber is None:
+            grabber = self._local.grabber = mss.mss()
+
+        return grabber
+
+    def screen_size(self) -> Tuple[int, int]:
+        monitor = self._grabber().monitors[self.monitor]
+        return (monitor["width"], monitor["height"])
+
+    def grab(self, region: Optional[Region] = None, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        grabber = self._grabber()
+
+        if region:
+            left, top, width, height = region
+            monitor = {"left": int(left), "top": int(top), "width": int(width), "height": int(height)}
+        else:
+            monitor = grabber.monitors[self.monitor]
+
+        shot = grabber.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+        return self._write(bgra, cv2.COLOR_BGRA2BGR, out)
+
+    def close(self):
+        grabber = getattr(self._local, "grabber", None)
+
+        if grabber is not None:
+            grabber.close()
+            self._local.grabber = None
+
+
+class PILBackend(CaptureBackend):
+    """PIL ImageGrab capture"""
+
+    name = "pil"
+
+    def is_available(self) -> bool:
+        if not IMAGEGRAB_AVAILABLE:
+            return False
+
+        try:
+            ImageGrab.grab(bbox=(0, 0, 1, 1))
+            return True
+        except Exception:
+            return False
+
+    def screen_size(self) -> Tuple[int, int]:
+        return ImageGrab.grab().size
+
+    def grab(self, region: Optional[Region] = None, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        if region:
+            left, top, width, height = region
+            image = ImageGrab.grab(bbox=(left, top, left + width, top + height))
+        else:
+            image = ImageGrab.grab()
+
+        return self._write(np.asarray(image), self._pil_conversion(image), out)
+
+
+class PyAutoGUIBackend(CaptureBackend):
+    """pyautogui.screenshot capture"""
+
+    name = "pyautogui"
+
+    def is_available(self) -> bool:
+        if not PYAUTOGUI_AVAILABLE:
+            return False
+
+        try:
+            pyautogui.screenshot(region=(0, 0, 1, 1))
+            return True
+        except Exception:
+            return False
+
+    def screen_size(self) -> Tuple[int, int]:
+        width, height = pyautogui.size()
+        return (int(width), int(height))
+
+    def grab(self, region: Optional[Region] = None, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        image = pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
+        return self._write(np.asarray(image), self._pil_conversion(image), out)
+
+
+class ReplayBackend(CaptureBackend):
+    """
+    Synthetic or file replay capture
+
+    Replays BGR frames from a list/array, a directory of images or a video
+    file, looping at the end. Without a source it generates synthetic frames
+    (a moving gradient) of the given size, which is useful for headless runs
+    and tests.
+    """
+
+    name = "replay"
+
+    def __init__(self, source: Union[None, str, Path, Sequence[np.ndarray], np.ndarray] = None,
+                 size: Tuple[int, int] = (1920, 1080)):
+        super().__init__()
+        self.size = size
+        self.frames = None
+        self.video = None
+        self.video_path = None
+        self.position = 0
+
+        if source is None:
+            pass
+        elif isinstance(source, (str, Path)) and Path(source).is_dir():
+            self.frames = [frame for frame in (cv2.imread(str(path)) for path in sorted(Path(source).iterdir()))
+                           if frame is not None]
+        elif isinstance(source, (str, Path)):
+            self.video_path = str(source)
+            self.video = cv2.VideoCapture(self.video_path)
+        else:
+            self.frames = list(source)
+
+        if self.frames:
+            height, width = self.frames[0].shape[:2]
+            self.size = (width, height)
+        elif self.video is not None and self.video.isOpened():
+            self.size = (int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        self._synthetic = None
+
+    def is_available(self) -> bool:
+        if self.video is not None:
+            return self.video.isOpened()
+
+        return self.frames is None or len(self.frames) > 0
+
+    def screen_size(self) -> Tuple[int, int]:
+        return self.size
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self.frames:
+            frame = self.frames[self.position % len(self.frames)]
+        elif self.video is not None:
+            success, frame = self.video.read()
+
+            if not success:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                success, frame = self.video.read()
+
+                if not success:
+                    return None
+        else:
+            if self._synthetic is None:
+                width, height = self.size
+                x = np.linspace(0, 255, width, dtype=np.float32)
+                y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+                self._synthetic = np.dstack([np.broadcast_to(x, (height, width)),
+                                             np.broadcast_to(y, (height, width)),
+                                             (x + y) / 2]).astype(np.uint8)
+
+            frame = np.roll(self._synthetic, self.position * 4, axis=1)
+
+        self.position += 1
+        return frame
+
+    def grab(self, region: Optional[Region] = None, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        frame = self._next_frame()
+
+        if frame is None:
+            return None
+
+        if region:
+            left, top, width, height = region
+            frame = frame[top:top + height, left:left + width]
+
+        return self._write(frame, None, out)
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+
+
+CAPTURE_BACKENDS = {
+    "mss": MSSBackend,
+    "pil": PILBackend,
+    "pyautogui": PyAutoGUIBackend,
+    "replay": ReplayBackend
+}
+
+
+def create_backend(name: str, **kwargs) -> CaptureBackend:
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f"Unknown capture backend: {name}")
+
+    return CAPTURE_BACKENDS[name](**kwargs)
+
+
+def available_backends(names: Optional[Sequence[str]] = None) -> List[CaptureBackend]:
+    """Instances of every available screen backend, in preference order"""
+    backends = []
+
+    for name in names or BACKEND_PREFERENCE:
+        backend = create_backend(name)
+
+        if backend.is_available():
+            backends.append(backend)
+
+    return backends
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_default_backend() -> Optional[CaptureBackend]:
+    """Shared backend used by callers that do not pick one; the first available by preference"""
+    global _default_backend
+
+    with _default_backend_lock:
+        if _default_backend is None:
+            backends = available_backends()
+            _default_backend = backends[0] if backends else None
+
+            for backend in backends[1:]:
+                backend.close()
+
+        return _default_backend
+
+
+def set_default_backend(backend: Optional[CaptureBackend]):
+    global _default_backend
+
+    with _default_backend_lock:
+        _default_backend = backend
+
+
+def benchmark_backends(backends: Optional[Sequence[CaptureBackend]] = None, frames: int = 10,
+                       region: Optional[Region] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Time each backend capturing into a preallocated buffer
+
+    Returns per-backend fps and average milliseconds per frame; backends
+    that fail report an error instead.
+    """
+    backends = available_backends() if backends is None else backends
+    results = {}
+
+    for backend in backends:
+        try:
+            out = np.empty(backend.frame_shape(region), dtype=np.uint8)
+
+            # Warm-up capture (lazy initialisation, first-call allocations)
+            backend.grab(region, out=out)
+
+            started = time.perf_counter()
+
+            for _ in range(frames):
+                backend.grab(region, out=out)
+
+            duration = time.perf_counter() - started
+
+            results[backend.name] = {
+                'fps': frames / duration if duration > 0 else float('inf'),
+                'avg_ms': duration * 1000 / frames,
+                'frame_shape': out.shape
+            }
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Capture backend {backend.name} failed benchmark: {e}")
+            results[backend.name] = {'error': str(e)}
+
+    return results
+
+
+def select_fastest_backend(backends: Optional[Sequence[CaptureBackend]] = None, frames: int = 10,
+                           region: Optional[Region] = None) -> Tuple[Optional[CaptureBackend], Dict[str, Dict[str, Any]]]:
+    """
+    Benchmark backends and return (fastest backend, benchmark results)
+
+    When no backends are given, every available one is created and all but
+    the fastest are closed again.
+    """
+    created = backends is None
+    backends = available_backends() if created else list(backends)
+    results = benchmark_backends(backends, frames, region)
+
+    timed = [backend for backend in backends if 'fps' in results.get(backend.name, {})]
+    fastest = max(timed, key=lambda backend: results[backend.name]['fps']) if timed else None
+
+    if created:
+        for backend in backends:
+            if backend is not fastest:
+                backend.close()
+
+    return fastest, results
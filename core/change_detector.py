@@ -0,0 +1,181 @@
+"""
+Frame Change Detection
+Cheap downsampled-signature comparison that reports which screen tiles changed
+between frames, so analysis can skip static frames and re-run only on dirty regions
+"""
+
+import time
+import logging
+from typing import Optional, Tuple, List, Dict, Any
+from dataclasses import dataclass, field
+
+import numpy as np
+import cv2
+
+
+@dataclass
+class FrameChange:
+    """Result of comparing a frame against the previous one"""
+    changed: bool
+    full_refresh: bool
+    dirty_tiles: List[Tuple[int, int, int, int]]
+    dirty_regions: List[Tuple[int, int, int, int]]
+    dirty_ratio: float
+    tile_mask: Optional[np.ndarray] = None
+    timestamp: float = field(default_factory=time.time)
+
+
+class FrameChangeDetector:
+    """
+    Tile-level change detector
+
+    Each frame is area-downsampled so every signature cell is the mean colour
+    of a cell_size x cell_size block. A tile (tile_size x tile_size pixels) is
+    dirty when any of its cells moved by more than `threshold` grey levels
+    from the reference signature. Adjacent dirty tiles are merged into
+    padded regions that detectors can re-run on.
+
+    The reference keeps each tile as it was last reported: only dirty
+    tiles (every tile on a full refresh) take the new frame's values, so
+    gradual changes (fades, slow scrolling, tints) accumulate until they
+    cross the threshold instead of being lost between frames.
+    """
+
+    def __init__(self, tile_size: int = 64, cell_size: int = 8, threshold: float = 6.0,
+                 full_refresh_ratio: float = 0.5, region_padding: int = 16):
+        if tile_size % cell_size:
+            raise ValueError("tile_size must be a multiple of cell_size")
+
+        self.logger = logging.getLogger(__name__)
+
+        self.tile_size = tile_size
+        self.cell_size = cell_size
+        self.threshold = threshold
+        self.full_refresh_ratio = full_refresh_ratio
+        self.region_padding = region_padding
+
+        self.previous_signature = None
+        self.frame_shape = None
+
+        self.stats = {
+            'frames_checked': 0,
+            'frames_unchanged': 0,
+            'partial_updates': 0,
+            'full_refreshes': 0
+        }
+
+    def reset(self):
+        """Forget the previous frame; the next update reports a full refresh"""
+        self.previous_signature = None
+        self.frame_shape = None
+
+    def signature(self, frame: np.ndarray) -> np.ndarray:
+        """Block-mean signature of a frame, one value per cell and channel"""
+        height, width = frame.shape[:2]
+        cells_x = -(-width // self.cell_size)
+        cells_y = -(-height // self.cell_size)
+
+        signature = cv2.resize(frame, (cells_x, cells_y), interpolation=cv2.INTER_AREA)
+
+        if signature.ndim == 2:
+            signature = signature[..., np.newaxis]
+
+        return signature.astype(np.int16)
+
+    def update(self, frame: np.ndarray) -> FrameChange:
+        """Compare a frame to the reference and take its dirty tiles into the reference"""
+        self.stats['frames_checked'] += 1
+
+        signature = self.signature(frame)
+        height, width = frame.shape[:2]
+
+        if self.previous_signature is None or self.frame_shape != frame.shape:
+            self.previous_signature = signature
+            self.frame_shape = frame.shape
+            self.stats['full_refreshes'] += 1
+
+            region = (0, 0, width, height)
+            return FrameChange(True, True, [region], [region], 1.0)
+
+        cell_changes = np.abs(signature - self.previous_signature).max(axis=2) > self.threshold
+
+        tile_mask = self._cells_to_tiles(cell_changes)
+        dirty_count = int(tile_mask.sum())
+
+        if dirty_count == 0:
+            self.stats['frames_unchanged'] += 1
+            return FrameChange(False, False, [], [], 0.0, tile_mask)
+
+        dirty_ratio = dirty_count / tile_mask.size
+        dirty_tiles = self._tile_rects(tile_mask, width, height)
+
+        if dirty_ratio >= self.full_refresh_ratio:
+            self.previous_signature = signature
+            self.stats['full_refreshes'] += 1
+            return FrameChange(True, True, dirty_tiles, [(0, 0, width, height)], dirty_ratio, tile_mask)
+
+        dirty_cells = self._tiles_to_cells(tile_mask, cell_changes.shape)
+        self.previous_signature[dirty_cells] = signature[dirty_cells]
+
+        self.stats['partial_updates'] += 1
+        dirty_regions = self._merge_tiles(tile_mask, width, height)
+
+        return FrameChange(True, False, dirty_tiles, dirty_regions, dirty_ratio, tile_mask)
+
+    def _cells_to_tiles(self, cell_changes: np.ndarray) -> np.ndarray:
+        cells_per_tile = self.tile_size // self.cell_size
+        cells_y, cells_x = cell_changes.shape
+
+        tiles_y = -(-cells_y // cells_per_tile)
+        tiles_x = -(-cells_x // cells_per_tile)
+
+        padded = np.zeros((tiles_y * cells_per_tile, tiles_x * cells_per_tile), dtype=bool)
+        padded[:cells_y, :cells_x] = cell_changes
+
+        return padded.reshape(tiles_y, cells_per_tile, tiles_x, cells_per_tile).any(axis=(1, 3))
+
+    def _tiles_to_cells(self, tile_mask: np.ndarray, cells_shape: Tuple[int, int]) -> np.ndarray:
+        """Cell mask covering the given tiles"""
+        cells_per_tile = self.tile_size // self.cell_size
+        cells = np.repeat(np.repeat(tile_mask, cells_per_tile, axis=0), cells_per_tile, axis=1)
+
+        return cells[:cells_shape[0], :cells_shape[1]]
+
+    def _tile_rects(self, tile_mask: np.ndarray, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+        rects = []
+
+        for tile_y, tile_x in zip(*np.nonzero(tile_mask)):
+            x = int(tile_x) * self.tile_size
+            y = int(tile_y) * self.tile_size
+            rects.append((x, y, min(self.tile_size, width - x), min(self.tile_size, height - y)))
+
+        return rects
+
+    def _merge_tiles(self, tile_mask: np.ndarray, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+        """Merge 8-connected dirty tiles into padded (x, y, w, h) regions"""
+        count, _, stats, _ = cv2.connectedComponentsWithStats(tile_mask.astype(np.uint8), connectivity=8)
+
+        regions = []
+        padding = self.region_padding
+
+        for label in range(1, count):
+            tile_x, tile_y, tiles_w, tiles_h = stats[label, :4]
+
+            x1 = max(0, int(tile_x) * self.tile_size - padding)
+            y1 = max(0, int(tile_y) * self.tile_size - padding)
+            x2 = min(width, int(tile_x + tiles_w) * self.tile_size + padding)
+            y2 = min(height, int(tile_y + tiles_h) * self.tile_size + padding)
+
+            regions.append((x1, y1, x2 - x1, y2 - y1))
+
+        return regions
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+
+        if stats['frames_checked'] > 0:
+            stats['skip_rate'] = stats['frames_unchanged'] / stats['frames_checked']
+        else:
+            stats['skip_rate'] = 0.0
+
+        return stats
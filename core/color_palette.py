@@ -0,0 +1,247 @@
+"""
+Color Palette Engine
+Dominant-color analysis for frames and ROIs: pixels are quantized to packed
+15- or 18-bit color codes and counted with one np.bincount, and palettes are
+refined with a few mini-batch k-means iterations on the histogram instead of
+on the pixels
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class PaletteEngine:
+    """
+    Histogram-based palette extraction
+
+    Each channel keeps its top `bits` bits (5 -> 15-bit codes, 6 -> 18-bit
+    codes), so a frame reduces to a fixed-size histogram in a single counting
+    pass. Colors are returned in the channel order of the input (BGR frames
+    give BGR colors). Frames with more than max_pixels pixels are sampled on
+    a regular grid before counting.
+    """
+
+    def __init__(self, bits: int = 5, max_pixels: Optional[int] = 1 << 18,
+                 iterations: int = 5, batch_size: int = 1024, seed: int = 0):
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8")
+
+        self.logger = logging.getLogger(__name__)
+
+        self.bits = bits
+        self.bins = 1 << (3 * bits)
+        self.max_pixels = max_pixels
+        self.iterations = iterations
+        self.batch_size = batch_size
+        self.seed = seed
+
+        self._shift = 8 - bits
+        self._mask = (1 << bits) - 1
+
+    def pack(self, pixels: np.ndarray) -> np.ndarray:
+        """Packed color codes of an (N, 3) uint8 pixel array"""
+        quantized = pixels >> np.uint8(self._shift)
+
+        codes = quantized[:, 0].astype(np.int32) << (2 * self.bits)
+        codes |= quantized[:, 1].astype(np.int32) << self.bits
+        codes |= quantized[:, 2]
+
+        return codes
+
+    def unpack(self, codes: np.ndarray) -> np.ndarray:
+        """(N, 3) colors at the centres of the quantization cells of the codes"""
+        codes = np.asarray(codes, dtype=np.int32)
+        channels = np.stack([codes >> (2 * self.bits), codes >> self.bits, codes], axis=-1) & self._mask
+
+        return ((channels << self._shift) + ((1 << self._shift) >> 1)).astype(np.uint8)
+
+    def histogram(self, image: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Pixel count of every color code (length 2 ** (3 * bits))"""
+        return np.bincount(self.pack(self._pixels(image, mask)), minlength=self.bins)
+
+    def top_colors(self, image: np.ndarray, k: int = 5,
+                   mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k most common colors as (colors (k, 3) uint8, pixel counts)
+
+        Colors are the mean of the pixels in each winning cell rather than
+        the cell centre, so flat colors (UI fills, backgrounds) come back
+        exactly. Most common first.
+        """
+        pixels = self._pixels(image, mask)
+        codes = self.pack(pixels)
+        counts = np.bincount(codes, minlength=self.bins)
+
+        k = min(k, int(np.count_nonzero(counts)))
+
+        if k == 0:
+            return np.zeros((0, 3), dtype=np.uint8), np.zeros(0, dtype=np.int64)
+
+        top = np.argpartition(counts, -k)[-k:]
+        top = top[np.argsort(counts[top])[::-1]]
+
+        # Route every pixel to its rank among the winners (k for the rest)
+        rank = np.full(self.bins, k, dtype=np.intp)
+        rank[top] = np.arange(k)
+        pixel_rank = rank[codes]
+
+        colors = np.empty((k, 3), dtype=np.float64)
+
+        for channel in range(3):
+            colors[:, channel] = np.bincount(pixel_rank, weights=pixels[:, channel], minlength=k + 1)[:k]
+
+        colors /= counts[top, np.newaxis]
+
+        return np.rint(colors).astype(np.uint8), counts[top]
+
+    def palette(self, image: np.ndarray, k: int = 8, mask: Optional[np.ndarray] = None,
+                iterations: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k-color palette as (colors (k, 3) uint8, pixel fractions), largest first
+
+        The occupied histogram cells, each at the mean color of its pixels,
+        are clustered weighted by their counts, so the cost depends on the
+        number of distinct colors rather than on the frame size. Fewer than k
+        colors are returned when the image has fewer occupied cells.
+        """
+        pixels = self._pixels(image, mask)
+        codes = self.pack(pixels)
+        counts = np.bincount(codes, minlength=self.bins)
+        occupied = np.flatnonzero(counts)
+
+        weights = counts[occupied].astype(np.float64)
+        colors = np.empty((len(occupied), 3), dtype=np.float64)
+
+        for channel in range(3):
+            colors[:, channel] = np.bincount(codes, weights=pixels[:, channel], minlength=self.bins)[occupied]
+
+        colors /= weights[:, np.newaxis]
+
+        return self._cluster(colors, weights, k, iterations)
+
+    def palette_from_histogram(self, counts: np.ndarray, k: int = 8,
+                               iterations: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Palette of a histogram from histogram(), with every cell at its centre color"""
+        occupied = np.flatnonzero(counts)
+
+        return self._cluster(self.unpack(occupied).astype(np.float64), counts[occupied].astype(np.float64),
+                             k, iterations)
+
+    def _cluster(self, colors: np.ndarray, weights: np.ndarray, k: int,
+                 iterations: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        if len(colors) == 0:
+            return np.zeros((0, 3), dtype=np.uint8), np.zeros(0, dtype=np.float64)
+
+        centers = self._seed_centers(colors, weights, min(k, len(colors)))
+        centers = self._refine(centers, colors, weights, self.iterations if iterations is None else iterations)
+
+        assignment = self._assign(colors, centers)
+        totals = np.bincount(assignment, weights=weights, minlength=len(centers))
+
+        # Final centers are the weighted means of their cells
+        for channel in range(3):
+            sums = np.bincount(assignment, weights=weights * colors[:, channel], minlength=len(centers))
+            centers[:, channel] = np.divide(sums, totals, out=centers[:, channel], where=totals > 0)
+
+        order = np.argsort(totals)[::-1]
+        order = order[totals[order] > 0]
+
+        return np.rint(centers[order]).astype(np.uint8), totals[order] / weights.sum()
+
+    def _pixels(self, image: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+        """(N, 3) uint8 pixels of the image, masked and grid-sampled"""
+        if image.ndim == 2:
+            image = np.repeat(image[:, :, np.newaxis], 3, axis=2)
+
+        image = image[:, :, :3]
+
+        if self.max_pixels and image.shape[0] * image.shape[1] > self.max_pixels:
+            step = int(np.ceil(np.sqrt(image.shape[0] * image.shape[1] / self.max_pixels)))
+            image = image[::step, ::step]
+
+            if mask is not None:
+                mask = mask[::step, ::step]
+
+        if mask is not None:
+            return image[mask > 0]
+
+        return np.ascontiguousarray(image).reshape(-1, 3)
+
+    @staticmethod
+    def _assign(colors: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = ((colors[:, np.newaxis, :] - centers[np.newaxis, :, :]) ** 2).sum(axis=2)
+        return np.argmin(distances, axis=1)
+
+    @staticmethod
+    def _seed_centers(colors: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+        """Deterministic k-means++ style seeding: heaviest cell, then the cell with the largest weighted distance"""
+        centers = [colors[np.argmax(weights)]]
+        nearest = ((colors - centers[0]) ** 2).sum(axis=1)
+
+        for _ in range(1, k):
+            index = int(np.argmax(weights * nearest))
+
+            if nearest[index] == 0:
+                break
+
+            centers.append(colors[index])
+            nearest = np.minimum(nearest, ((colors - colors[index]) ** 2).sum(axis=1))
+
+        return np.array(centers, dtype=np.float64)
+
+    def _refine(self, centers: np.ndarray, colors: np.ndarray, weights: np.ndarray, iterations: int) -> np.ndarray:
+        """
+        Mini-batch k-means on the histogram cells
+
+        Small histograms take full weighted Lloyd steps. Larger ones sample
+        batch_size cells per iteration with probability proportional to their
+        counts and move each center towards its batch mean with a learning
+        rate of 1 / (cells seen by that center).
+        """
+        if len(colors) <= self.batch_size:
+            for _ in range(iterations):
+                assignment = self._assign(colors, centers)
+                totals = np.bincount(assignment, weights=weights, minlength=len(centers))
+
+                for channel in range(3):
+                    sums = np.bincount(assignment, weights=weights * colors[:, channel], minlength=len(centers))
+                    centers[:, channel] = np.divide(sums, totals, out=centers[:, channel], where=totals > 0)
+
+            return centers
+
+        rng = np.random.default_rng(self.seed)
+        probabilities = weights / weights.sum()
+        seen = np.zeros(len(centers), dtype=np.float64)
+
+        for _ in range(iterations):
+            batch = colors[rng.choice(len(colors), size=self.batch_size, p=probabilities)]
+            assignment = self._assign(batch, centers)
+
+            batch_counts = np.bincount(assignment, minlength=len(centers)).astype(np.float64)
+            seen += batch_counts
+
+            updated = batch_counts > 0
+
+            for channel in range(3):
+                batch_means = np.bincount(assignment, weights=batch[:, channel], minlength=len(centers))
+                batch_means = np.divide(batch_means, batch_counts, out=np.zeros_like(batch_means), where=updated)
+
+                rate = np.divide(batch_counts, seen, out=np.zeros_like(seen), where=updated)
+                centers[:, channel] += rate * (batch_means - centers[:, channel])
+
+        return centers
+
+
+_default_engine = None
+
+
+def get_default_engine() -> PaletteEngine:
+    """Shared 15-bit engine for callers that do not configure their own"""
+    global _default_engine
+
+    if _default_engine is None:
+        _default_engine = PaletteEngine()
+
+    return _default_engine
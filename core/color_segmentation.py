@@ -0,0 +1,402 @@
+"""
+Fused Color Segmentation Engine
+Converts a frame to HSV once and classifies every pixel against all registered
+HSV ranges in a single vectorized pass, producing a label image whose connected
+components are extracted with one labeling call (one per layer of names whose
+ranges overlap)
+"""
+
+import logging
+from typing import Optional, Tuple, List, Dict, Any, Sequence
+
+import numpy as np
+import cv2
+
+from .region_features import FEATURE_DTYPE, component_features
+
+# Ranges are packed as bits of uint8 lookup tables; one bank holds 8 ranges
+RANGES_PER_BANK = 8
+
+# Label images are uint8, so at most 255 names can be registered
+MAX_NAMES = 255
+
+
+def _lowest_bit_table():
+    """Maps a bank bitmask to 1 + index of its lowest set bit (0 when empty)"""
+    table = np.zeros(256, dtype=np.uint8)
+
+    for value in range(1, 256):
+        table[value] = (value & -value).bit_length()
+
+    return table
+
+
+_LOWEST_BIT = _lowest_bit_table()
+
+
+class ColorSegmentation:
+    """
+    Per-frame segmentation result
+
+    Holds the HSV frame, the range bitmasks (one uint8 per pixel per bank of
+    8 ranges) and, per layer of names (see ColorSegmentationEngine.layers),
+    a lazily built label image of 1-based name indices and its components.
+    """
+
+    def __init__(self, engine: "ColorSegmentationEngine", hsv: np.ndarray, bits: List[np.ndarray]):
+        self.engine = engine
+        self.hsv = hsv
+        self.bits = bits
+        self._label_images = {}
+        self._components = {}
+        self._features = {}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.hsv.shape[:2]
+
+    def mask(self, name: str) -> np.ndarray:
+        """uint8 0/255 mask of every pixel inside any range registered under name"""
+        mask = np.zeros(self.shape, dtype=np.uint8)
+
+        for bank, bit in self.engine.range_bits(name):
+            range_mask = cv2.compare(cv2.bitwise_and(self.bits[bank], 1 << bit), 0, cv2.CMP_NE)
+            cv2.bitwise_or(mask, range_mask, dst=mask)
+
+        return mask
+
+    def label_image(self, layer: int = 0) -> np.ndarray:
+        """
+        uint8 image of 1-based name indices (0 = unclassified) for one layer of names
+
+        Names in a layer have no overlapping ranges, so each pixel matches at
+        most one of them (ranges of the same name may overlap each other).
+        """
+        labels = self._label_images.get(layer)
+
+        if labels is not None:
+            return labels
+
+        labels = np.zeros(self.shape, dtype=np.uint8)
+        layer_masks, range_to_name = self.engine.layer_tables(layer)
+
+        for bank in range(len(self.bits)):
+            if not layer_masks[bank]:
+                continue
+
+            bank_bits = self.bits[bank]
+            if layer_masks[bank] != 0xFF:
+                bank_bits = np.bitwise_and(bank_bits, np.uint8(layer_masks[bank]))
+
+            lowest = cv2.LUT(bank_bits, _LOWEST_BIT)
+            bank_labels = cv2.LUT(lowest, range_to_name[bank])
+            np.copyto(labels, bank_labels, where=lowest > 0)
+
+        self._label_images[layer] = labels
+        return labels
+
+    def components(self, names: Optional[Sequence[str]] = None, min_area: int = 0,
+                   max_area: Optional[int] = None, include_contours: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Connected components (8-connectivity) of the label image, grouped by name
+
+        Each component dict has center, bbox (x, y, w, h), area (pixel count)
+        and centroid; contours are added when requested.
+        """
+        names = list(self.engine.names) if names is None else list(names)
+        detections = {name: [] for name in names}
+
+        for layer, wanted in self._layers_of(names):
+            component_labels, stats, centroids, _ = self._layer_components(layer)
+
+            areas = stats[:, cv2.CC_STAT_AREA]
+            keep = areas >= min_area
+            keep[0] = False  # background
+
+            if max_area is not None:
+                keep &= areas <= max_area
+
+            for component_id in np.flatnonzero(keep):
+                group = self._component_group(layer, component_id)
+
+                if group not in wanted:
+                    continue
+
+                x, y, w, h, area = (int(v) for v in stats[component_id])
+
+                detection = {
+                    'center': (x + w // 2, y + h // 2),
+                    'bbox': (x, y, w, h),
+                    'area': area,
+                    'centroid': (float(centroids[component_id][0]), float(centroids[component_id][1]))
+                }
+
+                if include_contours:
+                    roi = (component_labels[y:y + h, x:x + w] == component_id).astype(np.uint8)
+                    contours, _ = cv2.findContours(roi, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x, y))
+                    detection['contour'] = max(contours, key=cv2.contourArea) if contours else None
+
+                detections[self.engine.names[group - 1]].append(detection)
+
+        return detections
+
+    def component_features(self, names: Optional[Sequence[str]] = None, image: Optional[np.ndarray] = None,
+                           min_area: int = 0, max_area: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Feature records (see region_features.FEATURE_DTYPE) of the components, grouped by name
+
+        Features of every component are computed once per segmentation (and
+        colour image) and layer, and filtered per call, so asking for each
+        name in turn costs a single set of full-frame passes per layer.
+        """
+        names = list(self.engine.names) if names is None else list(names)
+        result = {name: np.zeros(0, dtype=FEATURE_DTYPE) for name in names}
+
+        for layer, wanted in self._layers_of(names):
+            component_labels, stats, centroids, _ = self._layer_components(layer)
+            cached_image, features = self._features.get(layer, (None, None))
+
+            if features is None or cached_image is not image:
+                features = component_features(component_labels, stats, image, centroids)
+                self._features[layer] = (image, features)
+
+            areas = features['area']
+            keep = areas >= min_area
+
+            if max_area is not None:
+                keep &= areas <= max_area
+
+            features = features[keep]
+            groups = self._resolve_groups(layer)[features['label']]
+
+            for name in names:
+                index = self.engine.names.index(name) + 1 if name in self.engine.names else -1
+
+                if index in wanted:
+                    result[name] = features[groups == index]
+
+        return result
+
+    def _layers_of(self, names: Sequence[str]) -> List[Tuple[int, set]]:
+        """(layer, wanted 1-based name indices) of every layer holding one of the names"""
+        wanted = set(self.engine.names.index(name) + 1 for name in names if name in self.engine.names)
+
+        return [(layer, wanted & set(members)) for layer, members in enumerate(self.engine.layers())
+                if wanted & set(members)]
+
+    def _layer_components(self, layer: int):
+        if layer not in self._components:
+            self._components[layer] = self._label_components(layer)
+
+        return self._components[layer]
+
+    def _resolve_groups(self, layer: int) -> np.ndarray:
+        """Class of every component of a layer at once (each component lies inside one class)"""
+        component_labels, _, _, groups = self._components[layer]
+
+        if (groups < 0).any():
+            foreground = component_labels > 0
+            groups[component_labels[foreground]] = self._label_images[layer][foreground]
+            groups[0] = 0
+
+        return groups
+
+    def _component_group(self, layer: int, component_id: int) -> int:
+        """Class of a component, read from its first labelled pixel on the top row"""
+        component_labels, stats, _, groups = self._components[layer]
+
+        if groups[component_id] < 0:
+            x, y, w = (int(v) for v in stats[component_id, :3])
+            row = component_labels[y, x:x + w]
+            groups[component_id] = self._label_images[layer][y, x + int(np.argmax(row == component_id))]
+
+        return int(groups[component_id])
+
+    def _label_components(self, layer: int):
+        """Label every class of a layer's label image with a single labeling call"""
+        labels = self.label_image(layer)
+
+        # Pixels touching a differently labelled neighbour are cleared so that
+        # adjacent classes never merge into one component. Subtracting 1 with
+        # uint8 wrap-around turns background into 255 for the neighbour minimum.
+        kernel = np.ones((3, 3), dtype=np.uint8)
+        shifted = labels - np.uint8(1)
+
+        boundary = cv2.bitwise_or(
+            cv2.compare(cv2.dilate(labels, kernel), labels, cv2.CMP_NE),
+            cv2.compare(cv2.erode(shifted, kernel), shifted, cv2.CMP_NE)
+        )
+        foreground = cv2.bitwise_and(cv2.compare(labels, 0, cv2.CMP_GT), cv2.bitwise_not(boundary))
+
+        count, component_labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            foreground, 8, cv2.CV_32S, cv2.CCL_GRANA
+        )
+
+        # Component classes are resolved lazily, only for components that pass the filters
+        groups = np.full(count, -1, dtype=np.int64)
+
+        return component_labels, stats, centroids, groups
+
+
+class ColorSegmentationEngine:
+    """
+    Multi-range HSV classifier
+
+    HSV box ranges are separable per channel, so each bank keeps one uint8
+    lookup table per channel whose bit k is set when the channel value lies
+    inside range k. cv2.LUT applies the tables with one pass per channel and ANDing
+    the channels gives every range's membership at once, exactly matching
+    cv2.inRange for each range.
+
+    Names whose ranges overlap are put in separate layers (in registration
+    order, each name in the first layer it does not overlap), and each layer
+    is labelled on its own, so a pixel inside ranges of two names belongs to
+    a component of each, as with separate per-name masks. Without overlaps
+    there is a single layer and a single labeling pass.
+    """
+
+    def __init__(self, ranges: Optional[Dict[str, Any]] = None):
+        self.logger = logging.getLogger(__name__)
+
+        # (name, lower, upper) in registration order
+        self.ranges = []
+        self.names = []
+        self._luts = []
+        self._layers = None
+        self._layer_tables = {}
+
+        for name, bounds in (ranges or {}).items():
+            if len(bounds) == 2 and np.ndim(bounds[0]) == 1:
+                bounds = [bounds]
+
+            for lower, upper in bounds:
+                self.register(name, lower, upper)
+
+    def register(self, name: str, lower: Sequence[float], upper: Sequence[float]):
+        """Register an HSV range under a name; several ranges may share one name"""
+        if name not in self.names:
+            if len(self.names) >= MAX_NAMES:
+                raise ValueError(f"At most {MAX_NAMES} range names can be registered")
+
+            self.names.append(name)
+
+        lower = np.clip(np.asarray(lower, dtype=np.float64), 0, 255)
+        upper = np.clip(np.asarray(upper, dtype=np.float64), 0, 255)
+
+        self.ranges.append((name, lower, upper))
+        self._luts = []
+        self._layers = None
+        self._layer_tables = {}
+
+    def clear(self):
+        self.ranges = []
+        self.names = []
+        self._luts = []
+        self._layers = None
+        self._layer_tables = {}
+
+    def range_bits(self, name: str) -> List[Tuple[int, int]]:
+        """(bank, bit) positions of every range registered under name"""
+        return [divmod(index, RANGES_PER_BANK) for index, (range_name, _, _) in enumerate(self.ranges)
+                if range_name == name]
+
+    def overlapping(self, first: str, second: str) -> bool:
+        """Whether any range of one name intersects a range of the other"""
+        return any(np.all(lower_a <= upper_b) and np.all(lower_b <= upper_a)
+                   for name_a, lower_a, upper_a in self.ranges if name_a == first
+                   for name_b, lower_b, upper_b in self.ranges if name_b == second)
+
+    def layers(self) -> List[List[int]]:
+        """1-based name indices per layer; names within a layer have no overlapping ranges"""
+        if self._layers is None:
+            layers = []
+
+            for index, name in enumerate(self.names):
+                for members in layers:
+                    if not any(self.overlapping(name, self.names[member - 1]) for member in members):
+                        members.append(index + 1)
+                        break
+                else:
+                    layers.append([index + 1])
+
+            if len(layers) > 1:
+                self.logger.debug(f"Overlapping color ranges are labelled in {len(layers)} layers")
+
+            self._layers = layers
+
+        return self._layers
+
+    def layer_tables(self, layer: int) -> Tuple[List[int], List[np.ndarray]]:
+        """
+        Per bank, the bitmask of the layer's ranges and a table mapping
+        1 + bit index to the 1-based name index of that range
+        """
+        tables = self._layer_tables.get(layer)
+
+        if tables is None:
+            members = set(self.layers()[layer]) if layer < len(self.layers()) else set()
+            masks, luts = [], []
+
+            for bank_start in range(0, len(self.ranges), RANGES_PER_BANK):
+                mask = 0
+                table = np.zeros(256, dtype=np.uint8)
+
+                for bit, (name, _, _) in enumerate(self.ranges[bank_start:bank_start + RANGES_PER_BANK]):
+                    index = self.names.index(name) + 1
+
+                    if index in members:
+                        mask |= 1 << bit
+                        table[bit + 1] = index
+
+                masks.append(mask)
+                luts.append(table)
+
+            tables = self._layer_tables[layer] = (masks, luts)
+
+        return tables
+
+    def _build_luts(self):
+        values = np.arange(256, dtype=np.float64)[:, np.newaxis]
+        luts = []
+
+        for bank_start in range(0, len(self.ranges), RANGES_PER_BANK):
+            lut = np.zeros((256, 3), dtype=np.uint8)
+
+            for bit, (_, lower, upper) in enumerate(self.ranges[bank_start:bank_start + RANGES_PER_BANK]):
+                inside = (values >= lower) & (values <= upper)
+                lut |= inside.astype(np.uint8) << bit
+
+            # One contiguous table per H, S and V channel
+            luts.append([np.ascontiguousarray(lut[:, channel]) for channel in range(3)])
+
+        self._luts = luts
+
+    def to_hsv(self, frame: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+    def segment(self, frame: Optional[np.ndarray] = None, hsv: Optional[np.ndarray] = None) -> ColorSegmentation:
+        """Classify every pixel of a BGR frame (or a precomputed HSV frame)"""
+        if hsv is None:
+            hsv = self.to_hsv(frame)
+
+        if self.ranges and not self._luts:
+            self._build_luts()
+
+        bits = []
+        channels = cv2.split(hsv) if self._luts else ()
+
+        for bank_luts in self._luts:
+            hue_bits, saturation_bits, value_bits = (cv2.LUT(channel, lut) for channel, lut in zip(channels, bank_luts))
+            bits.append(cv2.bitwise_and(cv2.bitwise_and(hue_bits, saturation_bits), value_bits))
+
+        return ColorSegmentation(self, hsv, bits)
+
+    def detect(self, frame: Optional[np.ndarray] = None, names: Optional[Sequence[str]] = None,
+               min_area: int = 0, max_area: Optional[int] = None, include_contours: bool = False,
+               segmentation: Optional[ColorSegmentation] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Segment a frame (unless a segmentation is given) and return components per name"""
+        if segmentation is None:
+            segmentation = self.segment(frame)
+
+        return segmentation.components(names, min_area=min_area, max_area=max_area,
+                                       include_contours=include_contours)
@@ -0,0 +1,406 @@
+"""
+Counter OCR
+Reads numbers from fixed UI regions (coins, diamonds, egg counts) by
+segmenting glyphs with connected components and matching them against
+templates of the game font in one matrix product. Readings are cached per
+region by a hash of the region's pixels, so unchanged counters are never
+re-read.
+"""
+
+import re
+import time
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Union
+
+import numpy as np
+import cv2
+
+# Glyph files are named after their character; these stems name the rest
+GLYPH_FILE_NAMES = {'comma': ',', 'period': '.', 'dot': '.'}
+
+# Abbreviation suffixes used by the game's counters
+COUNTER_SUFFIXES = {'k': 1e3, 'm': 1e6, 'b': 1e9, 't': 1e12}
+
+_COUNTER_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)([kmbt]?)$', re.IGNORECASE)
+
+
+def parse_counter(text: str) -> Optional[float]:
+    """Numeric value of counter text such as '12,345', '1.5k' or '3M'; None if it does not parse"""
+    match = _COUNTER_PATTERN.match(text.replace(',', ''))
+
+    if match is None:
+        return None
+
+    return float(match.group(1)) * COUNTER_SUFFIXES.get(match.group(2).lower(), 1.0)
+
+
+def counter_reward(before: Dict[str, float], after: Dict[str, float],
+                   weights: Optional[Dict[str, float]] = None) -> float:
+    """
+    Reward for the change of counters read before and after an action
+
+    Each counter contributes sign(delta) * log1p(|delta|), so counters of
+    very different magnitudes (coins vs eggs) stay comparable.
+    """
+    reward = 0.0
+
+    for name, value in after.items():
+        previous = before.get(name)
+
+        if previous is None or value is None:
+            continue
+
+        delta = value - previous
+        weight = weights.get(name, 1.0) if weights else 1.0
+        reward += weight * float(np.sign(delta)) * float(np.log1p(abs(delta)))
+
+    return reward
+
+
+def _normalize(glyph: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """Zero-mean, unit-norm vector of a binary glyph resized to size (w, h)"""
+    vector = cv2.resize(glyph.astype(np.float32), size, interpolation=cv2.INTER_AREA).ravel()
+    vector -= vector.mean()
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _binarize(image: np.ndarray, polarity: str = 'auto') -> np.ndarray:
+    """Text mask of an image; polarity is 'light' text, 'dark' text or 'auto' (the minority side)"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    _, mask = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    if polarity == 'dark' or (polarity == 'auto' and mask.mean() > 0.5):
+        mask = 1 - mask
+
+    return mask
+
+
+class DigitFont:
+    """
+    Glyph templates of one font
+
+    Each glyph is cropped to its ink and stored as a normalized
+    glyph_size vector together with its aspect ratio; a character may have
+    several variants. Punctuation is recognised by size and position rather
+    than by template, so fonts only need digits and suffix letters.
+    """
+
+    def __init__(self, glyph_size: Tuple[int, int] = (12, 16)):
+        self.logger = logging.getLogger(__name__)
+
+        self.glyph_size = glyph_size
+        self.characters = []
+        self.aspects = []
+        self._vectors = []
+        self.matrix = np.zeros((0, glyph_size[0] * glyph_size[1]), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.characters)
+
+    def add_glyph(self, character: str, image: np.ndarray, polarity: str = 'auto'):
+        mask = _binarize(image, polarity)
+        points = cv2.findNonZero(mask)
+
+        if points is None:
+            self.logger.warning(f"Glyph '{character}' has no ink; skipped")
+            return
+
+        x, y, w, h = cv2.boundingRect(points)
+
+        self.characters.append(character)
+        self.aspects.append(w / h)
+        self._vectors.append(_normalize(mask[y:y + h, x:x + w], self.glyph_size))
+        self.matrix = np.stack(self._vectors)
+
+    def match(self, glyphs: List[np.ndarray], aspect_weight: float = 0.25) -> Tuple[List[str], np.ndarray]:
+        """Best character and score for each binary glyph crop, from one matrix product"""
+        if not glyphs or not self.characters:
+            return [], np.zeros(len(glyphs))
+
+        vectors = np.stack([_normalize(glyph, self.glyph_size) for glyph in glyphs])
+        scores = vectors @ self.matrix.T
+
+        # Penalise shape mismatches that resizing to glyph_size hides ('1' vs 'l')
+        aspects = np.array([glyph.shape[1] / glyph.shape[0] for glyph in glyphs])
+        scores -= aspect_weight * np.abs(np.log(aspects[:, np.newaxis] / np.array(self.aspects)[np.newaxis, :]))
+
+        best = np.argmax(scores, axis=1)
+        return [self.characters[index] for index in best], scores[np.arange(len(glyphs)), best]
+
+    @classmethod
+    def from_directory(cls, directory: Union[str, Path], glyph_size: Tuple[int, int] = (12, 16),
+                       polarity: str = 'auto') -> "DigitFont":
+        """
+        Font from glyph images cropped from the game, named '<char>.png'
+        (or '<char>_<variant>.png'; uppercase letters may be given as
+        'upper_K.png')
+        """
+        font = cls(glyph_size)
+
+        for path in sorted(Path(directory).glob("*.png")):
+            stem = path.stem.split('_')[0] if not path.stem.startswith('upper_') else path.stem[6:7]
+            character = GLYPH_FILE_NAMES.get(stem, stem)
+
+            image = cv2.imread(str(path))
+            if image is not None and len(character) == 1:
+                font.add_glyph(character, image, polarity)
+
+        font.logger.info(f"Loaded {len(font)} glyphs from {directory}")
+        return font
+
+    @classmethod
+    def render(cls, characters: str = "0123456789kmbtKMBT", font_face: int = cv2.FONT_HERSHEY_DUPLEX,
+               scale: float = 1.0, thickness: int = 2, glyph_size: Tuple[int, int] = (12, 16)) -> "DigitFont":
+        """Font rendered with an OpenCV Hershey face, for use until game glyphs are captured"""
+        font = cls(glyph_size)
+
+        for character in characters:
+            canvas = np.zeros((64, 64), dtype=np.uint8)
+            cv2.putText(canvas, character, (8, 48), font_face, scale, 255, thickness, cv2.LINE_AA)
+            font.add_glyph(character, canvas, 'light')
+
+        return font
+
+
+@dataclass
+class CounterReading:
+    """Text and value read from one counter region"""
+    name: str
+    text: str
+    value: Optional[float]
+    confidence: float
+    timestamp: float
+    cached: bool = False
+
+
+@dataclass
+class CounterRegion:
+    """A fixed UI region holding a counter, with its reading cache"""
+    name: str
+    bbox: Tuple[int, int, int, int]
+    polarity: str = 'auto'
+    cache: OrderedDict = field(default_factory=OrderedDict)
+    last_reading: Optional[CounterReading] = None
+
+
+class CounterReader:
+    """
+    OCR for fixed counter regions
+
+    A region's pixels are hashed on every read; a hash seen before returns
+    its cached reading without segmentation (the last cache_size distinct
+    renderings are kept, so counters flipping between values stay cached).
+    New pixels are binarized, split into glyphs by connected components,
+    matched against the font and parsed into a number. Components wider
+    than split_aspect line heights are touching glyphs (anti-aliased or
+    tightly kerned fonts) and are cut apart at the column profile's minima.
+    """
+
+    def __init__(self, font: Optional[DigitFont] = None, cache_size: int = 16, min_confidence: float = 0.5,
+                 min_glyph_height: float = 0.5, punctuation_height: float = 0.45, split_aspect: float = 1.3):
+        self.logger = logging.getLogger(__name__)
+
+        self.font = font if font is not None else DigitFont.render()
+        self.cache_size = cache_size
+        self.min_confidence = min_confidence
+        self.min_glyph_height = min_glyph_height
+        self.punctuation_height = punctuation_height
+        self.split_aspect = split_aspect
+
+        self.regions = {}
+
+        self.stats = {
+            'reads': 0,
+            'cache_hits': 0,
+            'recognitions': 0,
+            'recognition_ms': 0.0
+        }
+
+    def add_region(self, name: str, bbox: Tuple[int, int, int, int], polarity: str = 'auto'):
+        """Register a counter at (x, y, w, h) in frame pixels"""
+        self.regions[name] = CounterRegion(name, tuple(int(value) for value in bbox), polarity)
+
+    def remove_region(self, name: str):
+        self.regions.pop(name, None)
+
+    def load_regions(self, path: Union[str, Path]) -> int:
+        """Register regions from JSON: {name: {"bbox": [x, y, w, h], "polarity": "light"}}"""
+        with open(path, 'r') as f:
+            config = json.load(f)
+
+        for name, region in config.items():
+            self.add_region(name, region['bbox'], region.get('polarity', 'auto'))
+
+        return len(config)
+
+    def clear_cache(self):
+        for region in self.regions.values():
+            region.cache.clear()
+            region.last_reading = None
+
+    def read(self, frame: np.ndarray, name: str) -> Optional[CounterReading]:
+        region = self.regions.get(name)
+
+        if region is None:
+            return None
+
+        self.stats['reads'] += 1
+
+        x, y, w, h = region.bbox
+        crop = np.ascontiguousarray(frame[y:y + h, x:x + w])
+        key = hashlib.blake2b(crop, digest_size=8).digest()
+
+        cached = region.cache.get(key)
+        now = time.time()
+
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            region.cache.move_to_end(key)
+
+            reading = CounterReading(name, cached[0], cached[1], cached[2], now, cached=True)
+            region.last_reading = reading
+            return reading
+
+        started = time.perf_counter()
+        text, confidence = self.recognize(crop, region.polarity)
+        value = parse_counter(text) if confidence >= self.min_confidence else None
+
+        self.stats['recognitions'] += 1
+        self.stats['recognition_ms'] = (time.perf_counter() - started) * 1000
+
+        region.cache[key] = (text, value, confidence)
+        while len(region.cache) > self.cache_size:
+            region.cache.popitem(last=False)
+
+        reading = CounterReading(name, text, value, confidence, now)
+        region.last_reading = reading
+        return reading
+
+    def read_all(self, frame: np.ndarray) -> Dict[str, CounterReading]:
+        return {name: self.read(frame, name) for name in self.regions}
+
+    def values(self, frame: np.ndarray) -> Dict[str, float]:
+        """Parsed values of every counter that could be read"""
+        values = {}
+
+        for name in self.regions:
+            reading = self.read(frame, name)
+
+            if reading is not None and reading.value is not None:
+                values[name] = reading.value
+
+        return values
+
+    def recognize(self, image: np.ndarray, polarity: str = 'auto') -> Tuple[str, float]:
+        """
+        (text, confidence) of one counter image, uncached
+
+        Glyphs shorter than punctuation_height of the line are read as ','
+        when they reach below the baseline and '.' otherwise; confidence is
+        the weakest template score.
+        """
+        mask = _binarize(image, polarity)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        if count <= 1:
+            return "", 0.0
+
+        boxes = self._merge_columns(stats[1:, :4].tolist())
+        line_height = max(h for _, _, _, h in boxes)
+        baseline = np.median([y + h for _, y, _, h in boxes if h >= line_height * self.min_glyph_height])
+
+        characters = []
+        glyphs = []
+
+        for x, y, w, h in boxes:
+            if h >= line_height * self.min_glyph_height:
+                glyph = mask[y:y + h, x:x + w]
+                pieces = [glyph]
+
+                if w > line_height * self.split_aspect:
+                    split = self._split_glyph(glyph, line_height)
+
+                    # Wide single glyphs (e.g. 'm') match better whole
+                    if len(split) > 1 and self.font.match(split)[1].min() > self.font.match([glyph])[1][0]:
+                        pieces = split
+
+                characters.extend([None] * len(pieces))
+                glyphs.extend(pieces)
+            elif h <= line_height * self.punctuation_height and w <= line_height * self.punctuation_height:
+                # Specks above the baseline (e.g. outline noise) are dropped
+                if y + h >= baseline - line_height * 0.2:
+                    characters.append(',' if y + h > baseline + 1 else '.')
+
+        matched, scores = self.font.match(glyphs)
+        matched = iter(matched)
+
+        text = ''.join(character if character is not None else next(matched) for character in characters)
+        return text, float(scores.min()) if len(scores) else 0.0
+
+    def _split_glyph(self, glyph: np.ndarray, line_height: int) -> List[np.ndarray]:
+        """Cut touching glyphs apart at the emptiest columns near the expected glyph boundaries"""
+        width = glyph.shape[1]
+        glyph_width = line_height * (float(np.median(self.font.aspects)) if len(self.font) else 1.0)
+        count = max(2, int(round(width / glyph_width)))
+
+        # Ties go to the column closest to the expected boundary
+        profile = glyph.sum(axis=0).astype(np.float64)
+        cuts = [0]
+
+        for index in range(1, count):
+            expected = index * width / count
+            low = max(cuts[-1] + 1, int(expected - width / (4 * count)))
+            high = min(width - 1, int(expected + width / (4 * count)) + 1)
+
+            if low >= high:
+                return [glyph]
+
+            columns = np.arange(low, high)
+            cuts.append(int(columns[np.argmin(profile[low:high] + 1e-3 * np.abs(columns - expected))]))
+
+        cuts.append(width)
+        pieces = []
+
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            piece = glyph[:, start:end]
+            rows = np.flatnonzero(piece.any(axis=1))
+            columns = np.flatnonzero(piece.any(axis=0))
+
+            if len(rows) and len(columns):
+                pieces.append(piece[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1])
+
+        return pieces
+
+    @staticmethod
+    def _merge_columns(boxes: List[List[int]]) -> List[Tuple[int, int, int, int]]:
+        """Sort boxes left to right and merge boxes that share most of their columns (broken glyphs)"""
+        merged = []
+
+        for x, y, w, h in sorted(boxes):
+            if merged:
+                px, py, pw, ph = merged[-1]
+                overlap = min(px + pw, x + w) - max(px, x)
+
+                if overlap > 0.5 * min(pw, w):
+                    x0, y0 = min(px, x), min(py, y)
+                    merged[-1] = (x0, y0, max(px + pw, x + w) - x0, max(py + ph, y + h) - y0)
+                    continue
+
+            merged.append((x, y, w, h))
+
+        return merged
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['regions'] = len(self.regions)
+        stats['glyphs'] = len(self.font)
+        stats['hit_rate'] = stats['cache_hits'] / stats['reads'] if stats['reads'] else 0.0
+
+        return stats
@@ -5,9 +5,18 @@ import gc
 import os
 import time
 
+import numpy as np
+
 from d3dshot.display import Display
 from d3dshot.capture_output import CaptureOutput, CaptureOutputs
 
+from .frame_ring_buffer import FrameRingBuffer
+from .frame_pacer import FramePacer
+
+
+# Minimum time left in a capture frame for a full garbage collection to run in it
+GC_MIN_SLACK = 0.005
+
 
 class Singleton(type):
     _instances = {}
@@ -45,8 +54,12 @@ class D3DShot(metaclass=Singleton):
 
         self.capture_output = CaptureOutput(backend=capture_output)
 
+        # NumPy outputs are kept in a preallocated ring; other outputs (PIL, PyTorch) in a deque
+        self._uses_frame_ring = capture_output in (CaptureOutputs.NUMPY, CaptureOutputs.NUMPY_FLOAT)
+
         self.frame_buffer_size = frame_buffer_size
-        self.frame_buffer = collections.deque(list(), self.frame_buffer_size)
+        self.frame_buffer = None
+        self._reset_frame_buffer()
 
         self.previous_screenshot = None
 
@@ -60,6 +73,9 @@ class D3DShot(metaclass=Singleton):
         self._capture_thread = None
         self._is_capturing = False
 
+        # Pacer of the running capture loop; its get_stats() reports drift and dropped frames
+        self.frame_pacer = None
+
     @property
     def is_capturing(self):
         return self._is_capturing
@@ -71,6 +87,10 @@ class D3DShot(metaclass=Singleton):
         if frame_index < 0 or (frame_index + 1) > len(self.frame_buffer):
             return None
 
+        if self._uses_frame_ring:
+            # The ring is ordered oldest first; D3DShot indexes newest first
+            return self.frame_buffer.get_frame(-(frame_index + 1))
+
         return self.frame_buffer[frame_index]
 
     def get_frames(self, frame_indices):
@@ -88,6 +108,12 @@ class D3DShot(metaclass=Singleton):
         if stack_dimension not in ["first", "last"]:
             stack_dimension = "first"
 
+        if self._uses_frame_ring:
+            return self.frame_buffer.get_frame_stack(
+                [-(frame_index + 1) for frame_index in frame_indices if frame_index >= 0],
+                stack_dimension
+            )
+
         frames = self.get_frames(frame_indices)
 
         return self.capture_output.stack(frames, stack_dimension)
@@ -130,7 +156,7 @@ class D3DShot(metaclass=Singleton):
         directory = self._validate_directory(directory)
 
         # tuple cast to ensure an immutable frame buffer
-        for i, frame in enumerate(tuple(self.frame_buffer)):
+        for i, frame in enumerate(self.get_frames(range(len(self.frame_buffer)))):
             frame_pil = self.capture_output.to_pil(frame)
             frame_pil.save(f"{directory}/{i + 1}.png")
 
@@ -218,7 +244,19 @@ class D3DShot(metaclass=Singleton):
         self.displays = list()
 
     def _reset_frame_buffer(self):
-        self.frame_buffer = collections.deque(list(), self.frame_buffer_size)
+        if self._uses_frame_ring:
+            if isinstance(self.frame_buffer, FrameRingBuffer):
+                self.frame_buffer.clear()
+            else:
+                self.frame_buffer = FrameRingBuffer(self.frame_buffer_size)
+        else:
+            self.frame_buffer = collections.deque(list(), self.frame_buffer_size)
+
+    def _push_frame(self, frame):
+        if self._uses_frame_ring:
+            self.frame_buffer.add_frame(np.asarray(frame))
+        else:
+            self.frame_buffer.appendleft(frame)
 
     def _validate_region(self, region):
         region = region or self.region or None
@@ -294,61 +332,50 @@ class D3DShot(metaclass=Singleton):
     def _capture(self, target_fps, region):
         self._reset_frame_buffer()
 
-        frame_time = 1 / target_fps
+        pacer = self.frame_pacer = FramePacer(target_fps)
+        last_collection = time.perf_counter()
 
         while self.is_capturing:
-            cycle_start = time.time()
-
             frame = self.display.capture(
                 self.capture_output.process, region=self._validate_region(region)
             )
 
             if frame is not None:
-                self.frame_buffer.appendleft(frame)
+                self._push_frame(frame)
             else:
                 if len(self.frame_buffer):
-                    self.frame_buffer.appendleft(self.frame_buffer[0])
-
-            gc.collect()
+                    self._push_frame(self.get_latest_frame())
 
-            cycle_end = time.time()
+            # Collect at most once a second, and only when the frame has slack for it
+            now = time.perf_counter()
 
-            frame_time_left = frame_time - (cycle_end - cycle_start)
+            if now - last_collection >= 1.0 and pacer.remaining() >= GC_MIN_SLACK:
+                gc.collect()
+                last_collection = now
 
-            if frame_time_left > 0:
-                time.sleep(frame_time_left)
+            pacer.wait()
 
         self._is_capturing = False
 
     def _screenshot_every(self, interval, region):
         self._reset_frame_buffer()
 
-        while self.is_capturing:
-            cycle_start = time.time()
+        pacer = FramePacer(1 / interval)
 
+        while self.is_capturing:
             frame = self.screenshot(region=self._validate_region(region))
-            self.frame_buffer.appendleft(frame)
+            self._push_frame(frame)
 
-            cycle_end = time.time()
-
-            time_left = interval - (cycle_end - cycle_start)
-
-            if time_left > 0:
-                time.sleep(time_left)
+            pacer.wait()
 
         self._is_capturing = False
 
     def _screenshot_to_disk_every(self, interval, directory, region):
-        while self.is_capturing:
-            cycle_start = time.time()
+        pacer = FramePacer(1 / interval)
 
+        while self.is_capturing:
             self.screenshot_to_disk(directory=directory, region=self._validate_region(region))
 
-            cycle_end = time.time()
-
-            time_left = interval - (cycle_end - cycle_start)
-
-            if time_left > 0:
-                time.sleep(time_left)
+            pacer.wait()
 
         self._is_capturing = False
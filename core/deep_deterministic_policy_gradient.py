@@ -2,9 +2,10 @@ import numpy as np
 import tensorflow as tf
 import gym
 from datetime import datetime
-from collections import deque
 import time
 
+from replay_buffer import ReplayBuffer
+
 current_milli_time = lambda: int(round(time.time() * 1000))
 
 def mlp(x, hidden_layers, output_layer, activation=tf.nn.relu, last_activation=None):
@@ -33,46 +34,29 @@ def deterministic_actor_critic(x, a, hidden_sizes, act_dim, max_act):
 
     return p_means, tf.squeeze(q_d), tf.squeeze(q_a)
 
-class ExperiencedBuffer():
+class ExperiencedBuffer(ReplayBuffer):
     '''
     Experienced buffer
     '''
     def __init__(self, buffer_size):
-        # Contains up to 'buffer_size' experience
-        self.obs_buf = deque(maxlen=buffer_size)
-        self.rew_buf = deque(maxlen=buffer_size)
-        self.act_buf = deque(maxlen=buffer_size)
-        self.obs2_buf = deque(maxlen=buffer_size)
-        self.done_buf = deque(maxlen=buffer_size)
+        # Contains up to 'buffer_size' experience, in preallocated arrays
+        super().__init__(capacity=buffer_size)
 
 
     def add(self, obs, rew, act, obs2, done):
         '''
         Add a new transition to the buffers
         '''
-        self.obs_buf.append(obs)
-        self.rew_buf.append(rew)
-        self.act_buf.append(act)
-        self.obs2_buf.append(obs2)
-        self.done_buf.append(done)
+        super().add(obs, act, rew, obs2, done)
         
 
     def sample_minibatch(self, batch_size):
         '''
         Sample a mini-batch of size 'batch_size'
         '''
-        mb_indices = np.random.randint(len(self.obs_buf), size=batch_size)
-
-        mb_obs = [self.obs_buf[i] for i in mb_indices]
-        mb_rew = [self.rew_buf[i] for i in mb_indices]
-        mb_act = [self.act_buf[i] for i in mb_indices]
-        mb_obs2 = [self.obs2_buf[i] for i in mb_indices]
-        mb_done = [self.done_buf[i] for i in mb_indices]
-
-        return mb_obs, mb_rew, mb_act, mb_obs2, mb_done
+        mb = self.sample(batch_size)
 
-    def __len__(self):
-        return len(self.obs_buf)
+        return mb['observations'], mb['rewards'], mb['actions'], mb['next_observations'], mb['dones']
 
 def test_agent(env_test, agent_op, num_games=10):
     '''
@@ -2,11 +2,11 @@ import numpy as np
 import tensorflow as tf
 import gym
 from datetime import datetime
-from collections import deque
 import time
 import sys
 
 from atari_wrappers import make_env
+from replay_buffer import ReplayBuffer
 
 
 gym.logger.set_level(40)
@@ -40,41 +40,28 @@ def qnet(x, hidden_layers, output_size, fnn_activation=tf.nn.relu, last_activati
     return fnn(x, hidden_layers, output_size, fnn_activation, last_activation)
 
 
-class ExperienceBuffer():
+class ExperienceBuffer(ReplayBuffer):
     '''
     Experience Replay Buffer
+    Frames are kept as uint8 in preallocated arrays and scaled per minibatch
     '''
     def __init__(self, buffer_size):
-        self.obs_buf = deque(maxlen=buffer_size)
-        self.rew_buf = deque(maxlen=buffer_size)
-        self.act_buf = deque(maxlen=buffer_size)
-        self.obs2_buf = deque(maxlen=buffer_size)
-        self.done_buf = deque(maxlen=buffer_size)
+        super().__init__(capacity=buffer_size)
 
 
     def add(self, obs, rew, act, obs2, done):
         # Add a new transition to the buffers
-        self.obs_buf.append(obs)
-        self.rew_buf.append(rew)
-        self.act_buf.append(act)
-        self.obs2_buf.append(obs2)
-        self.done_buf.append(done)
+        super().add(obs, act, rew, obs2, done)
         
 
     def sample_minibatch(self, batch_size):
         # Sample a minibatch of size batch_size
-        mb_indices = np.random.randint(len(self.obs_buf), size=batch_size)
+        mb = self.sample(batch_size)
 
-        mb_obs = scale_frames([self.obs_buf[i] for i in mb_indices])
-        mb_rew = [self.rew_buf[i] for i in mb_indices]
-        mb_act = [self.act_buf[i] for i in mb_indices]
-        mb_obs2 = scale_frames([self.obs2_buf[i] for i in mb_indices])
-        mb_done = [self.done_buf[i] for i in mb_indices]
+        mb_obs = scale_frames(mb['observations'])
+        mb_obs2 = scale_frames(mb['next_observations'])
 
-        return mb_obs, mb_rew, mb_act, mb_obs2, mb_done
-
-    def __len__(self):
-        return len(self.obs_buf)
+        return mb_obs, mb['rewards'], mb['actions'], mb_obs2, mb['dones']
 
 
 def q_target_values(mini_batch_rw, mini_batch_done, av, discounted_value):   
@@ -0,0 +1,344 @@
+"""
+Detector Scheduler
+Runs independent detectors concurrently on a thread pool over one shared
+frame (OpenCV releases the GIL), within a per-frame time budget: detectors
+are admitted by priority against their measured latency, low-priority ones
+are deferred when the budget is spent, and results are collected until a
+fixed deadline so the decision loop never waits on a slow detector
+"""
+
+import os
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional, Tuple, List, Dict, Any, Callable, Sequence
+
+import numpy as np
+
+# Detector function: fn(frame, inputs) where inputs holds the run's context
+# entries and the values of the detector's dependencies
+DetectorFunction = Callable[[np.ndarray, Dict[str, Any]], Any]
+
+
+@dataclass
+class Detector:
+    """A registered detector"""
+    name: str
+    function: DetectorFunction
+    priority: int = 1
+    depends_on: Tuple[str, ...] = ()
+    required: bool = False
+
+
+@dataclass
+class DetectorResult:
+    """
+    Outcome of one detector for one frame
+
+    status is 'ok', 'error', 'deferred' (not admitted within the budget),
+    'timeout' (still running at the deadline), 'busy' (the previous run is
+    still in flight) or 'blocked' (a dependency did not produce a fresh
+    value). value is the fresh result for 'ok', otherwise the detector's
+    last value, which belongs to frame `frame_id`.
+    """
+    name: str
+    status: str
+    value: Any = None
+    latency_ms: float = 0.0
+    frame_id: int = -1
+
+    @property
+    def fresh(self) -> bool:
+        return self.status == 'ok'
+
+
+class FrameDetections(dict):
+    """Detector results of one frame, by detector name"""
+
+    def __init__(self, frame_id: int, results: Dict[str, DetectorResult], elapsed_ms: float):
+        super().__init__(results)
+        self.frame_id = frame_id
+        self.elapsed_ms = elapsed_ms
+
+    def value(self, name: str, default: Any = None, allow_stale: bool = False) -> Any:
+        """Value of a detector for this frame, or its last value with allow_stale"""
+        result = self.get(name)
+
+        if result is None or (not result.fresh and not allow_stale) or result.frame_id < 0:
+            return default
+
+        return result.value
+
+
+class _DetectorState:
+    """Latency estimate, last value and counters of one detector"""
+
+    __slots__ = ('value', 'frame_id', 'avg_ms', 'last_ms', 'max_ms', 'runs', 'deferrals',
+                 'deferred_total', 'timeouts', 'errors', 'future')
+
+    def __init__(self):
+        self.value = None
+        self.frame_id = -1
+        self.avg_ms = None
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.runs = 0
+        self.deferrals = 0
+        self.deferred_total = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.future = None
+
+
+class DetectorScheduler:
+    """
+    Budgeted parallel detector stage
+
+    For each frame, detectors are admitted in order of priority (raised by
+    one per consecutive deferral so none starves) while a list schedule of
+    their average latencies on max_workers threads finishes within
+    budget_ms. Required detectors, the dependencies of admitted detectors
+    and detectors deferred max_deferrals times in a row are always admitted.
+    Detectors without a latency estimate are admitted to get one.
+
+    run() returns after every admitted detector finished or at the
+    deadline (budget_ms * deadline_factor), whichever comes first.
+    Detectors still running keep going; their result becomes the
+    detector's last value and they are not started again until done.
+    Detectors share the frame and must not modify it.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, budget_ms: float = 25.0, deadline_factor: float = 1.5,
+                 max_deferrals: int = 5, smoothing: float = 0.2):
+        self.logger = logging.getLogger(__name__)
+
+        # The budget is planned on as many lanes as there are workers, so
+        # default to no more workers than cores
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.budget_ms = budget_ms
+        self.deadline_factor = deadline_factor
+        self.max_deferrals = max_deferrals
+        self.smoothing = smoothing
+
+        self.detectors = {}
+        self.states = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="detector")
+
+        self.frame_id = 0
+        self.stats = {
+            'frames': 0,
+            'over_deadline': 0,
+            'last_frame_ms': 0.0
+        }
+
+    def register(self, name: str, function: DetectorFunction, priority: int = 1,
+                 depends_on: Sequence[str] = (), required: bool = False):
+        """Add a detector; dependencies must be registered first"""
+        for dependency in depends_on:
+            if dependency not in self.detectors:
+                raise ValueError(f"Detector '{name}' depends on unknown detector '{dependency}'")
+
+        self.detectors[name] = Detector(name, function, priority, tuple(depends_on), required)
+        self.states.setdefault(name, _DetectorState())
+
+    def unregister(self, name: str):
+        for detector in self.detectors.values():
+            if name in detector.depends_on:
+                raise ValueError(f"Detector '{detector.name}' depends on '{name}'")
+
+        self.detectors.pop(name, None)
+        self.states.pop(name, None)
+
+    def run(self, frame: np.ndarray, names: Optional[Sequence[str]] = None, budget_ms: Optional[float] = None,
+            context: Optional[Dict[str, Any]] = None) -> FrameDetections:
+        """
+        Run the detectors (all, or names and their dependencies) on a frame within the budget
+
+        context entries (e.g. the frame's change detection result) are
+        passed to every detector in its inputs.
+        """
+        started = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+
+        with self.lock:
+            self.frame_id += 1
+            frame_id = self.frame_id
+
+        candidates = self._with_dependencies(names if names is not None else list(self.detectors))
+        admitted, results = self._admit(candidates, budget_ms, frame_id)
+
+        # Submit in dependency order so a waiting dependent never holds a
+        # worker its dependency still needs (the executor queue is FIFO)
+        futures = {}
+        for name in self._topological(admitted):
+            detector = self.detectors[name]
+            dependencies = {dependency: futures[dependency] for dependency in detector.depends_on}
+
+            future = self.executor.submit(self._execute, detector, frame, frame_id, dependencies, context or {})
+            self.states[name].future = future
+            futures[name] = future
+
+        deadline = budget_ms * self.deadline_factor / 1000.0
+        wait(list(futures.values()), timeout=max(deadline - (time.perf_counter() - started), 0.0))
+
+        for name, future in futures.items():
+            state = self.states[name]
+
+            if future.done():
+                status, value, latency = future.result()
+                results[name] = DetectorResult(name, status, value if status == 'ok' else state.value,
+                                               latency, frame_id if status == 'ok' else state.frame_id)
+            else:
+                state.timeouts += 1
+                results[name] = DetectorResult(name, 'timeout', state.value, 0.0, state.frame_id)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['frames'] += 1
+        self.stats['last_frame_ms'] = elapsed_ms
+
+        if elapsed_ms > budget_ms * self.deadline_factor:
+            self.stats['over_deadline'] += 1
+
+        return FrameDetections(frame_id, results, elapsed_ms)
+
+    def _admit(self, candidates: List[str], budget_ms: float,
+               frame_id: int) -> Tuple[List[str], Dict[str, DetectorResult]]:
+        """Detectors to run this frame, and results for the ones that will not run"""
+        results = {}
+        admitted = set()
+        finish = {}
+        lanes = [0.0] * self.max_workers
+
+        def effective_priority(name):
+            detector = self.detectors[name]
+            return (detector.required, detector.priority + self.states[name].deferrals)
+
+        for name in sorted(candidates, key=effective_priority, reverse=True):
+            if name in admitted or name in results:
+                continue
+
+            state = self.states[name]
+
+            if state.future is not None and not state.future.done():
+                results[name] = DetectorResult(name, 'busy', state.value, 0.0, state.frame_id)
+                continue
+
+            chain = [dependency for dependency in self._with_dependencies([name]) if dependency not in admitted]
+
+            if any(dependency in results for dependency in chain):
+                results[name] = DetectorResult(name, 'blocked', state.value, 0.0, state.frame_id)
+                continue
+
+            # List schedule of the chain on the earliest free lanes
+            trial_lanes = list(lanes)
+            trial_finish = dict(finish)
+
+            for member in self._topological(chain):
+                lane_start = heapq.heappop(trial_lanes)
+                start = max([lane_start] + [trial_finish[d] for d in self.detectors[member].depends_on])
+                trial_finish[member] = start + (self.states[member].avg_ms or 0.0)
+                heapq.heappush(trial_lanes, trial_finish[member])
+
+            forced = any(self.detectors[member].required or self.states[member].deferrals >= self.max_deferrals
+                         for member in chain)
+
+            if forced or trial_finish[name] <= budget_ms:
+                lanes, finish = trial_lanes, trial_finish
+                admitted.update(chain)
+            else:
+                state.deferrals += 1
+                state.deferred_total += 1
+                results[name] = DetectorResult(name, 'deferred', state.value, 0.0, state.frame_id)
+
+        for name in admitted:
+            self.states[name].deferrals = 0
+
+        return list(admitted), results
+
+    def _execute(self, detector: Detector, frame: np.ndarray, frame_id: int, dependencies: Dict[str, Any],
+                 context: Dict[str, Any]) -> Tuple[str, Any, float]:
+        """Worker body: wait for dependencies, run the detector and record its latency"""
+        inputs = dict(context)
+
+        for name, future in dependencies.items():
+            status, value, _ = future.result()
+
+            if status != 'ok':
+                return 'blocked', None, 0.0
+
+            inputs[name] = value
+
+        state = self.states.get(detector.name) or _DetectorState()
+        started = time.perf_counter()
+
+        try:
+            value = detector.function(frame, inputs)
+            status = 'ok'
+        except Exception as e:
+            self.logger.error(f"Detector '{detector.name}' failed: {e}")
+            state.errors += 1
+            value, status = None, 'error'
+
+        latency = (time.perf_counter() - started) * 1000
+
+        with self.lock:
+            state.runs += 1
+            state.last_ms = latency
+            state.max_ms = max(state.max_ms, latency)
+            state.avg_ms = latency if state.avg_ms is None else \
+                state.avg_ms + self.smoothing * (latency - state.avg_ms)
+
+            # Late results still become the last value
+            if status == 'ok' and frame_id >= state.frame_id:
+                state.value = value
+                state.frame_id = frame_id
+
+        return status, value, latency
+
+    def _with_dependencies(self, names: Sequence[str]) -> List[str]:
+        """names plus everything they depend on"""
+        ordered = []
+        pending = list(names)
+
+        while pending:
+            name = pending.pop()
+
+            if name in ordered or name not in self.detectors:
+                continue
+
+            ordered.append(name)
+            pending.extend(self.detectors[name].depends_on)
+
+        return ordered
+
+    def _topological(self, names: Sequence[str]) -> List[str]:
+        """names ordered so dependencies come first (registration order already is one)"""
+        selected = set(names)
+        return [name for name in self.detectors if name in selected]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-detector latency and scheduling counters plus frame totals"""
+        stats = self.stats.copy()
+        stats['budget_ms'] = self.budget_ms
+        stats['detectors'] = {
+            name: {
+                'priority': self.detectors[name].priority,
+                'runs': state.runs,
+                'avg_ms': state.avg_ms or 0.0,
+                'last_ms': state.last_ms,
+                'max_ms': state.max_ms,
+                'deferred': state.deferred_total,
+                'timeouts': state.timeouts,
+                'errors': state.errors
+            }
+            for name, state in self.states.items()
+        }
+
+        return stats
+
+    def shutdown(self, wait_for_running: bool = False):
+        self.executor.shutdown(wait=wait_for_running)
@@ -16,7 +16,13 @@ import random
 
 # Import our enhanced core systems
 from .serpent_enhanced_vision import SerpentEnhancedVision
+from .frame_pacer import FramePacer
+from .change_detector import FrameChangeDetector
+from .object_tracker import MultiObjectTracker, Track
+from .detector_scheduler import DetectorScheduler
+from .observation_stack import ObservationStack
 from .advanced_reinforcement_learning import AdvancedRLAgent
+from .actor_learner import ActorLearner
 from .vision_system import VisionSystem
 from .automation_engine import AutomationEngine
 from .learning_system import LearningSystem
@@ -27,6 +33,15 @@ class EnhancedIntegrationSystem:
     Orchestrates vision, automation, and learning with SerpentAI optimizations
     """
     
+    # Color ranges of the target types for the color detector
+    TARGET_COLOR_RANGES = {
+        'chests': ((20, 100, 100), (30, 255, 255)),  # Golden chests
+        'eggs': ((100, 150, 50), (120, 255, 255)),   # Blue eggs
+        'breakables': ((0, 100, 100), (10, 255, 255))  # Red breakables
+    }
+    
+    TARGET_TYPES = ('chests', 'eggs', 'breakables')
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         self.logger = logging.getLogger(__name__)
         self.config = config or self._get_default_config()
@@ -43,16 +58,37 @@ class EnhancedIntegrationSystem:
         self.automation_engine = AutomationEngine()
         self.learning_system = LearningSystem()
         
-        # Initialize reinforcement learning agent if enabled
+        # RL observations: each captured frame is resized and grayscaled
+        # once into a ring of uint8 planes served as a stacked view (the
+        # agent scales them on its device; replay stores them as uint8)
+        stack_size, obs_width, obs_height = self.config['rl']['input_shape']
+        self.observation_stack = ObservationStack(stack_size, (obs_width, obs_height), dtype=np.uint8)
+        
+        # Initialize reinforcement learning agent if enabled. With
+        # async_learner the loop's agent only runs inference and a learner
+        # process trains on the transitions it sends
         self.rl_agent = None
+        self.rl_learner = None
         if self.config['rl']['enabled']:
             try:
-                self.rl_agent = AdvancedRLAgent(
-                    algorithm=self.config['rl']['algorithm'],
-                    input_shape=tuple(self.config['rl']['input_shape']),
-                    num_actions=self.config['rl']['num_actions'],
-                    continuous=self.config['rl']['continuous']
-                )
+                agent_kwargs = {
+                    'algorithm': self.config['rl']['algorithm'],
+                    'input_shape': tuple(self.config['rl']['input_shape']),
+                    'num_actions': self.config['rl']['num_actions'],
+                    'continuous': self.config['rl']['continuous'],
+                    'replay_capacity': self.config['rl'].get('replay_capacity', 100000)
+                }
+                
+                if self.config['rl'].get('async_learner', False):
+                    self.rl_learner = ActorLearner(
+                        agent_kwargs,
+                        publish_interval=self.config['rl'].get('weight_publish_interval', 1.0),
+                        updates_per_transition=self.config['rl'].get('updates_per_transition')
+                    )
+                    self.rl_agent = self.rl_learner.agent
+                else:
+                    self.rl_agent = AdvancedRLAgent(**agent_kwargs)
+                
                 self.logger.info(f"RL Agent initialized: {self.config['rl']['algorithm']}")
             except Exception as e:
                 self.logger.warning(f"RL Agent initialization failed: {e}")
@@ -67,6 +103,29 @@ class EnhancedIntegrationSystem:
         self.pattern_analyzer = PatternAnalyzer(self)
         self.performance_optimizer = PerformanceOptimizer(self)
         
+        # Targets persist across frames as tracks: the detectors run on the full
+        # frame every detection_interval frames and on dirty regions in between
+        self.target_tracker = MultiObjectTracker()
+        self.change_detector = FrameChangeDetector()
+        self.detection_interval = 5
+        self._frames_since_detection = None
+        self._last_detections = {}
+        
+        # Sprite, color and template detectors run concurrently over the shared
+        # frame within a per-frame budget; late detectors are deferred
+        self.detector_scheduler = DetectorScheduler(
+            max_workers=self.config['automation'].get('detector_workers'),
+            budget_ms=self.config['automation'].get('detection_budget_ms', 25.0)
+        )
+        self._register_target_detectors()
+        
+        # Deadline pacing for the decision loop; adaptive timing lowers the
+        # rate to what analysis and decision making can sustain
+        self.decision_pacer = FramePacer(
+            self.config['automation'].get('decision_fps', 30),
+            adaptive=self.config['automation'].get('adaptive_timing', False)
+        )
+        
         # Integration metrics
         self.integration_stats = {
             'total_actions': 0,
@@ -92,11 +151,17 @@ class EnhancedIntegrationSystem:
                 'algorithm': 'PPO',  # PPO, DQN, DDPG, TD3
                 'input_shape': [4, 84, 84],  # 4-frame stack, 84x84 resolution
                 'num_actions': 6,  # move_up, move_down, move_left, move_right, click, wait
-                'continuous': False
+                'continuous': False,
+                'replay_capacity': 1000000,  # one 84x84 frame per step, ~8 GB when full
+                'async_learner': True,  # train in a learner process, off the decision loop
+                'weight_publish_interval': 1.0,  # seconds between learner weight updates
+                'updates_per_transition': None  # learner update cap (None: train continuously)
             },
             'automation': {
                 'serpent_mode': True,
                 'adaptive_timing': True,
+                'decision_fps': 30,
+                'detection_budget_ms': 25.0,
                 'human_like_movement': True
             },
             'learning': {
@@ -124,6 +189,10 @@ class EnhancedIntegrationSystem:
         # Start automation engine
         self.automation_engine.start()
         
+        # Start the RL learner process
+        if self.rl_learner:
+            self.rl_learner.start()
+        
         # Start AI coordination thread
         self.coordination_thread = threading.Thread(target=self._ai_coordination_loop, daemon=True)
         self.coordination_thread.start()
@@ -145,21 +214,24 @@ class EnhancedIntegrationSystem:
         if hasattr(self, 'coordination_thread') and self.coordination_thread.is_alive():
             self.coordination_thread.join(timeout=5.0)
         
+        if self.rl_learner:
+            self.rl_learner.stop()
+        
         self.logger.info("Enhanced integration mode stopped")
     
     def _ai_coordination_loop(self):
         """Main AI coordination loop combining all systems"""
         last_optimization = time.time()
         action_sequence = deque(maxlen=20)
+        pacer = self.decision_pacer
+        pacer.reset()
         
         while self.is_active:
             try:
-                loop_start = time.time()
-                
                 # Get current frame from enhanced vision
                 current_frame = self.serpent_vision.get_latest_frame()
                 if current_frame is None:
-                    time.sleep(0.1)
+                    pacer.wait()
                     continue
                 
                 # Analyze game state
@@ -201,9 +273,7 @@ class EnhancedIntegrationSystem:
                     self.learning_system.adaptive_learning_rate()
                 
                 # Control loop timing
-                loop_duration = time.time() - loop_start
-                sleep_time = max(0.1, 1.0/30 - loop_duration)  # 30 FPS target
-                time.sleep(sleep_time)
+                pacer.wait()
                 
             except Exception as e:
                 self.logger.error(f"Error in AI coordination loop: {e}")
@@ -215,41 +285,38 @@ class EnhancedIntegrationSystem:
             'timestamp': time.time(),
             'frame_shape': frame.shape,
             'detected_elements': {},
+            'tracks': {},
             'regions': {}
         }
         
         try:
-            # Use both vision systems for comprehensive analysis
-            
-            # SerpentAI enhanced detection
-            sprite_detections = self.serpent_vision.detect_sprites(
-                frame, self.serpent_vision.sprite_templates
-            )
+            # Full detection when due or when most of the screen changed,
+            # dirty-region detection otherwise; unchanged frames only hold tracks
+            change = self.change_detector.update(frame)
+            due = self._frames_since_detection is None or self._frames_since_detection + 1 >= self.detection_interval
             
-            # Color-based detection for game elements
-            color_ranges = {
-                'chests': ((20, 100, 100), (30, 255, 255)),  # Golden chests
-                'eggs': ((100, 150, 50), (120, 255, 255)),   # Blue eggs
-                'breakables': ((0, 100, 100), (10, 255, 255))  # Red breakables
-            }
-            
-            color_detections = self.serpent_vision.detect_color_regions(
-                frame, color_ranges, min_area=50
-            )
-            
-            # Traditional template matching
-            template_matches = {}
-            for element_type in ['chests', 'eggs', 'breakables']:
-                matches = self.vision_system.find_template(element_type, frame)
-                if matches:
-                    template_matches[element_type] = matches
+            if change.full_refresh or due:
+                self._last_detections = self._detect_targets(frame)
+                self.target_tracker.update(self._target_detections(self._last_detections), game_state['timestamp'])
+                self._frames_since_detection = 0
+            elif change.changed:
+                # Dirty regions share the frame's detection budget
+                region_targets = {}
+                region_budget = self.detector_scheduler.budget_ms / max(len(change.dirty_regions), 1)
+                for x, y, w, h in change.dirty_regions:
+                    detections = self._detect_targets(frame[y:y+h, x:x+w], region_budget)
+                    for target_type, targets in self._target_detections(detections, (x, y)).items():
+                        region_targets.setdefault(target_type, []).extend(targets)
+                
+                self.target_tracker.update(region_targets, game_state['timestamp'], regions=change.dirty_regions)
+                self._frames_since_detection += 1
+            else:
+                self.target_tracker.update({}, game_state['timestamp'], regions=[])
+                self._frames_since_detection += 1
             
-            # Combine detections
-            game_state['detected_elements'] = {
-                'sprites': sprite_detections,
-                'colors': color_detections,
-                'templates': template_matches
-            }
+            # Raw detector output of the last full pass, and the live tracks
+            game_state['detected_elements'] = self._last_detections
+            game_state['tracks'] = self.target_tracker.tracks_by_label()
             
             # Analyze specific regions
             for region_name in self.serpent_vision.detection_regions:
@@ -266,6 +333,77 @@ class EnhancedIntegrationSystem:
         self.current_game_state = game_state
         return game_state
     
+    def _register_target_detectors(self):
+        """Register the target detectors; one segmentation (and HSV conversion) and one pyramid serve them all"""
+        scheduler = self.detector_scheduler
+        
+        scheduler.register('segmentation', lambda frame, inputs: self.vision_system.segment_colors(frame),
+                           priority=3, required=True)
+        scheduler.register('pyramid', lambda frame, inputs: self.vision_system.template_bank.build_pyramid(frame),
+                           priority=2)
+        
+        # Color-based detection for game elements
+        scheduler.register('colors', lambda frame, inputs: self.serpent_vision.detect_color_regions(
+            frame, self.TARGET_COLOR_RANGES, min_area=50, include_contours=False,
+            hsv=inputs['segmentation'].hsv
+        ), priority=3, depends_on=['segmentation'], required=True)
+        
+        # Traditional template matching
+        for element_type in self.TARGET_TYPES:
+            scheduler.register(f'templates:{element_type}', lambda frame, inputs, element_type=element_type:
+                               self.vision_system.find_template(element_type, frame, inputs['segmentation'],
+                                                                inputs['pyramid']),
+                               priority=2, depends_on=['segmentation', 'pyramid'])
+        
+        # SerpentAI enhanced detection
+        scheduler.register('sprites', lambda frame, inputs: self.serpent_vision.detect_sprites(
+            frame, self.serpent_vision.sprite_templates
+        ), priority=1)
+    
+    def _detect_targets(self, frame: np.ndarray, budget_ms: Optional[float] = None) -> Dict[str, Dict[str, List[Any]]]:
+        """Run the sprite, color and template detectors on a frame; deferred detectors report nothing"""
+        detections = self.detector_scheduler.run(frame, budget_ms=budget_ms)
+        
+        template_matches = {}
+        for element_type in self.TARGET_TYPES:
+            matches = detections.value(f'templates:{element_type}')
+            if matches:
+                template_matches[element_type] = matches
+        
+        return {
+            'sprites': detections.value('sprites', {}),
+            'colors': detections.value('colors', {}),
+            'templates': template_matches
+        }
+    
+    def _target_detections(self, detections: Dict[str, Dict[str, List[Any]]],
+                           offset: Tuple[int, int] = (0, 0)) -> Dict[str, List[Tuple]]:
+        """Merge detector outputs into (x, y, w, h, confidence) boxes per target type"""
+        dx, dy = offset
+        targets = {}
+        
+        for target_type in self.TARGET_TYPES:
+            boxes = []
+            
+            for item in detections.get('colors', {}).get(target_type, []):
+                x, y, w, h = item['bbox']
+                boxes.append((x + dx, y + dy, w, h, 1.0))
+            
+            # Sprite matches are top-left corners of the sprite template
+            sprite = self.serpent_vision.sprite_templates.get(target_type)
+            for x, y, confidence in detections.get('sprites', {}).get(target_type, []):
+                h, w = sprite.shape[:2]
+                boxes.append((x + dx, y + dy, w, h, float(confidence)))
+            
+            # Template matches are centres; the tracker gives them its default size
+            for x, y, confidence in detections.get('templates', {}).get(target_type, []):
+                boxes.append((x + dx, y + dy, float(confidence)))
+            
+            if boxes:
+                targets[target_type] = boxes
+        
+        return targets
+    
     def _make_rl_decision(self, game_state: Dict[str, Any], frame: np.ndarray) -> Optional[Dict[str, Any]]:
         """Make decision using reinforcement learning agent"""
         if not self.rl_agent:
@@ -275,8 +413,13 @@ class EnhancedIntegrationSystem:
             # Prepare observation for RL agent
             observation = self._prepare_rl_observation(frame, game_state)
             
-            # Select action
-            action_index = self.rl_agent.select_action(observation, training=True)
+            # Select action (the async actor also picks up published weights)
+            policy = self.rl_learner or self.rl_agent
+            action_index = policy.select_action(observation, training=True)
+            
+            # Kept for the transition recorded with the action's outcome
+            self._last_observation = observation.copy()
+            self._last_action = action_index
             
             # Convert action index to game action
             action = self._convert_rl_action(action_index, game_state)
@@ -290,59 +433,28 @@ class EnhancedIntegrationSystem:
     
     def _make_heuristic_decision(self, game_state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Make decision using heuristic rules and learning patterns"""
-        detected = game_state.get('detected_elements', {})
+        tracks = game_state.get('tracks', {})
         
         # Priority: chests > eggs > breakables
-        
-        # Check for chests
-        chest_positions = []
-        for detection_type in ['sprites', 'colors', 'templates']:
-            if 'chests' in detected.get(detection_type, {}):
-                chest_data = detected[detection_type]['chests']
-                if detection_type == 'colors' and chest_data:
-                    chest_positions.extend([(item['center'][0], item['center'][1]) for item in chest_data])
-                elif detection_type in ['sprites', 'templates'] and chest_data:
-                    chest_positions.extend(chest_data)
-        
-        if chest_positions:
+        if tracks.get('chests'):
             # Use learning system to select best chest
-            best_chest = self._select_best_target('chest', chest_positions)
+            best_chest = self._select_best_target('chest', tracks['chests'])
             return {
                 'type': 'open_chest',
                 'target': best_chest,
                 'priority': 'high'
             }
         
-        # Check for eggs
-        egg_positions = []
-        for detection_type in ['sprites', 'colors', 'templates']:
-            if 'eggs' in detected.get(detection_type, {}):
-                egg_data = detected[detection_type]['eggs']
-                if detection_type == 'colors' and egg_data:
-                    egg_positions.extend([(item['center'][0], item['center'][1]) for item in egg_data])
-                elif detection_type in ['sprites', 'templates'] and egg_data:
-                    egg_positions.extend(egg_data)
-        
-        if egg_positions:
-            best_egg = self._select_best_target('egg', egg_positions)
+        if tracks.get('eggs'):
+            best_egg = self._select_best_target('egg', tracks['eggs'])
             return {
                 'type': 'hatch_egg',
                 'target': best_egg,
                 'priority': 'medium'
             }
         
-        # Check for breakables
-        breakable_positions = []
-        for detection_type in ['sprites', 'colors', 'templates']:
-            if 'breakables' in detected.get(detection_type, {}):
-                breakable_data = detected[detection_type]['breakables']
-                if detection_type == 'colors' and breakable_data:
-                    breakable_positions.extend([(item['center'][0], item['center'][1]) for item in breakable_data])
-                elif detection_type in ['sprites', 'templates'] and breakable_data:
-                    breakable_positions.extend(breakable_data)
-        
-        if breakable_positions:
-            best_breakable = self._select_best_target('breakable', breakable_positions)
+        if tracks.get('breakables'):
+            best_breakable = self._select_best_target('breakable', tracks['breakables'])
             return {
                 'type': 'break_object',
                 'target': best_breakable,
@@ -356,32 +468,35 @@ class EnhancedIntegrationSystem:
             'priority': 'low'
         }
     
-    def _select_best_target(self, target_type: str, positions: List[Tuple[int, int]]) -> Tuple[int, int]:
-        """Select best target using learning system insights"""
-        if not positions:
+    def _select_best_target(self, target_type: str, targets: List[Track]) -> Tuple[int, int]:
+        """Select best target using learning system insights; returns its tracked position"""
+        if not targets:
             return (0, 0)
         
+        # Oldest tracks first so action indices refer to the same objects across frames
+        targets = sorted(targets, key=lambda track: track.track_id)
+        
         # Use Q-learning if available
         if self.config['learning']['q_learning']:
             state = f"{target_type}_selection"
-            available_actions = [f"target_{i}" for i in range(len(positions))]
+            available_actions = [f"target_{i}" for i in range(len(targets))]
             
             if len(available_actions) > 0:
                 best_action = self.learning_system.select_action_epsilon_greedy(state, available_actions)
                 try:
                     action_index = int(best_action.split('_')[1])
-                    if 0 <= action_index < len(positions):
-                        return positions[action_index]
+                    if 0 <= action_index < len(targets):
+                        return targets[action_index].position
                 except:
                     pass
         
         # Fallback: select closest target
         screen_center = (self.config['vision']['width'] // 2, self.config['vision']['height'] // 2)
-        closest_position = min(positions, key=lambda pos: 
-            ((pos[0] - screen_center[0]) ** 2 + (pos[1] - screen_center[1]) ** 2) ** 0.5
+        closest = min(targets, key=lambda track: 
+            ((track.position[0] - screen_center[0]) ** 2 + (track.position[1] - screen_center[1]) ** 2) ** 0.5
         )
         
-        return closest_position
+        return closest.position
     
     def _execute_enhanced_action(self, action: Dict[str, Any], game_state: Dict[str, Any]) -> bool:
         """Execute action using enhanced automation engine"""
@@ -446,52 +561,43 @@ class EnhancedIntegrationSystem:
             try:
                 reward = 1.0 if success else -0.1
                 current_observation = self._prepare_rl_observation(
-                    self.serpent_vision.get_latest_frame(), game_state
+                    self.serpent_vision.get_latest_frame(), game_state, copy=True
                 )
                 
                 if current_observation is not None:
-                    self.rl_agent.train_step(
-                        self._last_observation, self._last_action,
-                        reward, current_observation, not success
-                    )
+                    if self.rl_learner:
+                        # Queued for the learner process; never blocks the loop
+                        self.rl_learner.add_transition(
+                            self._last_observation, self._last_action,
+                            reward, current_observation, not success
+                        )
+                    else:
+                        self.rl_agent.train_step(
+                            self._last_observation, self._last_action,
+                            reward, current_observation, not success
+                        )
             except Exception as e:
                 self.logger.error(f"RL training failed: {e}")
     
-    def _prepare_rl_observation(self, frame: np.ndarray, game_state: Dict[str, Any]) -> Optional[np.ndarray]:
-        """Prepare observation for RL agent"""
+    def _prepare_rl_observation(self, frame: np.ndarray, game_state: Dict[str, Any],
+                                copy: bool = False) -> Optional[np.ndarray]:
+        """
+        Prepare observation for RL agent
+        
+        Frames captured since the last call are preprocessed into the
+        observation stack; the returned stack is a view of its ring unless
+        copy is set (for observations that are kept, e.g. in replay).
+        """
         try:
-            # Resize frame to RL input size
-            target_size = (self.config['rl']['input_shape'][1], self.config['rl']['input_shape'][2])
-            
-            import cv2
-            resized_frame = cv2.resize(frame, target_size)
+            observation = self.observation_stack.sync(self.serpent_vision.game_frame_buffer.frames)
             
-            # Convert to grayscale if needed
-            if len(resized_frame.shape) == 3:
-                resized_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2GRAY)
+            if observation is None:
+                if frame is None:
+                    return None
+                # Nothing captured yet: the current frame fills the stack
+                observation = self.observation_stack.push(frame)
             
-            # Normalize
-            normalized_frame = resized_frame.astype(np.float32) / 255.0
-            
-            # Get frame stack
-            frame_stack = self.serpent_vision.get_frame_stack(
-                list(range(-self.config['rl']['input_shape'][0], 0)),
-                stack_dimension="first"
-            )
-            
-            if frame_stack is not None:
-                # Resize and normalize frame stack
-                processed_stack = []
-                for i in range(frame_stack.shape[0]):
-                    frame_slice = cv2.resize(frame_stack[i], target_size)
-                    if len(frame_slice.shape) == 3:
-                        frame_slice = cv2.cvtColor(frame_slice, cv2.COLOR_BGR2GRAY)
-                    processed_stack.append(frame_slice.astype(np.float32) / 255.0)
-                
-                return np.stack(processed_stack, axis=0)
-            else:
-                # Use current frame repeated
-                return np.stack([normalized_frame] * self.config['rl']['input_shape'][0], axis=0)
+            return observation.copy() if copy else observation
                 
         except Exception as e:
             self.logger.error(f"RL observation preparation failed: {e}")
@@ -529,18 +635,10 @@ class EnhancedIntegrationSystem:
             base_action['type'] = 'move'
         
         elif base_action['type'] == 'click':
-            # Find best click target from detected elements
-            detected = game_state.get('detected_elements', {})
-            click_targets = []
-            
-            for detection_type in ['sprites', 'colors', 'templates']:
-                for element_type in ['chests', 'eggs', 'breakables']:
-                    if element_type in detected.get(detection_type, {}):
-                        element_data = detected[detection_type][element_type]
-                        if detection_type == 'colors' and element_data:
-                            click_targets.extend([(item['center'][0], item['center'][1]) for item in element_data])
-                        elif detection_type in ['sprites', 'templates'] and element_data:
-                            click_targets.extend(element_data)
+            # Find best click target from the tracked elements
+            tracks = game_state.get('tracks', {})
+            click_targets = [track.position for element_type in ['chests', 'eggs', 'breakables']
+                             for track in tracks.get(element_type, [])]
             
             if click_targets:
                 base_action['target'] = random.choice(click_targets)
@@ -556,10 +654,14 @@ class EnhancedIntegrationSystem:
         
         # Add system-specific stats
         stats['vision'] = self.serpent_vision.get_capture_stats()
+        stats['decision_pacing'] = self.decision_pacer.get_stats()
+        stats['detectors'] = self.detector_scheduler.get_stats()
         stats['automation'] = self.automation_engine.get_performance_stats()
         stats['learning'] = self.learning_system.get_advanced_stats()
         
-        if self.rl_agent:
+        if self.rl_learner:
+            stats['rl'] = self.rl_learner.get_training_stats()
+        elif self.rl_agent:
             stats['rl'] = self.rl_agent.get_training_stats()
         
         # Calculate success rate
@@ -585,16 +687,19 @@ class EnhancedIntegrationSystem:
             # High precision, slower speed
             self.automation_engine.disable_serpent_mode()
             self.serpent_vision.set_fps(15)
+            self.detector_scheduler.budget_ms = 2 * self.config['automation'].get('detection_budget_ms', 25.0)
             
         elif mode == 'speed':
             # High speed, lower precision
             self.automation_engine.enable_serpent_mode()
             self.serpent_vision.set_fps(60)
+            self.detector_scheduler.budget_ms = 0.5 * self.config['automation'].get('detection_budget_ms', 25.0)
             
         else:  # balanced
             # Balanced settings
             self.automation_engine.enable_serpent_mode()
             self.serpent_vision.set_fps(30)
+            self.detector_scheduler.budget_ms = self.config['automation'].get('detection_budget_ms', 25.0)
         
         self.logger.info(f"Performance mode set to: {mode}")
 
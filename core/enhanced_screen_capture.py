@@ -9,87 +9,73 @@ import threading
 from typing import Optional, Tuple, Any, Dict, List
 from pathlib import Path
 import numpy as np
-from collections import deque
 import cv2
 
-try:
-    import pyautogui
-    PYAUTOGUI_AVAILABLE = True
-except Exception:
-    PYAUTOGUI_AVAILABLE = False
-
-try:
-    from PIL import Image
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
+from .frame_ring_buffer import FrameRingBuffer
+from .capture_backends import create_backend, get_default_backend, select_fastest_backend
+from .frame_pacer import FramePacer
 
 class FrameBuffer:
     """Thread-safe frame buffer inspired by SerpentAI's design"""
     
     def __init__(self, max_size: int = 60):
-        self.buffer = deque(maxlen=max_size)
-        self.lock = threading.Lock()
+        self.buffer = FrameRingBuffer(max_size)
+        self.lock = self.buffer.lock
         self.logger = logging.getLogger(__name__)
         
     def add_frame(self, frame: np.ndarray, timestamp: float = None):
         """Add frame to buffer with timestamp"""
-        if timestamp is None:
-            timestamp = time.time()
-            
-        with self.lock:
-            self.buffer.append({
-                'frame': frame,
-                'timestamp': timestamp
-            })
+        self.buffer.add_frame(frame, timestamp)
+    
+    def acquire_slot(self, frame_shape: Tuple[int, ...]) -> np.ndarray:
+        """Get the next ring slot so a capture can be written in place"""
+        return self.buffer.acquire_slot(frame_shape)
+    
+    def commit(self, timestamp: float = None):
+        """Publish the slot returned by acquire_slot"""
+        self.buffer.commit(timestamp)
+    
+    def abort(self):
+        """Release the slot returned by acquire_slot without publishing it"""
+        self.buffer.abort()
     
     def get_latest_frame(self) -> Optional[Dict[str, Any]]:
         """Get the most recent frame"""
         with self.lock:
-            if self.buffer:
-                return self.buffer[-1]
+            if len(self.buffer):
+                return {
+                    'frame': self.buffer.get_frame(-1),
+                    'timestamp': self.buffer.get_timestamp(-1)
+                }
             return None
     
     def get_frame_stack(self, indices: Tuple[int, ...], stack_dimension: str = "last") -> Optional[np.ndarray]:
         """Get multiple frames as a stack (SerpentAI style)"""
-        with self.lock:
-            if not self.buffer or not indices:
-                return None
-                
-            frames = []
-            for idx in indices:
-                if 0 <= idx < len(self.buffer):
-                    frames.append(self.buffer[idx]['frame'])
-            
-            if not frames:
-                return None
-                
-            if stack_dimension == "last":
-                return np.stack(frames, axis=-1)
-            elif stack_dimension == "first":
-                return np.stack(frames, axis=0)
-            else:
-                return np.stack(frames, axis=int(stack_dimension))
+        return self.buffer.get_frame_stack(indices, stack_dimension)
     
     def clear(self):
         """Clear the frame buffer"""
-        with self.lock:
-            self.buffer.clear()
+        self.buffer.clear()
     
     def get_buffer_size(self) -> int:
         """Get current buffer size"""
-        with self.lock:
-            return len(self.buffer)
+        return len(self.buffer)
 
 class EnhancedScreenCapture:
     """Enhanced screen capture system with SerpentAI optimizations"""
     
-    def __init__(self, frame_buffer_size: int = 60, capture_output: str = "numpy"):
+    def __init__(self, frame_buffer_size: int = 60, capture_output: str = "numpy",
+                 capture_backend: Optional[Any] = None):
         self.logger = logging.getLogger(__name__)
         
         # Frame buffer for high-speed capture
         self.frame_buffer = FrameBuffer(frame_buffer_size)
         
+        # Capture source: a CaptureBackend, a backend name, or the shared default
+        if isinstance(capture_backend, str):
+            capture_backend = create_backend(capture_backend)
+        self.capture_backend = capture_backend or get_default_backend()
+        
         # Capture settings
         self.capture_output = capture_output
         self.is_capturing = False
@@ -107,50 +93,49 @@ class EnhancedScreenCapture:
         self.current_region = None
         self.capture_interval = 0.033  # ~30 FPS default
         
+        # Deadline pacing for the capture loop; lowers the rate when capture can't keep up
+        self.frame_pacer = FramePacer(1.0 / self.capture_interval, adaptive=True)
+        
         self.logger.info(f"Enhanced Screen Capture initialized with {capture_output} output")
     
-    def screenshot(self, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+    def screenshot(self, region: Optional[Tuple[int, int, int, int]] = None,
+                   out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """
         Take a single screenshot
         
         Args:
             region: (left, top, right, bottom) for specific region
+            out: Optional preallocated array to write the BGR frame into
             
         Returns:
             Screenshot as numpy array or None if failed
         """
         try:
-            if not PYAUTOGUI_AVAILABLE:
-                self.logger.error("PyAutoGUI not available for screenshot capture")
+            if self.capture_backend is None:
+                self.logger.error("No capture backend available for screenshot capture")
                 return None
             
-            # Capture screenshot
-            if region:
-                # Convert region format: (left, top, right, bottom) -> (left, top, width, height)
-                left, top, right, bottom = region
-                width = right - left
-                height = bottom - top
-                screenshot = pyautogui.screenshot(region=(left, top, width, height))
-            else:
-                screenshot = pyautogui.screenshot()
-            
-            # Convert to numpy array
-            if PIL_AVAILABLE and hasattr(screenshot, 'convert'):
-                screenshot_rgb = screenshot.convert('RGB')
-                frame = np.array(screenshot_rgb)
-            else:
-                frame = np.array(screenshot)
-            
-            # Convert RGB to BGR for OpenCV compatibility
-            if len(frame.shape) == 3 and frame.shape[2] == 3:
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            return frame
+            return self.capture_backend.grab(self._backend_region(region), out=out)
             
         except Exception as e:
             self.logger.error(f"Screenshot capture failed: {e}")
             return None
     
+    def _backend_region(self, region: Optional[Tuple[int, int, int, int]]) -> Optional[Tuple[int, int, int, int]]:
+        """Convert region format: (left, top, right, bottom) -> (left, top, width, height)"""
+        if not region:
+            return None
+        
+        left, top, right, bottom = region
+        return (left, top, right - left, bottom - top)
+    
+    def _capture_into_buffer(self, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+        """Capture a frame straight into the next frame buffer slot"""
+        if self.capture_backend is None:
+            return None
+        
+        return self.capture_backend.grab_into_buffer(self.frame_buffer, self._backend_region(region))
+    
     def screenshot_to_disk(self, filename: Optional[str] = None, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[str]:
         """
         Take screenshot and save to disk
@@ -228,18 +213,18 @@ class EnhancedScreenCapture:
         if duration:
             end_time = time.time() + duration
         
+        pacer = self.frame_pacer
+        pacer.reset()
+        
         while self.is_capturing:
             try:
                 # Check duration limit
                 if end_time and time.time() >= end_time:
                     break
                 
-                # Capture frame
-                frame = self.screenshot(self.current_region)
+                # Capture frame directly into the ring buffer
+                frame = self._capture_into_buffer(self.current_region)
                 if frame is not None:
-                    # Add to frame buffer
-                    self.frame_buffer.add_frame(frame)
-                    
                     # Update stats
                     self.capture_stats['frames_captured'] += 1
                     self.capture_stats['last_capture_time'] = time.time()
@@ -250,7 +235,7 @@ class EnhancedScreenCapture:
                         self.capture_stats['avg_fps'] = self.capture_stats['frames_captured'] / elapsed
                 
                 # Control capture rate
-                time.sleep(self.capture_interval)
+                pacer.wait()
                 
             except Exception as e:
                 self.logger.error(f"Error in capture loop: {e}")
@@ -303,18 +288,18 @@ class EnhancedScreenCapture:
         def screenshot_worker():
             end_time = time.time() + duration
             screenshot_count = 0
+            pacer = FramePacer(1.0 / interval)
             
             while time.time() < end_time:
                 try:
-                    frame = self.screenshot(self.current_region)
+                    frame = self._capture_into_buffer(self.current_region)
                     if frame is not None:
-                        self.frame_buffer.add_frame(frame)
                         screenshot_count += 1
                         
                         if callback:
                             callback(frame, screenshot_count)
                     
-                    time.sleep(interval)
+                    pacer.wait()
                     
                 except Exception as e:
                     self.logger.error(f"Error in screenshot_every: {e}")
@@ -331,6 +316,7 @@ class EnhancedScreenCapture:
     def set_capture_rate(self, fps: float):
         """Set the capture frame rate"""
         self.capture_interval = 1.0 / fps
+        self.frame_pacer.set_target_fps(fps)
         self.logger.info(f"Capture rate set to {fps} FPS")
     
     def get_capture_stats(self) -> Dict[str, Any]:
@@ -338,6 +324,7 @@ class EnhancedScreenCapture:
         stats = self.capture_stats.copy()
         stats['buffer_size'] = self.frame_buffer.get_buffer_size()
         stats['is_capturing'] = self.is_capturing
+        stats['pacing'] = self.frame_pacer.get_stats()
         return stats
     
     def set_region(self, region: Optional[Tuple[int, int, int, int]]):
@@ -358,17 +345,18 @@ class EnhancedScreenCapture:
         Returns:
             Dictionary with recommended settings
         """
-        # Test capture performance
-        test_start = time.time()
+        # Benchmark every available capture backend and switch to the fastest
         test_frames = 10
+        fastest, benchmarks = select_fastest_backend(frames=test_frames,
+                                                     region=self._backend_region(self.current_region))
         
-        for _ in range(test_frames):
-            frame = self.screenshot()
-            if frame is None:
-                break
+        if fastest is not None:
+            self.capture_backend = fastest
+            actual_fps = benchmarks[fastest.name]['fps']
+        else:
+            actual_fps = 0
         
-        test_duration = time.time() - test_start
-        actual_fps = test_frames / test_duration if test_duration > 0 else 0
+        test_duration = test_frames / actual_fps if actual_fps > 0 else 0
         
         # Calculate recommendations
         recommended_fps = min(actual_fps * 0.8, target_fps)  # 80% of max performance
@@ -379,9 +367,12 @@ class EnhancedScreenCapture:
             'recommended_buffer_size': recommended_buffer_size,
             'max_observed_fps': actual_fps,
             'test_duration': test_duration,
-            'performance_rating': 'good' if actual_fps >= target_fps else 'limited'
+            'performance_rating': 'good' if actual_fps >= target_fps else 'limited',
+            'capture_backend': fastest.name if fastest is not None else None,
+            'backend_benchmarks': benchmarks
         }
         
-        self.logger.info(f"Performance test: {actual_fps:.2f} FPS, recommending {recommended_fps:.2f} FPS")
+        self.logger.info(f"Performance test: {recommendations['capture_backend']} at {actual_fps:.2f} FPS, "
+                         f"recommending {recommended_fps:.2f} FPS")
         
         return recommendations
\ No newline at end of file
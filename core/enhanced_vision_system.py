@@ -9,18 +9,26 @@ import logging
 import time
 import threading
 import json
+import hashlib
 from typing import Dict, List, Any, Optional, Tuple, Set
 from pathlib import Path
 from collections import defaultdict, deque
 from dataclasses import dataclass
 import pickle
+import dataclasses
+
+from .change_detector import FrameChangeDetector, FrameChange
+from .color_segmentation import ColorSegmentation, ColorSegmentationEngine
+from .capture_backends import get_default_backend
+from .object_tracker import MultiObjectTracker, Track
+from .region_features import extract_region_features, fill_enclosed, shape_features
+from .zone_map import ZoneMap
+from .path_planner import OccupancyGrid, PathPlanner, PathIndex
+from .screen_state_classifier import ScreenStateClassifier, load_labelled_frames, holdout_benchmark
+from .counter_ocr import CounterReader, DigitFont
+from .detector_scheduler import DetectorScheduler
+from .frame_pacer import FramePacer
 
-try:
-    import pyautogui
-    PYAUTOGUI_AVAILABLE = True
-except Exception:
-    PYAUTOGUI_AVAILABLE = False
-    pyautogui = None
 
 @dataclass
 class GameElement:
@@ -33,6 +41,7 @@ class GameElement:
     shape_features: Dict[str, float]
     timestamp: float
     stable_duration: float = 0.0
+    track_id: Optional[int] = None
 
 @dataclass
 class GameZone:
@@ -59,6 +68,16 @@ class GamePath:
 class EnhancedVisionSystem:
     """Advanced vision system with comprehensive game understanding"""
     
+    # Color ranges for different element types
+    ELEMENT_COLOR_RANGES = {
+        'chests': [(np.array([10, 100, 100]), np.array([30, 255, 255]))],  # Golden
+        'eggs': [(np.array([0, 100, 100]), np.array([10, 255, 255]))],     # Red/Pink
+        'breakables': [(np.array([100, 50, 50]), np.array([130, 255, 255]))], # Blue
+        'npcs': [(np.array([20, 50, 50]), np.array([40, 255, 255]))],      # Green
+        'doors': [(np.array([60, 50, 50]), np.array([80, 255, 255]))],     # Cyan
+        'collectibles': [(np.array([140, 100, 100]), np.array([180, 255, 255]))] # Purple
+    }
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
@@ -66,6 +85,7 @@ class EnhancedVisionSystem:
         self.is_active = False
         self.last_screenshot = None
         self.screenshot_history = deque(maxlen=30)  # Last 30 screenshots for analysis
+        self.capture_backend = get_default_backend()
         
         # Element detection
         self.detected_elements = {}
@@ -73,6 +93,9 @@ class EnhancedVisionSystem:
         self.element_templates = self._load_element_templates()
         self.custom_detectors = []
         
+        # All element color ranges are classified in one pass per frame
+        self.color_engine = ColorSegmentationEngine(self.ELEMENT_COLOR_RANGES)
+        
         # Spatial intelligence
         self.game_zones = {}
         self.learned_paths = {}
@@ -80,6 +103,20 @@ class EnhancedVisionSystem:
         self.obstacle_map = None
         self.navigation_grid = None
         
+        # Path planning: A* over an occupancy grid rebuilt when the zone layout
+        # changes; learned paths are indexed by their start points
+        self.path_planner = PathPlanner()
+        self.path_index = PathIndex()
+        self.path_match_radius = 100
+        self.grid_cell_size = 32
+        self._obstacle_layout = None
+        
+        # Zones are cached per screen layout and re-detected only for new
+        # layouts, or after a zone transition (enter_zone)
+        self.zone_map = ZoneMap()
+        self.learned_zones = self.zone_map.layouts
+        self.current_zone = None
+        
         # Dynamic learning
         self.ui_patterns = {}
         self.minigame_signatures = {}
@@ -95,6 +132,37 @@ class EnhancedVisionSystem:
         self.analysis_thread = None
         self.continuous_analysis = False
         
+        # Change detection: unchanged frames are skipped, dirty regions re-analyzed
+        self.change_detector = FrameChangeDetector()
+        self.last_analysis = None
+        
+        # Elements persist across frames as tracks: full detection runs every
+        # detection_interval analyses, dirty regions are re-detected in between.
+        # Detection is sparse, so tracks are reported from their first hit.
+        self.element_tracker = MultiObjectTracker(min_hits=1)
+        self.detection_interval = 5
+        self._analyses_since_detection = None
+        
+        # Screen state (overworld, hatch animation, shop UI, ...) is classified
+        # on every analysed frame; element detection only runs in states where
+        # elements are on screen. Untrained, every frame is 'unknown'.
+        self.screen_classifier_path = Path("data/enhanced_vision/screen_states.npz")
+        self.screen_classifier = self._load_screen_classifier()
+        self.screen_state = {'state': 'unknown', 'confidence': 0.0}
+        self.detection_states = {'overworld', 'minigame', 'unknown'}
+        self._classified_frame = None
+        
+        # On-screen counters (coins, diamonds, eggs) read from fixed regions;
+        # unchanged counters are served from the reader's pixel-hash cache
+        self.counter_regions_path = Path("data/enhanced_vision/counter_regions.json")
+        self.counter_glyphs_path = Path("data/enhanced_vision/counter_glyphs")
+        self.counter_reader = self._load_counter_reader()
+        
+        # Element, zone, UI, event and navigation analysis run concurrently
+        # within a per-analysis budget; lower priorities are deferred first
+        self.analysis_scheduler = DetectorScheduler(budget_ms=200.0)
+        self._register_analysis_detectors()
+        
         self.logger.info("Enhanced Vision System initialized with advanced capabilities")
     
     def start_enhanced_vision(self):
@@ -124,14 +192,18 @@ class EnhancedVisionSystem:
     
     def _continuous_analysis_loop(self):
         """Continuous analysis loop for real-time learning"""
+        pacer = FramePacer(2)  # Analyze twice per second
+        
         while self.continuous_analysis:
             try:
                 # Capture and analyze screen
                 screenshot = self._capture_enhanced_screenshot()
                 if screenshot is not None:
-                    self._comprehensive_analysis(screenshot)
+                    change = self.change_detector.update(screenshot)
+                    if change.changed:
+                        self._comprehensive_analysis(screenshot, change)
                 
-                time.sleep(0.5)  # Analyze every 500ms
+                pacer.wait()
                 
             except Exception as e:
                 self.logger.error(f"Continuous analysis error: {e}")
@@ -140,7 +212,7 @@ class EnhancedVisionSystem:
     def _capture_enhanced_screenshot(self) -> Optional[np.ndarray]:
         """Enhanced screenshot capture with metadata"""
         try:
-            if not PYAUTOGUI_AVAILABLE:
+            if self.capture_backend is None:
                 # Return dummy screenshot for demo
                 dummy = np.zeros((600, 800, 3), dtype=np.uint8)
                 # Add some random elements for demo
@@ -149,8 +221,9 @@ class EnhancedVisionSystem:
                 cv2.rectangle(dummy, (500, 300), (600, 400), (255, 0, 0), 2)  # Blue boundary
                 return dummy
             
-            screenshot = pyautogui.screenshot()
-            screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+            screenshot_cv = self.capture_backend.grab()
+            if screenshot_cv is None:
+                return None
             
             # Add timestamp and store in history
             screenshot_data = {
@@ -168,7 +241,7 @@ class EnhancedVisionSystem:
             self.logger.error(f"Enhanced screenshot capture failed: {e}")
             return None
     
-    def _comprehensive_analysis(self, screenshot: np.ndarray):
+    def _comprehensive_analysis(self, screenshot: np.ndarray, change: Optional[FrameChange] = None):
         """Comprehensive analysis of game screen"""
         try:
             analysis_results = {
@@ -177,26 +250,33 @@ class EnhancedVisionSystem:
                 'zones': {},
                 'ui_changes': {},
                 'events': [],
-                'navigation_info': {}
+                'navigation_info': {},
+                'dirty_regions': change.dirty_regions if change is not None else []
             }
             
-            # Multi-level element detection
-            analysis_results['elements'] = self._detect_all_elements(screenshot)
+            analysis_results['screen_state'] = self._classify_screen(screenshot)
             
-            # Zone and boundary detection
-            analysis_results['zones'] = self._detect_game_zones(screenshot)
+            # Detection on the tracking cadence; zones only change with the screen layout
+            detections = self.analysis_scheduler.run(screenshot, context={'change': change})
             
-            # UI pattern analysis
-            analysis_results['ui_changes'] = self._analyze_ui_patterns(screenshot)
+            elements = detections.value('elements')
+            if elements is not None:
+                analysis_results['elements'], analysis_results['detection_pass'] = elements
+            else:
+                analysis_results['elements'], analysis_results['detection_pass'] = self.get_tracked_elements(), 'pending'
+            analysis_results['partial_update'] = analysis_results['detection_pass'] != 'full'
             
-            # Event detection
-            analysis_results['events'] = self._detect_game_events(screenshot)
+            analysis_results['zones'] = detections.value('zones', self.zone_map.zones)
             
-            # Navigation analysis
-            analysis_results['navigation_info'] = self._analyze_navigation_context(screenshot)
+            # UI, event and navigation results of a deferred detector are carried over
+            analysis_results['ui_changes'] = detections.value('ui', {}, allow_stale=True)
+            analysis_results['events'] = detections.value('events', [], allow_stale=True)
+            analysis_results['navigation_info'] = detections.value('navigation', {}, allow_stale=True)
+            analysis_results['detector_status'] = {name: result.status for name, result in detections.items()}
             
             # Store analysis for learning
             self.context_memory.append(analysis_results)
+            self.last_analysis = analysis_results
             
             # Update learned knowledge
             self._update_learned_knowledge(analysis_results)
@@ -204,6 +284,91 @@ class EnhancedVisionSystem:
         except Exception as e:
             self.logger.error(f"Comprehensive analysis failed: {e}")
     
+    def _register_analysis_detectors(self):
+        """Register the per-frame analysis stages with the analysis scheduler"""
+        scheduler = self.analysis_scheduler
+        
+        scheduler.register('elements', lambda frame, inputs: self._track_elements(frame, inputs['change']),
+                           priority=3, required=True)
+        scheduler.register('zones', lambda frame, inputs: self.zone_map.update(
+            frame, inputs['change'], self._detect_game_zones), priority=2)
+        scheduler.register('ui', lambda frame, inputs: self._analyze_ui_patterns(frame), priority=1)
+        scheduler.register('events', lambda frame, inputs: self._detect_game_events(frame), priority=1)
+        scheduler.register('navigation', lambda frame, inputs: self._analyze_navigation_context(frame), priority=1)
+    
+    def _track_elements(self, screenshot: np.ndarray,
+                        change: Optional[FrameChange] = None) -> Tuple[Dict[str, List[GameElement]], str]:
+        """
+        Advance the element tracks by one analysed frame
+        
+        Runs full detection when due (or when the change is unknown or covers
+        most of the screen), detection on dirty regions when only part of the
+        screen changed, and otherwise just holds the tracks. Returns the
+        tracked elements and the pass type ('full', 'partial' or 'held').
+        """
+        timestamp = time.time()
+        
+        # No element search in states without game elements (hatch animation,
+        # shop, disconnect); the first frame back gets a full detection
+        if self.screen_state['state'] not in self.detection_states:
+            self.element_tracker.update({}, timestamp, regions=[])
+            self._analyses_since_detection = None
+            return self.get_tracked_elements(), 'gated'
+        
+        due = self._analyses_since_detection is None or self._analyses_since_detection + 1 >= self.detection_interval
+        
+        if change is None or change.full_refresh or due:
+            self.element_tracker.update(self._detect_all_elements(screenshot), timestamp)
+            self._analyses_since_detection = 0
+            detection_pass = 'full'
+        elif change.changed:
+            self.element_tracker.update(self._detect_elements_in_regions(screenshot, change.dirty_regions),
+                                        timestamp, regions=change.dirty_regions)
+            self._analyses_since_detection += 1
+            detection_pass = 'partial'
+        else:
+            self.element_tracker.update({}, timestamp, regions=[])
+            self._analyses_since_detection += 1
+            detection_pass = 'held'
+        
+        return self.get_tracked_elements(), detection_pass
+    
+    def get_tracked_elements(self) -> Dict[str, List[GameElement]]:
+        """Current element tracks as GameElements at their tracked positions"""
+        now = time.time()
+        elements = defaultdict(list)
+        
+        for track in self.element_tracker.get_tracks():
+            elements[track.label].append(self._track_to_element(track, now))
+        
+        return dict(elements)
+    
+    def _track_to_element(self, track: Track, now: float) -> GameElement:
+        x, y, w, h = track.bbox
+        
+        return dataclasses.replace(
+            track.detection,
+            position=track.center,
+            size=(w, h),
+            stable_duration=track.age(now),
+            track_id=track.track_id
+        )
+    
+    def _detect_elements_in_regions(self, screenshot: np.ndarray,
+                                    regions: List[Tuple[int, int, int, int]]) -> Dict[str, List[GameElement]]:
+        """Run element detection on dirty regions, in full-screen coordinates"""
+        elements = {}
+        
+        for x, y, w, h in regions:
+            region_elements = self._detect_all_elements(screenshot[y:y+h, x:x+w])
+            
+            for element_type, found in region_elements.items():
+                for element in found:
+                    element.position = (element.position[0] + x, element.position[1] + y)
+                elements.setdefault(element_type, []).extend(found)
+        
+        return elements
+    
     def _detect_all_elements(self, screenshot: np.ndarray) -> Dict[str, List[GameElement]]:
         """Advanced multi-element detection"""
         detected = defaultdict(list)
@@ -244,10 +409,13 @@ class EnhancedVisionSystem:
         """Detect standard game elements (chests, eggs, breakables)"""
         elements = defaultdict(list)
         
+        # One HSV conversion and range pass shared by every element type
+        segmentation = self.color_engine.segment(screenshot)
+        
         # Enhanced detection using multiple methods
         for element_type in ['chests', 'eggs', 'breakables', 'npcs', 'doors', 'collectibles']:
             # Color-based detection
-            color_elements = self._color_based_detection(screenshot, element_type)
+            color_elements = self._color_based_detection(screenshot, element_type, segmentation)
             
             # Shape-based detection
             shape_elements = self._shape_based_detection(screenshot, element_type)
@@ -268,38 +436,51 @@ class EnhancedVisionSystem:
         unknown_elements = []
         
         try:
-            # Use edge detection and contour analysis
+            # Use edge detection; the regions enclosed by edges (the filled
+            # external contours) are labelled and measured in one batch
             gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
             edges = cv2.Canny(gray, 50, 150)
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if 100 < area < 5000:  # Reasonable size range
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
-                    # Extract features
-                    roi = screenshot[y:y+h, x:x+w]
-                    features = self._extract_element_features(roi)
-                    
-                    # Check if this is a known element type
-                    if not self._is_known_element_type(features):
-                        element = GameElement(
-                            element_type='unknown',
-                            position=(x + w//2, y + h//2),
-                            confidence=0.6,
-                            size=(w, h),
-                            color_signature=self._get_color_signature(roi),
-                            shape_features=features,
-                            timestamp=time.time()
-                        )
-                        unknown_elements.append(element)
+            # Reasonable size range: 100 < area < 5000
+            regions, _ = extract_region_features(fill_enclosed(edges), screenshot, min_area=101, max_area=4999)
+            
+            for region in regions:
+                x, y, w, h = int(region['x']), int(region['y']), int(region['width']), int(region['height'])
+                features = shape_features(region)
+                
+                # Check if this is a known element type
+                if not self._is_known_element_type(features):
+                    element = GameElement(
+                        element_type='unknown',
+                        position=(x + w//2, y + h//2),
+                        confidence=0.6,
+                        size=(w, h),
+                        color_signature=region['mean_color'].astype(int).tolist(),
+                        shape_features=features,
+                        timestamp=time.time()
+                    )
+                    unknown_elements.append(element)
             
         except Exception as e:
             self.logger.error(f"Unknown element discovery failed: {e}")
         
         return unknown_elements
     
+    def enter_zone(self, zone_name: str):
+        """
+        Record a zone transition (teleport, world change)
+        
+        A new zone can look like the last one at layout-signature
+        resolution, so the current layout is dropped and re-detected on the
+        next analysed frame instead of being served until it ages out.
+        """
+        if zone_name == self.current_zone:
+            return
+        
+        self.logger.info(f"Zone transition: {self.current_zone} -> {zone_name}")
+        self.current_zone = zone_name
+        self.zone_map.invalidate()
+    
     def _detect_game_zones(self, screenshot: np.ndarray) -> Dict[str, GameZone]:
         """Detect different zones and areas in the game"""
         zones = {}
@@ -407,7 +588,9 @@ class EnhancedVisionSystem:
                    execution_time: float, success: bool) -> str:
         """Learn a new path or update existing path knowledge"""
         try:
-            path_id = f"{path_type}_{hash(str(waypoints))}"
+            # Stable across runs, unlike hash() of the string
+            digest = hashlib.blake2b(str([tuple(map(int, point)) for point in waypoints]).encode(), digest_size=8)
+            path_id = f"{path_type}_{digest.hexdigest()}"
             
             if path_id in self.learned_paths:
                 # Update existing path
@@ -432,6 +615,7 @@ class EnhancedVisionSystem:
                     average_time=execution_time,
                     obstacles=self._detect_path_obstacles(waypoints)
                 )
+                self.path_index.add(path_id, waypoints[0], waypoints[-1], path_type)
             
             # Mark as preferred if highly successful
             if self.learned_paths[path_id].success_rate > 0.9:
@@ -448,28 +632,24 @@ class EnhancedVisionSystem:
                         path_type: str = 'navigation') -> Optional[List[Tuple[int, int]]]:
         """Get optimal path between two points based on learned knowledge"""
         try:
-            # Look for existing learned paths
-            suitable_paths = [
-                path for path in self.learned_paths.values()
-                if path.path_type == path_type and path.success_rate > 0.7
-            ]
-            
-            if suitable_paths:
-                # Find path with start/end points closest to desired points
-                best_path = None
-                best_score = float('inf')
+            # Learned paths starting and ending near the requested points
+            nearby = self.path_index.nearby(start, self.path_match_radius, end, path_type)
+            
+            best_path = None
+            best_score = float('inf')
+            
+            for path_id, distance in nearby:
+                path = self.learned_paths[path_id]
                 
-                for path in suitable_paths:
-                    start_dist = self._distance(start, path.waypoints[0])
-                    end_dist = self._distance(end, path.waypoints[-1])
-                    score = start_dist + end_dist - (path.success_rate * 100)
+                if path.success_rate > 0.7:
+                    score = distance - (path.success_rate * 100)
                     
                     if score < best_score:
                         best_score = score
                         best_path = path
-                
-                if best_path:
-                    return best_path.waypoints
+            
+            if best_path:
+                return best_path.waypoints
             
             # Generate new path using A* with learned obstacles
             return self._generate_path_with_obstacles(start, end)
@@ -496,6 +676,19 @@ class EnhancedVisionSystem:
                 'time_limit': None
             }
             
+            # The screen state classifier rules out most frames without the
+            # full-screenshot checks below
+            screen_state = self._classify_screen(screenshot)
+            minigame_info['screen_state'] = screen_state['state']
+            
+            if screen_state['state'] not in ('minigame', 'unknown'):
+                return minigame_info
+            
+            if screen_state['state'] == 'minigame':
+                minigame_info['detected'] = True
+                minigame_info['type'] = 'minigame'
+                minigame_info['confidence'] = screen_state['confidence']
+            
             # Analyze UI patterns for minigame indicators
             ui_analysis = self._analyze_ui_patterns(screenshot)
             
@@ -528,6 +721,84 @@ class EnhancedVisionSystem:
             self.logger.error(f"Minigame detection failed: {e}")
             return {'detected': False, 'type': 'error', 'error': str(e)}
     
+    def _classify_screen(self, screenshot: np.ndarray) -> Dict[str, Any]:
+        """Screen state of a frame, classified once per frame"""
+        if screenshot is not self._classified_frame:
+            if self.screen_classifier.is_trained:
+                self.screen_state = self.screen_classifier.classify(screenshot)
+            self._classified_frame = screenshot
+        
+        return self.screen_state
+    
+    def _load_screen_classifier(self) -> ScreenStateClassifier:
+        try:
+            if self.screen_classifier_path.exists():
+                return ScreenStateClassifier.load(self.screen_classifier_path)
+        except Exception as e:
+            self.logger.error(f"Failed to load screen state classifier: {e}")
+        
+        return ScreenStateClassifier()
+    
+    def train_screen_classifier(self, recordings_dir: str, frame_step: int = 5,
+                                test_fraction: float = 0.2) -> Dict[str, Any]:
+        """
+        Train the screen state classifier from recorded sessions
+        
+        recordings_dir holds one directory per state (overworld,
+        hatch_animation, shop_ui, minigame, disconnect) with image
+        directories or videos of recorded sessions. Whole sessions are held
+        out for the reported benchmark; the saved model is then refitted on
+        every frame.
+        """
+        try:
+            frames, labels, sessions = load_labelled_frames(recordings_dir, frame_step)
+            
+            if not frames:
+                return {'error': f'No labelled frames found in {recordings_dir}'}
+            
+            _, results = holdout_benchmark(frames, labels, sessions, test_fraction)
+            
+            self.screen_classifier = ScreenStateClassifier().fit(frames, labels)
+            self._classified_frame = None
+            
+            self.screen_classifier_path.parent.mkdir(parents=True, exist_ok=True)
+            self.screen_classifier.save(self.screen_classifier_path)
+            
+            self.logger.info(f"Screen state classifier held-out accuracy: {results['accuracy']:.3f}")
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Screen state classifier training failed: {e}")
+            return {'error': str(e)}
+    
+    def _load_counter_reader(self) -> CounterReader:
+        try:
+            font = DigitFont.from_directory(self.counter_glyphs_path) if self.counter_glyphs_path.exists() else None
+            reader = CounterReader(font if font else None)
+            
+            if self.counter_regions_path.exists():
+                reader.load_regions(self.counter_regions_path)
+            
+            return reader
+            
+        except Exception as e:
+            self.logger.error(f"Failed to load counter OCR setup: {e}")
+            return CounterReader()
+    
+    def read_counters(self, screenshot: Optional[np.ndarray] = None, fresh: bool = False) -> Dict[str, float]:
+        """Values of the registered counters on a screenshot (a new capture with fresh, else the last one)"""
+        if screenshot is None:
+            screenshot = self._capture_enhanced_screenshot() if fresh else self.last_screenshot
+        
+        if screenshot is None or not self.counter_reader.regions:
+            return {}
+        
+        try:
+            return self.counter_reader.values(screenshot)
+        except Exception as e:
+            self.logger.error(f"Counter reading failed: {e}")
+            return {}
+    
     def analyze_game_state(self) -> Dict[str, Any]:
         """Comprehensive game state analysis"""
         if not self.last_screenshot is not None:
@@ -542,14 +813,26 @@ class EnhancedVisionSystem:
                 'navigation_context': {},
                 'minigame_status': {},
                 'ui_state': {},
+                'resources': {},
                 'recommended_actions': []
             }
             
-            # Comprehensive element detection
-            game_state['detected_elements'] = self._detect_all_elements(self.last_screenshot)
+            # Tracked elements and zones; the continuous analysis loop keeps the
+            # tracker and zone map current, otherwise this call advances them
+            # with the last screenshot
+            if not (self.continuous_analysis and self.last_analysis is not None):
+                change = self.change_detector.update(self.last_screenshot)
+                self._classify_screen(self.last_screenshot)
+                self._track_elements(self.last_screenshot, change)
+                self.zone_map.update(self.last_screenshot, change, self._detect_game_zones)
+            
+            game_state['screen_state'] = self.screen_state
+            game_state['current_zone'] = self.current_zone
+            game_state['detected_elements'] = self.get_tracked_elements()
+            game_state['tracks'] = self.element_tracker.tracks_by_label()
             
-            # Zone analysis
-            game_state['active_zones'] = self._detect_game_zones(self.last_screenshot)
+            # Zone analysis (cached per screen layout)
+            game_state['active_zones'] = self.zone_map.zones
             
             # Navigation context
             game_state['navigation_context'] = self._analyze_navigation_context(self.last_screenshot)
@@ -560,6 +843,9 @@ class EnhancedVisionSystem:
             # UI state analysis
             game_state['ui_state'] = self._analyze_ui_patterns(self.last_screenshot)
             
+            # Currency and counter values
+            game_state['resources'] = self.read_counters(self.last_screenshot)
+            
             # Generate action recommendations
             game_state['recommended_actions'] = self._generate_action_recommendations(game_state)
             
@@ -570,44 +856,33 @@ class EnhancedVisionSystem:
             return {'error': str(e)}
     
     # Helper methods for various detection algorithms
-    def _color_based_detection(self, screenshot: np.ndarray, element_type: str) -> List[GameElement]:
+    def _color_based_detection(self, screenshot: np.ndarray, element_type: str,
+                               segmentation: Optional[ColorSegmentation] = None) -> List[GameElement]:
         """Color-based element detection"""
         elements = []
         
-        # Define color ranges for different element types
-        color_ranges = {
-            'chests': [(np.array([10, 100, 100]), np.array([30, 255, 255]))],  # Golden
-            'eggs': [(np.array([0, 100, 100]), np.array([10, 255, 255]))],     # Red/Pink
-            'breakables': [(np.array([100, 50, 50]), np.array([130, 255, 255]))], # Blue
-            'npcs': [(np.array([20, 50, 50]), np.array([40, 255, 255]))],      # Green
-            'doors': [(np.array([60, 50, 50]), np.array([80, 255, 255]))],     # Cyan
-            'collectibles': [(np.array([140, 100, 100]), np.array([180, 255, 255]))] # Purple
-        }
-        
-        if element_type not in color_ranges:
+        if element_type not in self.color_engine.names:
             return elements
         
-        hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
+        if segmentation is None:
+            segmentation = self.color_engine.segment(screenshot)
         
-        for lower, upper in color_ranges[element_type]:
-            mask = cv2.inRange(hsv, lower, upper)
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if 50 < area < 2000:  # Size filter
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
-                    element = GameElement(
-                        element_type=element_type,
-                        position=(x + w//2, y + h//2),
-                        confidence=0.7,
-                        size=(w, h),
-                        color_signature=self._get_color_signature(screenshot[y:y+h, x:x+w]),
-                        shape_features=self._extract_element_features(screenshot[y:y+h, x:x+w]),
-                        timestamp=time.time()
-                    )
-                    elements.append(element)
+        # Size filter: 50 < area < 2000; features of all components are computed in one batch
+        components = segmentation.component_features([element_type], screenshot, min_area=51, max_area=1999)
+        
+        for component in components[element_type]:
+            x, y, w, h = int(component['x']), int(component['y']), int(component['width']), int(component['height'])
+            
+            element = GameElement(
+                element_type=element_type,
+                position=(x + w // 2, y + h // 2),
+                confidence=0.7,
+                size=(w, h),
+                color_signature=component['mean_color'].astype(int).tolist(),
+                shape_features=shape_features(component),
+                timestamp=time.time()
+            )
+            elements.append(element)
         
         return elements
     
@@ -694,46 +969,6 @@ class EnhancedVisionSystem:
                 valid_elements.append(element)
         return valid_elements
     
-    def _extract_element_features(self, roi: np.ndarray) -> Dict[str, float]:
-        """Extract shape and texture features from element ROI"""
-        try:
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            
-            # Basic shape features
-            contours, _ = cv2.findContours(gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                largest_contour = max(contours, key=cv2.contourArea)
-                area = cv2.contourArea(largest_contour)
-                perimeter = cv2.arcLength(largest_contour, True)
-                circularity = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0
-                
-                # Bounding rectangle
-                x, y, w, h = cv2.boundingRect(largest_contour)
-                aspect_ratio = w / h if h > 0 else 1
-                
-                return {
-                    'area': area,
-                    'perimeter': perimeter,
-                    'circularity': circularity,
-                    'aspect_ratio': aspect_ratio,
-                    'compactness': area / (w * h) if w * h > 0 else 0
-                }
-        except:
-            pass
-        
-        return {'area': 0, 'perimeter': 0, 'circularity': 0, 'aspect_ratio': 1, 'compactness': 0}
-    
-    def _get_color_signature(self, roi: np.ndarray) -> List[int]:
-        """Get color signature of ROI"""
-        try:
-            # Get dominant colors
-            roi_resized = cv2.resize(roi, (50, 50))
-            colors = roi_resized.reshape(-1, 3)
-            dominant_color = np.mean(colors, axis=0).astype(int)
-            return dominant_color.tolist()
-        except:
-            return [0, 0, 0]
-    
     def _is_known_element_type(self, features: Dict[str, float]) -> bool:
         """Check if element features match known element types"""
         # Compare with learned element patterns
@@ -808,10 +1043,29 @@ class EnhancedVisionSystem:
         """Calculate distance between two points"""
         return np.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
     
-    def _generate_path_with_obstacles(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
+    def _generate_path_with_obstacles(self, start: Tuple[int, int], end: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
         """Generate path avoiding known obstacles"""
-        # Simple straight line for placeholder
-        return [start, end]
+        self._update_obstacle_map()
+        return self.path_planner.plan(start, end)
+    
+    def _update_obstacle_map(self):
+        """Rebuild the planner's occupancy grid when the zone layout has changed"""
+        layout = self.zone_map.current
+        
+        if layout is None or self.last_screenshot is None:
+            return
+        
+        key = (layout.layout_hash, layout.detected_at, self.last_screenshot.shape[:2])
+        
+        if key == self._obstacle_layout:
+            return
+        
+        grid = OccupancyGrid.from_zones(layout.zones, self.last_screenshot.shape[:2], self.grid_cell_size)
+        self.path_planner.set_grid(grid)
+        
+        self.obstacle_map = grid.blocked
+        self.navigation_grid = grid
+        self._obstacle_layout = key
     
     def _has_timer_ui(self, screenshot: np.ndarray) -> bool:
         """Check for timer UI elements"""
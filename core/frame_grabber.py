@@ -2,8 +2,6 @@ import numpy as np
 
 import mss
 
-from redis import StrictRedis
-
 from serpent.config import config
 
 import time
@@ -13,8 +11,15 @@ from serpent.game_frame_buffer import GameFrameBuffer
 
 from serpent.frame_transformation_pipeline import FrameTransformationPipeline
 
+from .shared_frame_bus import SharedFrameBus, SharedFrameBusError, shared_memory_name
+from .frame_pacer import FramePacer
+
+
+FRAME_BUS_NAME = shared_memory_name(config["frame_grabber"]["redis_key"])
+PIPELINE_FRAME_BUS_NAME = FRAME_BUS_NAME + "_PIPELINE"
 
-redis_client = StrictRedis(**config["redis"])
+# Consumer-side bus mappings, attached on first use in each process
+frame_buses = dict()
 
 
 class FrameGrabber:
@@ -27,9 +32,9 @@ class FrameGrabber:
         self.y_offset = y_offset
 
         self.frame_time = 1 / fps
+        self.frame_pacer = FramePacer(fps)
         self.frame_buffer_size = buffer_seconds * fps
 
-        self.redis_client = redis_client
         self.screen_grabber = mss.mss()
 
         self.frame_transformation_pipeline = None
@@ -37,108 +42,135 @@ class FrameGrabber:
         if pipeline_string is not None and isinstance(pipeline_string, str):
             self.frame_transformation_pipeline = FrameTransformationPipeline(pipeline_string=pipeline_string)
 
-        # Clear any previously stored frames
-        self.redis_client.delete(config["frame_grabber"]["redis_key"])
-        self.redis_client.delete(config["frame_grabber"]["redis_key"] + "_PIPELINE")
+        # (Re)create the shared memory buses, dropping any previously stored frames
+        frame_shape = (self.height, self.width, 3)
 
-    def start(self):
-        while True:
-            cycle_start = time.time()
+        self.frame_bus = SharedFrameBus.create(FRAME_BUS_NAME, self.frame_buffer_size + 1, frame_shape=frame_shape)
+        self.frame_pipeline_bus = self._create_pipeline_bus(frame_shape)
 
-            frame = self.grab_frame()
+    def _create_pipeline_bus(self, frame_shape):
+        if self.frame_transformation_pipeline is None:
+            return SharedFrameBus.create(PIPELINE_FRAME_BUS_NAME, self.frame_buffer_size + 1, frame_shape=frame_shape)
 
-            if self.frame_transformation_pipeline is not None:
-                frame_pipeline = self.frame_transformation_pipeline.transform(frame)
-            else:
-                frame_pipeline = frame
+        if self._has_png_transformation_pipeline():
+            # PNG output size varies per frame; the raw frame size plus zlib/row overhead is an upper bound
+            slot_nbytes = int(np.prod(frame_shape)) + frame_shape[0] + 65536
 
-            frame_shape = str(frame.shape).replace("(", "").replace(")", "")
-            frame_dtype = str(frame.dtype)
+            return SharedFrameBus.create(PIPELINE_FRAME_BUS_NAME, self.frame_buffer_size + 1, slot_nbytes=slot_nbytes)
 
-            frame_bytes = f"{cycle_start}~{frame_shape}~{frame_dtype}~".encode("utf-8") + frame.tobytes()
+        # Probe the pipeline once to learn its output shape and dtype
+        probe = np.asarray(self.frame_transformation_pipeline.transform(np.zeros(frame_shape, dtype="uint8")))
 
-            self.redis_client.lpush(config["frame_grabber"]["redis_key"], frame_bytes)
-            self.redis_client.ltrim(config["frame_grabber"]["redis_key"], 0, self.frame_buffer_size)
-
-            if self._has_png_transformation_pipeline():
-                frame_pipeline_shape = "PNG"
-                frame_pipeline_dtype = "PNG"
-
-                frame_pipeline_bytes = f"{cycle_start}~{frame_pipeline_shape}~{frame_pipeline_dtype}~".encode("utf-8") + frame_pipeline
-            else:
-                frame_pipeline_shape = str(frame_pipeline.shape).replace("(", "").replace(")", "")
-                frame_pipeline_dtype = str(frame_pipeline.dtype)
+        return SharedFrameBus.create(
+            PIPELINE_FRAME_BUS_NAME,
+            self.frame_buffer_size + 1,
+            frame_shape=probe.shape,
+            dtype=probe.dtype
+        )
 
-                frame_pipeline_bytes = f"{cycle_start}~{frame_pipeline_shape}~{frame_pipeline_dtype}~".encode("utf-8") + frame_pipeline.tobytes()
+    def start(self):
+        try:
+            while True:
+                cycle_start = time.time()
 
-            self.redis_client.lpush(config["frame_grabber"]["redis_key"] + "_PIPELINE", frame_pipeline_bytes)
-            self.redis_client.ltrim(config["frame_grabber"]["redis_key"] + "_PIPELINE", 0, self.frame_buffer_size)
+                # Write the capture straight into the next shared memory slot
+                frame = self.frame_bus.acquire_slot()
+                self.grab_frame(out=frame)
+                self.frame_bus.commit(cycle_start)
 
-            cycle_end = time.time()
+                if self.frame_transformation_pipeline is not None:
+                    frame_pipeline = self.frame_transformation_pipeline.transform(frame)
+                else:
+                    frame_pipeline = frame
 
-            cycle_duration = (cycle_end - cycle_start)
-            cycle_duration -= int(cycle_duration)
+                self.frame_pipeline_bus.write(frame_pipeline, cycle_start)
 
-            frame_time_left = self.frame_time - cycle_duration
+                self.frame_pacer.wait()
+        finally:
+            self.stop()
 
-            if frame_time_left > 0:
-                time.sleep(frame_time_left)
+    def stop(self):
+        self.frame_bus.close()
+        self.frame_pipeline_bus.close()
 
-    def grab_frame(self):
-        frame = np.array(
+    def grab_frame(self, out=None):
+        screenshot = np.asarray(
             self.screen_grabber.grab({
                 "top": self.y_offset,
                 "left": self.x_offset,
                 "width": self.width,
                 "height": self.height
-            }),
-            dtype="uint8"
+            })
         )
 
-        frame = frame[..., [2, 1, 0, 3]]
+        # BGRA -> RGB in a single pass, straight into `out` when given
+        frame = screenshot[..., 2::-1]
+
+        if out is None:
+            return np.ascontiguousarray(frame)
 
-        return frame[..., :3]
+        np.copyto(out, frame)
+
+        return out
 
     def _has_png_transformation_pipeline(self):
         return self.frame_transformation_pipeline and self.frame_transformation_pipeline.pipeline_string and self.frame_transformation_pipeline.pipeline_string.endswith("|PNG")
 
     @classmethod
-    def get_frames(cls, frame_buffer_indices, frame_type="FULL", **kwargs):
+    def _attach_frame_bus(cls, name):
+        frame_bus = frame_buses.get(name)
+
+        if frame_bus is not None:
+            return frame_bus
+
         while True:
-            if redis_client.llen(config["frame_grabber"]["redis_key"]) > 149:
+            try:
+                frame_bus = SharedFrameBus.attach(name)
                 break
-            
-            time.sleep(0.1)
+            except (FileNotFoundError, SharedFrameBusError):
+                time.sleep(0.1)
 
-        game_frame_buffer = GameFrameBuffer(size=len(frame_buffer_indices))
+        frame_buses[name] = frame_bus
 
-        for i in frame_buffer_indices:
-            redis_key = config["frame_grabber"]["redis_key"]
-            redis_key = redis_key + "_PIPELINE" if frame_type == "PIPELINE" else redis_key
+        return frame_bus
 
-            frame_data = redis_client.lindex(redis_key, i)
+    @classmethod
+    def _read_game_frame(cls, frame_bus, index):
+        # GameFrames outlive the slot (the producer laps the ring), so they
+        # get a copy; the copy is taken inside the seqlock check and is
+        # only returned if the slot was not rewritten during it
+        frame_data = frame_bus.read(index, copy=True)
+
+        while frame_data is None:
+            # The producer lapped this slot mid-read; try again
+            time.sleep(0.001)
+            frame_data = frame_bus.read(index, copy=True)
 
-            timestamp, shape, dtype, frame_bytes = frame_data.split("~".encode("utf-8"), maxsplit=3)
+        frame_array, timestamp, _ = frame_data
 
-            if dtype == "PNG".encode("utf-8"):
-                frame_array = frame_bytes
-            else:
-                frame_shape = [int(i) for i in shape.decode("utf-8").split(", ")]
-                frame_array = np.fromstring(frame_bytes, dtype=dtype.decode("utf-8")).reshape(frame_shape)
+        return GameFrame(frame_array, timestamp=timestamp)
+
+    @classmethod
+    def get_frames(cls, frame_buffer_indices, frame_type="FULL", **kwargs):
+        frame_bus = cls._attach_frame_bus(PIPELINE_FRAME_BUS_NAME if frame_type == "PIPELINE" else FRAME_BUS_NAME)
+        frame_bus.wait_for_frames(max(frame_buffer_indices) + 1)
 
-            game_frame = GameFrame(frame_array, timestamp=float(timestamp))
+        game_frame_buffer = GameFrameBuffer(size=len(frame_buffer_indices))
 
-            game_frame_buffer.add_game_frame(game_frame)
+        for i in frame_buffer_indices:
+            game_frame_buffer.add_game_frame(cls._read_game_frame(frame_bus, i))
 
         return game_frame_buffer
 
     @classmethod
     def get_frames_with_pipeline(cls, frame_buffer_indices, **kwargs):
-        while True:
-            if redis_client.llen(config["frame_grabber"]["redis_key"]) > 149:
-                break
+        frame_bus_list = [
+            cls._attach_frame_bus(FRAME_BUS_NAME),
+            cls._attach_frame_bus(PIPELINE_FRAME_BUS_NAME)
+        ]
 
-            time.sleep(0.1)
+        for frame_bus in frame_bus_list:
+            frame_bus.wait_for_frames(max(frame_buffer_indices) + 1)
 
         game_frame_buffers = [
             GameFrameBuffer(size=len(frame_buffer_indices)),
@@ -146,21 +178,7 @@ class FrameGrabber:
         ]
 
         for i in frame_buffer_indices:
-            redis_keys = [config["frame_grabber"]["redis_key"], config["frame_grabber"]["redis_key"] + "_PIPELINE"]
-
-            for index, redis_key in enumerate(redis_keys):
-                frame_data = redis_client.lindex(redis_key, i)
-
-                timestamp, shape, dtype, frame_bytes = frame_data.split("~".encode("utf-8"), maxsplit=3)
-
-                if dtype == "PNG".encode("utf-8"):
-                    frame_array = frame_bytes
-                else:
-                    frame_shape = [int(i) for i in shape.decode("utf-8").split(", ")]
-                    frame_array = np.fromstring(frame_bytes, dtype=dtype.decode("utf-8")).reshape(frame_shape)
-
-                game_frame = GameFrame(frame_array, timestamp=float(timestamp))
-
-                game_frame_buffers[index].add_game_frame(game_frame)
+            for index, frame_bus in enumerate(frame_bus_list):
+                game_frame_buffers[index].add_game_frame(cls._read_game_frame(frame_bus, i))
 
         return game_frame_buffers
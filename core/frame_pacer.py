@@ -0,0 +1,168 @@
+"""
+Frame Pacing Scheduler
+Absolute-deadline pacing for capture and decision loops on time.perf_counter,
+with drift and dropped-frame reporting and optional adaptation of the target
+rate to the measured per-frame processing time
+"""
+
+import time
+import logging
+from typing import Optional, Dict, Any
+
+
+class FramePacer:
+    """
+    Deadline-driven loop pacer
+
+    Frames are scheduled on a fixed grid of absolute deadlines
+    (start + n * period) instead of sleeping a fixed interval after the work,
+    so processing time never stretches the period and timing errors do not
+    accumulate. Call wait() once per loop iteration, after the frame's work.
+
+    A frame whose work overruns one or more deadlines starts immediately and
+    the skipped grid points are counted as dropped frames; the loop never
+    bursts to catch up. With adaptive=True the rate is lowered to what the
+    measured processing time (times headroom) can sustain and raised back
+    towards max_fps when the work gets cheaper.
+    """
+
+    def __init__(self, target_fps: float, adaptive: bool = False, min_fps: float = 1.0,
+                 headroom: float = 1.2, smoothing: float = 0.1, spin_time: float = 0.0005):
+        if target_fps <= 0:
+            raise ValueError("target_fps must be positive")
+
+        self.logger = logging.getLogger(__name__)
+
+        self.max_fps = float(target_fps)
+        self.min_fps = min(float(min_fps), self.max_fps)
+        self.adaptive = adaptive
+        self.headroom = headroom
+        self.smoothing = smoothing
+
+        # time.sleep overshoots by up to a scheduler tick, so the last stretch is spun
+        self.spin_time = spin_time
+
+        self.target_fps = self.max_fps
+        self.period = 1.0 / self.max_fps
+
+        self.reset()
+
+    def reset(self):
+        """Start a new schedule; the next wait() returns immediately and anchors the grid"""
+        self._scheduled = None
+        self._frame_start = None
+        self._started_at = None
+
+        self.stats = {
+            'frames': 0,
+            'dropped_frames': 0,
+            'late_frames': 0,
+            'avg_drift_ms': 0.0,
+            'max_drift_ms': 0.0,
+            'avg_work_ms': 0.0
+        }
+
+    def set_target_fps(self, target_fps: float):
+        """Change the configured rate; the current schedule continues on the new period"""
+        if target_fps <= 0:
+            raise ValueError("target_fps must be positive")
+
+        self.max_fps = float(target_fps)
+        self.min_fps = min(self.min_fps, self.max_fps)
+        self._set_rate(self.max_fps)
+
+    def remaining(self) -> float:
+        """Seconds left until the next deadline (negative when already late)"""
+        if self._scheduled is None:
+            return 0.0
+
+        return self._scheduled + self.period - time.perf_counter()
+
+    def wait(self) -> bool:
+        """
+        Block until the next frame's deadline
+
+        Returns False when the frame that just finished overran its deadline.
+        """
+        now = time.perf_counter()
+
+        if self._scheduled is None:
+            self._scheduled = self._frame_start = self._started_at = now
+            return True
+
+        self._record_work(now - self._frame_start)
+
+        deadline = self._scheduled + self.period
+        on_time = now <= deadline
+
+        if on_time:
+            self._sleep_until(deadline)
+            self._scheduled = deadline
+        else:
+            # Skip the grid points that passed while working and start right away
+            missed = int((now - deadline) // self.period)
+            self._scheduled = deadline + missed * self.period
+
+            self.stats['dropped_frames'] += missed
+            self.stats['late_frames'] += 1
+
+        self._frame_start = time.perf_counter()
+        self._record_drift(self._frame_start - deadline)
+
+        return on_time
+
+    def _sleep_until(self, deadline: float):
+        remaining = deadline - time.perf_counter()
+
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+
+        while time.perf_counter() < deadline:
+            pass
+
+    def _record_work(self, work: float):
+        stats = self.stats
+        stats['frames'] += 1
+
+        work_ms = work * 1000
+
+        if stats['frames'] == 1:
+            stats['avg_work_ms'] = work_ms
+        else:
+            stats['avg_work_ms'] += self.smoothing * (work_ms - stats['avg_work_ms'])
+
+        if self.adaptive:
+            average_work = stats['avg_work_ms'] / 1000
+            sustainable = 1.0 / (average_work * self.headroom) if average_work > 0 else self.max_fps
+            self._set_rate(min(max(sustainable, self.min_fps), self.max_fps))
+
+    def _record_drift(self, drift: float):
+        stats = self.stats
+        drift_ms = drift * 1000
+
+        stats['avg_drift_ms'] += self.smoothing * (drift_ms - stats['avg_drift_ms'])
+        stats['max_drift_ms'] = max(stats['max_drift_ms'], drift_ms)
+
+    def _set_rate(self, fps: float):
+        # Ignore jitter-sized changes so the grid is not re-timed every frame
+        if abs(fps - self.target_fps) <= 0.02 * self.target_fps and fps != self.max_fps:
+            return
+
+        if fps != self.target_fps:
+            self.target_fps = fps
+            self.period = 1.0 / fps
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['target_fps'] = self.target_fps
+        stats['max_fps'] = self.max_fps
+
+        if self._started_at is not None and stats['frames'] > 0:
+            elapsed = self._frame_start - self._started_at
+            stats['effective_fps'] = stats['frames'] / elapsed if elapsed > 0 else 0.0
+        else:
+            stats['effective_fps'] = 0.0
+
+        stats['utilization'] = stats['avg_work_ms'] / (self.period * 1000)
+
+        return stats
@@ -0,0 +1,218 @@
+"""
+Frame Ring Buffer
+Preallocated, contiguous NumPy frame store shared by all capture backends
+"""
+
+import time
+import threading
+from typing import Optional, Tuple, Any, List, Sequence
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Fixed-capacity ring of frames backed by one (N, H, W, C) array
+
+    Frames are indexed chronologically like a deque: 0 is the oldest frame
+    still held and -1 is the newest. Storage is allocated once, on the first
+    frame (or up front when frame_shape is given), and reallocated only if
+    the frame shape or dtype changes. Captures can write straight into the
+    next slot with acquire_slot()/commit() so no per-frame array is created;
+    readers are not blocked while the slot is filled, since the slot being
+    written is taken out of the readable frames until commit().
+
+    Views returned by the buffer alias the ring storage and are overwritten
+    after `capacity` further frames; copy them if they must outlive that.
+    """
+
+    def __init__(self, capacity: int = 60, frame_shape: Optional[Tuple[int, ...]] = None,
+                 dtype: Any = np.uint8):
+        if capacity < 1:
+            raise ValueError("FrameRingBuffer capacity must be at least 1")
+
+        self.capacity = capacity
+        self.lock = threading.RLock()
+
+        # Held by the single writer from acquire_slot() to commit()/abort()
+        self._write_lock = threading.Lock()
+        self._writing = False
+
+        self.frames = None
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+
+        # Total number of frames ever committed; the write cursor is derived from it
+        self.frames_written = 0
+
+        if frame_shape is not None:
+            self._allocate(tuple(frame_shape), np.dtype(dtype))
+
+    def __len__(self) -> int:
+        # Once the ring is full the slot being written held the oldest frame
+        return min(self.frames_written, self.capacity - 1 if self._writing else self.capacity)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        with self.lock:
+            return self.frames[self._slot(index)]
+
+    @property
+    def frame_shape(self) -> Optional[Tuple[int, ...]]:
+        return None if self.frames is None else self.frames.shape[1:]
+
+    @property
+    def write_cursor(self) -> int:
+        """Slot that the next frame will be written to"""
+        return self.frames_written % self.capacity
+
+    def _allocate(self, frame_shape: Tuple[int, ...], dtype: np.dtype):
+        self.frames = np.zeros((self.capacity,) + frame_shape, dtype=dtype)
+        self.timestamps.fill(0)
+        self.frames_written = 0
+
+    def _ensure_storage(self, frame_shape: Tuple[int, ...], dtype: Any):
+        dtype = np.dtype(dtype)
+
+        if self.frames is None or self.frames.shape[1:] != frame_shape or self.frames.dtype != dtype:
+            self._allocate(frame_shape, dtype)
+
+    def _slot(self, index: int) -> int:
+        """Map a chronological index (negative allowed) to a ring slot"""
+        size = len(self)
+
+        if index < 0:
+            index += size
+
+        if index < 0 or index >= size:
+            raise IndexError(f"Frame index out of range for buffer of {size} frames")
+
+        return (self.frames_written - size + index) % self.capacity
+
+    def acquire_slot(self, frame_shape: Tuple[int, ...], dtype: Any = np.uint8) -> np.ndarray:
+        """
+        Get a writable view of the next slot
+
+        The caller fills the view in place and then calls commit(). Readers
+        only wait for the bookkeeping here and in commit(), not for the fill:
+        the slot is dropped from the readable frames (it held the oldest one
+        once the ring is full) until it is published. One writer at a time.
+        """
+        self._write_lock.acquire()
+
+        try:
+            with self.lock:
+                self._ensure_storage(tuple(frame_shape), dtype)
+                self._writing = True
+                return self.frames[self.write_cursor]
+        except Exception:
+            self._write_lock.release()
+            raise
+
+    def commit(self, timestamp: Optional[float] = None):
+        """Publish the slot returned by acquire_slot()"""
+        try:
+            with self.lock:
+                self.timestamps[self.write_cursor] = time.time() if timestamp is None else timestamp
+                self.frames_written += 1
+                self._writing = False
+        finally:
+            self._write_lock.release()
+
+    def abort(self):
+        """Release a slot acquired with acquire_slot() without publishing it"""
+        try:
+            with self.lock:
+                self._writing = False
+        finally:
+            self._write_lock.release()
+
+    def add_frame(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """Copy a frame into the next slot and return its slot index"""
+        slot = self.acquire_slot(frame.shape, frame.dtype)
+        slot_index = self.write_cursor
+
+        try:
+            np.copyto(slot, frame)
+        except Exception:
+            self.abort()
+            raise
+
+        self.commit(timestamp)
+        return slot_index
+
+    def get_frame(self, index: int = -1) -> Optional[np.ndarray]:
+        with self.lock:
+            try:
+                return self.frames[self._slot(index)]
+            except IndexError:
+                return None
+
+    def get_latest_frame(self) -> Optional[np.ndarray]:
+        return self.get_frame(-1)
+
+    def get_timestamp(self, index: int = -1) -> Optional[float]:
+        with self.lock:
+            try:
+                return float(self.timestamps[self._slot(index)])
+            except IndexError:
+                return None
+
+    def get_slots(self, indices: Sequence[int]) -> List[int]:
+        """Resolve chronological indices to ring slots, skipping invalid ones"""
+        with self.lock:
+            slots = []
+
+            for index in indices:
+                try:
+                    slots.append(self._slot(index))
+                except IndexError:
+                    continue
+
+            return slots
+
+    def get_frame_stack(self, indices: Sequence[int], stack_dimension: Any = "last") -> Optional[np.ndarray]:
+        """
+        Stack frames at the given chronological indices
+
+        Indices that map to consecutive, non-wrapping slots are returned as a
+        zero-copy view of the ring; anything else is a single gather.
+        """
+        with self.lock:
+            if self.frames is None or not indices:
+                return None
+
+            slots = self.get_slots(indices)
+
+            if not slots:
+                return None
+
+            first = slots[0]
+
+            if slots == list(range(first, first + len(slots))):
+                stack = self.frames[first:first + len(slots)]
+            else:
+                stack = self.frames.take(slots, axis=0)
+
+        if stack_dimension == "first":
+            return stack
+        elif stack_dimension == "last":
+            return np.moveaxis(stack, 0, -1)
+        else:
+            return np.moveaxis(stack, 0, int(stack_dimension))
+
+    def get_timestamps(self) -> np.ndarray:
+        """Timestamps of the held frames, oldest first"""
+        with self.lock:
+            size = len(self)
+            start = self.frames_written - size
+            return self.timestamps.take(np.arange(start, start + size) % self.capacity)
+
+    def find_range(self, start_time: float, end_time: float) -> List[int]:
+        """Chronological indices of frames whose timestamps fall in a range"""
+        timestamps = self.get_timestamps()
+        return np.flatnonzero((timestamps >= start_time) & (timestamps <= end_time)).tolist()
+
+    def clear(self):
+        """Forget all frames; storage is kept for reuse"""
+        with self.lock:
+            self.frames_written = 0
+            self.timestamps.fill(0)
@@ -1,20 +1,31 @@
-import skimage.color
 import skimage.measure
-import skimage.transform
-import skimage.filters
-import skimage.morphology
+import skimage.util
 
 import numpy as np
+import cv2
 
 import io
+import time
 
 from PIL import Image
 
+from .color_palette import get_default_engine
+
 
 class GameFrameError(BaseException):
     pass
 
 
+# Variant name -> (downscale factor, grayscale)
+FRAME_VARIANTS = {
+    "half": (2, False),
+    "quarter": (4, False),
+    "eighth": (8, False),
+    "grayscale": (1, True),
+    "eighth_grayscale": (8, True)
+}
+
+
 class GameFrame:
 
     def __init__(self, frame_data, frame_variants=None, timestamp=None, **kwargs):
@@ -41,47 +52,27 @@ class GameFrame:
     @property
     def half_resolution_frame(self):
         """ A quarter-sized version of the frame (half-width, half-height)"""
-
-        if "half" not in self.frame_variants:
-            self.frame_variants["half"] = self._to_half_resolution()
-
-        return self.frame_variants["half"]
+        return self.get_variant("half")
 
     @property
     def quarter_resolution_frame(self):
         """ A sixteenth-sized version of the frame (quarter-width, quarter-height)"""
-
-        if "quarter" not in self.frame_variants:
-            self.frame_variants["quarter"] = self._to_quarter_resolution()
-
-        return self.frame_variants["quarter"]
+        return self.get_variant("quarter")
 
     @property
     def eighth_resolution_frame(self):
         """ A 1/32-sized version of the frame (eighth-width, eighth-height)"""
-
-        if "eighth" not in self.frame_variants:
-            self.frame_variants["eighth"] = self._to_eighth_resolution()
-
-        return self.frame_variants["eighth"]
+        return self.get_variant("eighth")
 
     @property
     def eighth_resolution_grayscale_frame(self):
         """ A 1/32-sized, grayscale version of the frame (eighth-width, eighth-height)"""
-
-        if "eighth_grayscale" not in self.frame_variants:
-            self.frame_variants["eighth_grayscale"] = self._to_eighth_grayscale_resolution()
-
-        return self.frame_variants["eighth_grayscale"]
+        return self.get_variant("eighth_grayscale")
 
     @property
     def grayscale_frame(self):
         """ A full-size grayscale version of the frame"""
-
-        if "grayscale" not in self.frame_variants:
-            self.frame_variants["grayscale"] = self._to_grayscale()
-
-        return self.frame_variants["grayscale"]
+        return self.get_variant("grayscale")
 
     @property
     def ssim_frame(self):
@@ -92,21 +83,113 @@ class GameFrame:
 
         return self.frame_variants["ssim"]
 
+    @property
+    def blurred_grayscale_frame(self):
+        """ A full-size grayscale frame, scaled to [0, 1] and Gaussian blurred (sigma 8), used by difference()"""
+
+        if "blurred_grayscale" not in self.frame_variants:
+            grayscale = self.grayscale_frame.astype(np.float32) / 255.0
+            self.frame_variants["blurred_grayscale"] = cv2.GaussianBlur(grayscale, (65, 65), 8, borderType=cv2.BORDER_REPLICATE)
+
+        return self.frame_variants["blurred_grayscale"]
+
     @property
     def top_color(self):
-        height, width, channels = self.eighth_resolution_frame.shape
-        values, counts = np.unique(self.eighth_resolution_frame.reshape(width * height, channels), axis=0, return_counts=True)
+        colors, _ = get_default_engine().top_colors(self.eighth_resolution_frame, k=1)
 
-        return [int(i) for i in values[np.argsort(counts)[::-1][0]]]
+        return colors[0].tolist()
 
     def compare_ssim(self, previous_game_frame):
         return skimage.measure.compare_ssim(previous_game_frame.ssim_frame, self.ssim_frame)
 
     def difference(self, previous_game_frame):
-        current = skimage.filters.gaussian(self.grayscale_frame, 8)
-        previous = skimage.filters.gaussian(previous_game_frame.grayscale_frame, 8)
+        return self.blurred_grayscale_frame - previous_game_frame.blurred_grayscale_frame
+
+    def get_variant(self, name):
+        """
+        Compute a frame variant lazily, from its cheapest already-computed parent
+
+        A variant derives from the smallest computed variant it can be resized
+        from (quarter from half, eighth from quarter, ...). Grayscale variants
+        convert the color variant of their own size when it exists, otherwise
+        they resize a larger grayscale variant.
+        Variants are cached in frame_variants and returned without copying;
+        treat them as read-only.
+        """
+        if name not in self.frame_variants:
+            if name not in FRAME_VARIANTS:
+                raise GameFrameError(f"Unknown frame variant: {name}")
+
+            self.frame_variants[name] = self._derive_variant(*FRAME_VARIANTS[name])
+
+        return self.frame_variants[name]
+
+    def _derive_variant(self, factor, grayscale):
+        if self.frame_array is None:
+            raise GameFrameError("Frame variants require a decoded frame array")
+
+        color_name = self._variant_name(factor, False)
 
-        return current - previous
+        # Converting an existing color variant of the same size is the cheapest path
+        if grayscale and color_name in self.frame_variants:
+            return self._to_grayscale(self.frame_variants[color_name])
+
+        parent, parent_factor = self._cheapest_parent(factor, grayscale)
+
+        if not grayscale or parent is not None:
+            return self._resize(self.frame_array if parent is None else parent, parent_factor, factor)
+
+        # No grayscale parent yet: convert the color variant of the target size
+        if factor == 1:
+            color = self.frame_array
+        elif color_name is not None:
+            color = self.get_variant(color_name)
+        else:
+            color = self._resize(*self._color_parent(factor), factor)
+
+        return self._to_grayscale(color)
+
+    def _color_parent(self, factor):
+        parent, parent_factor = self._cheapest_parent(factor, False)
+        return (self.frame_array, 1) if parent is None else (parent, parent_factor)
+
+    def _cheapest_parent(self, factor, grayscale):
+        """Smallest computed variant that can be downscaled to factor by an integer ratio, or (None, 1)"""
+        best, best_factor = None, 1
+
+        for name, (variant_factor, variant_grayscale) in FRAME_VARIANTS.items():
+            if variant_grayscale != grayscale or name not in self.frame_variants or factor % variant_factor:
+                continue
+
+            if best is None or variant_factor > best_factor:
+                best, best_factor = self.frame_variants[name], variant_factor
+
+        return best, best_factor
+
+    @staticmethod
+    def _variant_name(factor, grayscale):
+        for name, variant in FRAME_VARIANTS.items():
+            if variant == (factor, grayscale):
+                return name
+
+        return None
+
+    def _resize(self, frame, frame_factor, factor):
+        if factor == frame_factor:
+            return frame
+
+        # Sizes always follow floor division of the original frame
+        height, width = self.frame_array.shape[:2]
+        return cv2.resize(frame, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+
+    def _to_grayscale(self, frame):
+        if frame.ndim == 2:
+            return frame
+
+        if frame.shape[2] == 4:
+            return cv2.cvtColor(frame, cv2.COLOR_RGBA2GRAY)
+
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
 
     def to_pil(self):
         return Image.fromarray(self.frame)
@@ -125,42 +208,50 @@ class GameFrame:
         return png_frame.read()
 
 
-    # TODO: Refactor Fraction of Resolution Frames...
-    def _to_half_resolution(self):
-        shape = (
-            self.frame_array.shape[0] // 2,
-            self.frame_array.shape[1] // 2
-        )
+    def _to_ssim(self):
+        # Nearest-neighbour sample of the smallest computed grayscale variant
+        grayscale, _ = self._cheapest_parent(8, True)
 
-        return np.array(skimage.transform.resize(self.frame_array, shape, mode="reflect", order=self.resize_order) * 255, dtype="uint8")
+        if grayscale is None:
+            grayscale = self.grayscale_frame
 
-    def _to_quarter_resolution(self):
-        shape = (
-            self.frame_array.shape[0] // 4,
-            self.frame_array.shape[1] // 4
-        )
+        return cv2.resize(grayscale, (100, 100), interpolation=cv2.INTER_NEAREST) / 255.0
 
-        return np.array(skimage.transform.resize(self.frame_array, shape, mode="reflect", order=self.resize_order) * 255, dtype="uint8")
 
-    def _to_eighth_resolution(self):
-        shape = (
-            self.frame_array.shape[0] // 8,
-            self.frame_array.shape[1] // 8
-        )
+def benchmark_frame_variants(frame=None, repeat=20):
+    """
+    Per-variant cost in milliseconds
 
-        return np.array(skimage.transform.resize(self.frame_array, shape, mode="reflect", order=self.resize_order) * 255, dtype="uint8")
+    'cold' computes each variant alone on a fresh GameFrame; 'shared'
+    computes all variants in order on one GameFrame, so later variants
+    derive from the ones already computed. Returns
+    {variant: {'cold': ms, 'shared': ms}} for the caller to report.
+    """
+    if frame is None:
+        frame = np.random.randint(0, 256, (1080, 1920, 3), dtype=np.uint8)
 
-    def _to_eighth_grayscale_resolution(self):
-        shape = (
-            self.frame_array.shape[0] // 8,
-            self.frame_array.shape[1] // 8
-        )
+    variants = list(FRAME_VARIANTS) + ["ssim", "blurred_grayscale", "top_color"]
 
-        return np.array(skimage.transform.resize(self.grayscale_frame, shape, mode="reflect", order=self.resize_order) * 255, dtype="uint8")
+    def compute(game_frame, name):
+        if name in FRAME_VARIANTS:
+            return game_frame.get_variant(name)
 
-    def _to_grayscale(self):
-        return np.array(skimage.color.rgb2gray(self.frame_array) * 255, dtype="uint8")
+        return getattr(game_frame, "top_color" if name == "top_color" else f"{name}_frame")
 
-    def _to_ssim(self):
-        grayscale = self.grayscale_frame
-        return skimage.transform.resize(grayscale, (100, 100), mode="reflect", order=0)
+    results = {name: {"cold": 0.0, "shared": 0.0} for name in variants}
+
+    for _ in range(repeat):
+        for name in variants:
+            game_frame = GameFrame(frame)
+            started = time.perf_counter()
+            compute(game_frame, name)
+            results[name]["cold"] += (time.perf_counter() - started) * 1000 / repeat
+
+        game_frame = GameFrame(frame)
+
+        for name in variants:
+            started = time.perf_counter()
+            compute(game_frame, name)
+            results[name]["shared"] += (time.perf_counter() - started) * 1000 / repeat
+
+    return results
@@ -2,6 +2,8 @@ from serpent.visual_debugger.visual_debugger import VisualDebugger
 
 import numpy as np
 
+import collections
+
 
 class GameFrameBufferError(BaseException):
     pass
@@ -11,7 +13,7 @@ class GameFrameBuffer:
 
     def __init__(self, size=5):
         self.size = size
-        self.frames = list()
+        self.frames = collections.deque(maxlen=size)
 
     @property
     def full(self):
@@ -22,10 +24,8 @@ class GameFrameBuffer:
         return self.frames[0] if len(self.frames) else None
 
     def add_game_frame(self, game_frame):
-        if self.full:
-            self.frames = [game_frame] + self.frames[:-1]
-        else:
-            self.frames = [game_frame] + self.frames
+        # Newest frame first; the bounded deque drops the oldest in O(1)
+        self.frames.appendleft(game_frame)
 
     def to_visual_debugger(self):
         visual_debugger = VisualDebugger()
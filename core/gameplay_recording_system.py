@@ -15,6 +15,8 @@ from dataclasses import dataclass, asdict
 import pickle
 import cv2
 
+from .frame_pacer import FramePacer
+
 try:
     import pyautogui
     PYAUTOGUI_AVAILABLE = True
@@ -164,6 +166,8 @@ class GameplayRecordingSystem:
     
     def _recording_loop(self):
         """Main recording loop that monitors user input"""
+        pacer = FramePacer(20)  # 20 FPS monitoring
+        
         while self.is_recording:
             try:
                 current_time = time.time()
@@ -187,7 +191,7 @@ class GameplayRecordingSystem:
                             self.last_mouse_pos = current_mouse_pos
                             self.last_action_time = current_time
                 
-                time.sleep(0.05)  # 20 FPS monitoring
+                pacer.wait()
                 
             except Exception as e:
                 self.logger.error(f"Recording loop error: {e}")
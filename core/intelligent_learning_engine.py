@@ -17,6 +17,8 @@ import math
 from dataclasses import dataclass
 from enum import Enum
 
+from .counter_ocr import counter_reward
+
 class LearningType(Enum):
     SUPERVISED = "supervised"
     UNSUPERVISED = "unsupervised" 
@@ -102,6 +104,10 @@ class IntelligentLearningEngine:
         self.learning_rate = 0.1
         self.discount_factor = 0.95
         
+        # Per-counter weights for rewards read from on-screen counters
+        # (GameState.player_stats, e.g. coins, diamonds, eggs)
+        self.resource_weights = {}
+        
         # Self-improvement tracking
         self.improvement_metrics = {
             "actions_learned": 0,
@@ -226,6 +232,11 @@ class IntelligentLearningEngine:
         
         self.logger.debug(f"Recorded experience: {action} -> {outcome} (reward: {reward})")
     
+    def record_transition(self, game_state: GameState, action: str, next_state: GameState, outcome: str):
+        """Record an experience rewarded by the counter changes between two states"""
+        reward = counter_reward(game_state.player_stats, next_state.player_stats, self.resource_weights)
+        self.record_experience(game_state, action, reward, outcome)
+    
     def _process_recent_experiences(self):
         """Process recent experiences for immediate learning"""
         if len(self.episodic_memory) < 10:
@@ -361,7 +372,19 @@ class IntelligentLearningEngine:
         )
         
         self.q_table[state_key][action] = new_q
-    
+
+    def _detect_immediate_patterns(self, experience: Dict[str, Any]):
+        """Keep a running reward average per action as experiences arrive"""
+        action_rewards = self.semantic_memory.setdefault('action_rewards', {})
+
+        if experience['action'] not in action_rewards:
+            action_rewards[experience['action']] = {'count': 0, 'mean_reward': 0.0}
+            self.improvement_metrics["actions_learned"] += 1
+
+        stats = action_rewards[experience['action']]
+        stats['count'] += 1
+        stats['mean_reward'] += (experience['reward'] - stats['mean_reward']) / stats['count']
+
     def choose_optimal_action(self, state: GameState, available_actions: List[str]) -> str:
         """Choose optimal action using learned Q-values"""
         state_key = self._state_to_key(state)
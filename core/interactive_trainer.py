@@ -14,6 +14,9 @@ from pathlib import Path
 from dataclasses import dataclass, asdict
 from collections import deque
 
+from .template_bank import TemplateBank
+from .capture_backends import ReplayBackend, get_default_backend
+
 # Handle PyAutoGUI import for headless environments
 try:
     import pyautogui
@@ -24,11 +27,6 @@ except Exception as e:
         @staticmethod
         def position():
             return (400, 300)  # Mock position
-        @staticmethod
-        def screenshot(region=None):
-            # Return a mock PIL Image
-            from PIL import Image
-            return Image.new('RGB', (100, 100), color='blue')
     pyautogui = MockPyAutoGUI()
 
 @dataclass
@@ -66,6 +64,9 @@ class InteractiveTrainer:
         self.enhanced_vision = enhanced_vision
         self.automation_engine = automation_engine
         
+        # Screen capture; headless environments replay synthetic frames
+        self.capture_backend = get_default_backend() or ReplayBackend()
+        
         # Training data storage
         self.learned_items = {}
         self.game_zones = {}
@@ -81,6 +82,9 @@ class InteractiveTrainer:
         self.items_file = Path("data/learned_items.json")
         self.zones_file = Path("data/game_zones.json")
         
+        # Learned item screenshots, decoded and preprocessed once for matching
+        self.template_bank = TemplateBank()
+        
         # Load existing data
         self._load_training_data()
         
@@ -104,6 +108,8 @@ class InteractiveTrainer:
                     items_data = json.load(f)
                     for item_id, item_data in items_data.items():
                         self.learned_items[item_id] = InteractiveItem(**item_data)
+                        self.template_bank.add_encoded_template(item_id, self.learned_items[item_id].screenshot,
+                                                                group=item_id)
                 self.logger.info(f"Loaded {len(self.learned_items)} learned items")
             
             # Load game zones
@@ -186,10 +192,7 @@ class InteractiveTrainer:
             
             # Take screenshot of area around mouse
             screenshot_region = (int(mouse_x - 50), int(mouse_y - 50), 100, 100)
-            screenshot = pyautogui.screenshot(region=screenshot_region)
-            
-            # Convert to OpenCV format
-            screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+            screenshot_cv = self.capture_backend.grab(screenshot_region)
             
             # Extract color signature
             color_signature = self._extract_color_signature(screenshot_cv)
@@ -199,10 +202,8 @@ class InteractiveTrainer:
             
             # Save screenshot as base64
             import base64
-            from io import BytesIO
-            buffer = BytesIO()
-            screenshot.save(buffer, format='PNG')
-            screenshot_b64 = base64.b64encode(buffer.getvalue()).decode()
+            _, png = cv2.imencode('.png', screenshot_cv)
+            screenshot_b64 = base64.b64encode(png.tobytes()).decode()
             
             # Create interactive item
             interactive_item = InteractiveItem(
@@ -222,6 +223,7 @@ class InteractiveTrainer:
             
             # Store the item
             self.learned_items[item_id] = interactive_item
+            self.template_bank.add_template(item_id, screenshot_cv, group=item_id)
             
             # Clear pending item type
             self.pending_item_type = None
@@ -416,33 +418,23 @@ class InteractiveTrainer:
                 return []
             
             # Take screenshot
-            screenshot = pyautogui.screenshot()
-            screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+            screenshot_cv = self.capture_backend.grab()
             
             matches = []
             
-            for item_id, learned_item in self.learned_items.items():
-                # Decode the stored screenshot
-                import base64
-                from PIL import Image
-                from io import BytesIO
-                
-                img_data = base64.b64decode(learned_item.screenshot)
-                template = Image.open(BytesIO(img_data))
-                template_cv = cv2.cvtColor(np.array(template), cv2.COLOR_RGB2BGR)
-                
-                # Template matching
-                result = cv2.matchTemplate(screenshot_cv, template_cv, cv2.TM_CCOEFF_NORMED)
-                locations = np.where(result >= threshold)
+            # Template matching against the preprocessed bank
+            for match in self.template_bank.match(screenshot_cv, threshold=threshold):
+                learned_item = self.learned_items.get(match.name)
+                if learned_item is None:
+                    continue
                 
-                for pt in zip(*locations[::-1]):  # Switch x and y
-                    matches.append({
-                        'item_id': item_id,
-                        'item_type': learned_item.item_type,
-                        'position': pt,
-                        'confidence': float(result[pt[1], pt[0]]),
-                        'original_item': learned_item
-                    })
+                matches.append({
+                    'item_id': match.name,
+                    'item_type': learned_item.item_type,
+                    'position': match.bbox[:2],
+                    'confidence': match.confidence,
+                    'original_item': learned_item
+                })
             
             return matches
             
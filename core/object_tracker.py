@@ -0,0 +1,472 @@
+"""
+Multi-Object Tracker
+Links per-frame detections into persistent tracks with stable IDs using a
+constant-velocity Kalman filter and IoU/centroid association, and predicts
+track positions on frames where detection is skipped
+"""
+
+import time
+import logging
+import itertools
+from typing import Optional, Tuple, List, Dict, Any, Sequence, Union
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .template_bank import non_max_suppression
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except Exception:
+    SCIPY_AVAILABLE = False
+
+# Bounding boxes are (x, y, w, h) in frame pixels
+BBox = Tuple[int, int, int, int]
+
+# Cost assigned to pairs that fail the association gate
+_GATED = 1e6
+
+
+@dataclass
+class Track:
+    """A tracked object; bbox and velocity are Kalman estimates"""
+    track_id: int
+    label: str
+    bbox: BBox
+    confidence: float
+    first_seen: float
+    last_seen: float
+    velocity: Tuple[float, float] = (0.0, 0.0)
+    hits: int = 1
+    misses: int = 0
+    confirmed: bool = False
+    predicted: bool = False
+    detection: Any = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        x, y, w, h = self.bbox
+        return (x + w // 2, y + h // 2)
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        return self.center
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Seconds since the track was first detected"""
+        return (time.time() if now is None else now) - self.first_seen
+
+
+class MultiObjectTracker:
+    """
+    Kalman/IoU multi-object tracker
+
+    Each track keeps a constant-velocity state [cx, cy, vx, vy] with its
+    covariance; all tracks are predicted together as one batched matrix
+    product. Detections are associated per label with the predicted boxes:
+    pairs overlapping by at least iou_threshold are preferred, smaller
+    objects fall back to centre distance within max_distance. The assignment
+    is solved optimally with scipy when available, greedily otherwise.
+
+    Tracks become confirmed after min_hits detections and are removed after
+    max_misses consecutive detection passes without a match, or once they
+    have only been predicted for max_prediction_time seconds. Detection
+    passes restricted to regions (dirty tiles) treat tracks outside those
+    regions as unchanged: they are neither moved, missed nor aged out (their
+    filter state is not predicted forward). An update with regions=[]
+    therefore holds every track for an unchanged frame.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_distance: float = 60.0, min_hits: int = 2,
+                 max_misses: int = 3, max_prediction_time: float = 2.0, nms_overlap: float = 0.3,
+                 default_size: Tuple[int, int] = (32, 32), acceleration_noise: float = 400.0,
+                 measurement_noise: float = 16.0, size_smoothing: float = 0.5):
+        self.logger = logging.getLogger(__name__)
+
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.max_prediction_time = max_prediction_time
+        self.nms_overlap = nms_overlap
+        self.default_size = default_size
+        self.acceleration_noise = acceleration_noise
+        self.measurement_noise = measurement_noise
+        self.size_smoothing = size_smoothing
+
+        self._ids = itertools.count(1)
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.last_timestamp = None
+
+        # Batched Kalman state, row i belongs to self.tracks[i]
+        self._states = np.zeros((0, 4), dtype=np.float64)
+        self._covariances = np.zeros((0, 4, 4), dtype=np.float64)
+        self._sizes = np.zeros((0, 2), dtype=np.float64)
+
+        self.stats = {
+            'updates': 0,
+            'predictions': 0,
+            'tracks_created': 0,
+            'tracks_removed': 0
+        }
+
+    # Public API
+
+    def predict(self, timestamp: Optional[float] = None) -> List[Track]:
+        """Advance every track to timestamp without detections (a skipped frame)"""
+        timestamp = time.time() if timestamp is None else timestamp
+
+        self._predict(timestamp)
+        self._prune(timestamp)
+        self.stats['predictions'] += 1
+
+        return self.get_tracks()
+
+    def update(self, detections: Union[Dict[str, Sequence[Any]], Sequence[Tuple[str, Any]]],
+               timestamp: Optional[float] = None,
+               regions: Optional[Sequence[BBox]] = None) -> List[Track]:
+        """
+        Associate one detection pass with the tracks
+
+        detections maps labels to detections, or is a list of
+        (label, detection) pairs. A detection may be a dict with 'bbox' or
+        'center', an object with position (centre) and size (e.g.
+        GameElement), an (x, y, w, h[, confidence]) box or an
+        (x, y[, confidence]) centre point. When regions is given the pass
+        only covered those (x, y, w, h) regions.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+
+        # Tracks outside the covered area are frozen where they were last seen
+        covered = self._covered(regions)
+        self._predict(timestamp, covered)
+
+        by_label = self._normalize(detections)
+        labels = set(by_label) | set(track.label for track in self.tracks)
+
+        matched = set()
+
+        for label in labels:
+            boxes, confidences, raw = by_label.get(label, (np.zeros((0, 4)), np.zeros(0), []))
+            track_indices = [index for index, track in enumerate(self.tracks)
+                             if track.label == label and covered[index]]
+
+            pairs = self._associate(track_indices, boxes)
+
+            for track_index, detection_index in pairs:
+                self._correct(track_index, boxes[detection_index], confidences[detection_index],
+                              raw[detection_index], timestamp)
+                matched.add(track_index)
+
+            assigned = set(detection_index for _, detection_index in pairs)
+
+            for detection_index in range(len(boxes)):
+                if detection_index not in assigned:
+                    self._create(label, boxes[detection_index], confidences[detection_index],
+                                 raw[detection_index], timestamp)
+
+        for index, track in enumerate(self.tracks[:len(covered)]):
+            if index in matched:
+                continue
+
+            if covered[index]:
+                track.misses += 1
+                track.predicted = True
+            else:
+                # The pass found this track's area unchanged, so it still holds
+                track.last_seen = timestamp
+
+        self._prune(timestamp)
+        self.stats['updates'] += 1
+
+        return self.get_tracks()
+
+    def get_tracks(self, label: Optional[str] = None, include_tentative: bool = False) -> List[Track]:
+        return [track for track in self.tracks
+                if (include_tentative or track.confirmed) and (label is None or track.label == label)]
+
+    def tracks_by_label(self, include_tentative: bool = False) -> Dict[str, List[Track]]:
+        grouped = {}
+
+        for track in self.get_tracks(include_tentative=include_tentative):
+            grouped.setdefault(track.label, []).append(track)
+
+        return grouped
+
+    def get_track(self, track_id: int) -> Optional[Track]:
+        for track in self.tracks:
+            if track.track_id == track_id:
+                return track
+
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['active_tracks'] = len(self.tracks)
+        stats['confirmed_tracks'] = sum(1 for track in self.tracks if track.confirmed)
+        return stats
+
+    # Kalman filter
+
+    def _transition(self, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = dt
+
+        # White-noise acceleration model
+        noise_gain = np.array([[dt * dt / 2, 0], [0, dt * dt / 2], [dt, 0], [0, dt]])
+        process_noise = noise_gain @ noise_gain.T * self.acceleration_noise
+
+        return transition, process_noise
+
+    def _predict(self, timestamp: float, active: Optional[Sequence[bool]] = None):
+        """Advance the tracks (those flagged in active, when given) to timestamp"""
+        dt = 0.0 if self.last_timestamp is None else max(0.0, timestamp - self.last_timestamp)
+        self.last_timestamp = timestamp
+
+        if not self.tracks or dt == 0.0:
+            return
+
+        rows = np.arange(len(self.tracks)) if active is None else np.flatnonzero(active)
+
+        if len(rows) == 0:
+            return
+
+        transition, process_noise = self._transition(dt)
+
+        self._states[rows] = self._states[rows] @ transition.T
+        self._covariances[rows] = transition @ self._covariances[rows] @ transition.T + process_noise
+
+        for index in rows:
+            track = self.tracks[index]
+            self._sync(index, track)
+            track.predicted = True
+
+    def _correct(self, index: int, box: np.ndarray, confidence: float, raw: Any, timestamp: float):
+        state = self._states[index]
+        covariance = self._covariances[index]
+
+        measurement = box[:2] + box[2:] / 2
+        innovation = measurement - state[:2]
+        innovation_covariance = covariance[:2, :2] + np.eye(2) * self.measurement_noise
+        gain = covariance[:, :2] @ np.linalg.inv(innovation_covariance)
+
+        self._states[index] = state + gain @ innovation
+        self._covariances[index] = covariance - gain @ covariance[:2, :]
+        self._sizes[index] += self.size_smoothing * (box[2:] - self._sizes[index])
+
+        track = self.tracks[index]
+        track.hits += 1
+        track.misses = 0
+        track.predicted = False
+        track.confidence = float(confidence)
+        track.last_seen = timestamp
+        track.detection = raw
+        track.confirmed = track.confirmed or track.hits >= self.min_hits
+
+        self._sync(index, track)
+
+    def _create(self, label: str, box: np.ndarray, confidence: float, raw: Any, timestamp: float):
+        center = box[:2] + box[2:] / 2
+
+        state = np.array([center[0], center[1], 0.0, 0.0])
+
+        # Position is known to measurement accuracy, velocity is unknown
+        covariance = np.diag([self.measurement_noise, self.measurement_noise,
+                              self.max_distance ** 2, self.max_distance ** 2])
+
+        track = Track(
+            track_id=next(self._ids),
+            label=label,
+            bbox=tuple(int(round(v)) for v in box),
+            confidence=float(confidence),
+            first_seen=timestamp,
+            last_seen=timestamp,
+            confirmed=self.min_hits <= 1,
+            detection=raw
+        )
+
+        self.tracks.append(track)
+        self._states = np.vstack([self._states, state])
+        self._covariances = np.concatenate([self._covariances, covariance[np.newaxis]])
+        self._sizes = np.vstack([self._sizes, box[2:]])
+
+        self.stats['tracks_created'] += 1
+
+    def _sync(self, index: int, track: Track):
+        """Copy the filter estimate of row index into its Track"""
+        cx, cy, vx, vy = self._states[index]
+        w, h = self._sizes[index]
+
+        track.bbox = (int(round(cx - w / 2)), int(round(cy - h / 2)), int(round(w)), int(round(h)))
+        track.velocity = (float(vx), float(vy))
+
+    def _prune(self, timestamp: float):
+        keep = []
+
+        for track in self.tracks:
+            if track.confirmed:
+                alive = track.misses <= self.max_misses
+            else:
+                # Tentative tracks must be re-detected on the next pass
+                alive = track.misses == 0
+
+            keep.append(alive and timestamp - track.last_seen <= self.max_prediction_time)
+
+        if all(keep):
+            return
+
+        keep = np.asarray(keep, dtype=bool)
+
+        self.stats['tracks_removed'] += int((~keep).sum())
+        self.tracks = [track for track, alive in zip(self.tracks, keep) if alive]
+        self._states = self._states[keep]
+        self._covariances = self._covariances[keep]
+        self._sizes = self._sizes[keep]
+
+    # Association
+
+    def _covered(self, regions: Optional[Sequence[BBox]]) -> List[bool]:
+        """Whether each track lies inside the area the detection pass covered"""
+        if regions is None:
+            return [True] * len(self.tracks)
+
+        covered = []
+
+        for track in self.tracks:
+            cx, cy = track.center
+            covered.append(any(x <= cx < x + w and y <= cy < y + h for x, y, w, h in regions))
+
+        return covered
+
+    def _associate(self, track_indices: List[int], boxes: np.ndarray) -> List[Tuple[int, int]]:
+        if not track_indices or len(boxes) == 0:
+            return []
+
+        predicted = np.array([self.tracks[index].bbox for index in track_indices], dtype=np.float64)
+        cost = self._association_cost(predicted, boxes)
+
+        if SCIPY_AVAILABLE:
+            rows, columns = linear_sum_assignment(cost)
+            pairs = [(row, column) for row, column in zip(rows, columns) if cost[row, column] < _GATED]
+        else:
+            pairs = []
+            used_rows, used_columns = set(), set()
+
+            for flat in np.argsort(cost, axis=None):
+                row, column = np.unravel_index(flat, cost.shape)
+
+                if cost[row, column] >= _GATED:
+                    break
+
+                if row in used_rows or column in used_columns:
+                    continue
+
+                pairs.append((row, column))
+                used_rows.add(row)
+                used_columns.add(column)
+
+        return [(track_indices[row], int(column)) for row, column in pairs]
+
+    def _association_cost(self, predicted: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """Cost in [0, 1) for IoU matches, [1, 2] for centre-distance matches, _GATED otherwise"""
+        px1, py1 = predicted[:, 0:1], predicted[:, 1:2]
+        px2, py2 = px1 + predicted[:, 2:3], py1 + predicted[:, 3:4]
+        dx1, dy1 = boxes[:, 0], boxes[:, 1]
+        dx2, dy2 = dx1 + boxes[:, 2], dy1 + boxes[:, 3]
+
+        inter_w = np.maximum(0.0, np.minimum(px2, dx2) - np.maximum(px1, dx1))
+        inter_h = np.maximum(0.0, np.minimum(py2, dy2) - np.maximum(py1, dy1))
+        intersection = inter_w * inter_h
+        union = (predicted[:, 2:3] * predicted[:, 3:4]) + (boxes[:, 2] * boxes[:, 3]) - intersection
+        iou = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+        distance = np.hypot((px1 + px2) / 2 - (dx1 + dx2) / 2, (py1 + py2) / 2 - (dy1 + dy2) / 2)
+
+        cost = np.full(iou.shape, _GATED)
+
+        near = distance <= self.max_distance
+        cost[near] = 1.0 + distance[near] / self.max_distance
+
+        overlapping = iou >= self.iou_threshold
+        cost[overlapping] = 1.0 - iou[overlapping]
+
+        return cost
+
+    # Detection normalization
+
+    def _normalize(self, detections) -> Dict[str, Tuple[np.ndarray, np.ndarray, List[Any]]]:
+        """Group detections by label as (boxes, confidences, raw), with duplicates suppressed"""
+        items = detections.items() if isinstance(detections, dict) else self._group_pairs(detections)
+        normalized = {}
+
+        for label, label_detections in items:
+            boxes, confidences, raw = [], [], []
+
+            for detection in label_detections:
+                parsed = self._parse(detection)
+
+                if parsed is None:
+                    continue
+
+                boxes.append(parsed[0])
+                confidences.append(parsed[1])
+                raw.append(detection)
+
+            if not boxes:
+                continue
+
+            boxes = np.asarray(boxes, dtype=np.float64)
+            confidences = np.asarray(confidences, dtype=np.float64)
+
+            # Template matchers report clusters of neighbouring hits per object
+            keep = non_max_suppression(boxes, confidences, self.nms_overlap)
+            normalized[label] = (boxes[keep], confidences[keep], [raw[index] for index in keep])
+
+        return normalized
+
+    @staticmethod
+    def _group_pairs(pairs) -> List[Tuple[str, List[Any]]]:
+        grouped = {}
+
+        for label, detection in pairs:
+            grouped.setdefault(label, []).append(detection)
+
+        return list(grouped.items())
+
+    def _parse(self, detection: Any) -> Optional[Tuple[Tuple[float, float, float, float], float]]:
+        default_w, default_h = self.default_size
+
+        if isinstance(detection, dict):
+            confidence = float(detection.get('confidence', 1.0))
+
+            if 'bbox' in detection:
+                return tuple(float(v) for v in detection['bbox'][:4]), confidence
+
+            if 'center' in detection:
+                w, h = detection.get('size', self.default_size)
+                cx, cy = detection['center'][:2]
+                return (cx - w / 2, cy - h / 2, float(w), float(h)), confidence
+
+            return None
+
+        if hasattr(detection, 'position'):
+            w, h = getattr(detection, 'size', None) or self.default_size
+            cx, cy = detection.position[:2]
+            return (cx - w / 2, cy - h / 2, float(w), float(h)), float(getattr(detection, 'confidence', 1.0))
+
+        if isinstance(detection, (tuple, list, np.ndarray)):
+            if len(detection) >= 4:
+                confidence = float(detection[4]) if len(detection) > 4 else 1.0
+                return tuple(float(v) for v in detection[:4]), confidence
+
+            if len(detection) >= 2:
+                confidence = float(detection[2]) if len(detection) > 2 else 1.0
+                cx, cy = detection[0], detection[1]
+                return (cx - default_w / 2, cy - default_h / 2, float(default_w), float(default_h)), confidence
+
+        return None
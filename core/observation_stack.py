@@ -0,0 +1,144 @@
+"""
+Observation Stack
+Frame-stack observations for RL agents: every frame is preprocessed once,
+on arrival, into a ring of small planes (84x84 grayscale by default), and
+the stack is served as a view of that ring instead of re-preprocessing the
+whole stack for each decision
+"""
+
+import time
+import logging
+from typing import Optional, Tuple, Dict, Any
+
+import numpy as np
+
+from .frame_ring_buffer import FrameRingBuffer
+from .serpent_enhanced_vision import FrameTransformationPipeline
+
+
+class ObservationStack:
+    """
+    Ring of preprocessed planes served as a zero-copy stack
+
+    Planes live in a (2k - 1, H, W) array and each plane is written to its
+    slot and to the mirror slot k positions later, so the newest k planes
+    are always one contiguous slice, oldest first. float32 planes are
+    normalized to [0, 1]; uint8 planes keep raw gray levels (a quarter of
+    the memory) and are scaled by the consumer.
+
+    observation() returns a view that the next push overwrites; use
+    snapshot() for observations that are kept (replay buffers, states).
+    """
+
+    def __init__(self, stack_size: int = 4, size: Tuple[int, int] = (84, 84), dtype: Any = np.float32,
+                 pipeline: Optional[str] = None, stack_dimension: str = "first"):
+        self.logger = logging.getLogger(__name__)
+
+        self.stack_size = stack_size
+        self.dtype = np.dtype(dtype)
+        self.stack_dimension = stack_dimension
+
+        if pipeline is None:
+            width, height = size
+            pipeline = f"RESIZE:{width}x{height}|GRAYSCALE" + ("|NORMALIZE" if self.dtype == np.float32 else "")
+
+        self.pipeline = FrameTransformationPipeline(pipeline)
+
+        self.planes = None
+        self.cursor = 0
+        self.count = 0
+
+        # frames_written of the ring buffer at the last sync()
+        self._frames_seen = None
+
+        self.stats = {
+            'planes': 0,
+            'preprocess_ms': 0.0
+        }
+
+    def reset(self):
+        """Start a new episode: the next frame fills the whole stack"""
+        self.cursor = 0
+        self.count = 0
+        self._frames_seen = None
+
+    def push(self, frame: np.ndarray) -> np.ndarray:
+        """Preprocess one new frame into the ring and return the stack"""
+        started = time.perf_counter()
+        plan = self.pipeline.compile(frame.shape, frame.dtype)
+        shape = tuple(plan['output_shape'])
+
+        if self.planes is None or self.planes.shape[1:] != shape:
+            self.planes = np.zeros((2 * self.stack_size - 1,) + shape, dtype=self.dtype)
+            self.reset()
+
+        slot = self.cursor
+        plane = self.planes[slot]
+
+        if plan['output_dtype'] == self.dtype:
+            self.pipeline.transform(frame, out=plane)
+        else:
+            np.copyto(plane, self.pipeline.transform(frame), casting='unsafe')
+
+        if self.count == 0:
+            # First frame of an episode stands in for the missing history
+            self.planes[:] = plane
+        elif slot + self.stack_size < len(self.planes):
+            self.planes[slot + self.stack_size] = plane
+
+        self.cursor = (slot + 1) % self.stack_size
+        self.count += 1
+
+        self.stats['planes'] += 1
+        self.stats['preprocess_ms'] = (time.perf_counter() - started) * 1000
+
+        return self.observation()
+
+    def sync(self, buffer: FrameRingBuffer) -> Optional[np.ndarray]:
+        """
+        Push the frames a ring buffer received since the last sync
+
+        Only the newest stack_size of them can reach the stack, so older
+        unseen frames are skipped. Returns the stack, or None while neither
+        the buffer nor the stack holds a frame.
+        """
+        with buffer.lock:
+            written = buffer.frames_written
+            available = len(buffer)
+
+            if self._frames_seen is None or written < self._frames_seen:
+                new = available
+            else:
+                new = written - self._frames_seen
+
+            for index in range(-min(new, available, self.stack_size), 0):
+                self.push(buffer[index])
+
+            self._frames_seen = written
+
+        return self.observation() if self.count else None
+
+    def observation(self) -> Optional[np.ndarray]:
+        """The newest stack_size planes, oldest first, as a view of the ring"""
+        if self.planes is None:
+            return None
+
+        window = self.planes[self.cursor:self.cursor + self.stack_size]
+
+        if self.stack_dimension == "last":
+            return np.moveaxis(window, 0, -1)
+
+        return window
+
+    def snapshot(self) -> Optional[np.ndarray]:
+        """A copy of the current stack that later pushes do not change"""
+        observation = self.observation()
+        return None if observation is None else observation.copy()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['stack_size'] = self.stack_size
+        stats['plane_shape'] = None if self.planes is None else self.planes.shape[1:]
+        stats['dtype'] = str(self.dtype)
+
+        return stats
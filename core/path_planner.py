@@ -0,0 +1,463 @@
+"""
+Path Planner
+Coarse occupancy grid built from detected boundary zones, A* search over it
+with a cached obstacle distance field and query cache, and a grid-bucket
+spatial index over the endpoints of learned paths
+"""
+
+import heapq
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Optional, Tuple, List, Dict, Any, Iterable
+
+import numpy as np
+import cv2
+
+Point = Tuple[int, int]
+Cell = Tuple[int, int]
+
+SQRT2 = 2 ** 0.5
+
+# (row step, column step, cost) for the 8-connected neighbourhood
+NEIGHBOURS = [(-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+              (-1, -1, SQRT2), (-1, 1, SQRT2), (1, -1, SQRT2), (1, 1, SQRT2)]
+
+
+class OccupancyGrid:
+    """
+    Blocked/free cells over the screen at cell_size pixel resolution
+
+    Obstacles are inflated by `inflation` cells so planned paths keep a
+    margin from walls. The obstacle distance field (in cells) is computed
+    once per grid and reused by every query.
+    """
+
+    def __init__(self, frame_shape: Tuple[int, int], cell_size: int = 32, inflation: int = 1):
+        self.cell_size = cell_size
+        self.inflation = inflation
+        self.frame_shape = tuple(frame_shape[:2])
+
+        height, width = self.frame_shape
+        self.rows = -(-height // cell_size)
+        self.cols = -(-width // cell_size)
+
+        self._obstacles = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        self._blocked = None
+        self._distance = None
+
+    @classmethod
+    def from_zones(cls, zones: Dict[str, Any], frame_shape: Tuple[int, int], cell_size: int = 32,
+                   inflation: int = 1, obstacle_types: Iterable[str] = ('boundary',)) -> "OccupancyGrid":
+        """
+        Grid with every boundary zone drawn in
+
+        Zone boundaries are either line segments (x1, y1, x2, y2), as from
+        Hough barrier detection, or polygon points (x, y), as from contours.
+        """
+        grid = cls(frame_shape, cell_size, inflation)
+        obstacle_types = set(obstacle_types)
+
+        for zone in zones.values():
+            if getattr(zone, 'zone_type', None) not in obstacle_types:
+                continue
+
+            boundaries = getattr(zone, 'boundaries', None)
+
+            if boundaries is None or len(boundaries) == 0:
+                continue
+
+            points = np.asarray(boundaries, dtype=np.float64)
+
+            if points.ndim == 2 and points.shape[1] == 4:
+                for x1, y1, x2, y2 in points:
+                    grid.add_line((x1, y1), (x2, y2))
+            elif points.ndim == 2 and points.shape[1] == 2 and len(points) >= 3:
+                grid.add_polygon(points)
+
+        return grid
+
+    def add_line(self, start: Tuple[float, float], end: Tuple[float, float], thickness: int = 1):
+        cv2.line(self._obstacles, self._grid_point(start), self._grid_point(end), 1, thickness)
+        self._invalidate()
+
+    def add_polygon(self, points: np.ndarray):
+        polygon = np.floor(np.asarray(points, dtype=np.float64) / self.cell_size).astype(np.int32)
+        cv2.fillPoly(self._obstacles, [polygon.reshape(-1, 1, 2)], 1)
+        self._invalidate()
+
+    def add_rect(self, x: int, y: int, width: int, height: int):
+        # The rectangle covers pixels x .. x + width - 1 (and likewise in y)
+        last = (x + max(width, 1) - 1, y + max(height, 1) - 1)
+        cv2.rectangle(self._obstacles, self._grid_point((x, y)), self._grid_point(last), 1, -1)
+        self._invalidate()
+
+    @property
+    def blocked(self) -> np.ndarray:
+        """Inflated obstacle mask (rows, cols)"""
+        if self._blocked is None:
+            if self.inflation > 0:
+                size = 2 * self.inflation + 1
+                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+                self._blocked = cv2.dilate(self._obstacles, kernel).astype(bool)
+            else:
+                self._blocked = self._obstacles.astype(bool)
+
+        return self._blocked
+
+    @property
+    def distance(self) -> np.ndarray:
+        """Distance in cells from every cell to the nearest blocked cell"""
+        if self._distance is None:
+            if self.blocked.any():
+                free = (~self.blocked).astype(np.uint8)
+                self._distance = cv2.distanceTransform(free, cv2.DIST_L2, 3)
+            else:
+                self._distance = np.full((self.rows, self.cols), np.inf, dtype=np.float32)
+
+        return self._distance
+
+    def to_cell(self, point: Point) -> Cell:
+        col = min(max(int(point[0]) // self.cell_size, 0), self.cols - 1)
+        row = min(max(int(point[1]) // self.cell_size, 0), self.rows - 1)
+        return (row, col)
+
+    def to_point(self, cell: Cell) -> Point:
+        return (cell[1] * self.cell_size + self.cell_size // 2, cell[0] * self.cell_size + self.cell_size // 2)
+
+    def is_free(self, cell: Cell) -> bool:
+        return not self.blocked[cell]
+
+    def nearest_free(self, cell: Cell) -> Optional[Cell]:
+        """The free cell closest to a (possibly blocked) cell"""
+        if self.is_free(cell):
+            return cell
+
+        rows, cols = np.nonzero(~self.blocked)
+
+        if len(rows) == 0:
+            return None
+
+        index = int(np.argmin((rows - cell[0]) ** 2 + (cols - cell[1]) ** 2))
+        return (int(rows[index]), int(cols[index]))
+
+    def line_of_sight(self, a: Cell, b: Cell) -> bool:
+        """True when the straight segment between two cells crosses no blocked cell"""
+        steps = max(abs(b[0] - a[0]), abs(b[1] - a[1])) + 1
+        rows = np.rint(np.linspace(a[0], b[0], steps)).astype(np.intp)
+        cols = np.rint(np.linspace(a[1], b[1], steps)).astype(np.intp)
+
+        return not self.blocked[rows, cols].any()
+
+    def _grid_point(self, point: Tuple[float, float]) -> Tuple[int, int]:
+        """The cell (col, row) holding a pixel, floored like to_cell()"""
+        return (int(point[0] // self.cell_size), int(point[1] // self.cell_size))
+
+    def _invalidate(self):
+        self._blocked = None
+        self._distance = None
+
+
+class PathPlanner:
+    """
+    A* planner over an OccupancyGrid
+
+    Moves are 8-connected without corner cutting, with an octile-distance
+    heuristic. Cells closer than `clearance` cells to an obstacle cost extra
+    (from the grid's cached distance field), so routes prefer open space.
+    Straight lines are returned directly when nothing blocks them, found
+    paths are shortened by line-of-sight smoothing, and results are cached
+    per (start cell, goal cell) until the grid changes.
+    """
+
+    def __init__(self, grid: Optional[OccupancyGrid] = None, clearance: float = 2.0,
+                 clearance_weight: float = 2.0, heuristic_weight: float = 1.0,
+                 cache_size: int = 256, max_expansions: int = 200000):
+        self.logger = logging.getLogger(__name__)
+
+        self.clearance = clearance
+        self.clearance_weight = clearance_weight
+        self.heuristic_weight = heuristic_weight
+        self.cache_size = cache_size
+        self.max_expansions = max_expansions
+
+        self.grid = None
+        self.version = 0
+        self._cache = OrderedDict()
+
+        self.stats = {
+            'queries': 0,
+            'cache_hits': 0,
+            'direct': 0,
+            'searches': 0,
+            'failures': 0,
+            'last_expansions': 0
+        }
+
+        if grid is not None:
+            self.set_grid(grid)
+
+    def set_grid(self, grid: Optional[OccupancyGrid]):
+        """Replace the obstacle grid; cached plans are dropped"""
+        self.grid = grid
+        self.version += 1
+        self._cache.clear()
+
+    def plan(self, start: Point, goal: Point) -> Optional[List[Point]]:
+        """
+        Waypoints from start to goal in screen pixels, or None when unreachable
+
+        The first and last waypoints are the exact start and goal; the ones
+        in between are cell centres.
+        """
+        self.stats['queries'] += 1
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+
+        grid = self.grid
+
+        if grid is None:
+            self.stats['direct'] += 1
+            return [start, goal]
+
+        start_cell = grid.nearest_free(grid.to_cell(start))
+        goal_cell = grid.nearest_free(grid.to_cell(goal))
+
+        if start_cell is None or goal_cell is None:
+            self.stats['failures'] += 1
+            return None
+
+        key = (start_cell, goal_cell)
+        cells = self._cache.get(key)
+
+        if cells is not None:
+            self.stats['cache_hits'] += 1
+            self._cache.move_to_end(key)
+        else:
+            cells = self._plan_cells(start_cell, goal_cell)
+            self._cache[key] = cells
+
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        if cells is False:
+            return None
+
+        return [start] + [grid.to_point(cell) for cell in cells[1:-1]] + [goal]
+
+    def _plan_cells(self, start: Cell, goal: Cell):
+        """Smoothed cell path, or False when the goal is unreachable"""
+        if start == goal or self.grid.line_of_sight(start, goal):
+            self.stats['direct'] += 1
+            return [start, goal]
+
+        self.stats['searches'] += 1
+        cells = self._astar(start, goal)
+
+        if cells is None:
+            self.stats['failures'] += 1
+            return False
+
+        return self._smooth(cells)
+
+    def _astar(self, start: Cell, goal: Cell) -> Optional[List[Cell]]:
+        grid = self.grid
+        rows, cols = grid.rows, grid.cols
+        size = rows * cols
+
+        # Flat Python lists index much faster than numpy scalars in the inner loop
+        blocked = grid.blocked.ravel().tolist()
+        penalty = (np.maximum(self.clearance - grid.distance, 0) * self.clearance_weight).ravel().tolist()
+
+        goal_row, goal_col = goal
+        start_index = start[0] * cols + start[1]
+        goal_index = goal_row * cols + goal_col
+
+        g_score = [float('inf')] * size
+        came_from = [-1] * size
+        closed = [False] * size
+        g_score[start_index] = 0.0
+
+        weight = self.heuristic_weight
+        diagonal = SQRT2 - 2
+
+        # Ties on f are broken towards the larger g (deeper nodes)
+        heap = [(0.0, 0.0, start_index)]
+        expansions = 0
+
+        while heap:
+            _, negative_g, index = heapq.heappop(heap)
+
+            if index == goal_index:
+                self.stats['last_expansions'] = expansions
+                return self._reconstruct(came_from, index, cols)
+
+            if closed[index]:
+                continue
+
+            closed[index] = True
+            expansions += 1
+
+            if expansions > self.max_expansions:
+                break
+
+            g = -negative_g
+            row, col = divmod(index, cols)
+
+            for dr, dc, step in NEIGHBOURS:
+                next_row = row + dr
+                next_col = col + dc
+
+                if next_row < 0 or next_row >= rows or next_col < 0 or next_col >= cols:
+                    continue
+
+                next_index = next_row * cols + next_col
+
+                if blocked[next_index] or closed[next_index]:
+                    continue
+
+                # No corner cutting past blocked cells on diagonal moves
+                if dr and dc and (blocked[row * cols + next_col] or blocked[next_row * cols + col]):
+                    continue
+
+                tentative = g + step * (1.0 + penalty[next_index])
+
+                if tentative < g_score[next_index]:
+                    g_score[next_index] = tentative
+                    came_from[next_index] = index
+
+                    # Octile distance to the goal
+                    distance_row = abs(next_row - goal_row)
+                    distance_col = abs(next_col - goal_col)
+                    heuristic = distance_row + distance_col + diagonal * min(distance_row, distance_col)
+
+                    heapq.heappush(heap, (tentative + weight * heuristic, -tentative, next_index))
+
+        self.stats['last_expansions'] = expansions
+        return None
+
+    @staticmethod
+    def _reconstruct(came_from: List[int], index: int, cols: int) -> List[Cell]:
+        path = [divmod(index, cols)]
+
+        while came_from[index] >= 0:
+            index = came_from[index]
+            path.append(divmod(index, cols))
+
+        path.reverse()
+        return path
+
+    def _smooth(self, cells: List[Cell]) -> List[Cell]:
+        """String pulling: keep only the cells needed to stay in line of sight"""
+        smoothed = [cells[0]]
+        anchor = 0
+
+        while anchor < len(cells) - 1:
+            furthest = anchor + 1
+
+            for candidate in range(len(cells) - 1, anchor + 1, -1):
+                if self.grid.line_of_sight(cells[anchor], cells[candidate]):
+                    furthest = candidate
+                    break
+
+            smoothed.append(cells[furthest])
+            anchor = furthest
+
+        return smoothed
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['cached_plans'] = len(self._cache)
+        stats['grid_version'] = self.version
+
+        if self.grid is not None:
+            stats['grid_shape'] = (self.grid.rows, self.grid.cols)
+            stats['blocked_ratio'] = float(self.grid.blocked.mean())
+
+        return stats
+
+
+class PathIndex:
+    """
+    Grid-bucket index over the start points of learned paths
+
+    Paths are bucketed by the bucket_size cell their first waypoint falls
+    in, so finding routes that start near a point only visits the buckets
+    overlapping the search radius instead of every learned path.
+    """
+
+    def __init__(self, bucket_size: int = 64):
+        self.bucket_size = bucket_size
+        self._buckets = defaultdict(dict)
+        self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bucket(self, point: Point) -> Tuple[int, int]:
+        return (int(point[0]) // self.bucket_size, int(point[1]) // self.bucket_size)
+
+    def add(self, path_id: str, start: Point, end: Point, path_type: Optional[str] = None):
+        self.remove(path_id)
+
+        bucket = self._bucket(start)
+        self._buckets[bucket][path_id] = (tuple(start), tuple(end), path_type)
+        self._entries[path_id] = bucket
+
+    def remove(self, path_id: str):
+        bucket = self._entries.pop(path_id, None)
+
+        if bucket is not None:
+            entries = self._buckets[bucket]
+            entries.pop(path_id, None)
+
+            if not entries:
+                del self._buckets[bucket]
+
+    def clear(self):
+        self._buckets.clear()
+        self._entries.clear()
+
+    def nearby(self, start: Point, radius: float, end: Optional[Point] = None,
+               path_type: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        (path id, start distance + end distance) of paths starting within radius of start
+
+        With end given, the path's last waypoint must also lie within radius
+        of it. Sorted by distance.
+        """
+        min_x, min_y = self._bucket((start[0] - radius, start[1] - radius))
+        max_x, max_y = self._bucket((start[0] + radius, start[1] + radius))
+        radius_squared = radius * radius
+
+        matches = []
+
+        for bucket_x in range(min_x, max_x + 1):
+            for bucket_y in range(min_y, max_y + 1):
+                entries = self._buckets.get((bucket_x, bucket_y))
+
+                if not entries:
+                    continue
+
+                for path_id, (path_start, path_end, entry_type) in entries.items():
+                    if path_type is not None and entry_type != path_type:
+                        continue
+
+                    start_squared = (path_start[0] - start[0]) ** 2 + (path_start[1] - start[1]) ** 2
+
+                    if start_squared > radius_squared:
+                        continue
+
+                    distance = start_squared ** 0.5
+
+                    if end is not None:
+                        end_squared = (path_end[0] - end[0]) ** 2 + (path_end[1] - end[1]) ** 2
+
+                        if end_squared > radius_squared:
+                            continue
+
+                        distance += end_squared ** 0.5
+
+                    matches.append((path_id, distance))
+
+        matches.sort(key=lambda match: match[1])
+        return matches
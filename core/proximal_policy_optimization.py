@@ -3,8 +3,11 @@ import tensorflow as tf
 import gym
 from datetime import datetime
 import time
+from functools import partial
 import roboschool
 
+from vec_env import SubprocVecEnv
+
 def mlp(x, hidden_layers, output_layer, activation=tf.tanh, last_activation=None):
     '''
     Multi-layer perceptron
@@ -142,7 +145,7 @@ def PPO(env_name, hidden_sizes=[32], cr_lr=5e-3, ac_lr=5e-3, num_epochs=50, mini
     gamma: discount factor
     lam: lambda parameter for computing the GAE
     number_envs: number of parallel synchronous environments
-        # NB: it isn't distributed across multiple CPUs
+        # NB: each runs in its own worker process; the policy picks all their actions in one run
     eps: Clip threshold. Max deviation from previous policy.
     actor_iter: Number of SGD iterations on the actor per epoch
     critic_iter: NUmber of SGD iterations on the critic per epoch
@@ -154,19 +157,19 @@ def PPO(env_name, hidden_sizes=[32], cr_lr=5e-3, ac_lr=5e-3, num_epochs=50, mini
     tf.reset_default_graph()
 
     # Create some environments to collect the trajectories
-    envs = [StructEnv(gym.make(env_name)) for _ in range(number_envs)]
+    envs = SubprocVecEnv([partial(gym.make, env_name) for _ in range(number_envs)])
     
-    obs_dim = envs[0].observation_space.shape
+    obs_dim = envs.observation_space.shape
 
     # Placeholders
     if action_type == 'Discrete':
-        act_dim = envs[0].action_space.n 
+        act_dim = envs.action_space.n 
         act_ph = tf.placeholder(shape=(None,), dtype=tf.int32, name='act')
 
     elif action_type == 'Box':
-        low_action_space = envs[0].action_space.low
-        high_action_space = envs[0].action_space.high
-        act_dim = envs[0].action_space.shape[0]
+        low_action_space = envs.action_space.low
+        high_action_space = envs.action_space.high
+        act_dim = envs.action_space.shape[0]
         act_ph = tf.placeholder(shape=(None,act_dim), dtype=tf.float32, name='act')
 
     obs_ph = tf.placeholder(shape=(None, obs_dim[0]), dtype=tf.float32, name='obs')
@@ -249,6 +252,9 @@ def PPO(env_name, hidden_sizes=[32], cr_lr=5e-3, ac_lr=5e-3, num_epochs=50, mini
     
     print('Env batch size:',steps_per_env, ' Batch size:',steps_per_env*number_envs)
 
+    # first observation of every environment
+    obs = envs.reset()
+
     for ep in range(num_epochs):
         # Create the buffer that will contain the trajectories (full or partial) 
         # run with the last policy
@@ -257,43 +263,43 @@ def PPO(env_name, hidden_sizes=[32], cr_lr=5e-3, ac_lr=5e-3, num_epochs=50, mini
         batch_rew = []
         batch_len = []
 
-        # Execute in serial the environments, storing temporarily the trajectories. 
-        for env in envs:
-            temp_buf = []
+        # Step all the environments together, storing temporarily the trajectory of each
+        temp_bufs = [[] for _ in range(number_envs)]
 
-            #iterate over a fixed number of steps
-            for _ in range(steps_per_env):
+        #iterate over a fixed number of steps
+        for _ in range(steps_per_env):
 
-                # run the policy
-                act, val = sess.run([act_smp, s_values], feed_dict={obs_ph:[env.n_obs]})
-                act = np.squeeze(act)
+            # run the policy on the observations of all the environments at once
+            acts, vals = sess.run([act_smp, s_values], feed_dict={obs_ph:obs})
+            acts = np.reshape(acts, (number_envs,) + np.shape(acts)[-1:] if action_type == 'Box' else (number_envs,))
+            vals = np.reshape(vals, (number_envs,))
 
-                # take a step in the environment
-                obs2, rew, done, _ = env.step(act)
-                
-                # add the new transition to the temporary buffer
-                temp_buf.append([env.n_obs.copy(), rew, act, np.squeeze(val)])
+            # take a step in every environment (finished ones are reset by the workers)
+            obs2, rews, dones, infos = envs.step(acts)
 
-                env.n_obs = obs2.copy()
-                step_count += 1
+            for i in range(number_envs):
+                # add the new transition to the temporary buffer
+                temp_buf = temp_bufs[i]
+                temp_buf.append([obs[i].copy(), rews[i], acts[i], vals[i]])
 
-                if done:
+                if dones[i]:
                     # Store the full trajectory in the buffer 
                     # (the value of the last state is 0 as the trajectory is completed)
                     buffer.store(np.array(temp_buf), 0)
 
                     # Empty temporary buffer
-                    temp_buf = []
-                    
-                    batch_rew.append(env.get_episode_reward())
-                    batch_len.append(env.get_episode_length())
+                    temp_bufs[i] = []
                     
-                    # reset the environment
-                    env.reset()                 
+                    batch_rew.append(infos[i]['episode']['r'])
+                    batch_len.append(infos[i]['episode']['l'])
+
+            obs = obs2
+            step_count += number_envs
 
-            # Bootstrap with the estimated state value of the next state!
-            last_v = sess.run(s_values, feed_dict={obs_ph:[env.n_obs]})
-            buffer.store(np.array(temp_buf), np.squeeze(last_v))
+        # Bootstrap with the estimated state value of the next state!
+        last_v = np.reshape(sess.run(s_values, feed_dict={obs_ph:obs}), (number_envs,))
+        for temp_buf, last_sv in zip(temp_bufs, last_v):
+            buffer.store(np.array(temp_buf), last_sv)
 
 
         # Gather the entire batch from the buffer
@@ -341,8 +347,7 @@ def PPO(env_name, hidden_sizes=[32], cr_lr=5e-3, ac_lr=5e-3, num_epochs=50, mini
             print('Ep:%d Rew:%.2f -- Step:%d' % (ep, np.mean(batch_rew), step_count))
 
     # closing environments..
-    for env in envs:
-        env.close()
+    envs.close()
 
     # Close the writer
     file_writer.close()
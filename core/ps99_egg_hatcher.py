@@ -16,7 +16,25 @@ from typing import Dict, List, Optional, Tuple, Any
 import threading
 import queue
 
+from .color_segmentation import ColorSegmentationEngine
+from .template_bank import BatchTemplateMatcher
+from .capture_backends import get_default_backend
+
 class PS99EggHatcher:
+    # Egg color ranges (these would need to be calibrated for PS99)
+    EGG_COLOR_RANGES = {
+        # Common Egg (gray/white)
+        'Common Egg': (np.array([0, 0, 200]), np.array([180, 30, 255])),
+        # Uncommon Egg (green)
+        'Uncommon Egg': (np.array([50, 100, 100]), np.array([70, 255, 255])),
+        # Rare Egg (blue)
+        'Rare Egg': (np.array([100, 100, 100]), np.array([130, 255, 255])),
+        # Epic Egg (purple)
+        'Epic Egg': (np.array([130, 100, 100]), np.array([160, 255, 255])),
+        # Legendary Egg (gold/yellow)
+        'Legendary Egg': (np.array([20, 100, 100]), np.array([30, 255, 255])),
+    }
+    
     def __init__(self, logger=None):
         self.logger = logger or logging.getLogger(__name__)
         self.eggs_data = {}
@@ -30,12 +48,21 @@ class PS99EggHatcher:
         # Screen detection settings
         self.game_window = None
         self.last_screenshot = None
+        self.capture_backend = get_default_backend()
+        
+        # All egg colors are classified in a single pass per screenshot
+        self.egg_color_engine = ColorSegmentationEngine(self.EGG_COLOR_RANGES)
         
         # Load PS99 data
         self.load_ps99_data()
         
+        # Hatch popup search area as fractions (x, y, w, h) of the screenshot;
+        # None searches the whole screenshot (would need calibration for PS99 UI)
+        self.hatch_popup_roi = (0.25, 0.15, 0.5, 0.7)
+        
         # Initialize pet detection templates
         self.pet_templates = {}
+        self.pet_matcher = BatchTemplateMatcher()
         self.load_pet_templates()
         
     def load_ps99_data(self):
@@ -71,6 +98,7 @@ class PS99EggHatcher:
                 template = cv2.imread(str(template_file))
                 if template is not None:
                     self.pet_templates[pet_name] = template
+                    self.pet_matcher.add_template(pet_name, template)
                     
             self.logger.info(f"Loaded {len(self.pet_templates)} pet templates")
         except Exception as e:
@@ -102,10 +130,7 @@ class PS99EggHatcher:
             if self.game_window:
                 # Get window region
                 left, top, width, height = self.game_window.left, self.game_window.top, self.game_window.width, self.game_window.height
-                screenshot = pyautogui.screenshot(region=(left, top, width, height))
-                
-                # Convert to OpenCV format
-                screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+                screenshot_cv = self.capture_backend.grab((left, top, width, height))
                 self.last_screenshot = screenshot_cv
                 return screenshot_cv
             else:
@@ -121,43 +146,17 @@ class PS99EggHatcher:
         detected_eggs = []
         
         try:
-            # Convert to HSV for better color detection
-            hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
-            
-            # Define egg color ranges (these would need to be calibrated for PS99)
-            egg_color_ranges = [
-                # Common Egg (gray/white)
-                {'name': 'Common Egg', 'lower': np.array([0, 0, 200]), 'upper': np.array([180, 30, 255])},
-                # Uncommon Egg (green)
-                {'name': 'Uncommon Egg', 'lower': np.array([50, 100, 100]), 'upper': np.array([70, 255, 255])},
-                # Rare Egg (blue)
-                {'name': 'Rare Egg', 'lower': np.array([100, 100, 100]), 'upper': np.array([130, 255, 255])},
-                # Epic Egg (purple)
-                {'name': 'Epic Egg', 'lower': np.array([130, 100, 100]), 'upper': np.array([160, 255, 255])},
-                # Legendary Egg (gold/yellow)
-                {'name': 'Legendary Egg', 'lower': np.array([20, 100, 100]), 'upper': np.array([30, 255, 255])},
-            ]
+            # Minimum egg size: area > 500
+            detections = self.egg_color_engine.detect(screenshot, min_area=501)
             
-            for egg_range in egg_color_ranges:
-                # Create mask for egg color
-                mask = cv2.inRange(hsv, egg_range['lower'], egg_range['upper'])
-                
-                # Find contours
-                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for contour in contours:
-                    area = cv2.contourArea(contour)
-                    if area > 500:  # Minimum egg size
-                        x, y, w, h = cv2.boundingRect(contour)
-                        center_x = x + w // 2
-                        center_y = y + h // 2
-                        
-                        detected_eggs.append({
-                            'name': egg_range['name'],
-                            'position': (center_x, center_y),
-                            'area': area,
-                            'bounds': (x, y, w, h)
-                        })
+            for egg_name, components in detections.items():
+                for component in components:
+                    detected_eggs.append({
+                        'name': egg_name,
+                        'position': component['center'],
+                        'area': component['area'],
+                        'bounds': component['bbox']
+                    })
                         
         except Exception as e:
             self.logger.error(f"Error detecting eggs: {e}")
@@ -169,29 +168,26 @@ class PS99EggHatcher:
         detected_pets = []
         
         try:
-            # Look for pet popup/notification areas (would need calibration for PS99 UI)
-            gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
+            # Look for pets in the hatch popup area only
+            roi = None
+            if self.hatch_popup_roi:
+                height, width = screenshot.shape[:2]
+                fx, fy, fw, fh = self.hatch_popup_roi
+                roi = (int(fx * width), int(fy * height), int(fw * width), int(fh * height))
             
-            # Template matching for known pet appearances
-            for pet_name, template in self.pet_templates.items():
-                template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-                result = cv2.matchTemplate(gray, template_gray, cv2.TM_CCOEFF_NORMED)
+            # One batched match over all pet templates, best hit per pet after NMS
+            for match in self.pet_matcher.match(screenshot, threshold=0.8, roi=roi):
+                detected_pets.append({
+                    'name': match.name,
+                    'position': match.bbox[:2],
+                    'confidence': match.confidence,
+                    'timestamp': datetime.now()
+                })
                 
-                threshold = 0.8
-                locations = np.where(result >= threshold)
-                
-                for pt in zip(*locations[::-1]):
-                    detected_pets.append({
-                        'name': pet_name,
-                        'position': pt,
-                        'confidence': result[pt[1], pt[0]],
-                        'timestamp': datetime.now()
-                    })
-                    
-                    # Check if this is a target pet
-                    if pet_name in self.target_pets:
-                        self.logger.info(f"🎉 TARGET PET HATCHED: {pet_name}!")
-                        self.notify_target_pet_hatched(pet_name)
+                # Check if this is a target pet
+                if match.name in self.target_pets:
+                    self.logger.info(f"🎉 TARGET PET HATCHED: {match.name}!")
+                    self.notify_target_pet_hatched(match.name)
                         
         except Exception as e:
             self.logger.error(f"Error detecting hatched pets: {e}")
@@ -110,6 +110,10 @@ def add_ps99_zones_worlds_endpoints(app):
                 if hasattr(game_bot, 'learning_system'):
                     game_bot.learning_system.add_experience(knowledge_update)
                 
+                # Zone layouts cached by the vision system belong to the old location
+                if hasattr(game_bot, 'enhanced_vision_system'):
+                    game_bot.enhanced_vision_system.enter_zone(location_name)
+                
                 return app.response_class(
                     response=json.dumps({
                         'success': True,
@@ -0,0 +1,478 @@
+"""
+Replay Buffer
+Preallocated NumPy experience replay: transitions are written into fixed
+arrays at a circular index and batches are gathered with one take() per
+field, with proportional prioritized sampling on sum/min segment trees
+(O(log N) per sampled index and per priority update)
+"""
+
+import logging
+import operator
+from typing import Optional, Tuple, Dict, Any, Union
+
+import numpy as np
+
+
+def storage_dtype(value: np.ndarray) -> np.dtype:
+    """Array dtype used to store values like this one: uint8/bool kept, other ints int64, the rest float32"""
+    if value.dtype == np.uint8 or value.dtype == np.bool_:
+        return value.dtype
+    if np.issubdtype(value.dtype, np.integer):
+        return np.dtype(np.int64)
+    return np.dtype(np.float32)
+
+
+class SegmentTree:
+    """
+    Binary segment tree over capacity leaves in one array
+
+    Node i has children 2i and 2i + 1 and the root is node 1; leaves start
+    at `leaves` (capacity rounded up to a power of two). Unused leaves hold
+    the neutral element of the operation.
+    """
+
+    def __init__(self, capacity: int, operation: np.ufunc, neutral: float):
+        self.capacity = capacity
+        self.operation = operation
+        self.neutral = neutral
+
+        # Python scalar equivalent for single-leaf updates (ufuncs on scalars are slow)
+        self._combine = {np.add: operator.add, np.minimum: min, np.maximum: max}.get(operation, operation)
+
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+
+        self.tree = np.full(2 * self.leaves, neutral, dtype=np.float64)
+
+    def set(self, index: int, value: float):
+        """Set one leaf and refresh its ancestors"""
+        tree = self.tree
+        combine = self._combine
+        node = index + self.leaves
+        tree[node] = value
+
+        node //= 2
+        while node:
+            tree[node] = combine(float(tree[2 * node]), float(tree[2 * node + 1]))
+            node //= 2
+
+    def update(self, indices: np.ndarray, values: np.ndarray):
+        """Set a batch of leaves and refresh each affected ancestor once per level"""
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaves
+        self.tree[nodes] = values
+
+        nodes = np.unique(nodes // 2)
+        while nodes[0]:
+            self.tree[nodes] = self.operation(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+            nodes = np.unique(nodes // 2)
+
+    def get(self, indices: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        return self.tree[np.asarray(indices) + self.leaves]
+
+    def root(self) -> float:
+        """The operation reduced over all leaves"""
+        return float(self.tree[1])
+
+    def find_prefix(self, values: np.ndarray) -> np.ndarray:
+        """
+        For a sum tree: the leaf where each running total reaches the given value
+
+        All values descend the tree together, one level per step.
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+
+        while nodes[0] < self.leaves:
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            right = values >= left_sums
+
+            values -= left_sums * right
+            nodes = left + right
+
+        return nodes - self.leaves
+
+    def clear(self):
+        self.tree.fill(self.neutral)
+
+
+class ReplayBuffer:
+    """
+    Circular experience replay in preallocated arrays
+
+    Observation and action layouts are taken from the first transition
+    unless given: integer actions are stored as int64, float data as
+    float32, and uint8 observations (e.g. ObservationStack planes) stay
+    uint8 at a quarter of the float32 memory. sample() returns C-contiguous
+    arrays ready for torch.from_numpy / torch.as_tensor.
+
+    With prioritized set, transitions are drawn with probability
+    proportional to priority ** alpha (stratified over the total priority)
+    and batches carry importance-sampling weights (N * P(i)) ** -beta
+    normalized by the largest possible weight; beta is annealed towards 1
+    by beta_increment per batch. New transitions get the largest priority
+    seen so far, so each is replayed at least once with high probability.
+    """
+
+    def __init__(self, capacity: int = 100000, observation_shape: Optional[Tuple[int, ...]] = None,
+                 observation_dtype: Any = None, action_shape: Optional[Tuple[int, ...]] = None,
+                 action_dtype: Any = None, prioritized: bool = False, alpha: float = 0.6, beta: float = 0.4,
+                 beta_increment: float = 0.0, epsilon: float = 1e-6, seed: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.rng = np.random.default_rng(seed)
+
+        self.observation_shape = tuple(observation_shape) if observation_shape is not None else None
+        self.observation_dtype = np.dtype(observation_dtype) if observation_dtype is not None else None
+        self.action_shape = tuple(action_shape) if action_shape is not None else None
+        self.action_dtype = np.dtype(action_dtype) if action_dtype is not None else None
+
+        self.observations = None
+        self.actions = None
+        self.rewards = None
+        self.next_observations = None
+        self.dones = None
+
+        self.cursor = 0
+        self.size = 0
+        self.total_added = 0
+
+        if prioritized:
+            self.sum_tree = SegmentTree(capacity, np.add, 0.0)
+            self.min_tree = SegmentTree(capacity, np.minimum, np.inf)
+            self.max_priority = 1.0
+
+        if self.observation_shape is not None and self.action_shape is not None:
+            self._allocate()
+
+    def _allocate(self, observation: Optional[np.ndarray] = None, action: Any = None):
+        """Create the arrays, inferring layouts the constructor did not give"""
+        if self.observation_shape is None or self.observation_dtype is None:
+            observation = np.asarray(observation)
+            self.observation_shape = self.observation_shape or observation.shape
+            self.observation_dtype = self.observation_dtype or storage_dtype(observation)
+
+        if self.action_shape is None or self.action_dtype is None:
+            action = np.asarray(action)
+            self.action_shape = action.shape if self.action_shape is None else self.action_shape
+            self.action_dtype = self.action_dtype or storage_dtype(action)
+
+        # np.zeros maps pages lazily, so an unfilled buffer costs little memory
+        self._allocate_observations()
+        self.actions = np.zeros((self.capacity,) + self.action_shape, dtype=self.action_dtype)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.dones = np.zeros(self.capacity, dtype=np.bool_)
+
+        self.logger.info(f"Replay buffer allocated: {self.capacity} x {self.observation_shape} "
+                         f"{self.observation_dtype} ({self.nbytes / 1e9:.2f} GB)")
+
+    def _allocate_observations(self):
+        self.observations = np.zeros((self.capacity,) + self.observation_shape, dtype=self.observation_dtype)
+        self.next_observations = np.zeros((self.capacity,) + self.observation_shape, dtype=self.observation_dtype)
+
+    def _store_observations(self, index: int, observation: np.ndarray, next_observation: np.ndarray,
+                            env_id: int = 0):
+        self.observations[index] = observation
+        self.next_observations[index] = next_observation
+
+    def _gather_observations(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.observations.take(indices, axis=0), self.next_observations.take(indices, axis=0)
+
+    def _storage_arrays(self) -> Tuple[np.ndarray, ...]:
+        return self.observations, self.next_observations, self.actions, self.rewards, self.dones
+
+    @property
+    def nbytes(self) -> int:
+        if self.actions is None:
+            return 0
+
+        return sum(array.nbytes for array in self._storage_arrays())
+
+    def _is_live(self, indices: np.ndarray) -> np.ndarray:
+        """Whether indices hold one of the newest `size` transitions"""
+        return (indices >= 0) & (indices < self.capacity) & \
+            ((indices - (self.cursor - self.size)) % self.capacity < self.size)
+
+    def add(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float,
+            next_observation: np.ndarray, done: bool, priority: Optional[float] = None, env_id: int = 0) -> int:
+        """
+        Store one transition, overwriting the oldest when full; returns its index
+
+        env_id identifies the environment the transition came from when
+        several environments feed one buffer (see FrameStackReplayBuffer).
+        """
+        if self.actions is None:
+            self._allocate(observation, action)
+
+        index = self.cursor
+
+        self._store_observations(index, observation, next_observation, env_id)
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.dones[index] = done
+
+        if self.prioritized:
+            priority = self.max_priority if priority is None else abs(priority) + self.epsilon
+            self.max_priority = max(self.max_priority, priority)
+
+            scaled = priority ** self.alpha
+            self.sum_tree.set(index, scaled)
+            self.min_tree.set(index, scaled)
+
+        self.cursor = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.total_added += 1
+
+        return index
+
+    def sample(self, batch_size: int, beta: Optional[float] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Batch of transitions with their indices and importance-sampling weights, or None while too small"""
+        if self.size < batch_size:
+            return None
+
+        if self.prioritized:
+            indices, weights = self._sample_prioritized(batch_size, self.beta if beta is None else beta)
+            self.beta = min(1.0, self.beta + self.beta_increment)
+        else:
+            # Live transitions are the newest `size` ones, ending before the cursor
+            offsets = self.rng.integers(0, self.size, size=batch_size)
+            indices = (self.cursor - self.size + offsets) % self.capacity
+            weights = np.ones(batch_size, dtype=np.float32)
+
+        observations, next_observations = self._gather_observations(indices)
+
+        return {
+            'observations': observations,
+            'actions': self.actions.take(indices, axis=0),
+            'rewards': self.rewards.take(indices),
+            'next_observations': next_observations,
+            'dones': self.dones.take(indices),
+            'indices': indices,
+            'weights': weights
+        }
+
+    def _sample_prioritized(self, batch_size: int, beta: float) -> Tuple[np.ndarray, np.ndarray]:
+        total = self.sum_tree.root()
+
+        # One draw per equal slice of the total priority
+        targets = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        indices = self.sum_tree.find_prefix(targets)
+
+        # Rounding can carry a draw onto an empty leaf; use the newest transition instead
+        probabilities = self.sum_tree.get(indices) / total
+        empty = probabilities <= 0
+
+        if empty.any():
+            indices[empty] = (self.cursor - 1) % self.capacity
+            probabilities[empty] = self.sum_tree.get(indices[empty]) / total
+
+        smallest = self.min_tree.root() / total
+
+        # (N * P(i)) ** -beta / (N * min P) ** -beta
+        weights = (probabilities / smallest) ** -beta
+
+        return indices, weights.astype(np.float32)
+
+    def update_priorities(self, indices: np.ndarray, priorities: np.ndarray):
+        """Set new priorities (e.g. absolute TD errors) for sampled transitions"""
+        if not self.prioritized:
+            return
+
+        indices = np.asarray(indices, dtype=np.int64)
+        priorities = np.abs(np.asarray(priorities, dtype=np.float64)) + self.epsilon
+
+        valid = self._is_live(indices)
+        indices, priorities = indices[valid], priorities[valid]
+
+        if len(indices) == 0:
+            return
+
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+        scaled = priorities ** self.alpha
+        self.sum_tree.update(indices, scaled)
+        self.min_tree.update(indices, scaled)
+
+    def clear(self):
+        self.cursor = 0
+        self.size = 0
+
+        if self.prioritized:
+            self.sum_tree.clear()
+            self.min_tree.clear()
+            self.max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            'size': self.size,
+            'capacity': self.capacity,
+            'total_added': self.total_added,
+            'observation_shape': self.observation_shape,
+            'observation_dtype': str(self.observation_dtype),
+            'memory_mb': self.nbytes / 1e6,
+            'prioritized': self.prioritized
+        }
+
+        if self.prioritized:
+            stats['max_priority'] = self.max_priority
+            stats['beta'] = self.beta
+
+        return stats
+
+
+class FrameStackReplayBuffer(ReplayBuffer):
+    """
+    Replay of frame-stack observations that stores every frame once
+
+    Frames go into one ring and each transition keeps the ring positions of
+    its observation and next-observation planes; sample() rebuilds the
+    stacks with one take() each. Consecutive transitions of an episode
+    share all but one plane, so a step costs one frame instead of
+    2 * stack_size: a next observation that extends the observation by one
+    plane adds that plane only, and an observation equal to the previous
+    next observation of the same env_id reuses its planes, so interleaved
+    environments (VecEnvCollector) each continue their own episode. Repeated planes within a stack
+    (e.g. the first frame standing in for missing history after
+    ObservationStack.reset()) are stored once. Stacks never mix episodes,
+    since each stack is stored as given.
+
+    When the frame ring wraps over planes still referenced by the oldest
+    transitions, those transitions are dropped; frame_capacity defaults to
+    capacity plus a margin for episode starts, which add one extra frame
+    (enough for episodes of 8 steps or more).
+    """
+
+    def __init__(self, capacity: int = 100000, stack_size: int = 4, stack_dimension: str = "first",
+                 frame_capacity: Optional[int] = None, **kwargs):
+        self.stack_size = stack_size
+        self.stack_dimension = stack_dimension
+        self.frame_capacity = frame_capacity or capacity + capacity // 8 + 2 * stack_size
+
+        self.frames = None
+        self.observation_frames = None
+        self.next_frames = None
+
+        # Absolute frame numbers: frames_written counts every stored plane,
+        # oldest_frame holds the oldest plane each transition references
+        self.frames_written = 0
+        self.oldest_frame = None
+
+        # Ring positions of the last next observation per env_id
+        self._last_next = {}
+
+        self.frame_stats = {'planes_offered': 0, 'planes_stored': 0, 'evicted': 0}
+
+        super().__init__(capacity=capacity, **kwargs)
+
+    def _planes(self, stack: np.ndarray) -> np.ndarray:
+        """A stack as (stack_size, H, W) planes"""
+        stack = np.asarray(stack)
+        return np.moveaxis(stack, -1, 0) if self.stack_dimension == "last" else stack
+
+    def _allocate_observations(self):
+        plane_shape = self.observation_shape[:-1] if self.stack_dimension == "last" else self.observation_shape[1:]
+
+        self.frames = np.zeros((self.frame_capacity,) + tuple(plane_shape), dtype=self.observation_dtype)
+        self.observation_frames = np.zeros((self.capacity, self.stack_size), dtype=np.int64)
+        self.next_frames = np.zeros((self.capacity, self.stack_size), dtype=np.int64)
+        self.oldest_frame = np.zeros(self.capacity, dtype=np.int64)
+
+    def _storage_arrays(self) -> Tuple[np.ndarray, ...]:
+        return (self.frames, self.observation_frames, self.next_frames, self.oldest_frame,
+                self.actions, self.rewards, self.dones)
+
+    def _push_frame(self, plane: np.ndarray) -> int:
+        self.frames[self.frames_written % self.frame_capacity] = plane
+        self.frames_written += 1
+        self.frame_stats['planes_stored'] += 1
+
+        return self.frames_written - 1
+
+    def _push_stack(self, planes: np.ndarray) -> np.ndarray:
+        ids = np.empty(self.stack_size, dtype=np.int64)
+
+        for position in range(self.stack_size):
+            if position and np.array_equal(planes[position], planes[position - 1]):
+                ids[position] = ids[position - 1]
+            else:
+                ids[position] = self._push_frame(planes[position])
+
+        return ids
+
+    def _store_observations(self, index: int, observation: np.ndarray, next_observation: np.ndarray,
+                            env_id: int = 0):
+        planes = self._planes(observation)
+        next_planes = self._planes(next_observation)
+        self.frame_stats['planes_offered'] += 2 * self.stack_size
+
+        # Continuing an episode: the observation is this environment's previous next observation
+        last_next = self._last_next.get(env_id)
+        if last_next is not None and np.array_equal(self.frames[last_next % self.frame_capacity], planes):
+            observation_ids = last_next
+        else:
+            observation_ids = self._push_stack(planes)
+
+        if np.array_equal(next_planes[:-1], planes[1:]):
+            next_ids = np.append(observation_ids[1:], self._push_frame(next_planes[-1]))
+        else:
+            next_ids = self._push_stack(next_planes)
+
+        self.observation_frames[index] = observation_ids
+        self.next_frames[index] = next_ids
+        self.oldest_frame[index] = min(observation_ids.min(), next_ids.min())
+        self._last_next[env_id] = next_ids
+
+    def add(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float,
+            next_observation: np.ndarray, done: bool, priority: Optional[float] = None, env_id: int = 0) -> int:
+        index = super().add(observation, action, reward, next_observation, done, priority, env_id)
+
+        if done:
+            self._last_next.pop(env_id, None)
+
+        # Drop the oldest transitions whose planes the frame ring overwrote
+        while self.size > 1:
+            oldest = (self.cursor - self.size) % self.capacity
+
+            if self.oldest_frame[oldest] >= self.frames_written - self.frame_capacity:
+                break
+
+            if self.prioritized:
+                self.sum_tree.set(oldest, 0.0)
+                self.min_tree.set(oldest, np.inf)
+
+            self.size -= 1
+            self.frame_stats['evicted'] += 1
+
+        return index
+
+    def _gather_observations(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        observations = self.frames.take(self.observation_frames[indices] % self.frame_capacity, axis=0)
+        next_observations = self.frames.take(self.next_frames[indices] % self.frame_capacity, axis=0)
+
+        if self.stack_dimension == "last":
+            observations = np.ascontiguousarray(np.moveaxis(observations, 1, -1))
+            next_observations = np.ascontiguousarray(np.moveaxis(next_observations, 1, -1))
+
+        return observations, next_observations
+
+    def clear(self):
+        super().clear()
+        self._last_next = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats.update(self.frame_stats)
+        stats['frame_capacity'] = self.frame_capacity
+        stats['frames_per_transition'] = self.frame_stats['planes_stored'] / max(self.total_added, 1)
+
+        return stats
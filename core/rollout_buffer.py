@@ -0,0 +1,217 @@
+"""
+Rollout Buffer
+Preallocated on-policy rollout storage for PPO-style updates: steps are
+written into fixed arrays, advantages are computed with a vectorized
+reverse-scan GAE once the rollout is finished, and updates iterate over
+shuffled minibatch indices
+"""
+
+import logging
+from typing import Optional, Tuple, Dict, Any, Iterator, Union
+
+import numpy as np
+
+from .replay_buffer import storage_dtype
+
+try:
+    from scipy.signal import lfilter
+    SCIPY_AVAILABLE = True
+except Exception:
+    SCIPY_AVAILABLE = False
+
+
+def discount_cumsum(values: np.ndarray, discount: float) -> np.ndarray:
+    """y[t] = x[t] + discount * y[t + 1] along the first axis"""
+    values = np.asarray(values, dtype=np.float64)
+
+    if SCIPY_AVAILABLE:
+        # IIR filter over the reversed sequence: one C loop instead of T Python steps
+        return lfilter([1.0], [1.0, -discount], values[::-1], axis=0)[::-1]
+
+    result = np.empty_like(values)
+    running = np.zeros(values.shape[1:])
+
+    for t in range(len(values) - 1, -1, -1):
+        running = values[t] + discount * running
+        result[t] = running
+
+    return result
+
+
+def compute_gae(rewards: np.ndarray, values: np.ndarray, dones: np.ndarray, last_value: Union[float, np.ndarray],
+                gamma: float = 0.99, gae_lambda: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generalized Advantage Estimation over a rollout: (advantages, returns)
+
+    Arrays are (T,) or (T, num_envs). dones[t] marks that the episode ended
+    after step t, so neither the bootstrap value nor the advantage carries
+    across it; last_value bootstraps the state after the final step.
+    """
+    rewards = np.asarray(rewards, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    not_done = 1.0 - np.asarray(dones, dtype=np.float64)
+
+    last_value = np.asarray(last_value, dtype=np.float64).reshape((1,) + values.shape[1:])
+    next_values = np.concatenate([values[1:], last_value])
+    deltas = rewards + gamma * next_values * not_done - values
+
+    decay = gamma * gae_lambda
+
+    if values.ndim == 1:
+        # Episodes are independent discounted sums: filter each segment at once
+        ends = np.flatnonzero(not_done == 0) + 1
+        advantages = np.concatenate([discount_cumsum(segment, decay)
+                                     for segment in np.split(deltas, ends) if len(segment)])
+    else:
+        # Reverse scan over time, vectorized across environments
+        advantages = np.empty_like(deltas)
+        running = np.zeros(deltas.shape[1:])
+
+        for t in range(len(deltas) - 1, -1, -1):
+            running = deltas[t] + decay * not_done[t] * running
+            advantages[t] = running
+
+    returns = advantages + values
+
+    return advantages.astype(np.float32), returns.astype(np.float32)
+
+
+class RolloutBuffer:
+    """
+    Fixed-length rollout in preallocated arrays
+
+    Each of the size steps holds one transition per environment (arrays
+    are (size, num_envs, ...)); with num_envs == 1, add() also takes
+    unbatched values. Layouts are taken from the first step, as in
+    ReplayBuffer. After finish(last_value) the buffer holds advantages and
+    returns, get() returns every field flattened to (steps * num_envs, ...)
+    and minibatches() yields shuffled index arrays into it covering the
+    rollout once per epoch.
+    """
+
+    def __init__(self, size: int = 2048, gamma: float = 0.99, gae_lambda: float = 0.95,
+                 num_envs: int = 1, seed: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+
+        self.size = size
+        self.num_envs = num_envs
+        self.gamma = gamma
+        self.gae_lambda = gae_lambda
+        self.rng = np.random.default_rng(seed)
+
+        shape = (size, num_envs)
+        self.observations = None
+        self.actions = None
+        self.rewards = np.zeros(shape, dtype=np.float32)
+        self.values = np.zeros(shape, dtype=np.float32)
+        self.log_probs = np.zeros(shape, dtype=np.float32)
+        self.dones = np.zeros(shape, dtype=np.bool_)
+        self.advantages = np.zeros(shape, dtype=np.float32)
+        self.returns = np.zeros(shape, dtype=np.float32)
+
+        self.position = 0
+        self.finished = False
+
+    def _allocate(self, observations: np.ndarray, actions: Any):
+        """Arrays for a first step of per-environment observations and actions"""
+        self.observations = np.zeros((self.size, self.num_envs) + observations.shape[1:],
+                                     dtype=storage_dtype(observations))
+        self.actions = np.zeros((self.size, self.num_envs) + actions.shape[1:], dtype=storage_dtype(actions))
+
+    @property
+    def full(self) -> bool:
+        return self.position >= self.size
+
+    def __len__(self):
+        return self.position
+
+    def add(self, observation: np.ndarray, action: Union[int, np.ndarray], reward: float, value: float,
+            log_prob: float, done: bool, batched: bool = False):
+        """
+        Store one step
+
+        Values are per environment (leading num_envs axis) when batched is
+        set; otherwise they are a single environment's and num_envs must be 1.
+        """
+        if self.full:
+            raise RuntimeError("Rollout buffer is full; finish() and reset() it first")
+
+        observation = np.asarray(observation)
+        action = np.asarray(action)
+
+        if not batched:
+            observation = observation[np.newaxis]
+            action = action[np.newaxis]
+
+        if self.observations is None:
+            self._allocate(observation, action)
+
+        index = self.position
+
+        self.observations[index] = observation
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.values[index] = value
+        self.log_probs[index] = log_prob
+        self.dones[index] = done
+
+        self.position += 1
+        self.finished = False
+
+    def end_episode(self):
+        """Mark the last stored step as the end of its episode (e.g. when the steps after it were lost)"""
+        if self.position:
+            self.dones[self.position - 1] = True
+
+    def finish(self, last_value: Union[float, np.ndarray] = 0.0):
+        """
+        Compute advantages and returns
+
+        last_value is the value of the state after the last step, per
+        environment (zero where that step ended an episode).
+        """
+        count = self.position
+        last_value = np.broadcast_to(np.asarray(last_value, dtype=np.float64), (self.num_envs,))
+
+        if self.num_envs == 1:
+            # A single sequence takes the per-episode lfilter path
+            advantages, returns = compute_gae(self.rewards[:count, 0], self.values[:count, 0],
+                                              self.dones[:count, 0], last_value[0], self.gamma, self.gae_lambda)
+            self.advantages[:count, 0], self.returns[:count, 0] = advantages, returns
+        else:
+            self.advantages[:count], self.returns[:count] = compute_gae(
+                self.rewards[:count], self.values[:count], self.dones[:count], last_value,
+                self.gamma, self.gae_lambda
+            )
+
+        self.finished = True
+
+    def get(self) -> Dict[str, np.ndarray]:
+        """The filled part of every field, flattened to (steps * num_envs, ...) (views)"""
+        samples = self.position * self.num_envs
+
+        def flat(array):
+            return array[:self.position].reshape((samples,) + array.shape[2:])
+
+        return {
+            'observations': flat(self.observations),
+            'actions': flat(self.actions),
+            'rewards': flat(self.rewards),
+            'values': flat(self.values),
+            'log_probs': flat(self.log_probs),
+            'dones': flat(self.dones),
+            'advantages': flat(self.advantages),
+            'returns': flat(self.returns)
+        }
+
+    def minibatches(self, minibatch_size: int, shuffle: bool = True) -> Iterator[np.ndarray]:
+        """Index arrays into get() for one pass over the rollout (the last may be shorter)"""
+        samples = self.position * self.num_envs
+        order = self.rng.permutation(samples) if shuffle else np.arange(samples)
+
+        for start in range(0, samples, minibatch_size):
+            yield order[start:start + minibatch_size]
+
+    def reset(self):
+        self.position = 0
+        self.finished = False
@@ -0,0 +1,282 @@
+"""
+Screen State Classifier
+Always-on nearest-centroid classifier that labels every frame's screen state
+(overworld, hatch animation, shop UI, minigame, disconnect dialog) from a tiny
+grayscale thumbnail, so expensive detectors can be gated on it
+"""
+
+import time
+import logging
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Sequence, Iterable, Union
+
+import numpy as np
+import cv2
+
+SCREEN_STATES = ('overworld', 'hatch_animation', 'shop_ui', 'minigame', 'disconnect')
+
+IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.bmp'}
+VIDEO_SUFFIXES = {'.mp4', '.avi', '.mkv', '.mov'}
+
+
+class ScreenStateClassifier:
+    """
+    Nearest-centroid screen state model
+
+    A frame (full resolution, or already reduced such as
+    GameFrame.eighth_resolution_grayscale_frame) is area-resized to a
+    feature_size grayscale thumbnail. Each state is the mean thumbnail of
+    its training frames; features are scaled by the per-pixel spread of the
+    training set so the distance favours pixels that separate states.
+    Frames farther from every centroid than that state's rejection distance
+    are labelled 'unknown'.
+    """
+
+    def __init__(self, feature_size: Tuple[int, int] = (32, 18), rejection_quantile: float = 0.99,
+                 rejection_margin: float = 1.5, temperature: float = 0.25):
+        self.logger = logging.getLogger(__name__)
+
+        self.feature_size = tuple(feature_size)
+        self.rejection_quantile = rejection_quantile
+        self.rejection_margin = rejection_margin
+        self.temperature = temperature
+
+        self.classes = []
+        self.centroids = None
+        self.scale = None
+        self.rejection = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def features(self, frame: np.ndarray) -> np.ndarray:
+        """Flattened float32 thumbnail of one frame"""
+        thumbnail = cv2.resize(frame, self.feature_size, interpolation=cv2.INTER_AREA)
+
+        # Both steps are linear, so converting the thumbnail matches converting the frame
+        if thumbnail.ndim == 3:
+            thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGRA2GRAY if thumbnail.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+        return thumbnail.astype(np.float32).ravel() / 255.0
+
+    def fit(self, frames: Iterable[np.ndarray], labels: Sequence[str]) -> "ScreenStateClassifier":
+        samples = np.stack([self.features(frame) for frame in frames])
+        return self.fit_features(samples, labels)
+
+    def fit_features(self, samples: np.ndarray, labels: Sequence[str]) -> "ScreenStateClassifier":
+        labels = np.asarray(labels)
+
+        if len(samples) != len(labels) or len(samples) == 0:
+            raise ValueError("Need one label per training frame")
+
+        self.classes = sorted(set(labels.tolist()))
+        self.scale = 1.0 / (samples.std(axis=0) + 0.05)
+
+        scaled = samples * self.scale
+        self.centroids = np.stack([scaled[labels == name].mean(axis=0) for name in self.classes])
+
+        # Per-state rejection radius from the spread of its own training frames
+        distances = self._distances(scaled)
+        self.rejection = np.empty(len(self.classes), dtype=np.float64)
+
+        for index, name in enumerate(self.classes):
+            own = distances[labels == name, index]
+            self.rejection[index] = np.quantile(own, self.rejection_quantile) * self.rejection_margin + 1e-6
+
+        self.logger.info(f"Screen state classifier trained on {len(samples)} frames: {self.classes}")
+        return self
+
+    def _distances(self, scaled: np.ndarray) -> np.ndarray:
+        """Root-mean-square distances (samples, classes) between scaled features and centroids"""
+        squared = (scaled * scaled).sum(axis=1)[:, np.newaxis] - 2 * scaled @ self.centroids.T + \
+            (self.centroids * self.centroids).sum(axis=1)[np.newaxis, :]
+
+        return np.sqrt(np.maximum(squared, 0) / scaled.shape[1])
+
+    def predict_features(self, samples: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """(labels, confidences) for a batch of feature vectors"""
+        if not self.is_trained:
+            return ['unknown'] * len(samples), np.zeros(len(samples))
+
+        distances = self._distances(samples * self.scale)
+        nearest = np.argmin(distances, axis=1)
+
+        # Softmax over negative distances as a confidence
+        logits = -distances / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        rows = np.arange(len(samples))
+        rejected = distances[rows, nearest] > self.rejection[nearest]
+
+        labels = [('unknown' if reject else self.classes[index]) for index, reject in zip(nearest, rejected)]
+        return labels, probabilities[rows, nearest]
+
+    def classify(self, frame: np.ndarray) -> Dict[str, Any]:
+        """Screen state of one frame: {'state', 'confidence'}"""
+        labels, confidences = self.predict_features(self.features(frame)[np.newaxis, :])
+        return {'state': labels[0], 'confidence': float(confidences[0])}
+
+    def evaluate(self, frames: Iterable[np.ndarray], labels: Sequence[str]) -> Dict[str, Any]:
+        """
+        Accuracy, per-state recall, confusion counts and per-frame latency on held-out frames
+
+        Latency covers feature extraction and classification of single
+        frames, as in the live loop.
+        """
+        labels = list(labels)
+        predictions = []
+
+        started = time.perf_counter()
+        for frame in frames:
+            predictions.append(self.classify(frame)['state'])
+        duration = time.perf_counter() - started
+
+        names = sorted(set(labels) | set(predictions))
+        confusion = {truth: {name: 0 for name in names} for truth in names}
+
+        for truth, predicted in zip(labels, predictions):
+            confusion[truth][predicted] += 1
+
+        correct = sum(truth == predicted for truth, predicted in zip(labels, predictions))
+        recall = {name: confusion[name][name] / max(sum(confusion[name].values()), 1)
+                  for name in set(labels)}
+
+        return {
+            'frames': len(labels),
+            'accuracy': correct / len(labels) if labels else 0.0,
+            'recall': recall,
+            'confusion': confusion,
+            'avg_latency_us': duration * 1e6 / len(labels) if labels else 0.0
+        }
+
+    def save(self, path: Union[str, Path]):
+        np.savez(path, classes=np.array(self.classes), centroids=self.centroids, scale=self.scale,
+                 rejection=self.rejection, feature_size=np.array(self.feature_size))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ScreenStateClassifier":
+        data = np.load(path)
+
+        classifier = cls(feature_size=tuple(int(value) for value in data['feature_size']))
+        classifier.classes = [str(name) for name in data['classes']]
+        classifier.centroids = data['centroids']
+        classifier.scale = data['scale']
+        classifier.rejection = data['rejection']
+
+        return classifier
+
+
+def load_labelled_frames(root: Union[str, Path], frame_step: int = 1,
+                         max_frames_per_source: Optional[int] = None) -> Tuple[List[np.ndarray], List[str], List[str]]:
+    """
+    Frames, labels and session ids from recorded sessions laid out as root/<state>/<session>
+
+    A session is an image file, a directory of images or a video file;
+    every frame_step-th frame is kept. Session ids let held-out splits keep
+    whole sessions apart, since neighbouring frames are near duplicates.
+    """
+    frames, labels, sessions = [], [], []
+
+    for state_dir in sorted(Path(root).iterdir()):
+        if not state_dir.is_dir():
+            continue
+
+        for source in sorted(state_dir.iterdir()):
+            session = f"{state_dir.name}/{source.name}"
+
+            for frame in _iter_source_frames(source, frame_step, max_frames_per_source):
+                frames.append(frame)
+                labels.append(state_dir.name)
+                sessions.append(session)
+
+    return frames, labels, sessions
+
+
+def _iter_source_frames(source: Path, frame_step: int, max_frames: Optional[int]):
+    count = 0
+
+    if source.is_dir():
+        paths = [path for path in sorted(source.iterdir()) if path.suffix.lower() in IMAGE_SUFFIXES]
+
+        for path in paths[::frame_step]:
+            frame = cv2.imread(str(path))
+
+            if frame is not None:
+                yield frame
+                count += 1
+
+                if max_frames and count >= max_frames:
+                    return
+
+    elif source.suffix.lower() in IMAGE_SUFFIXES:
+        frame = cv2.imread(str(source))
+
+        if frame is not None:
+            yield frame
+
+    elif source.suffix.lower() in VIDEO_SUFFIXES:
+        video = cv2.VideoCapture(str(source))
+        index = 0
+
+        try:
+            while True:
+                success, frame = video.read()
+
+                if not success:
+                    break
+
+                if index % frame_step == 0:
+                    yield frame
+                    count += 1
+
+                    if max_frames and count >= max_frames:
+                        break
+
+                index += 1
+        finally:
+            video.release()
+
+
+def holdout_benchmark(frames: Sequence[np.ndarray], labels: Sequence[str], sessions: Optional[Sequence[str]] = None,
+                      test_fraction: float = 0.2, seed: int = 0,
+                      classifier: Optional[ScreenStateClassifier] = None) -> Tuple[ScreenStateClassifier, Dict[str, Any]]:
+    """
+    Train on part of the frames and evaluate on the rest
+
+    With session ids, whole sessions are held out (at least one per state
+    when a state has several sessions); otherwise frames are split at random.
+    Returns the trained classifier and its evaluation.
+    """
+    rng = np.random.default_rng(seed)
+    labels = list(labels)
+    test = np.zeros(len(labels), dtype=bool)
+
+    if sessions is not None:
+        sessions = np.asarray(sessions)
+        labels_array = np.asarray(labels)
+
+        for state in sorted(set(labels)):
+            state_sessions = np.unique(sessions[labels_array == state])
+
+            if len(state_sessions) < 2:
+                continue
+
+            held = rng.choice(state_sessions, size=max(1, int(round(len(state_sessions) * test_fraction))),
+                              replace=False)
+            test |= np.isin(sessions, held)
+    else:
+        test[rng.permutation(len(labels))[:int(round(len(labels) * test_fraction))]] = True
+
+    train = np.flatnonzero(~test)
+    held_out = np.flatnonzero(test)
+
+    classifier = classifier or ScreenStateClassifier()
+    classifier.fit([frames[index] for index in train], [labels[index] for index in train])
+
+    results = classifier.evaluate([frames[index] for index in held_out], [labels[index] for index in held_out])
+    results['train_frames'] = len(train)
+
+    return classifier, results
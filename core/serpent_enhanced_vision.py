@@ -9,21 +9,16 @@ import threading
 from typing import Optional, Tuple, Any, Dict, List, Union
 from pathlib import Path
 import numpy as np
-from collections import deque
 import cv2
 import json
 
-try:
-    import pyautogui
-    PYAUTOGUI_AVAILABLE = True
-except Exception:
-    PYAUTOGUI_AVAILABLE = False
+from .frame_ring_buffer import FrameRingBuffer
+from .change_detector import FrameChangeDetector, FrameChange
+from .color_segmentation import ColorSegmentationEngine
+from .capture_backends import get_default_backend
+from .frame_pacer import FramePacer
+from .sprite_index import SpriteIndex
 
-try:
-    from PIL import Image
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
 
 class GameFrameBuffer:
     """
@@ -32,72 +27,80 @@ class GameFrameBuffer:
     """
     
     def __init__(self, size: int = 60):
-        self.frames = deque(maxlen=size)
-        self.lock = threading.Lock()
+        self.frames = FrameRingBuffer(size)
+        self.game_states = [None] * size
+        self.lock = self.frames.lock
         self.logger = logging.getLogger(__name__)
         
     def add_frame(self, frame: np.ndarray, timestamp: float = None, game_state: Dict = None):
         """Add a game frame with metadata"""
-        if timestamp is None:
-            timestamp = time.time()
-            
-        frame_data = {
-            'frame': frame,
-            'timestamp': timestamp,
-            'game_state': game_state or {},
-            'frame_id': len(self.frames)
-        }
+        slot = self.frames.acquire_slot(frame.shape, frame.dtype)
+        
+        try:
+            np.copyto(slot, frame)
+        except Exception:
+            self.abort()
+            raise
         
+        self.commit(timestamp, game_state)
+    
+    def acquire_slot(self, frame_shape: Tuple[int, ...]) -> np.ndarray:
+        """Get the next ring slot so a capture can be written in place"""
+        return self.frames.acquire_slot(frame_shape)
+    
+    def commit(self, timestamp: float = None, game_state: Dict = None):
+        """Publish the slot returned by acquire_slot"""
+        self.game_states[self.frames.write_cursor] = game_state or {}
+        self.frames.commit(timestamp)
+    
+    def abort(self):
+        """Release the slot returned by acquire_slot without publishing it"""
+        self.frames.abort()
+    
+    def update_game_state(self, game_state: Dict, index: int = -1):
+        """Attach game state metadata to an already buffered frame"""
         with self.lock:
-            self.frames.append(frame_data)
+            slots = self.frames.get_slots([index])
+            if slots:
+                self.game_states[slots[0]] = game_state
     
     def get_latest_frame(self) -> Optional[np.ndarray]:
         """Get the most recent frame"""
-        with self.lock:
-            if self.frames:
-                return self.frames[-1]['frame']
-            return None
+        return self.frames.get_latest_frame()
     
     def get_frame_stack(self, indices: List[int], stack_dimension: str = "last") -> Optional[np.ndarray]:
         """Get frame stack for temporal learning"""
-        with self.lock:
-            if not self.frames or not indices:
-                return None
-                
-            frames = []
-            for idx in indices:
-                if 0 <= idx < len(self.frames):
-                    frames.append(self.frames[idx]['frame'])
-            
-            if not frames:
-                return None
-                
-            if stack_dimension == "last":
-                return np.stack(frames, axis=-1)
-            elif stack_dimension == "first":
-                return np.stack(frames, axis=0)
-            else:
-                return np.stack(frames, axis=int(stack_dimension))
+        return self.frames.get_frame_stack(indices, stack_dimension)
     
     def get_frames_in_range(self, start_time: float, end_time: float) -> List[np.ndarray]:
         """Get frames within a time range"""
         with self.lock:
-            frames = []
-            for frame_data in self.frames:
-                if start_time <= frame_data['timestamp'] <= end_time:
-                    frames.append(frame_data['frame'])
-            return frames
+            return [self.frames[index] for index in self.frames.find_range(start_time, end_time)]
+    
+    def __len__(self) -> int:
+        return len(self.frames)
 
 class FrameTransformationPipeline:
     """
     Frame transformation pipeline inspired by SerpentAI
     Supports multiple transformation stages for preprocessing
+
+    The parsed steps are compiled once per input shape into a fused plan:
+    crops run first as views, grayscale is placed where it touches the
+    fewest pixels relative to the resizes, and normalization writes into a
+    reusable float32 buffer. Arrays returned by transform() may therefore
+    alias the input frame or that buffer and are overwritten by the next
+    call; copy them if they must be kept.
     """
     
     def __init__(self, pipeline_string: str = ""):
+        self.logger = logging.getLogger(__name__)
         self.pipeline_string = pipeline_string
         self.transformations = self._parse_pipeline(pipeline_string)
-        self.logger = logging.getLogger(__name__)
+        
+        # (input shape, dtype) -> compiled plan
+        self._compiled = {}
+        self._buffers = {}
     
     def _parse_pipeline(self, pipeline_string: str) -> List[Dict[str, Any]]:
         """Parse pipeline string into transformation steps"""
@@ -140,49 +143,157 @@ class FrameTransformationPipeline:
         
         return transformations
     
-    def transform(self, frame: np.ndarray) -> Union[np.ndarray, bytes]:
-        """Apply transformation pipeline to frame"""
-        current_frame = frame.copy()
+    def compile(self, frame_shape: Tuple[int, ...], dtype: Any = np.uint8) -> Dict[str, Any]:
+        """Build (or reuse) the fused plan for frames of one shape and dtype"""
+        key = (tuple(frame_shape), np.dtype(dtype))
+        
+        if key in self._compiled:
+            return self._compiled[key]
+        
+        spatial = []  # crops and resizes, in pipeline order
+        grayscale = normalize = png = False
         
         for transformation in self.transformations:
-            try:
-                if transformation["type"] == "grayscale":
-                    if len(current_frame.shape) == 3:
-                        current_frame = cv2.cvtColor(current_frame, cv2.COLOR_BGR2GRAY)
-                
-                elif transformation["type"] == "resize":
-                    current_frame = cv2.resize(
-                        current_frame, 
-                        (transformation["width"], transformation["height"])
-                    )
-                
-                elif transformation["type"] == "normalize":
-                    current_frame = current_frame.astype(np.float32) / 255.0
+            if transformation["type"] == "crop":
+                x1, y1, x2, y2 = transformation["coords"]
+                spatial.append(("crop", (slice(y1, y2), slice(x1, x2))))
+            elif transformation["type"] == "resize":
+                spatial.append(("resize", (transformation["width"], transformation["height"])))
+            elif transformation["type"] == "grayscale":
+                grayscale = True
+            elif transformation["type"] == "normalize":
+                normalize = True
+            elif transformation["type"] == "png":
+                # PNG encoding ends the pipeline
+                png = True
+                break
+        
+        # Shapes (height, width) after each spatial step
+        height, width = frame_shape[:2]
+        channels = frame_shape[2] if len(frame_shape) == 3 else 1
+        shapes = [(height, width)]
+        
+        for kind, argument in spatial:
+            if kind == "crop":
+                rows, cols = argument
+                height, width = len(range(height)[rows]), len(range(width)[cols])
+            else:
+                width, height = argument
+            shapes.append((height, width))
+        
+        # Grayscale is pointwise, so it can run before any spatial step;
+        # pick the position with the cheapest total (resizes cost per channel)
+        gray_position = None
+        
+        if grayscale and channels in (3, 4):
+            costs = []
+            
+            for position in range(len(spatial) + 1):
+                cost = shapes[position][0] * shapes[position][1] * channels
                 
-                elif transformation["type"] == "crop":
-                    x1, y1, x2, y2 = transformation["coords"]
-                    current_frame = current_frame[y1:y2, x1:x2]
+                for index, (kind, _) in enumerate(spatial):
+                    if kind == "resize":
+                        step_channels = 1 if index >= position else channels
+                        cost += step_channels * (shapes[index][0] * shapes[index][1] + shapes[index + 1][0] * shapes[index + 1][1])
                 
-                elif transformation["type"] == "png":
-                    # Convert to PNG bytes
-                    if PIL_AVAILABLE:
-                        if len(current_frame.shape) == 3:
-                            img = Image.fromarray(cv2.cvtColor(current_frame, cv2.COLOR_BGR2RGB))
-                        else:
-                            img = Image.fromarray(current_frame)
-                        
-                        import io
-                        buffer = io.BytesIO()
-                        img.save(buffer, format='PNG')
-                        return buffer.getvalue()
-                    else:
-                        self.logger.warning("PIL not available for PNG conversion")
-                        
-            except Exception as e:
-                self.logger.error(f"Error in transformation {transformation['type']}: {e}")
-                continue
+                costs.append(cost)
+            
+            gray_position = int(np.argmin(costs))
+        
+        steps = []
+        
+        for position, (kind, argument) in enumerate(spatial + [(None, None)]):
+            if position == gray_position:
+                conversion = cv2.COLOR_BGRA2GRAY if channels == 4 else cv2.COLOR_BGR2GRAY
+                steps.append(lambda frame, conversion=conversion: cv2.cvtColor(frame, conversion))
+            
+            if kind == "crop":
+                rows, cols = argument
+                steps.append(lambda frame, rows=rows, cols=cols: frame[rows, cols])
+            elif kind == "resize":
+                steps.append(lambda frame, size=argument: cv2.resize(frame, size))
+        
+        if gray_position is not None or len(frame_shape) == 2:
+            output_shape = shapes[-1]
+        else:
+            output_shape = shapes[-1] + (channels,)
+        
+        plan = {
+            "steps": steps,
+            "normalize": normalize,
+            "png": png,
+            "output_shape": output_shape,
+            "output_dtype": np.dtype(np.float32) if normalize else np.dtype(dtype)
+        }
+        
+        self._compiled[key] = plan
+        return plan
+    
+    def _buffer(self, shape: Tuple[int, ...], dtype: Any) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype))
+        
+        if key not in self._buffers:
+            self._buffers[key] = np.empty(shape, dtype=dtype)
+        
+        return self._buffers[key]
+    
+    def _run(self, plan: Dict[str, Any], frame: np.ndarray, out: Optional[np.ndarray] = None) -> Union[np.ndarray, bytes]:
+        for step in plan["steps"]:
+            frame = step(frame)
+        
+        if plan["normalize"]:
+            if out is None:
+                out = self._buffer(plan["output_shape"], np.float32)
+            np.divide(frame, np.float32(255.0), out=out, casting="unsafe")
+            frame = out
+        elif out is not None:
+            np.copyto(out, frame)
+            frame = out
+        
+        if plan["png"]:
+            success, encoded = cv2.imencode(".png", frame)
+            if not success:
+                raise ValueError("PNG encoding failed")
+            return encoded.tobytes()
+        
+        return frame
+    
+    def transform(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> Union[np.ndarray, bytes]:
+        """
+        Apply transformation pipeline to frame
+
+        Nothing is copied up front; a pipeline of only crops returns a view
+        of the input frame. With out given, the result is written there.
+        """
+        try:
+            return self._run(self.compile(frame.shape, frame.dtype), frame, out)
+        except Exception as e:
+            self.logger.error(f"Error in transformation pipeline '{self.pipeline_string}': {e}")
+            return frame
+    
+    def transform_batch(self, frames: Union[np.ndarray, List[np.ndarray]],
+                        out: Optional[np.ndarray] = None) -> Union[np.ndarray, List[bytes], None]:
+        """
+        Apply the pipeline to every frame of a stack (N, H, W[, C])
+
+        Results are written into one (N, ...) output array, reused across
+        calls unless out is given. PNG pipelines return a list of bytes.
+        """
+        if len(frames) == 0:
+            return None
+        
+        plan = self.compile(frames[0].shape, frames[0].dtype)
+        
+        if plan["png"]:
+            return [self._run(plan, frame) for frame in frames]
+        
+        if out is None:
+            out = self._buffer((len(frames),) + tuple(plan["output_shape"]), plan["output_dtype"])
+        
+        for index, frame in enumerate(frames):
+            self._run(plan, frame, out[index])
         
-        return current_frame
+        return out
 
 class SerpentEnhancedVision:
     """
@@ -199,10 +310,12 @@ class SerpentEnhancedVision:
         self.height = height
         self.x_offset = x_offset
         self.y_offset = y_offset
+        self.capture_backend = get_default_backend()
         
         # Performance settings
         self.frame_time = 1.0 / fps
         self.fps = fps
+        self.frame_pacer = FramePacer(fps, adaptive=True)
         
         # Frame management
         self.frame_buffer_size = buffer_seconds * fps
@@ -229,6 +342,14 @@ class SerpentEnhancedVision:
         # Game-specific detection regions
         self.detection_regions = {}
         self.sprite_templates = {}
+        self.sprite_index = SpriteIndex()
+        
+        # Change detection so static frames are not re-analyzed
+        self.change_detector = FrameChangeDetector()
+        self.last_game_state = None
+        
+        # Fused color engines keyed by their color range sets
+        self.color_engines = {}
         
         self.logger.info(f"SerpentAI Enhanced Vision initialized: {width}x{height} @ {fps}FPS")
     
@@ -245,23 +366,27 @@ class SerpentEnhancedVision:
     
     def _analysis_loop(self):
         """Continuous analysis loop for game state detection"""
+        pacer = FramePacer(10)  # Analyze 10 times per second
+        
         while self.is_capturing:
             try:
                 # Get latest frame for analysis
                 latest_frame = self.game_frame_buffer.get_latest_frame()
                 
                 if latest_frame is not None:
-                    # Perform game state analysis
-                    self._analyze_game_state(latest_frame)
+                    # Perform game state analysis only when the screen changed
+                    change = self.change_detector.update(latest_frame)
+                    if change.changed:
+                        self._analyze_game_state(latest_frame, change)
                 
                 # Control analysis frequency
-                time.sleep(0.1)  # Analyze 10 times per second
+                pacer.wait()
                 
             except Exception as e:
                 self.logger.error(f"Error in analysis loop: {e}")
                 time.sleep(0.5)
     
-    def _analyze_game_state(self, frame: np.ndarray):
+    def _analyze_game_state(self, frame: np.ndarray, change: Optional[FrameChange] = None):
         """Analyze current frame for game state information"""
         try:
             # Basic game state detection
@@ -269,11 +394,15 @@ class SerpentEnhancedVision:
                 'timestamp': time.time(),
                 'frame_shape': frame.shape,
                 'detected_objects': [],
+                'dirty_tiles': change.dirty_tiles if change is not None else [],
+                'dirty_regions': change.dirty_regions if change is not None else [],
                 'analysis_complete': True
             }
             
-            # Add to buffer with game state metadata
-            self.game_frame_buffer.add_frame(frame, game_state=game_state)
+            self.last_game_state = game_state
+            
+            # Attach game state metadata to the buffered frame
+            self.game_frame_buffer.update_game_state(game_state)
             
         except Exception as e:
             self.logger.error(f"Game state analysis failed: {e}")
@@ -298,13 +427,15 @@ class SerpentEnhancedVision:
         """Main capture loop optimized for real-time performance"""
         last_fps_check = time.time()
         fps_frame_count = 0
+        pacer = self.frame_pacer
+        pacer.reset()
         
         while self.is_capturing:
             try:
                 cycle_start = time.time()
                 
-                # Capture frame
-                frame = self._grab_frame()
+                # Capture frame directly into the ring buffer
+                frame = self._grab_frame_into_buffer(cycle_start)
                 if frame is not None:
                     # Process frame if pipeline exists
                     processed_frame = frame
@@ -315,9 +446,6 @@ class SerpentEnhancedVision:
                         self.capture_stats['processing_time'] += processing_time
                         self.capture_stats['frames_processed'] += 1
                     
-                    # Add to buffer
-                    self.game_frame_buffer.add_frame(frame, cycle_start)
-                    
                     # Update stats
                     self.capture_stats['frames_captured'] += 1
                     self.capture_stats['last_frame_time'] = cycle_start
@@ -331,10 +459,7 @@ class SerpentEnhancedVision:
                     last_fps_check = current_time
                 
                 # Control frame rate
-                cycle_duration = time.time() - cycle_start
-                sleep_time = max(0, self.frame_time - cycle_duration)
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                pacer.wait()
                     
             except Exception as e:
                 self.logger.error(f"Error in capture loop: {e}")
@@ -342,35 +467,37 @@ class SerpentEnhancedVision:
         
         self.logger.info("Capture loop ended")
     
-    def _grab_frame(self) -> Optional[np.ndarray]:
-        """Optimized frame grabbing using PyAutoGUI"""
+    def _grab_frame(self, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Grab the capture region as a BGR frame, writing into out when given"""
+        if self.capture_backend is None:
+            return None
+        
         try:
-            if not PYAUTOGUI_AVAILABLE:
-                return None
-            
-            # Define capture region
-            if self.x_offset or self.y_offset or self.width or self.height:
-                region = (self.x_offset, self.y_offset, self.width, self.height)
-                screenshot = pyautogui.screenshot(region=region)
-            else:
-                screenshot = pyautogui.screenshot()
-            
-            # Convert to numpy array
-            if PIL_AVAILABLE and hasattr(screenshot, 'convert'):
-                frame = np.array(screenshot.convert('RGB'))
-            else:
-                frame = np.array(screenshot)
+            return self.capture_backend.grab(self._capture_region(), out=out)
             
-            # Convert RGB to BGR for OpenCV compatibility
-            if len(frame.shape) == 3 and frame.shape[2] == 3:
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            return frame
+        except Exception as e:
+            self.logger.error(f"Frame grab failed: {e}")
+            return None
+    
+    def _grab_frame_into_buffer(self, timestamp: float) -> Optional[np.ndarray]:
+        """Grab a frame and write it straight into the next frame buffer slot"""
+        if self.capture_backend is None:
+            return None
+        
+        try:
+            return self.capture_backend.grab_into_buffer(self.game_frame_buffer, self._capture_region(), timestamp)
             
         except Exception as e:
             self.logger.error(f"Frame grab failed: {e}")
             return None
     
+    def _capture_region(self) -> Optional[Tuple[int, int, int, int]]:
+        """Capture region as (left, top, width, height), or None for the full screen"""
+        if self.x_offset or self.y_offset or self.width or self.height:
+            return (self.x_offset, self.y_offset, self.width, self.height)
+        
+        return None
+    
     def stop_capture(self):
         """Stop frame capture"""
         if not self.is_capturing:
@@ -391,15 +518,22 @@ class SerpentEnhancedVision:
         """Get frame stack for temporal analysis"""
         return self.game_frame_buffer.get_frame_stack(indices, stack_dimension)
     
-    def detect_sprites(self, frame: np.ndarray, sprite_templates: Dict[str, np.ndarray], 
-                      threshold: float = 0.8) -> Dict[str, List[Tuple[int, int, float]]]:
+    def detect_sprites(self, frame: np.ndarray, sprite_templates: Optional[Dict[str, np.ndarray]] = None,
+                      threshold: float = 0.8,
+                      regions: Optional[List[Tuple[int, int, int, int]]] = None) -> Dict[str, List[Tuple[int, int, float]]]:
         """
-        Detect sprites in frame using template matching
-        Optimized for real-time game detection
+        Detect sprites in frame as {name: [(x, y, confidence)]} top-left corners
+        Loaded sprites are identified through the signature index: candidate
+        regions (from the edge segmentation unless given) are looked up by
+        hash and colors, and only the best few sprites per region are template
+        matched. Other template dicts fall back to full-frame matching.
         """
         detections = {}
         
         try:
+            if sprite_templates is None or sprite_templates is self.sprite_templates:
+                return self.sprite_index.locate(frame, regions, threshold)
+            
             # Convert to grayscale for faster matching
             gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
             
@@ -426,50 +560,42 @@ class SerpentEnhancedVision:
         return detections
     
     def detect_color_regions(self, frame: np.ndarray, color_ranges: Dict[str, Tuple[Tuple, Tuple]], 
-                           min_area: int = 100) -> Dict[str, List[Dict[str, Any]]]:
+                           min_area: int = 100, include_contours: bool = True,
+                           hsv: Optional[np.ndarray] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         Detect colored regions in frame using HSV color space
-        Optimized for game element detection
+        Optimized for game element detection: all ranges are classified in
+        one pass and labelled with a single connected-components call
         """
-        detections = {}
+        detections = {name: [] for name in color_ranges}
         
         try:
-            # Convert to HSV for better color detection
-            hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            engine = self._get_color_engine(color_ranges)
+            segmentation = engine.segment(frame, hsv=hsv)
             
-            for color_name, (lower_bound, upper_bound) in color_ranges.items():
-                # Create color mask
-                mask = cv2.inRange(hsv_frame, np.array(lower_bound), np.array(upper_bound))
-                
-                # Find contours
-                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                # Filter by area and extract properties
-                color_detections = []
-                for contour in contours:
-                    area = cv2.contourArea(contour)
-                    if area >= min_area:
-                        # Get bounding rectangle
-                        x, y, w, h = cv2.boundingRect(contour)
-                        
-                        # Calculate center
-                        center_x = x + w // 2
-                        center_y = y + h // 2
-                        
-                        color_detections.append({
-                            'center': (center_x, center_y),
-                            'bbox': (x, y, w, h),
-                            'area': area,
-                            'contour': contour
-                        })
-                
-                detections[color_name] = color_detections
+            detections = segmentation.components(min_area=min_area, include_contours=include_contours)
                 
         except Exception as e:
             self.logger.error(f"Color detection failed: {e}")
         
         return detections
     
+    def _get_color_engine(self, color_ranges: Dict[str, Tuple[Tuple, Tuple]]) -> ColorSegmentationEngine:
+        key = tuple((name, tuple(np.ravel(lower).tolist()), tuple(np.ravel(upper).tolist()))
+                    for name, (lower, upper) in color_ranges.items())
+        
+        engine = self.color_engines.get(key)
+        
+        if engine is None:
+            engine = ColorSegmentationEngine()
+            
+            for name, lower, upper in key:
+                engine.register(name, lower, upper)
+            
+            self.color_engines[key] = engine
+        
+        return engine
+    
     def set_detection_region(self, name: str, region: Tuple[int, int, int, int]):
         """Set a named detection region for focused analysis"""
         self.detection_regions[name] = region
@@ -501,6 +627,7 @@ class SerpentEnhancedVision:
                 if template is not None:
                     sprite_name = template_file.stem
                     self.sprite_templates[sprite_name] = template
+                    self.sprite_index.add_sprite(sprite_name, template)
                     self.logger.info(f"Loaded sprite template: {sprite_name}")
             
             self.logger.info(f"Loaded {len(self.sprite_templates)} sprite templates")
@@ -511,9 +638,11 @@ class SerpentEnhancedVision:
     def get_capture_stats(self) -> Dict[str, Any]:
         """Get current capture performance statistics"""
         stats = self.capture_stats.copy()
-        stats['buffer_size'] = len(self.game_frame_buffer.frames)
+        stats['buffer_size'] = len(self.game_frame_buffer)
         stats['is_capturing'] = self.is_capturing
         stats['fps_target'] = self.fps
+        stats['pacing'] = self.frame_pacer.get_stats()
+        stats['sprite_index'] = self.sprite_index.get_stats()
         
         # Calculate average processing time
         if stats['frames_processed'] > 0:
@@ -535,6 +664,7 @@ class SerpentEnhancedVision:
         """Update target FPS"""
         self.fps = fps
         self.frame_time = 1.0 / fps
+        self.frame_pacer.set_target_fps(fps)
         self.logger.info(f"Target FPS updated to {fps}")
     
     def export_detection_config(self, filepath: str):
@@ -578,6 +708,7 @@ class SerpentEnhancedVision:
                 self.y_offset = settings.get('y_offset', self.y_offset)
                 self.fps = settings.get('fps', self.fps)
                 self.frame_time = 1.0 / self.fps
+                self.frame_pacer.set_target_fps(self.fps)
             
             if 'pipeline_string' in config and config['pipeline_string']:
                 self.frame_transformation_pipeline = FrameTransformationPipeline(config['pipeline_string'])
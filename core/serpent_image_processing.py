@@ -14,7 +14,7 @@ import skimage.transform
 
 from PIL import Image as PILImage
 
-from sklearn.cluster import KMeans
+from .color_palette import get_default_engine
 
 
 class Image:
@@ -315,32 +315,10 @@ class Image:
         )
 
     def determine_dominant_colors(self, quantity=8):
-        image = self.resize_long_side_to(256, as_image=True)
-        image_kmeans = image.lab.reshape(image.width * image.height, 3)
-
-        kmeans = KMeans(n_clusters=quantity, n_jobs=1).fit_predict(image_kmeans)
-
-        clusters = dict()
-
-        for i in range(quantity):
-            clusters[i] = list()
-
-        for i, cluster in enumerate(kmeans):
-            clusters[cluster].append(image_kmeans[i])
-
-        dominant_colors = list()
-
-        for lab_tuples in clusters.values():
-            l, a, b = zip(*lab_tuples)
-
-            lab_color = np.array((np.mean(l), np.mean(a), np.mean(b)), dtype=np.float64)
-            lab_color = np.full((1, 1, 3), lab_color, dtype=np.float64)
-
-            rgb_color = np.array(skimage.color.lab2rgb(lab_color) * 255, dtype=np.uint8)
-
-            dominant_colors.append(tuple(rgb_color[0, 0, :]))
+        # Clustered on the quantized color histogram rather than on every pixel
+        colors, _ = get_default_engine().palette(self.rgb, k=quantity)
 
-        return dominant_colors
+        return [tuple(color) for color in colors]
 
     def generate_color_strip(self, colors=2048, height=1):
         image = self.resize_long_side_to(256, as_image=True)
@@ -16,6 +16,14 @@ from collections import deque, defaultdict
 import random
 import math
 
+from .observation_stack import ObservationStack
+
+# States do not carry screen pixels (the tabular agent keys on zone, health,
+# objects and resources); every state shares this read-only placeholder and
+# the frame stack is read from SerpentReinforcementLearning.get_observation()
+SCREEN_FEATURES_PLACEHOLDER = np.zeros(50)
+SCREEN_FEATURES_PLACEHOLDER.flags.writeable = False
+
 @dataclass
 class GameState:
     """Represents the current state of the game"""
@@ -354,6 +362,10 @@ class SerpentReinforcementLearning:
         self.current_episode = 0
         self.episode_start_time = 0
         
+        # Screen observations: each captured frame is preprocessed once into
+        # an 84x84 uint8 plane ring, served on demand by get_observation()
+        self.observation_stack = ObservationStack(4, (84, 84), dtype=np.uint8)
+        
         # State tracking
         self.current_state = None
         self.previous_action = None
@@ -420,6 +432,7 @@ class SerpentReinforcementLearning:
         episode_steps = 0
         self.episode_start_time = time.time()
         self.episode_experiences = []
+        self.observation_stack.reset()
         
         # Get initial state
         current_state = self._get_current_game_state()
@@ -520,6 +533,10 @@ class SerpentReinforcementLearning:
         
         return actions
     
+    def get_observation(self, copy: bool = False) -> Optional[np.ndarray]:
+        """The current (4, 84, 84) uint8 frame stack; a view the next frame overwrites unless copy"""
+        return self.observation_stack.snapshot() if copy else self.observation_stack.observation()
+    
     def _get_current_game_state(self) -> GameState:
         """Get the current state of the game"""
         try:
@@ -528,10 +545,11 @@ class SerpentReinforcementLearning:
                 frame = self.enhanced_vision._capture_frame()
                 if frame is not None:
                     analysis = self.enhanced_vision.analyze_frame(frame)
+                    self.observation_stack.push(frame)
                     
                     return GameState(
                         timestamp=time.time(),
-                        screen_features=np.array([0.0] * 50),  # Placeholder features
+                        screen_features=SCREEN_FEATURES_PLACEHOLDER,
                         detected_objects=analysis.detected_sprites,
                         player_position=None,  # Would need to be detected
                         health=1.0,  # Would need to be detected from UI
@@ -544,7 +562,7 @@ class SerpentReinforcementLearning:
             # Fallback state
             return GameState(
                 timestamp=time.time(),
-                screen_features=np.array([0.0] * 50),
+                screen_features=SCREEN_FEATURES_PLACEHOLDER,
                 detected_objects=[],
                 player_position=None,
                 health=1.0,
@@ -558,7 +576,7 @@ class SerpentReinforcementLearning:
             self.logger.error(f"Error getting game state: {e}")
             return GameState(
                 timestamp=time.time(),
-                screen_features=np.array([0.0] * 50),
+                screen_features=SCREEN_FEATURES_PLACEHOLDER,
                 detected_objects=[],
                 player_position=None,
                 health=0.5,
@@ -0,0 +1,299 @@
+"""
+Shared Frame Bus
+Fixed-slot frame ring in multiprocessing shared memory so consumer processes
+(vision, RL, recorder) can map the latest captured frames without copying
+"""
+
+import re
+import time
+from typing import Optional, Tuple, Any, Union
+
+import numpy as np
+
+from multiprocessing import shared_memory, resource_tracker
+
+
+class SharedFrameBusError(BaseException):
+    pass
+
+
+# Header layout: int64 meta block, fixed-width dtype string, then per-slot arrays
+_MAGIC = 0x5346425553  # "SFBUS"
+_VERSION = 1
+_MAX_DIMENSIONS = 4
+_META_FIELDS = 16
+_DTYPE_FIELD_BYTES = 16
+_ALIGNMENT = 64
+
+# Meta indices
+_META_MAGIC = 0
+_META_VERSION = 1
+_META_CAPACITY = 2
+_META_SLOT_NBYTES = 3
+_META_FRAMES_WRITTEN = 4
+_META_IS_BYTES = 5
+_META_NDIM = 6
+_META_SHAPE = 7  # _MAX_DIMENSIONS entries
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _layout(capacity):
+    meta_offset = 0
+    dtype_offset = meta_offset + _META_FIELDS * 8
+    generations_offset = _align(dtype_offset + _DTYPE_FIELD_BYTES)
+    timestamps_offset = _align(generations_offset + capacity * 8)
+    lengths_offset = _align(timestamps_offset + capacity * 8)
+    data_offset = _align(lengths_offset + capacity * 8)
+
+    return meta_offset, dtype_offset, generations_offset, timestamps_offset, lengths_offset, data_offset
+
+
+def shared_memory_name(key):
+    """Turn an arbitrary key (e.g. a former Redis key) into a valid segment name"""
+    return re.sub(r"[^A-Za-z0-9_]", "_", key)
+
+
+def _open_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached segments with the resource tracker,
+        # which would unlink them when this consumer process exits
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedFrameBus:
+    """
+    Single-producer, multi-consumer frame ring in shared memory
+
+    Each slot carries a generation counter used as a seqlock: the producer
+    makes it odd while writing and even once the slot is consistent. Readers
+    check the counter around a read and retry if the slot changed under them.
+    Frames are indexed like the old Redis list: 0 is the newest frame.
+
+    A bus either holds fixed-shape arrays or, when created with
+    frame_shape=None, variable-length byte payloads (e.g. PNG pipelines) of
+    at most slot_nbytes each.
+    """
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+
+        capacity = int(np.ndarray((_META_FIELDS,), dtype=np.int64, buffer=shm.buf)[_META_CAPACITY])
+        self._map(capacity)
+
+        if not owner and (self.meta[_META_MAGIC] != _MAGIC or self.meta[_META_VERSION] != _VERSION):
+            raise SharedFrameBusError(f"Shared memory segment '{shm.name}' is not a frame bus")
+
+        self.capacity = capacity
+        self.is_bytes = bool(self.meta[_META_IS_BYTES])
+        self.slot_nbytes = int(self.meta[_META_SLOT_NBYTES])
+
+        dtype_raw = bytes(shm.buf[self._dtype_offset:self._dtype_offset + _DTYPE_FIELD_BYTES])
+        self.dtype = np.dtype(dtype_raw.rstrip(b"\0").decode("utf-8") or "uint8")
+
+        if self.is_bytes:
+            self.frame_shape = None
+            self.slots = np.ndarray((capacity, self.slot_nbytes), dtype=np.uint8, buffer=shm.buf, offset=self._data_offset)
+        else:
+            ndim = int(self.meta[_META_NDIM])
+            self.frame_shape = tuple(int(d) for d in self.meta[_META_SHAPE:_META_SHAPE + ndim])
+            self.slots = np.ndarray((capacity,) + self.frame_shape, dtype=self.dtype, buffer=shm.buf, offset=self._data_offset)
+
+    def _map(self, capacity):
+        buf = self.shm.buf
+        meta_offset, self._dtype_offset, generations_offset, timestamps_offset, lengths_offset, self._data_offset = _layout(capacity)
+
+        self.meta = np.ndarray((_META_FIELDS,), dtype=np.int64, buffer=buf, offset=meta_offset)
+        self.generations = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=generations_offset)
+        self.timestamps = np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=timestamps_offset)
+        self.lengths = np.ndarray((capacity,), dtype=np.int64, buffer=buf, offset=lengths_offset)
+
+    @classmethod
+    def create(cls, name, capacity, frame_shape=None, dtype="uint8", slot_nbytes=None, replace=True):
+        """Create a bus segment; an existing segment with the same name is replaced"""
+        dtype = np.dtype(dtype)
+
+        if frame_shape is not None:
+            frame_shape = tuple(int(d) for d in frame_shape)
+
+            if len(frame_shape) > _MAX_DIMENSIONS:
+                raise SharedFrameBusError(f"Frames may have at most {_MAX_DIMENSIONS} dimensions")
+
+            slot_nbytes = int(np.prod(frame_shape)) * dtype.itemsize
+        elif slot_nbytes is None:
+            raise SharedFrameBusError("'slot_nbytes' is required for byte payload buses")
+
+        size = _layout(capacity)[-1] + capacity * slot_nbytes
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if not replace:
+                raise
+
+            stale = _open_shared_memory(name)
+            stale.close()
+            stale.unlink()
+
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        meta = np.ndarray((_META_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        meta[:] = 0
+        meta[_META_CAPACITY] = capacity
+        meta[_META_SLOT_NBYTES] = slot_nbytes
+        meta[_META_IS_BYTES] = 1 if frame_shape is None else 0
+
+        if frame_shape is not None:
+            meta[_META_NDIM] = len(frame_shape)
+            meta[_META_SHAPE:_META_SHAPE + len(frame_shape)] = frame_shape
+
+        dtype_offset = _layout(capacity)[1]
+        dtype_bytes = dtype.str.encode("utf-8")[:_DTYPE_FIELD_BYTES]
+        shm.buf[dtype_offset:dtype_offset + _DTYPE_FIELD_BYTES] = dtype_bytes.ljust(_DTYPE_FIELD_BYTES, b"\0")
+
+        bus = cls(shm, owner=True)
+        bus.generations[:] = 0
+        bus.timestamps[:] = 0
+        bus.lengths[:] = 0
+
+        # Publish the header last so attaching consumers never see a partial one
+        meta[_META_VERSION] = _VERSION
+        meta[_META_MAGIC] = _MAGIC
+
+        return bus
+
+    @classmethod
+    def attach(cls, name):
+        """Map an existing bus created by another process"""
+        return cls(_open_shared_memory(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def frames_written(self):
+        return int(self.meta[_META_FRAMES_WRITTEN])
+
+    def __len__(self):
+        return min(self.frames_written, self.capacity)
+
+    def _slot(self, index, frames_written=None):
+        """Slot holding the frame `index` positions back from the newest (0)"""
+        frames_written = self.frames_written if frames_written is None else frames_written
+
+        if index < 0 or index >= min(frames_written, self.capacity):
+            return None
+
+        return (frames_written - 1 - index) % self.capacity
+
+    # Producer side
+
+    def acquire_slot(self):
+        """Writable view of the next slot; fill it and call commit()"""
+        slot = self.frames_written % self.capacity
+
+        # Odd generation marks the slot as being written
+        self.generations[slot] += 1
+
+        return self.slots[slot]
+
+    def commit(self, timestamp=None, length=None):
+        frames_written = self.frames_written
+        slot = frames_written % self.capacity
+
+        self.timestamps[slot] = time.time() if timestamp is None else timestamp
+        self.lengths[slot] = self.slot_nbytes if length is None else length
+
+        self.generations[slot] += 1
+        self.meta[_META_FRAMES_WRITTEN] = frames_written + 1
+
+    def write(self, frame: Union[np.ndarray, bytes], timestamp=None):
+        """Copy a frame (or a byte payload) into the next slot"""
+        if self.is_bytes:
+            payload = np.frombuffer(frame, dtype=np.uint8)
+
+            if payload.size > self.slot_nbytes:
+                raise SharedFrameBusError(f"Payload of {payload.size} bytes exceeds slot size of {self.slot_nbytes}")
+
+            slot = self.acquire_slot()
+            slot[:payload.size] = payload
+            self.commit(timestamp, length=payload.size)
+        else:
+            slot = self.acquire_slot()
+            np.copyto(slot, frame, casting="unsafe")
+            self.commit(timestamp)
+
+    # Consumer side
+
+    def read(self, index=0, copy=False, retries=100) -> Optional[Tuple[Any, float, int]]:
+        """
+        Read the frame `index` positions back from the newest
+
+        Returns (frame, timestamp, generation). With copy=False the frame is a
+        view into shared memory that stays valid until the producer wraps
+        around to this slot again; is_current() tells whether it still holds.
+        Byte buses always return a bytes object.
+        """
+        for _ in range(retries):
+            frames_written = self.frames_written
+            slot = self._slot(index, frames_written)
+
+            if slot is None:
+                return None
+
+            generation = int(self.generations[slot])
+
+            if generation & 1:
+                continue
+
+            timestamp = float(self.timestamps[slot])
+
+            if self.is_bytes:
+                frame = self.slots[slot, :int(self.lengths[slot])].tobytes()
+            elif copy:
+                frame = self.slots[slot].copy()
+            else:
+                frame = self.slots[slot]
+
+            if int(self.generations[slot]) == generation:
+                return frame, timestamp, generation
+
+        return None
+
+    def is_current(self, index, generation, frames_written=None):
+        slot = self._slot(index, frames_written)
+        return slot is not None and int(self.generations[slot]) == generation
+
+    def wait_for_frames(self, count, timeout=None, poll_interval=0.005):
+        """Block until at least `count` frames have been published"""
+        deadline = None if timeout is None else time.time() + timeout
+
+        while self.frames_written < count:
+            if deadline is not None and time.time() >= deadline:
+                return False
+
+            time.sleep(poll_interval)
+
+        return True
+
+    def close(self):
+        if self.slots is None:
+            return
+
+        # Drop our views before closing, otherwise the mmap cannot be released
+        self.meta = self.generations = self.timestamps = self.lengths = self.slots = None
+        self.shm.close()
+
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
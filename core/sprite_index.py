@@ -0,0 +1,418 @@
+"""
+Sprite Signature Index
+Identifies sprites by compact signatures (coarse dominant-color set plus a
+64-bit difference hash) looked up in a BK-tree and an inverted color index,
+so candidate regions are compared against a handful of likely sprites
+instead of template matching every loaded sprite over the whole frame
+"""
+
+import time
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Sequence, Union
+
+import numpy as np
+import cv2
+
+from .color_palette import PaletteEngine
+from .region_features import extract_region_features, fill_enclosed
+from .template_bank import non_max_suppression
+
+
+def difference_hash(image: np.ndarray) -> int:
+    """64-bit dHash: sign of horizontal gradients on a 9x8 grayscale thumbnail"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+    thumbnail = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+@dataclass
+class SpriteSignature:
+    """Compact description of a sprite or a candidate region"""
+    phash: int
+    colors: frozenset
+    width: int
+    height: int
+
+    def color_similarity(self, other: "SpriteSignature") -> float:
+        """Jaccard overlap of the two dominant-color sets"""
+        if not self.colors or not other.colors:
+            return 0.0
+
+        return len(self.colors & other.colors) / len(self.colors | other.colors)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes with Hamming distance
+
+    Each child edge is labelled with its distance to the parent, so a radius
+    query only descends into edges within radius of the query's own distance
+    (triangle inequality) and visits a small part of the tree.
+    """
+
+    def __init__(self):
+        # Node: [hash, names, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, name: str):
+        self.size += 1
+
+        if self.root is None:
+            self.root = [value, [name], {}]
+            return
+
+        node = self.root
+
+        while True:
+            distance = hamming(value, node[0])
+
+            if distance == 0:
+                node[1].append(name)
+                return
+
+            child = node[2].get(distance)
+
+            if child is None:
+                node[2][distance] = [value, [name], {}]
+                return
+
+            node = child
+
+    def query(self, value: int, radius: int) -> List[Tuple[int, str]]:
+        """(distance, name) of every entry within radius of value"""
+        results = []
+
+        if self.root is None:
+            return results
+
+        stack = [self.root]
+
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+
+            if distance <= radius:
+                results.extend((distance, name) for name in node[1])
+
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+        return results
+
+    def clear(self):
+        self.root = None
+        self.size = 0
+
+
+class SpriteIndex:
+    """
+    Signature index of sprite templates
+
+    A sprite's signature is its dHash and the set of coarse (color_bits per
+    channel) colors covering at least min_color_fraction of its pixels.
+    Regions are looked up by hash in a BK-tree (within hash_radius bits) and
+    by shared colors in an inverted index; candidates of a plausible size
+    are ranked by hash and color similarity, hash hits ahead of color-only
+    ones, and only the best max_candidates are confirmed with normalized
+    template matching around the region. Proposed regions are the edge
+    components shrunk back by the edge dilation, so they hash the same
+    crop as the sprite.
+    """
+
+    def __init__(self, hash_radius: int = 12, color_bits: int = 3, min_color_fraction: float = 0.05,
+                 max_colors: int = 6, min_shared_colors: int = 2, max_candidates: int = 3,
+                 size_tolerance: float = 1.5, search_margin: float = 0.25, nms_overlap: float = 0.3):
+        self.logger = logging.getLogger(__name__)
+
+        self.hash_radius = hash_radius
+        self.min_color_fraction = min_color_fraction
+        self.max_colors = max_colors
+        self.min_shared_colors = min_shared_colors
+        self.max_candidates = max_candidates
+        self.size_tolerance = size_tolerance
+        self.search_margin = search_margin
+        self.nms_overlap = nms_overlap
+
+        self.palette = PaletteEngine(bits=color_bits, max_pixels=4096)
+
+        self.sprites = {}
+        self.signatures = {}
+        self.hash_tree = BKTree()
+        self.color_index = {}
+
+        self.stats = {
+            'lookups': 0,
+            'candidates': 0,
+            'verifications': 0,
+            'detections': 0,
+            'lookup_ms': 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self.sprites)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sprites
+
+    def signature(self, image: np.ndarray) -> SpriteSignature:
+        counts = self.palette.histogram(image)
+        total = max(int(counts.sum()), 1)
+
+        order = np.argsort(counts)[::-1][:self.max_colors]
+        colors = frozenset(int(code) for code in order if counts[code] >= total * self.min_color_fraction)
+
+        return SpriteSignature(difference_hash(image), colors, image.shape[1], image.shape[0])
+
+    def add_sprite(self, name: str, image: np.ndarray) -> bool:
+        """Index one sprite (BGR or grayscale); returns False for unusable images"""
+        if image is None or image.size == 0 or min(image.shape[:2]) < 4:
+            self.logger.warning(f"Sprite '{name}' is too small to index")
+            return False
+
+        if name in self.sprites:
+            self.remove_sprite(name)
+
+        image = image[:, :, :3] if image.ndim == 3 else image
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        signature = self.signature(image)
+
+        self.sprites[name] = gray
+        self.signatures[name] = signature
+        self.hash_tree.add(signature.phash, name)
+
+        for color in signature.colors:
+            self.color_index.setdefault(color, set()).add(name)
+
+        return True
+
+    def remove_sprite(self, name: str):
+        if self.sprites.pop(name, None) is None:
+            return
+
+        signature = self.signatures.pop(name)
+
+        for color in signature.colors:
+            self.color_index.get(color, set()).discard(name)
+
+        # BK-trees do not support deletion; rebuild from the remaining sprites
+        self.hash_tree.clear()
+        for other, other_signature in self.signatures.items():
+            self.hash_tree.add(other_signature.phash, other)
+
+    def clear(self):
+        self.sprites.clear()
+        self.signatures.clear()
+        self.hash_tree.clear()
+        self.color_index.clear()
+
+    def load_directory(self, directory: Union[str, Path], pattern: str = "*.png") -> int:
+        """Index every image in a directory under its file stem; returns the number added"""
+        added = 0
+
+        for path in sorted(Path(directory).glob(pattern)):
+            image = cv2.imread(str(path))
+
+            if image is not None and self.add_sprite(path.stem, image):
+                added += 1
+
+        self.logger.info(f"Indexed {added} sprites from {directory}")
+        return added
+
+    def size_range(self) -> Tuple[int, int]:
+        """Shortest and longest sprite sides in pixels"""
+        sides = [side for sprite in self.sprites.values() for side in sprite.shape[:2]]
+        return (min(sides), max(sides)) if sides else (0, 0)
+
+    def propose_regions(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Candidate (x, y, w, h) regions from an edge segmentation of the frame
+
+        Edges are dilated to close small gaps, filled with everything they
+        enclose and labelled in one pass; components whose bounding box is
+        far outside the indexed sprite sizes are dropped.
+        """
+        if not self.sprites:
+            return []
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        edges = cv2.dilate(cv2.Canny(gray, 50, 150), np.ones((3, 3), dtype=np.uint8))
+
+        shortest, longest = self.size_range()
+        low, high = shortest / self.size_tolerance, longest * self.size_tolerance
+
+        regions, _ = extract_region_features(fill_enclosed(edges), min_area=int(low))
+        inside = (regions['width'] >= low) & (regions['width'] <= high) & \
+            (regions['height'] >= low) & (regions['height'] <= high)
+
+        # Dilation grew every component by one pixel on each side, and Canny
+        # may put an edge on the background side of the sprite's outline
+        boxes = [(int(record['x']) + 1, int(record['y']) + 1, int(record['width']) - 2, int(record['height']) - 2)
+                 for record in regions[inside]]
+
+        return [self._trim_to_ink(gray, box) for box in boxes]
+
+    @staticmethod
+    def _trim_to_ink(gray: np.ndarray, box: Tuple[int, int, int, int], steps: int = 1,
+                     tolerance: float = 4.0) -> Tuple[int, int, int, int]:
+        """Drop outer rows/columns of a box that match the frame just outside it (background)"""
+        x, y, w, h = box
+        frame_height, frame_width = gray.shape[:2]
+
+        def same(line: np.ndarray, outside: np.ndarray) -> bool:
+            return float(np.mean(np.abs(line.astype(np.int16) - outside))) <= tolerance
+
+        for _ in range(steps):
+            if w > 4 and x > 0 and same(gray[y:y + h, x], gray[y:y + h, x - 1]):
+                x, w = x + 1, w - 1
+            if w > 4 and x + w < frame_width and same(gray[y:y + h, x + w - 1], gray[y:y + h, x + w]):
+                w -= 1
+            if h > 4 and y > 0 and same(gray[y, x:x + w], gray[y - 1, x:x + w]):
+                y, h = y + 1, h - 1
+            if h > 4 and y + h < frame_height and same(gray[y + h - 1, x:x + w], gray[y + h, x:x + w]):
+                h -= 1
+
+        return (x, y, w, h)
+
+    def candidates(self, region: np.ndarray) -> List[Tuple[float, str]]:
+        """(score, name) of the sprites most likely shown in a region crop, best first"""
+        signature = self.signature(region)
+        scores = {}
+
+        for distance, name in self.hash_tree.query(signature.phash, self.hash_radius):
+            scores[name] = 1.0 - distance / 64.0
+
+        hash_hits = set(scores)
+
+        shared = {}
+        for color in signature.colors:
+            for name in self.color_index.get(color, ()):
+                shared[name] = shared.get(name, 0) + 1
+
+        for name, count in shared.items():
+            if count >= self.min_shared_colors:
+                scores.setdefault(name, 0.0)
+
+        ranked = []
+
+        for name, hash_score in scores.items():
+            sprite = self.signatures[name]
+
+            if not self._plausible_size(sprite, signature):
+                continue
+
+            ranked.append((name in hash_hits, 0.5 * hash_score + 0.5 * sprite.color_similarity(signature), name))
+
+        # Color-only hits fill the slots hash hits leave, never displacing them
+        ranked.sort(reverse=True)
+        return [(score, name) for _, score, name in ranked[:self.max_candidates]]
+
+    def locate(self, frame: np.ndarray, regions: Optional[Sequence[Tuple[int, int, int, int]]] = None,
+               threshold: float = 0.8, names: Optional[Sequence[str]] = None) -> Dict[str, List[Tuple[int, int, float]]]:
+        """
+        Sprites found in the frame as {name: [(x, y, confidence)]}
+
+        x, y is the sprite's top-left corner, as in template matching.
+        Regions default to propose_regions(frame); names restricts the
+        result (and the verified candidates) to some sprites.
+        """
+        started = time.perf_counter()
+
+        wanted = set(names) if names is not None else None
+        detections = {name: [] for name in (names if names is not None else self.sprites)}
+
+        if regions is None:
+            regions = self.propose_regions(frame)
+
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        frame_height, frame_width = gray_frame.shape[:2]
+
+        matches = []
+
+        for x, y, w, h in regions:
+            if w < 4 or h < 4:
+                continue
+
+            for _, name in self.candidates(frame[y:y + h, x:x + w]):
+                if wanted is not None and name not in wanted:
+                    continue
+
+                self.stats['candidates'] += 1
+                match = self._verify(gray_frame, name, (x, y, w, h), frame_width, frame_height)
+
+                if match is not None and match[2] >= threshold:
+                    matches.append((name,) + match)
+
+        # Sprites compete for a location, so suppression runs across all of them
+        if matches:
+            rects = np.array([(mx, my) + self.sprites[name].shape[1::-1] for name, mx, my, _ in matches])
+            scores = np.array([confidence for _, _, _, confidence in matches])
+
+            for index in non_max_suppression(rects, scores, self.nms_overlap):
+                name, mx, my, confidence = matches[index]
+                detections[name].append((mx, my, confidence))
+
+            self.stats['detections'] += sum(len(found) for found in detections.values())
+
+        self.stats['lookups'] += 1
+        self.stats['lookup_ms'] = (time.perf_counter() - started) * 1000
+
+        return detections
+
+    def _verify(self, gray_frame: np.ndarray, name: str, region: Tuple[int, int, int, int],
+                frame_width: int, frame_height: int) -> Optional[Tuple[int, int, float]]:
+        """Best normalized match of one sprite in a window around the region"""
+        sprite = self.sprites[name]
+        sprite_height, sprite_width = sprite.shape[:2]
+        x, y, w, h = region
+
+        # Window covers the region plus a margin and is never smaller than the sprite
+        margin_x = int(sprite_width * self.search_margin)
+        margin_y = int(sprite_height * self.search_margin)
+        center_x, center_y = x + w // 2, y + h // 2
+        half_w = max(w, sprite_width) // 2 + margin_x
+        half_h = max(h, sprite_height) // 2 + margin_y
+
+        x0, y0 = max(center_x - half_w, 0), max(center_y - half_h, 0)
+        x1, y1 = min(center_x + half_w + 1, frame_width), min(center_y + half_h + 1, frame_height)
+
+        if x1 - x0 < sprite_width or y1 - y0 < sprite_height:
+            return None
+
+        self.stats['verifications'] += 1
+
+        result = cv2.matchTemplate(gray_frame[y0:y1, x0:x1], sprite, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, location = cv2.minMaxLoc(result)
+
+        if not np.isfinite(confidence):
+            return None
+
+        return (x0 + location[0], y0 + location[1], float(confidence))
+
+    def _plausible_size(self, sprite: SpriteSignature, region: SpriteSignature) -> bool:
+        width_ratio = region.width / sprite.width
+        height_ratio = region.height / sprite.height
+        low, high = 1.0 / self.size_tolerance, self.size_tolerance
+
+        return low <= width_ratio <= high and low <= height_ratio <= high
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['sprites'] = len(self.sprites)
+        stats['colors'] = len(self.color_index)
+
+        lookups = stats['lookups']
+        stats['avg_verifications'] = stats['verifications'] / lookups if lookups else 0.0
+
+        return stats
@@ -0,0 +1,659 @@
+"""
+Template Bank
+Decodes and preprocesses templates once (grayscale, scale variants, pyramid
+levels, zero-mean kernels with precomputed norms) and matches them
+coarse-to-fine against a shared frame pyramid with non-maximum suppression.
+BatchTemplateMatcher ranks thousands of templates with shared-FFT correlation.
+"""
+
+import base64
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, List, Dict, Any, Sequence, Union
+
+import numpy as np
+import cv2
+
+# Windows with (almost) no intensity variation have an undefined correlation
+_FLAT_EPSILON = 1e-3
+
+
+@dataclass
+class TemplateMatch:
+    """A template found in a frame; x, y is the center of bbox"""
+    name: str
+    group: str
+    x: int
+    y: int
+    confidence: float
+    bbox: Tuple[int, int, int, int]
+    scale: float = 1.0
+
+    def as_tuple(self) -> Tuple[int, int, float]:
+        return (self.x, self.y, self.confidence)
+
+
+class _TemplateLevel:
+    """One pyramid level of a template: zero-mean kernel and its L2 norm"""
+
+    __slots__ = ('kernel', 'norm', 'width', 'height')
+
+    def __init__(self, gray: np.ndarray):
+        kernel = gray.astype(np.float32)
+        kernel -= kernel.mean()
+
+        self.kernel = kernel
+        self.norm = float(np.sqrt(np.sum(np.square(kernel, dtype=np.float64))))
+        self.height, self.width = kernel.shape
+
+
+@dataclass
+class Template:
+    """A preprocessed template at one scale"""
+    name: str
+    group: str
+    scale: float
+    levels: List[_TemplateLevel]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.levels[0].width, self.levels[0].height
+
+    @property
+    def coarse_level(self) -> int:
+        return len(self.levels) - 1
+
+
+class FramePyramid:
+    """
+    Grayscale float32 pyramid of a frame with lazily built integral images
+
+    The integrals give every window's sum and sum of squares in O(1), so the
+    normalization term is shared by all templates matched on the frame.
+    """
+
+    def __init__(self, frame: np.ndarray, levels: int = 1):
+        if frame.ndim == 3 and frame.shape[2] == 4:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY)
+        elif frame.ndim == 3:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = frame
+
+        self.images = [gray.astype(np.float32)]
+
+        for _ in range(1, max(1, levels)):
+            previous = self.images[-1]
+
+            if min(previous.shape[:2]) < 2:
+                break
+
+            self.images.append(cv2.pyrDown(previous))
+
+        self._integrals = [None] * len(self.images)
+
+    @property
+    def levels(self) -> int:
+        return len(self.images)
+
+    def integrals(self, level: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self._integrals[level] is None:
+            self._integrals[level] = cv2.integral2(self.images[level], sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+        return self._integrals[level]
+
+    def response(self, level: int, template: _TemplateLevel, x0: int = 0, y0: int = 0,
+                 x1: Optional[int] = None, y1: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Normalized correlation coefficient (TM_CCOEFF_NORMED) for the window
+        top-left positions x0 <= x < x1, y0 <= y < y1
+        """
+        image = self.images[level]
+        height, width = image.shape[:2]
+        w, h = template.width, template.height
+
+        x1 = width - w + 1 if x1 is None else min(x1, width - w + 1)
+        y1 = height - h + 1 if y1 is None else min(y1, height - h + 1)
+        x0, y0 = max(0, x0), max(0, y0)
+
+        if x1 <= x0 or y1 <= y0 or template.norm < _FLAT_EPSILON:
+            return None
+
+        # The kernel is zero-mean, so plain correlation equals the covariance term
+        crop = image[y0:y1 + h - 1, x0:x1 + w - 1]
+        numerator = cv2.matchTemplate(crop, template.kernel, cv2.TM_CCORR).astype(np.float64)
+
+        sums, squares = self.integrals(level)
+        window_sum = sums[y0 + h:y1 + h, x0 + w:x1 + w] - sums[y0:y1, x0 + w:x1 + w] \
+            - sums[y0 + h:y1 + h, x0:x1] + sums[y0:y1, x0:x1]
+        window_squares = squares[y0 + h:y1 + h, x0 + w:x1 + w] - squares[y0:y1, x0 + w:x1 + w] \
+            - squares[y0 + h:y1 + h, x0:x1] + squares[y0:y1, x0:x1]
+
+        variance = np.maximum(window_squares - window_sum * window_sum / (w * h), 0.0)
+        denominator = np.sqrt(variance) * template.norm
+
+        response = np.zeros(numerator.shape, dtype=np.float32)
+        np.divide(numerator, denominator, out=response, where=denominator > _FLAT_EPSILON * template.norm,
+                  casting="unsafe")
+
+        return np.clip(response, -1.0, 1.0, out=response)
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, overlap: float = 0.3) -> List[int]:
+    """Greedy NMS over (x, y, w, h) boxes; returns kept indices, best first"""
+    if len(boxes) == 0:
+        return []
+
+    boxes = np.asarray(boxes, dtype=np.float64)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    order = np.argsort(scores)[::-1]
+    keep = []
+
+    while order.size > 0:
+        best = order[0]
+        keep.append(int(best))
+
+        rest = order[1:]
+        inter_w = np.maximum(0.0, np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]))
+        inter_h = np.maximum(0.0, np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]))
+        intersection = inter_w * inter_h
+        union = areas[best] + areas[rest] - intersection
+
+        iou = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        order = rest[iou <= overlap]
+
+    return keep
+
+
+def _peaks(response: np.ndarray, threshold: float, limit: Optional[int] = None) -> List[Tuple[int, int, float]]:
+    """Local maxima (3x3) above threshold as (x, y, value), strongest first"""
+    local_max = cv2.dilate(response, np.ones((3, 3), dtype=np.uint8))
+    ys, xs = np.nonzero((response >= threshold) & (response >= local_max))
+
+    values = response[ys, xs]
+    order = np.argsort(values)[::-1]
+
+    if limit is not None:
+        order = order[:limit]
+
+    return [(int(xs[i]), int(ys[i]), float(values[i])) for i in order]
+
+
+class TemplateBank:
+    """
+    Cache of preprocessed templates matched coarse-to-fine
+
+    Each template is stored once per scale with a small pyramid of zero-mean
+    kernels. Matching runs the full search on the coarsest level the
+    template supports, then refines each candidate in a small window at full
+    resolution. Results are suppressed per group (templates sharing a group,
+    e.g. an element type, compete for the same location).
+    """
+
+    def __init__(self, scales: Sequence[float] = (1.0,), max_levels: int = 3, min_coarse_size: int = 12,
+                 coarse_margin: float = 0.15, max_candidates: int = 32, nms_overlap: float = 0.3):
+        self.logger = logging.getLogger(__name__)
+
+        self.scales = tuple(scales)
+        self.max_levels = max_levels
+        self.min_coarse_size = min_coarse_size
+        self.coarse_margin = coarse_margin
+        self.max_candidates = max_candidates
+        self.nms_overlap = nms_overlap
+
+        self.templates = {}  # name -> List[Template], one per scale
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.templates)
+
+    def add_template(self, name: str, image: np.ndarray, group: Optional[str] = None,
+                     metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Preprocess a BGR, BGRA or grayscale image; replaces any template with the same name"""
+        if image is None or image.size == 0:
+            return False
+
+        if image.ndim == 3 and image.shape[2] == 4:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+        elif image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+
+        variants = []
+
+        for scale in self.scales:
+            if scale == 1.0:
+                scaled = gray
+            else:
+                size = (max(1, int(round(gray.shape[1] * scale))), max(1, int(round(gray.shape[0] * scale))))
+                interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+                scaled = cv2.resize(gray, size, interpolation=interpolation)
+
+            level_images = [scaled.astype(np.float32)]
+
+            while (len(level_images) < self.max_levels
+                   and min(level_images[-1].shape[:2]) // 2 >= self.min_coarse_size):
+                level_images.append(cv2.pyrDown(level_images[-1]))
+
+            levels = [_TemplateLevel(level_image) for level_image in level_images]
+
+            if levels[0].norm < _FLAT_EPSILON:
+                self.logger.debug(f"Template '{name}' has no texture at scale {scale}; skipped")
+                continue
+
+            variants.append(Template(name, group or name, scale, levels, dict(metadata or {})))
+
+        if not variants:
+            return False
+
+        with self.lock:
+            self.templates[name] = variants
+
+        return True
+
+    def add_encoded_template(self, name: str, data: Union[str, bytes], group: Optional[str] = None,
+                             metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Decode a base64 encoded image (e.g. a stored PNG screenshot) and add it"""
+        try:
+            buffer = np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+        except Exception as e:
+            self.logger.error(f"Failed to decode template '{name}': {e}")
+            return False
+
+        return self.add_template(name, image, group, metadata)
+
+    def remove_template(self, name: str):
+        with self.lock:
+            self.templates.pop(name, None)
+
+    def clear(self):
+        with self.lock:
+            self.templates = {}
+
+    def build_pyramid(self, frame: np.ndarray) -> FramePyramid:
+        """Pyramid deep enough for every template in the bank"""
+        with self.lock:
+            levels = max((variant.coarse_level + 1 for variants in self.templates.values() for variant in variants),
+                         default=1)
+
+        return FramePyramid(frame, levels)
+
+    def match(self, frame: Optional[np.ndarray] = None, names: Optional[Sequence[str]] = None,
+              groups: Optional[Sequence[str]] = None, threshold: float = 0.8,
+              max_results: Optional[int] = None, pyramid: Optional[FramePyramid] = None) -> List[TemplateMatch]:
+        """
+        Find templates in a frame
+
+        Args:
+            frame: BGR or grayscale frame (not needed when pyramid is given)
+            names: Only match these templates
+            groups: Only match templates in these groups
+            threshold: Minimum normalized correlation
+            max_results: Keep at most this many matches per group
+            pyramid: Precomputed build_pyramid() result for the frame
+
+        Returns:
+            Matches ordered by confidence, after per-group NMS
+        """
+        with self.lock:
+            selected = [variant for name, variants in self.templates.items()
+                        if names is None or name in names
+                        for variant in variants
+                        if groups is None or variant.group in groups]
+
+        if not selected:
+            return []
+
+        if pyramid is None:
+            pyramid = self.build_pyramid(frame)
+
+        by_group = {}
+
+        for template in selected:
+            by_group.setdefault(template.group, []).extend(self._match_template(pyramid, template, threshold))
+
+        matches = []
+
+        for group_matches in by_group.values():
+            if not group_matches:
+                continue
+
+            boxes = np.array([match.bbox for match in group_matches])
+            scores = np.array([match.confidence for match in group_matches])
+            keep = non_max_suppression(boxes, scores, self.nms_overlap)
+
+            if max_results is not None:
+                keep = keep[:max_results]
+
+            matches.extend(group_matches[index] for index in keep)
+
+        matches.sort(key=lambda match: match.confidence, reverse=True)
+        return matches
+
+    def find(self, frame: np.ndarray, group: str, threshold: float = 0.8,
+             pyramid: Optional[FramePyramid] = None) -> List[Tuple[int, int, float]]:
+        """Matches of one group in the (x, y, confidence) format used by VisionSystem"""
+        return [match.as_tuple() for match in self.match(frame, groups=[group], threshold=threshold, pyramid=pyramid)]
+
+    def _match_template(self, pyramid: FramePyramid, template: Template, threshold: float) -> List[TemplateMatch]:
+        level = min(template.coarse_level, pyramid.levels - 1)
+        full = template.levels[0]
+
+        if level == 0:
+            response = pyramid.response(0, full)
+
+            if response is None:
+                return []
+
+            candidates = _peaks(response, threshold)
+        else:
+            coarse = pyramid.response(level, template.levels[level])
+
+            if coarse is None:
+                return []
+
+            candidates = []
+            radius = (1 << level) + 1
+
+            # Refine each coarse peak in a small full-resolution window
+            for coarse_x, coarse_y, _ in _peaks(coarse, threshold - self.coarse_margin, self.max_candidates):
+                x0 = (coarse_x << level) - radius
+                y0 = (coarse_y << level) - radius
+
+                refined = pyramid.response(0, full, x0, y0, x0 + 2 * radius + 1, y0 + 2 * radius + 1)
+
+                if refined is None:
+                    continue
+
+                _, confidence, _, (dx, dy) = cv2.minMaxLoc(refined)
+
+                if confidence >= threshold:
+                    candidates.append((max(0, x0) + dx, max(0, y0) + dy, confidence))
+
+        return [
+            TemplateMatch(
+                name=template.name,
+                group=template.group,
+                x=x + full.width // 2,
+                y=y + full.height // 2,
+                confidence=confidence,
+                bbox=(x, y, full.width, full.height),
+                scale=template.scale
+            )
+            for x, y, confidence in candidates
+        ]
+
+
+
+class _SizeGroup:
+    """Templates of one size: stacked coarse kernels, norms and cached spectra"""
+
+    def __init__(self, height: int, width: int, level: int):
+        self.height = height
+        self.width = width
+        self.level = level
+        self.names = []
+        self.full = []  # full-resolution _TemplateLevel per template, for refinement
+        self.kernels = None  # (n, coarse_h, coarse_w) zero-mean coarse kernels
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.spectra = {}  # FFT shape -> conjugated coarse spectra
+
+    def add(self, name: str, full: _TemplateLevel, coarse: _TemplateLevel):
+        if self.kernels is None:
+            self.kernels = np.zeros((0,) + coarse.kernel.shape, dtype=np.float32)
+
+        self.names.append(name)
+        self.full.append(full)
+        self.kernels = np.concatenate([self.kernels, coarse.kernel[np.newaxis]])
+        self.norms = np.append(self.norms, np.float32(coarse.norm))
+
+    def remove(self, name: str):
+        index = self.names.index(name)
+        del self.names[index]
+        del self.full[index]
+        self.kernels = np.delete(self.kernels, index, axis=0)
+        self.norms = np.delete(self.norms, index)
+
+
+class BatchTemplateMatcher:
+    """
+    Batched FFT matcher for large sets of same-purpose templates (e.g. pet icons)
+
+    Templates are grouped by size and ranked on a downsampled copy of the
+    search region: the region is transformed once per pyramid level, each
+    batch of template spectra is multiplied against that single transform and
+    inverse-transformed together, and the window normalisation comes from the
+    shared integral images. Only each template's best coarse location is kept;
+    the strongest candidates are refined at full resolution in a small
+    window, then overlapping hits from different templates are resolved
+    with NMS.
+    """
+
+    def __init__(self, levels: int = 2, min_coarse_size: int = 8, coarse_margin: float = 0.15,
+                 max_refinements: int = 16, batch_size: int = 64,
+                 spectrum_cache_bytes: int = 256 * 1024 * 1024, nms_overlap: float = 0.3):
+        self.logger = logging.getLogger(__name__)
+
+        self.levels = levels
+        self.min_coarse_size = min_coarse_size
+        self.coarse_margin = coarse_margin
+        self.max_refinements = max_refinements
+        self.batch_size = batch_size
+        self.spectrum_cache_bytes = spectrum_cache_bytes
+        self.nms_overlap = nms_overlap
+
+        self.groups = {}  # (height, width) -> _SizeGroup
+        self.template_sizes = {}  # name -> (height, width)
+        self.cached_bytes = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.template_sizes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.template_sizes
+
+    def add_template(self, name: str, image: np.ndarray) -> bool:
+        """Preprocess a BGR, BGRA or grayscale template; replaces any template with the same name"""
+        if image is None or image.size == 0:
+            return False
+
+        if image.ndim == 3 and image.shape[2] == 4:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+        elif image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+
+        full = _TemplateLevel(gray)
+
+        if full.norm < _FLAT_EPSILON:
+            self.logger.debug(f"Template '{name}' has no texture; skipped")
+            return False
+
+        coarse_image = gray.astype(np.float32)
+        level = 0
+
+        while level < self.levels and min(coarse_image.shape[:2]) // 2 >= self.min_coarse_size:
+            coarse_image = cv2.pyrDown(coarse_image)
+            level += 1
+
+        coarse = _TemplateLevel(coarse_image)
+
+        with self.lock:
+            self.remove_template(name)
+
+            size = (full.height, full.width)
+            group = self.groups.setdefault(size, _SizeGroup(full.height, full.width, level))
+            self._drop_spectra(group)
+            group.add(name, full, coarse)
+            self.template_sizes[name] = size
+
+        return True
+
+    def remove_template(self, name: str):
+        with self.lock:
+            size = self.template_sizes.pop(name, None)
+
+            if size is None:
+                return
+
+            group = self.groups[size]
+            self._drop_spectra(group)
+            group.remove(name)
+
+            if not group.names:
+                del self.groups[size]
+
+    def clear(self):
+        with self.lock:
+            self.groups = {}
+            self.template_sizes = {}
+            self.cached_bytes = 0
+
+    def _drop_spectra(self, group: _SizeGroup):
+        self.cached_bytes -= sum(spectra.nbytes for spectra in group.spectra.values())
+        group.spectra = {}
+
+    def _batch_spectra(self, group: _SizeGroup, fft_shape: Tuple[int, int], start: int, stop: int) -> np.ndarray:
+        spectra = group.spectra.get(fft_shape)
+
+        if spectra is not None:
+            return spectra[start:stop]
+
+        # Conjugated spectra turn the product into a cross-correlation
+        nbytes = len(group.names) * fft_shape[0] * (fft_shape[1] // 2 + 1) * np.dtype(np.complex64).itemsize
+
+        if self.cached_bytes + nbytes > self.spectrum_cache_bytes:
+            return np.conj(np.fft.rfft2(group.kernels[start:stop], s=fft_shape))
+
+        spectra = np.conj(np.fft.rfft2(group.kernels, s=fft_shape))
+        group.spectra[fft_shape] = spectra
+        self.cached_bytes += spectra.nbytes
+
+        return spectra[start:stop]
+
+    def match(self, image: np.ndarray, threshold: float = 0.8,
+              roi: Optional[Tuple[int, int, int, int]] = None) -> List[TemplateMatch]:
+        """
+        Best match of every template inside roi (x, y, w, h) of a BGR or
+        grayscale image, thresholded and suppressed across templates
+        """
+        offset_x = offset_y = 0
+
+        if roi is not None:
+            x, y, w, h = roi
+            offset_x, offset_y = max(0, x), max(0, y)
+            image = image[offset_y:y + h, offset_x:x + w]
+
+        if image.size == 0:
+            return []
+
+        with self.lock:
+            groups = list(self.groups.values())
+
+        pyramid = FramePyramid(image, self.levels + 1)
+        height, width = pyramid.images[0].shape[:2]
+        image_spectra = {}
+
+        # (coarse score, group, index, coarse x, coarse y)
+        candidates = []
+
+        for group in groups:
+            if group.height > height or group.width > width or group.level >= pyramid.levels:
+                continue
+
+            level = group.level
+            search = pyramid.images[level]
+            search_height, search_width = search.shape[:2]
+            h, w = group.kernels.shape[1:]
+            rows, cols = search_height - h + 1, search_width - w + 1
+
+            if rows <= 0 or cols <= 0:
+                continue
+
+            # Valid correlations never wrap, so the transform only has to cover the image
+            fft_shape = (cv2.getOptimalDFTSize(search_height), cv2.getOptimalDFTSize(search_width))
+
+            if (level, fft_shape) not in image_spectra:
+                image_spectra[(level, fft_shape)] = np.fft.rfft2(search, s=fft_shape)
+
+            image_spectrum = image_spectra[(level, fft_shape)]
+
+            sums, squares = pyramid.integrals(level)
+            window_sum = sums[h:, w:] - sums[:rows, w:] - sums[h:, :cols] + sums[:rows, :cols]
+            window_squares = squares[h:, w:] - squares[:rows, w:] - squares[h:, :cols] + squares[:rows, :cols]
+            window_std = np.sqrt(np.maximum(window_squares - window_sum * window_sum / (w * h), 0.0))
+
+            # Flat windows can never match; give them an infinite denominator
+            window_std = np.where(window_std > _FLAT_EPSILON, window_std, np.inf).astype(np.float32)
+
+            with self.lock:
+                for start in range(0, len(group.names), self.batch_size):
+                    stop = min(start + self.batch_size, len(group.names))
+                    spectra = self._batch_spectra(group, fft_shape, start, stop)
+
+                    correlation = np.fft.irfft2(spectra * image_spectrum, s=fft_shape)[:, :rows, :cols]
+                    response = correlation / window_std
+                    response /= group.norms[start:stop, np.newaxis, np.newaxis]
+
+                    flat = response.reshape(stop - start, -1)
+                    best = flat.argmax(axis=1)
+                    scores = flat[np.arange(stop - start), best]
+
+                    for offset in np.flatnonzero(scores >= threshold - self.coarse_margin):
+                        coarse_y, coarse_x = divmod(int(best[offset]), cols)
+                        candidates.append((float(scores[offset]), group, start + offset, coarse_x, coarse_y))
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        refined = []
+
+        # Refine the strongest candidates in a small full-resolution window
+        for _, group, index, coarse_x, coarse_y in candidates[:self.max_refinements]:
+            radius = (1 << group.level) + 1
+            x0 = (coarse_x << group.level) - radius
+            y0 = (coarse_y << group.level) - radius
+
+            response = pyramid.response(0, group.full[index], x0, y0, x0 + 2 * radius + 1, y0 + 2 * radius + 1)
+
+            if response is None:
+                continue
+
+            _, confidence, _, (dx, dy) = cv2.minMaxLoc(response)
+
+            if confidence >= threshold:
+                x, y = max(0, x0) + dx + offset_x, max(0, y0) + dy + offset_y
+                refined.append((group.names[index], x, y, group.width, group.height, float(confidence)))
+
+        if not refined:
+            return []
+
+        boxes = np.array([candidate[1:5] for candidate in refined])
+        scores = np.array([candidate[5] for candidate in refined])
+
+        return [
+            TemplateMatch(
+                name=name,
+                group=name,
+                x=x + w // 2,
+                y=y + h // 2,
+                confidence=confidence,
+                bbox=(x, y, w, h)
+            )
+            for name, x, y, w, h, confidence in (refined[i] for i in non_max_suppression(boxes, scores, self.nms_overlap))
+        ]
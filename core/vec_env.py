@@ -0,0 +1,322 @@
+"""
+Vectorized Environments
+Steps N environments (game instances, or gym environments for offline
+runs) as one batch: in-process or each in its own worker process, with
+observations stacked so the agent picks all N actions in one forward pass,
+plus a collector that drives an agent through them
+"""
+
+import time
+import logging
+import multiprocessing
+from collections import deque
+from typing import Optional, Tuple, List, Dict, Any, Callable, Sequence
+
+import numpy as np
+
+try:
+    import cloudpickle
+    CLOUDPICKLE_AVAILABLE = True
+except Exception:
+    CLOUDPICKLE_AVAILABLE = False
+
+# Environment factory: returns an object with gym's reset() -> observation
+# and step(action) -> (observation, reward, done, info)
+EnvFactory = Callable[[], Any]
+
+
+class VecEnv:
+    """
+    Batch of environments stepped together
+
+    step() resets environments whose episode ended and returns the first
+    observation of the new episode in their slot; the final observation is
+    in info['terminal_observation'] and the episode's return and length in
+    info['episode'].
+    """
+
+    def __init__(self, num_envs: int):
+        self.logger = logging.getLogger(__name__)
+
+        self.num_envs = num_envs
+        self.observation_space = None
+        self.action_space = None
+
+        self._episode_returns = np.zeros(num_envs, dtype=np.float64)
+        self._episode_lengths = np.zeros(num_envs, dtype=np.int64)
+
+        self.stats = {
+            'steps': 0,
+            'episodes': 0,
+            'step_ms': 0.0
+        }
+
+    def reset(self) -> np.ndarray:
+        self._episode_returns[:] = 0
+        self._episode_lengths[:] = 0
+        return np.stack(self._reset_all())
+
+    def step(self, actions: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """(observations, rewards, dones, infos) for one action per environment"""
+        started = time.perf_counter()
+        results = self._step_all(actions)
+
+        observations, rewards, dones, infos = zip(*results)
+        rewards = np.asarray(rewards, dtype=np.float32)
+        dones = np.asarray(dones, dtype=np.bool_)
+
+        self._episode_returns += rewards
+        self._episode_lengths += 1
+
+        for index in np.flatnonzero(dones):
+            infos[index]['episode'] = {'r': float(self._episode_returns[index]),
+                                       'l': int(self._episode_lengths[index])}
+            self._episode_returns[index] = 0
+            self._episode_lengths[index] = 0
+            self.stats['episodes'] += 1
+
+        self.stats['steps'] += self.num_envs
+        self.stats['step_ms'] = (time.perf_counter() - started) * 1000
+
+        return np.stack(observations), rewards, dones, list(infos)
+
+    def _reset_all(self) -> List[np.ndarray]:
+        raise NotImplementedError
+
+    def _step_all(self, actions: Sequence[Any]) -> List[Tuple[np.ndarray, float, bool, Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['num_envs'] = self.num_envs
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _step_env(env: Any, action: Any) -> Tuple[np.ndarray, float, bool, Dict[str, Any]]:
+    """Step one environment, resetting it when its episode ends"""
+    observation, reward, done, info = env.step(action)
+    info = dict(info or {})
+
+    if done:
+        info['terminal_observation'] = observation
+        observation = env.reset()
+
+    return observation, reward, done, info
+
+
+class SyncVecEnv(VecEnv):
+    """Environments stepped one after another in this process (tests, debugging, cheap environments)"""
+
+    def __init__(self, env_fns: Sequence[EnvFactory]):
+        super().__init__(len(env_fns))
+
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.observation_space = getattr(self.envs[0], 'observation_space', None)
+        self.action_space = getattr(self.envs[0], 'action_space', None)
+
+    def _reset_all(self) -> List[np.ndarray]:
+        return [env.reset() for env in self.envs]
+
+    def _step_all(self, actions: Sequence[Any]) -> List[Tuple[np.ndarray, float, bool, Dict[str, Any]]]:
+        return [_step_env(env, action) for env, action in zip(self.envs, actions)]
+
+    def close(self):
+        for env in self.envs:
+            if hasattr(env, 'close'):
+                env.close()
+
+
+class _PickledFactory:
+    """Ships an environment factory to a worker with cloudpickle when available (lambdas, closures)"""
+
+    def __init__(self, env_fn: EnvFactory):
+        self.env_fn = env_fn
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.env_fn) if CLOUDPICKLE_AVAILABLE else self.env_fn
+
+    def __setstate__(self, state):
+        self.env_fn = cloudpickle.loads(state) if isinstance(state, bytes) else state
+
+    def __call__(self):
+        return self.env_fn()
+
+
+def _worker(remote, parent_remote, env_fn: _PickledFactory):
+    """Worker process body: owns one environment and serves commands over a pipe"""
+    parent_remote.close()
+    env = env_fn()
+
+    try:
+        while True:
+            command, data = remote.recv()
+
+            if command == 'step':
+                remote.send(_step_env(env, data))
+            elif command == 'reset':
+                remote.send(env.reset())
+            elif command == 'spaces':
+                remote.send((getattr(env, 'observation_space', None), getattr(env, 'action_space', None)))
+            elif command == 'close':
+                break
+            else:
+                raise ValueError(f"Unknown command '{command}'")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        if hasattr(env, 'close'):
+            env.close()
+        remote.close()
+
+
+class SubprocVecEnv(VecEnv):
+    """
+    Each environment in its own worker process
+
+    Actions are sent to all workers before any result is awaited, so the
+    environments (e.g. separate game instances capturing and acting on
+    their own windows) step in parallel. Factories must be picklable for
+    the start method (spawn on Windows), or cloudpickle must be installed.
+    """
+
+    def __init__(self, env_fns: Sequence[EnvFactory], start_method: Optional[str] = None):
+        super().__init__(len(env_fns))
+
+        context = multiprocessing.get_context(start_method)
+        self.remotes, worker_remotes = zip(*[context.Pipe() for _ in env_fns])
+        self.processes = []
+
+        for remote, worker_remote, env_fn in zip(self.remotes, worker_remotes, env_fns):
+            process = context.Process(target=_worker, args=(worker_remote, remote, _PickledFactory(env_fn)),
+                                      daemon=True)
+            process.start()
+            worker_remote.close()
+            self.processes.append(process)
+
+        self.closed = False
+
+        self.remotes[0].send(('spaces', None))
+        self.observation_space, self.action_space = self.remotes[0].recv()
+
+    def _reset_all(self) -> List[np.ndarray]:
+        for remote in self.remotes:
+            remote.send(('reset', None))
+
+        return [remote.recv() for remote in self.remotes]
+
+    def _step_all(self, actions: Sequence[Any]) -> List[Tuple[np.ndarray, float, bool, Dict[str, Any]]]:
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', action))
+
+        return [remote.recv() for remote in self.remotes]
+
+    def close(self):
+        if self.closed:
+            return
+
+        for remote in self.remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+
+        for process in self.processes:
+            process.join(timeout=5.0)
+
+            if process.is_alive():
+                process.terminate()
+
+        self.closed = True
+
+
+class VecEnvCollector:
+    """
+    Drives an agent through a VecEnv
+
+    Each step makes one batched select_actions() call for all environments
+    and hands the whole step to agent.train_batch(); the agent's replay or
+    rollout storage takes the N transitions at once. Transitions that end
+    an episode use the terminal observation as next observation.
+    """
+
+    def __init__(self, agent: Any, vec_env: VecEnv):
+        self.logger = logging.getLogger(__name__)
+
+        self.agent = agent
+        self.vec_env = vec_env
+        self.observations = None
+
+        self.episode_rewards = deque(maxlen=100)
+        self.episode_lengths = deque(maxlen=100)
+
+        self.stats = {
+            'steps': 0,
+            'episodes': 0,
+            'updates': 0,
+            'select_ms': 0.0,
+            'env_ms': 0.0,
+            'train_ms': 0.0
+        }
+
+    def run(self, total_steps: int, training: bool = True) -> Dict[str, Any]:
+        """Collect total_steps environment steps (over all environments), training the agent as it goes"""
+        if self.observations is None:
+            self.observations = self.vec_env.reset()
+
+        last_train_info = {}
+
+        for _ in range(max(1, total_steps // self.vec_env.num_envs)):
+            started = time.perf_counter()
+            actions, policy_info = self.agent.select_actions(self.observations, training=training, return_info=True)
+            selected = time.perf_counter()
+
+            next_observations, rewards, dones, infos = self.vec_env.step(actions)
+            stepped = time.perf_counter()
+
+            if training:
+                # Replay needs each transition's own next state, not the reset observation
+                transition_next = next_observations
+                if dones.any():
+                    transition_next = next_observations.copy()
+                    for index in np.flatnonzero(dones):
+                        transition_next[index] = infos[index].get('terminal_observation', next_observations[index])
+
+                train_info = self.agent.train_batch(self.observations, actions, rewards, transition_next, dones,
+                                                    policy_info)
+                if train_info:
+                    last_train_info = train_info
+                    self.stats['updates'] += 1
+
+            for info in infos:
+                if 'episode' in info:
+                    self.episode_rewards.append(info['episode']['r'])
+                    self.episode_lengths.append(info['episode']['l'])
+                    self.stats['episodes'] += 1
+
+            self.observations = next_observations
+            self.stats['steps'] += self.vec_env.num_envs
+
+            finished = time.perf_counter()
+            self.stats['select_ms'] = (selected - started) * 1000
+            self.stats['env_ms'] = (stepped - selected) * 1000
+            self.stats['train_ms'] = (finished - stepped) * 1000
+
+        stats = self.get_stats()
+        stats['train'] = last_train_info
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['num_envs'] = self.vec_env.num_envs
+        stats['avg_episode_reward'] = float(np.mean(self.episode_rewards)) if self.episode_rewards else 0.0
+        stats['avg_episode_length'] = float(np.mean(self.episode_lengths)) if self.episode_lengths else 0.0
+        return stats
@@ -11,6 +11,7 @@ import time
 import threading
 from pathlib import Path
 import json
+import base64
 
 try:
     import pyautogui
@@ -19,21 +20,29 @@ except Exception:
     PYAUTOGUI_AVAILABLE = False
     pyautogui = None
 
-try:
-    from PIL import Image
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
-
-from collections import deque
+from .frame_ring_buffer import FrameRingBuffer
+from .frame_pacer import FramePacer
+from .capture_backends import get_default_backend
+from .color_segmentation import ColorSegmentation, ColorSegmentationEngine
+from .template_bank import TemplateBank, FramePyramid
+from .color_palette import PaletteEngine
 
 class VisionSystem:
     """Main computer vision system for game automation"""
     
+    # Default color ranges for templates without their own color_range
+    DEFAULT_COLOR_RANGES = {
+        'chests': {'lower': [10, 100, 100], 'upper': [30, 255, 255]},  # Golden/brown
+        'eggs': {'lower': [0, 100, 100], 'upper': [10, 255, 255]},     # Red/pink
+        'breakables': {'lower': [100, 50, 50], 'upper': [130, 255, 255]}, # Blue
+        'ui_elements': {'lower': [0, 0, 200], 'upper': [180, 30, 255]}  # White/bright
+    }
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.is_capturing = False
         self.last_screenshot = None
+        self._last_screenshot_borrowed = False
         self.capture_thread = None
         
         # Disable PyAutoGUI failsafe to prevent interruption
@@ -43,19 +52,32 @@ class VisionSystem:
         # Load game element templates
         self.templates = self._load_templates()
         
+        # Fused color segmentation over every template range (built lazily)
+        self.color_engine = None
+        self.color_engine_ranges = None
+        
+        # Learned template images, preprocessed once for pyramid matching
+        self.template_bank = TemplateBank()
+        self._load_template_images()
+        
+        # Quantized color histograms for dominant-color analysis
+        self.palette_engine = PaletteEngine()
+        
         # Vision settings
         self.match_threshold = 0.8
         self.screen_region = None  # Full screen by default
         
         # SerpentAI-inspired frame buffer for high-performance capture
-        self.frame_buffer = deque(maxlen=60)  # Store last 2 seconds at 30fps
-        self.frame_buffer_lock = threading.Lock()
+        self.frame_buffer = FrameRingBuffer(60)  # Store last 2 seconds at 30fps
+        self.capture_backend = get_default_backend()
+        self.frame_buffer_lock = self.frame_buffer.lock
         
         # Performance optimization settings
         self.fps = 30
         self.frame_time = 1.0 / self.fps
         self.capture_stats = {
             'frames_captured': 0,
+            'region_captures': 0,
             'avg_fps': 0.0,
             'last_capture_time': 0.0
         }
@@ -88,6 +110,18 @@ class VisionSystem:
             "areas": {}
         }
     
+    def _load_template_images(self):
+        """Add every template that carries a stored image to the template bank"""
+        for element_type, template_data in self.templates.items():
+            if not isinstance(template_data, list):
+                continue
+            
+            for index, template_info in enumerate(template_data):
+                if template_info.get('template_image'):
+                    self.template_bank.add_encoded_template(
+                        f"{element_type}:{index}", template_info['template_image'], group=element_type
+                    )
+    
     def save_templates(self):
         """Save current templates to file"""
         try:
@@ -101,80 +135,151 @@ class VisionSystem:
         except Exception as e:
             self.logger.error(f"Failed to save templates: {e}")
     
-    def capture_screen(self, region: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+    @property
+    def last_screenshot(self) -> Optional[np.ndarray]:
+        """The most recent capture, as an array no later capture changes"""
+        if self._last_screenshot_borrowed:
+            # The newest ring slot is only reused after frame_buffer.capacity
+            # more captures, and every capture replaces it here first
+            self._last_screenshot = self._last_screenshot.copy()
+            self._last_screenshot_borrowed = False
+        
+        return self._last_screenshot
+    
+    @last_screenshot.setter
+    def last_screenshot(self, screenshot: Optional[np.ndarray]):
+        self._last_screenshot = screenshot
+        self._last_screenshot_borrowed = False
+    
+    def capture_screen(self, region: Optional[Tuple[int, int, int, int]] = None,
+                       copy: bool = True) -> Optional[np.ndarray]:
         """
         Enhanced screen capture with SerpentAI optimizations
         
         Args:
             region: (x, y, width, height) tuple for specific region
+            copy: Return an array the caller owns. With copy=False a
+                full-screen capture is returned as a view of its ring buffer
+                slot, which is overwritten frame_buffer.capacity captures
+                later; use it only before the next captures (e.g. within one
+                analysis pass)
             
         Returns:
             Screenshot as numpy array or None if failed
         """
         try:
-            if not PYAUTOGUI_AVAILABLE:
-                self.logger.error("PyAutoGUI not available - cannot capture real screenshots. Install with: pip install PyAutoGUI")
+            if self.capture_backend is None:
+                self.logger.error("No screen capture backend available - cannot capture real screenshots. Install mss or PyAutoGUI")
                 return None
             
             capture_start = time.time()
-                
-            if region:
-                screenshot = pyautogui.screenshot(region=region)
-            else:
-                screenshot = pyautogui.screenshot()
             
-            # Convert PIL image to numpy array with optimizations
-            if PIL_AVAILABLE and hasattr(screenshot, 'convert'):
-                frame = np.array(screenshot.convert('RGB'))
-            else:
-                frame = np.array(screenshot)
-            
-            # Convert RGB to BGR for OpenCV
-            if len(frame.shape) == 3:
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            # Add to frame buffer with timestamp (SerpentAI style)
-            frame_data = {
-                'frame': frame,
-                'timestamp': capture_start,
-                'frame_id': self.capture_stats['frames_captured']
-            }
+            # Region captures vary in size, so only full-screen frames go
+            # into the ring buffer; those are captured straight into a slot
+            if region:
+                frame = self.capture_backend.grab(region)
+                if frame is None:
+                    return None
+                
+                self.capture_stats['frames_captured'] += 1
+                self.capture_stats['region_captures'] += 1
+                self.capture_stats['last_capture_time'] = capture_start
+                
+                self.last_screenshot = frame
+                return frame
             
-            with self.frame_buffer_lock:
-                self.frame_buffer.append(frame_data)
+            frame = self.capture_backend.grab_into_buffer(self.frame_buffer, None, capture_start)
+            if frame is None:
+                return None
             
             # Update capture statistics
             self.capture_stats['frames_captured'] += 1
             self.capture_stats['last_capture_time'] = capture_start
             
             # Calculate FPS
-            if len(self.frame_buffer) > 1:
-                time_span = capture_start - self.frame_buffer[0]['timestamp']
+            buffered = len(self.frame_buffer)
+            if buffered > 1:
+                time_span = capture_start - self.frame_buffer.get_timestamp(0)
                 if time_span > 0:
-                    self.capture_stats['avg_fps'] = len(self.frame_buffer) / time_span
+                    self.capture_stats['avg_fps'] = buffered / time_span
+            
+            if copy:
+                frame = frame.copy()
+                self.last_screenshot = frame
+            else:
+                self._last_screenshot = frame
+                self._last_screenshot_borrowed = True
             
-            self.last_screenshot = frame
             return frame
             
         except Exception as e:
             self.logger.error(f"Screen capture failed: {e}")
             return None
     
-    def find_template(self, template_name: str, screenshot: Optional[np.ndarray] = None) -> List[Tuple[int, int, float]]:
+    def segment_colors(self, screenshot: np.ndarray, hsv: Optional[np.ndarray] = None) -> ColorSegmentation:
+        """
+        Classify a screenshot against every template color range in one pass
+        
+        The result can be passed to find_template() for each element type so
+        the HSV conversion and range masks are computed once per frame.
+        """
+        return self._get_color_engine().segment(screenshot, hsv=hsv)
+    
+    def _get_color_engine(self) -> ColorSegmentationEngine:
+        """Fused color engine over all template ranges, rebuilt when templates change"""
+        ranges = []
+        
+        for element_type, template_data in self.templates.items():
+            if not isinstance(template_data, list):
+                continue
+            
+            for index, template_info in enumerate(template_data):
+                # Templates with a stored image are matched by the template bank
+                if template_info.get('template_image'):
+                    continue
+                
+                color_range = template_info.get('color_range') or self.DEFAULT_COLOR_RANGES.get(
+                    element_type, self.DEFAULT_COLOR_RANGES['ui_elements'])
+                
+                ranges.append((
+                    f"{element_type}:{index}",
+                    tuple(color_range.get('lower', [0, 0, 0])),
+                    tuple(color_range.get('upper', [180, 255, 255]))
+                ))
+        
+        if self.color_engine is None or self.color_engine_ranges != ranges:
+            engine = ColorSegmentationEngine()
+            
+            for name, lower, upper in ranges:
+                engine.register(name, lower, upper)
+            
+            self.color_engine = engine
+            self.color_engine_ranges = ranges
+        
+        return self.color_engine
+    
+    def find_template(self, template_name: str, screenshot: Optional[np.ndarray] = None,
+                      segmentation: Optional[ColorSegmentation] = None,
+                      pyramid: Optional[FramePyramid] = None) -> List[Tuple[int, int, float]]:
         """
         Find template matches in screenshot
         
+        Templates with a stored image are matched through the template bank;
+        the rest fall back to color range detection.
+        
         Args:
             template_name: Name of template to find
             screenshot: Screenshot to search in (uses last capture if None)
+            segmentation: Precomputed segment_colors() result for the screenshot
+            pyramid: Precomputed template_bank.build_pyramid() result for the screenshot
             
         Returns:
             List of (x, y, confidence) tuples for matches
         """
-        if screenshot is None:
+        if screenshot is None and segmentation is None:
             screenshot = self.last_screenshot
             
-        if screenshot is None:
+        if screenshot is None and segmentation is None:
             self.logger.warning("No screenshot available for template matching")
             return []
         
@@ -186,75 +291,69 @@ class VisionSystem:
             self.logger.warning(f"No template data found for: {template_name}")
             return []
         
-        for template_info in template_data:
+        image_templates = set(name for name in self.template_bank.names if name.startswith(f"{template_name}:"))
+        
+        if image_templates:
+            try:
+                if pyramid is None:
+                    pyramid = self.template_bank.build_pyramid(
+                        screenshot if screenshot is not None else self.last_screenshot
+                    )
+                
+                matches.extend(self.template_bank.find(None, template_name, self.match_threshold, pyramid))
+            except Exception as e:
+                self.logger.error(f"Template matching failed for {template_name}: {e}")
+            
+            if len(image_templates) == len(template_data):
+                return matches
+        
+        try:
+            engine = self._get_color_engine()
+            
+            if segmentation is None:
+                segmentation = engine.segment(screenshot)
+            elif segmentation.engine is not engine:
+                # Templates changed since the segmentation was made; reuse its HSV frame
+                segmentation = engine.segment(hsv=segmentation.hsv)
+        except Exception as e:
+            self.logger.error(f"Color segmentation failed: {e}")
+            return []
+        
+        for index, template_info in enumerate(template_data):
+            if f"{template_name}:{index}" in image_templates:
+                continue
+            
             try:
-                # In a real implementation, this would load actual template images
-                # For now, we'll use color-based detection as a placeholder
+                # Templates learned without an image use color-based detection
                 matches.extend(self._find_by_color_range(
-                    screenshot, 
-                    template_info.get('color_range', {}),
-                    template_info.get('size_range', {}),
-                    template_name
+                    segmentation,
+                    f"{template_name}:{index}",
+                    template_info.get('size_range', {})
                 ))
             except Exception as e:
                 self.logger.error(f"Template matching failed for {template_name}: {e}")
         
         return matches
     
-    def _find_by_color_range(self, screenshot: np.ndarray, color_range: Dict, size_range: Dict, element_type: str) -> List[Tuple[int, int, float]]:
-        """
-        Find elements by color range detection
-        
-        This is a simplified approach for demonstration.
-        In a real implementation, you'd use actual template matching with cv2.matchTemplate
-        """
+    def _find_by_color_range(self, segmentation: ColorSegmentation, range_name: str, size_range: Dict) -> List[Tuple[int, int, float]]:
+        """Find elements by color range detection"""
         matches = []
         
         try:
-            # Convert to HSV for better color detection
-            hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
-            
-            # Default color ranges for different game elements
-            default_ranges = {
-                'chests': {'lower': [10, 100, 100], 'upper': [30, 255, 255]},  # Golden/brown
-                'eggs': {'lower': [0, 100, 100], 'upper': [10, 255, 255]},     # Red/pink
-                'breakables': {'lower': [100, 50, 50], 'upper': [130, 255, 255]}, # Blue
-                'ui_elements': {'lower': [0, 0, 200], 'upper': [180, 30, 255]}  # White/bright
-            }
-            
-            # Use provided color range or default
-            if color_range:
-                lower = np.array(color_range.get('lower', [0, 0, 0]))
-                upper = np.array(color_range.get('upper', [180, 255, 255]))
-            else:
-                range_data = default_ranges.get(element_type, default_ranges['ui_elements'])
-                lower = np.array(range_data['lower'])
-                upper = np.array(range_data['upper'])
-            
-            # Create mask
-            mask = cv2.inRange(hsv, lower, upper)
-            
-            # Find contours
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter contours by size
+            # Filter components by size
             min_area = size_range.get('min_area', 100)
             max_area = size_range.get('max_area', 10000)
             
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if min_area <= area <= max_area:
-                    # Get bounding rectangle
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
-                    # Calculate confidence based on area and shape
-                    confidence = min(0.9, area / max_area)
-                    
-                    # Use center point
-                    center_x = x + w // 2
-                    center_y = y + h // 2
-                    
-                    matches.append((center_x, center_y, confidence))
+            components = segmentation.components([range_name], min_area=min_area, max_area=max_area)
+            
+            for component in components[range_name]:
+                # Calculate confidence based on area and shape
+                confidence = min(0.9, component['area'] / max_area)
+                
+                # Use center point
+                center_x, center_y = component['center']
+                
+                matches.append((center_x, center_y, confidence))
             
         except Exception as e:
             self.logger.error(f"Color range detection failed: {e}")
@@ -280,7 +379,7 @@ class VisionSystem:
         Returns:
             Dictionary containing analysis results
         """
-        screenshot = self.capture_screen()
+        screenshot = self.capture_screen(copy=False)
         if screenshot is None:
             return {"error": "Failed to capture screen"}
         
@@ -290,11 +389,13 @@ class VisionSystem:
             "elements_found": {}
         }
         
-        # Find all types of game elements
+        # Find all types of game elements from a single color segmentation
         element_types = ['chests', 'eggs', 'breakables', 'ui_elements']
+        segmentation = self.segment_colors(screenshot)
+        pyramid = self.template_bank.build_pyramid(screenshot) if len(self.template_bank) else None
         
         for element_type in element_types:
-            matches = self.find_template(element_type, screenshot)
+            matches = self.find_template(element_type, screenshot, segmentation, pyramid)
             analysis["elements_found"][element_type] = {
                 "count": len(matches),
                 "positions": matches
@@ -314,16 +415,10 @@ class VisionSystem:
         
         # Basic color analysis
         try:
-            # Convert to different color spaces for analysis
-            hsv = cv2.cvtColor(screenshot, cv2.COLOR_BGR2HSV)
-            
-            # Calculate dominant colors
+            # Top 5 most common colors from one quantized histogram, most common first
             colors = screenshot.reshape(-1, 3)
-            unique_colors, counts = np.unique(colors, axis=0, return_counts=True)
-            
-            # Get top 5 most common colors
-            top_indices = np.argsort(counts)[-5:]
-            dominant_colors = [unique_colors[i].tolist() for i in top_indices]
+            top_colors, _ = self.palette_engine.top_colors(screenshot, k=5)
+            dominant_colors = top_colors.tolist()
             
             analysis["color_analysis"] = {
                 "dominant_colors": dominant_colors,
@@ -365,6 +460,7 @@ class VisionSystem:
                 "color_range": element_analysis.get("color_range", {}),
                 "size_range": element_analysis.get("size_range", {}),
                 "features": element_analysis.get("features", {}),
+                "template_image": self._encode_template_image(element_screenshot),
                 "learned_at": time.time()
             }
             
@@ -373,6 +469,9 @@ class VisionSystem:
                 self.templates[element_type] = []
             
             self.templates[element_type].append(template_entry)
+            self.template_bank.add_template(
+                f"{element_type}:{len(self.templates[element_type]) - 1}", element_screenshot, group=element_type
+            )
             
             # Save templates
             self.save_templates()
@@ -384,6 +483,11 @@ class VisionSystem:
             self.logger.error(f"Failed to learn element: {e}")
             return False
     
+    def _encode_template_image(self, element_image: np.ndarray) -> str:
+        """PNG + base64 so the template image can be stored in the templates JSON"""
+        success, encoded = cv2.imencode('.png', element_image)
+        return base64.b64encode(encoded.tobytes()).decode() if success else ""
+    
     def _analyze_element(self, element_image: np.ndarray) -> Dict[str, Any]:
         """Analyze an element image to extract features"""
         try:
@@ -470,10 +574,12 @@ class VisionSystem:
     
     def _continuous_capture_loop(self, interval: float):
         """Background loop for continuous screen capture"""
+        pacer = FramePacer(1.0 / interval)
+        
         while self.is_capturing:
             try:
-                self.capture_screen()
-                time.sleep(interval)
+                self.capture_screen(copy=False)
+                pacer.wait()
             except Exception as e:
                 self.logger.error(f"Continuous capture error: {e}")
                 time.sleep(interval)
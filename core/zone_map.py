@@ -0,0 +1,167 @@
+"""
+Screen Zone Map
+Persistent cache of detected game zones keyed by a cheap screen-layout hash,
+so zone and boundary detection re-runs only when the layout changes instead
+of on every analysed frame
+"""
+
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, Dict, Any, Callable
+
+import numpy as np
+import cv2
+
+from .change_detector import FrameChange
+
+
+@dataclass
+class ZoneLayout:
+    """Zones detected for one screen layout"""
+    layout_hash: str
+    signature: np.ndarray
+    zones: Dict[str, Any]
+    detected_at: float
+    last_seen: float
+    hits: int = 0
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class ZoneMap:
+    """
+    Layout-keyed zone cache
+
+    A layout is described by a tiny grayscale thumbnail (signature_size
+    cells). Frames the change detector reports as unchanged return the
+    current zones without touching the frame. Changed frames are compared
+    with the current layout's thumbnail; within `tolerance` grey levels the
+    layout is the same and the cached zones stand. Otherwise the layout is
+    looked up by hash among previously seen layouts and zones are detected
+    only for new ones. invalidate() forces re-detection (e.g. on a zone
+    transition the thumbnail cannot see), and entries older than max_age
+    seconds are refreshed when next used.
+    """
+
+    def __init__(self, signature_size: Tuple[int, int] = (16, 9), tolerance: float = 12.0,
+                 quantization: int = 32, max_layouts: int = 32, max_age: Optional[float] = 60.0):
+        self.logger = logging.getLogger(__name__)
+
+        self.signature_size = signature_size
+        self.tolerance = tolerance
+        self.quantization = quantization
+        self.max_layouts = max_layouts
+        self.max_age = max_age
+
+        # layout hash -> ZoneLayout, least recently used first
+        self.layouts = OrderedDict()
+        self.current = None
+
+        self.stats = {
+            'updates': 0,
+            'unchanged_hits': 0,
+            'same_layout_hits': 0,
+            'known_layout_hits': 0,
+            'detections': 0,
+            'detection_ms': 0.0
+        }
+
+    @property
+    def zones(self) -> Dict[str, Any]:
+        """Zones of the current layout (empty before the first update)"""
+        return self.current.zones if self.current is not None else {}
+
+    def layout_signature(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.signature_size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def layout_hash(self, signature: np.ndarray) -> str:
+        quantized = (signature // self.quantization).astype(np.uint8)
+        return hashlib.blake2b(quantized.tobytes(), digest_size=8).hexdigest()
+
+    def update(self, frame: np.ndarray, change: Optional[FrameChange],
+               detect: Callable[[np.ndarray], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Zones for a frame, running detect(frame) only when the layout is new or stale
+
+        change is the frame's FrameChangeDetector result; None means unknown
+        and always checks the layout.
+        """
+        self.stats['updates'] += 1
+        now = time.time()
+
+        if change is not None and not change.changed and self._is_fresh(self.current, now):
+            self.stats['unchanged_hits'] += 1
+            self.current.last_seen = now
+            return self.current.zones
+
+        signature = self.layout_signature(frame)
+
+        if self.current is not None and self._is_fresh(self.current, now) and \
+                np.abs(signature - self.current.signature).max() <= self.tolerance:
+            self.stats['same_layout_hits'] += 1
+            self.current.last_seen = now
+            return self.current.zones
+
+        layout_hash = self.layout_hash(signature)
+        known = self.layouts.get(layout_hash)
+
+        if known is not None and self._is_fresh(known, now):
+            self.stats['known_layout_hits'] += 1
+            self.layouts.move_to_end(layout_hash)
+
+            known.hits += 1
+            known.last_seen = now
+            known.signature = signature
+            self.current = known
+
+            return known.zones
+
+        started = time.perf_counter()
+        zones = detect(frame)
+
+        self.stats['detections'] += 1
+        self.stats['detection_ms'] = (time.perf_counter() - started) * 1000
+
+        self.current = ZoneLayout(layout_hash, signature, zones, now, now)
+        self.layouts[layout_hash] = self.current
+        self.layouts.move_to_end(layout_hash)
+
+        while len(self.layouts) > self.max_layouts:
+            self.layouts.popitem(last=False)
+
+        return zones
+
+    def invalidate(self, layout_hash: Optional[str] = None):
+        """Drop one cached layout (the current one by default) so it is detected again"""
+        if layout_hash is None:
+            if self.current is None:
+                return
+            layout_hash = self.current.layout_hash
+
+        self.layouts.pop(layout_hash, None)
+
+        if self.current is not None and self.current.layout_hash == layout_hash:
+            self.current = None
+
+    def clear(self):
+        self.layouts.clear()
+        self.current = None
+
+    def _is_fresh(self, layout: Optional[ZoneLayout], now: float) -> bool:
+        if layout is None:
+            return False
+
+        return self.max_age is None or now - layout.detected_at <= self.max_age
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats['layouts'] = len(self.layouts)
+        stats['current_layout'] = self.current.layout_hash if self.current is not None else None
+
+        lookups = stats['updates']
+        stats['hit_rate'] = (lookups - stats['detections']) / lookups if lookups else 0.0
+
+        return stats
@@ -94,7 +94,8 @@ class GameBot:
             enhanced_vision=self.enhanced_vision_system,
             automation_engine=self.automation_engine,
             learning_system=self.learning_system,
-            gameplay_recorder=self.gameplay_recording
+            gameplay_recorder=self.gameplay_recording,
+            learning_engine=self.intelligent_learning_engine
         )
         
         # Initialize advanced SerpentAI components (if available)